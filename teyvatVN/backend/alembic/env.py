@@ -12,24 +12,25 @@ from alembic import context
 config = context.config
 
 # Interpret the config file for Python logging.
-# This line sets up loggers basically.
-if config.config_file_name is not None:
+# This line sets up loggers basically. (Skipped when the server runs the migrations
+# itself, so the app's own logging setup is left alone.)
+if config.config_file_name is not None and "connection" not in config.attributes:
     fileConfig(config.config_file_name)
 
-# add your model's MetaData object here
-# for 'autogenerate' support
-from models import Base
-target_metadata = Base.metadata
+# this ensures that the backend directory is in the sys.path
+# so that `import app...` works however alembic is started
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 # add your model's MetaData object here
 # for 'autogenerate' support
-# from myapp import mymodel
-# target_metadata = mymodel.Base.metadata
-# target_metadata = None
+from app.core.config import DATABASE_URL
+from app.core.database import Base
+import app.models.sql  # noqa: F401  (registers the tables on Base.metadata)
+target_metadata = Base.metadata
 
-# this ensures that the backend_server directory is in the sys.path
-# so that relative imports like `from .models import Base` work correctly
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# The database comes from DATABASE_URL (.env), the same one the server uses
+# (sqlalchemy.url in alembic.ini is only a placeholder).
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -69,6 +70,12 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # app/core/migrations.py hands us an open connection.
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run_with(connection)
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -76,14 +83,18 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-            render_as_batch=True,
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+        _run_with(connection)
+
+
+def _run_with(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
 
 
 if context.is_offline_mode():
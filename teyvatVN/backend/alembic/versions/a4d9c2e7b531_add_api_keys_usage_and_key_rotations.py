@@ -0,0 +1,77 @@
+"""Add API keys, usage counters and key rotation progress
+
+Revision ID: a4d9c2e7b531
+Revises: f1e5d0bba151
+Create Date: 2026-10-19 10:00:00.000000
+
+Databases made by the old Base.metadata.create_all() may already have some of these,
+so each table and column is only added if it is missing.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d9c2e7b531'
+down_revision: Union[str, Sequence[str], None] = 'f1e5d0bba151'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'gemini_api_key' not in {column['name'] for column in inspector.get_columns('users')}:
+        with op.batch_alter_table('users') as batch_op:
+            batch_op.add_column(sa.Column('gemini_api_key', sa.String(), nullable=True))
+
+    if 'user_usage' not in tables:
+        op.create_table('user_usage',
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('chapters', sa.Integer(), nullable=False),
+        sa.Column('bytes', sa.Integer(), nullable=False),
+        sa.Column('generations', sa.Integer(), nullable=False),
+        sa.Column('generations_today', sa.Integer(), nullable=False),
+        sa.Column('generations_day', sa.String(), nullable=True),
+        sa.Column('counted', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('username')
+        )
+        op.create_index(op.f('ix_user_usage_bytes'), 'user_usage', ['bytes'], unique=False)
+        op.create_index(op.f('ix_user_usage_chapters'), 'user_usage', ['chapters'], unique=False)
+        op.create_index(op.f('ix_user_usage_generations'), 'user_usage', ['generations'], unique=False)
+
+    if 'chapter_usage' not in tables:
+        op.create_table('chapter_usage',
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('chapter_id', sa.String(), nullable=False),
+        sa.Column('bytes', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('username', 'chapter_id')
+        )
+
+    if 'key_rotations' not in tables:
+        op.create_table('key_rotations',
+        sa.Column('key_id', sa.String(), nullable=False),
+        sa.Column('last_user_id', sa.Integer(), nullable=False),
+        sa.Column('checked', sa.Integer(), nullable=False),
+        sa.Column('rotated', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key_id')
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('key_rotations')
+    op.drop_table('chapter_usage')
+    op.drop_index(op.f('ix_user_usage_generations'), table_name='user_usage')
+    op.drop_index(op.f('ix_user_usage_chapters'), table_name='user_usage')
+    op.drop_index(op.f('ix_user_usage_bytes'), table_name='user_usage')
+    op.drop_table('user_usage')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('gemini_api_key')
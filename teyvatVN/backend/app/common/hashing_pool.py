@@ -0,0 +1,40 @@
+"""
+Password Hashing Executor
+
+bcrypt is slow on purpose: one hash or check takes around a quarter of a second at the
+default cost. Run on the event loop, every login would freeze the whole server for that long.
+
+Like chapter I/O (storage_io.py), password work goes to its own small pool of threads:
+1.  **Off the Loop**: bcrypt releases the GIL while it works, so other requests keep
+    being served while a password is checked.
+2.  **Bounded**: At most PASSWORD_HASH_WORKERS hashes run at once, so a burst of logins
+    can use at most that many CPU cores. Extra logins wait in line.
+3.  **Separate**: A login burst can't fill up the storage pool or FastAPI's shared thread pool.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.core.config import PASSWORD_HASH_WORKERS
+
+hashing_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+async def run_hashing(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a password hash/check on the hashing pool and waits for it without blocking the loop.
+
+    Usage:
+        ok = await run_hashing(auth_service.verify_password, password, user.hashed_password)
+
+    Args:
+        func (Callable): The blocking function.
+        *args, **kwargs: Passed to func.
+
+    Returns:
+        Any: Whatever func returns (exceptions are re-raised here).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hashing_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,70 @@
+"""
+Shared Outgoing HTTP Client
+
+Talking to Google (OAuth token exchange, signing keys) used to open a new connection every
+time: a fresh TCP and TLS handshake per login.
+
+How it works:
+1.  **One Client**: get_http_client() creates one httpx.AsyncClient the first time Google
+    is called (setting up TLS takes ~0.1 s, which a starting worker shouldn't pay), and
+    the app's lifespan closes it with close_http_client() when the server stops.
+2.  **Pooled**: Connections are kept open (HTTP_KEEPALIVE_SECONDS) and reused, and with
+    HTTP/2 many requests share one connection.
+3.  **Timeouts**: Connecting gives up after HTTP_CONNECT_TIMEOUT seconds, anything else
+    after HTTP_TIMEOUT, so a slow Google can't hold requests forever.
+"""
+
+from typing import Optional
+
+import httpx
+
+from app.core.config import HTTP_CONNECT_TIMEOUT, HTTP_KEEPALIVE_SECONDS, HTTP_MAX_CONNECTIONS, HTTP_TIMEOUT
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # Optional dependency (httpx[http2]): without it, HTTP/1.1 keep-alive only
+    h2 = None
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def create_http_client(**overrides) -> httpx.AsyncClient:
+    """
+    Builds a pooled client with the configured timeouts and limits.
+
+    Args:
+        **overrides: Passed on to httpx.AsyncClient (e.g. transport= in tests).
+    """
+    options = {
+        "http2": h2 is not None,
+        "timeout": httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        ),
+        **overrides,
+    }
+    return httpx.AsyncClient(**options)
+
+
+def start_http_client(client: Optional[httpx.AsyncClient] = None) -> httpx.AsyncClient:
+    """Makes 'client' (or a new pooled one) the app's client, e.g. to use a stand-in in tests."""
+    global _client
+    _client = client or create_http_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    """Closes the app's client and its open connections."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The app's shared client, created on first use."""
+    if _client is None:
+        return start_http_client()
+    return _client
@@ -0,0 +1,223 @@
+"""
+Static File Serving for /data
+
+Everything under /data goes through the tunnel, so every byte and every round trip counts.
+On top of Starlette's StaticFiles (which already does Range requests and 304s),
+DataStaticFiles adds:
+
+1.  **Content ETags**: A hash of the file's content, computed once per file version
+    (same path, mtime and size) and then served from memory.
+2.  **Precompressed Siblings**: If 'output.json.br' or 'output.json.gz' sits next to
+    'output.json' (written by scripts/precompress_data.py) and the browser
+    accepts that encoding, the smaller file is sent as is. Nothing is compressed per request.
+3.  **Cache Headers**: Hashed URLs never change, so they may be cached for a year:
+    - file names with a content hash in them ('scene.3f9a1c2b.png'), or
+    - any URL with '?v=<content hash>' (see versioned_path()).
+    Everything else gets 'no-cache', i.e. "check with us first", which costs one
+    cheap 304 when nothing changed.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+import stat
+import threading
+from collections import OrderedDict
+from mimetypes import guess_type
+from typing import Optional
+
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from app.core.config import STATIC_PRECOMPRESS_MIN_BYTES
+from app.storage.filesystem import atomic_write
+
+try:
+    import brotli
+except ImportError:  # Optional dependency: without it only .gz siblings are written
+    brotli = None
+
+# Preferred first. (encoding name, sibling file suffix)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# 'name.<8+ hex digits>.ext' counts as a hashed file name.
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[^./]+$")
+# How many file versions we remember the content hash of.
+ETAG_CACHE_ENTRIES = 4096
+
+
+# --- Writing ---
+
+def write_precompressed(path: str, raw: bytes, min_bytes: int = STATIC_PRECOMPRESS_MIN_BYTES) -> None:
+    """
+    Writes '.gz' (and '.br' if the brotli package is installed) copies of a file next to it.
+
+    Call it right after writing the file itself, so the copies are never older than it
+    (the server ignores copies older than the original).
+    Small files, and copies that wouldn't be smaller, are skipped.
+
+    Args:
+        path (str): The file that was just written.
+        raw (bytes): Its contents.
+        min_bytes (int): Files smaller than this aren't worth compressing.
+    """
+    if len(raw) < min_bytes:
+        return
+    variants = [(".gz", gzip.compress(raw, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", brotli.compress(raw, quality=9)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(raw):
+            atomic_write(path + suffix, compressed)
+
+
+# --- Serving ---
+
+class DataStaticFiles(StaticFiles):
+    """StaticFiles with content ETags, precompressed siblings and long-lived hashed URLs."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # full path -> (mtime_ns, size, content hash)
+        self._hashes: "OrderedDict[str, tuple[int, int, str]]" = OrderedDict()
+        # full path -> {encoding: (sibling path, stat)}, refreshed on every lookup
+        self._siblings: dict[str, dict[str, tuple[str, os.stat_result]]] = {}
+        self._hashes_lock = threading.Lock()
+
+    def content_hash(self, full_path: str, stat_result: os.stat_result) -> str:
+        """
+        Hex hash of a file's content, read from disk only once per file version.
+
+        Blocking (it may read the whole file): call it from a worker thread.
+        """
+        key = (stat_result.st_mtime_ns, stat_result.st_size)
+        with self._hashes_lock:
+            cached = self._hashes.get(full_path)
+            if cached is not None and cached[:2] == key:
+                self._hashes.move_to_end(full_path)
+                return cached[2]
+
+        digest = hashlib.blake2b(digest_size=12)
+        with open(full_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+
+        with self._hashes_lock:
+            self._hashes[full_path] = (*key, content_hash)
+            self._hashes.move_to_end(full_path)
+            while len(self._hashes) > ETAG_CACHE_ENTRIES:
+                evicted, _ = self._hashes.popitem(last=False)
+                self._siblings.pop(evicted, None)
+        return content_hash
+
+    def versioned_path(self, path: str) -> Optional[str]:
+        """
+        'path?v=<content hash>' for a file under the directory, or None if there is no such file.
+
+        Links built with this can be cached forever: a new version gets a new URL.
+        """
+        full_path, stat_result = self.lookup_path(path)
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            return None
+        return f"{path}?v={self.content_hash(full_path, stat_result)}"
+
+    def lookup_path(self, path: str) -> tuple[str, Optional[os.stat_result]]:
+        # Runs in a worker thread (see StaticFiles.get_response), so the file is hashed
+        # and its siblings stat'ed here, off the event loop; file_response() reads the results.
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+            self.content_hash(full_path, stat_result)
+            siblings = {}
+            for encoding, suffix in ENCODINGS:
+                try:
+                    sibling_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                # A copy older than the file belongs to an earlier version (e.g. a hand edit).
+                if sibling_stat.st_mtime_ns >= stat_result.st_mtime_ns:
+                    siblings[encoding] = (full_path + suffix, sibling_stat)
+            with self._hashes_lock:
+                self._siblings[full_path] = siblings
+        return full_path, stat_result
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        full_path = os.fspath(full_path)
+        request_headers = Headers(scope=scope)
+        content_hash = self._cached_hash(full_path, stat_result)
+        if content_hash is None:
+            # Not looked up through lookup_path(): plain StaticFiles behaviour.
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        headers = {
+            "cache-control": self._cache_control(scope, content_hash),
+            "vary": "Accept-Encoding",
+        }
+        media_type = guess_type(full_path)[0] or "application/octet-stream"
+
+        path, file_stat, etag = full_path, stat_result, f'"{content_hash}"'
+        # Byte ranges refer to the plain file, so Range requests never get a compressed copy.
+        if status_code == 200 and "range" not in request_headers:
+            sibling = self._pick_sibling(full_path, request_headers.get("accept-encoding", ""))
+            if sibling is not None:
+                encoding, path, file_stat = sibling
+                headers["content-encoding"] = encoding
+                etag = f'"{content_hash}-{encoding}"'
+        headers["etag"] = etag
+
+        response = FileResponse(path, status_code=status_code, headers=headers,
+                                media_type=media_type, stat_result=file_stat)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    # --- Helpers ---
+
+    def _cached_hash(self, full_path: str, stat_result: os.stat_result) -> Optional[str]:
+        with self._hashes_lock:
+            cached = self._hashes.get(full_path)
+        if cached is not None and cached[:2] == (stat_result.st_mtime_ns, stat_result.st_size):
+            return cached[2]
+        return None
+
+    @staticmethod
+    def _cache_control(scope: Scope, content_hash: str) -> str:
+        if HASHED_NAME.search(scope["path"]):
+            return IMMUTABLE_CACHE_CONTROL
+        version = QueryParams(scope.get("query_string", b"")).get("v")
+        if version and len(version) >= 8 and content_hash.startswith(version):
+            return IMMUTABLE_CACHE_CONTROL
+        return REVALIDATE_CACHE_CONTROL
+
+    def _pick_sibling(self, full_path: str, accept_encoding: str) -> Optional[tuple[str, str, os.stat_result]]:
+        """The best up-to-date precompressed copy the client accepts (found by lookup_path())."""
+        with self._hashes_lock:
+            siblings = self._siblings.get(full_path, {})
+        if not siblings:
+            return None
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in accepted and encoding in siblings:
+                return (encoding, *siblings[encoding])
+        return None
+
+
+def _accepted_encodings(accept_encoding: str) -> set[str]:
+    """Parses an Accept-Encoding header, e.g. 'gzip, deflate, br;q=0.9' -> {'gzip', 'deflate', 'br'}."""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip())
+    return accepted
@@ -0,0 +1,39 @@
+"""
+Storage I/O Executor
+
+Our 'async def' routes run on the event loop: the single thread that serves every request.
+Calling open(), json.load() or shutil.rmtree() there freezes the whole server until the disk answers.
+
+Instead, file work is handed to a small, dedicated pool of threads:
+1.  **Bounded**: At most STORAGE_IO_WORKERS file operations run at once, so a slow disk can't
+    spawn an unlimited number of threads. Extra work simply waits in line.
+2.  **Separate**: It is not FastAPI's shared thread pool, so slow disk work can't starve
+    the sync routes (and database calls) that use that pool.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.core.config import STORAGE_IO_WORKERS
+
+storage_executor = ThreadPoolExecutor(max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage-io")
+
+
+async def run_io(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a blocking function on the storage pool and waits for it without blocking the loop.
+
+    Usage:
+        chapter = await run_io(store.read, username, chapter_id)
+
+    Args:
+        func (Callable): The blocking function.
+        *args, **kwargs: Passed to func.
+
+    Returns:
+        Any: Whatever func returns (exceptions are re-raised here).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(storage_executor, functools.partial(func, *args, **kwargs))
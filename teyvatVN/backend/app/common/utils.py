@@ -1,142 +1,62 @@
 """
 Common Utility Functions
 
-This file handles the boring but necessary stuff: File Management.
-Since we store stories as JSON files on the disk (not in a database), we need helpers to:
-1.  Find where to save files.
-2.  List all the files a user has.
-3.  Figure out what to name the next file (chapter1, chapter2, etc.).
+Small helpers around chapter storage.
+Where and how chapters are actually stored is decided by the chapter store
+(see app/storage); these functions just ask the configured store:
+1.  List all the chapters a user has.
+2.  Figure out what to name the next chapter (chapter1, chapter2, etc.) without two requests picking the same name.
 """
 
-import os
-import re
-from typing import Optional
+from app.storage import get_chapter_store
+from app.storage.base import project
 
-# Base data directory
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
-# Base data directory: Where all user stories live.
-# We go up 3 levels from here (backend/app/common -> backend/app -> backend -> data)
-# DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 
 def get_next_chapter_id(username: str) -> str:
     """
-    Get the next available chapter ID for a user.
-    
-    Checks the user's data directory for existing chapters and returns
-    the next sequential ID (e.g., 'chapter1', 'chapter2').
-    
+    Get the next available chapter ID for a user, without reserving it.
+
+    Use allocate_chapter_id() when you are actually going to create the chapter.
+
     Args:
         username (str): The username of the user.
-    
+
     Returns:
         str: The next available chapter ID (e.g., 'chapterN+1').
     """
-    user_dir = os.path.join(DATA_DIR, username)
-    
-    # If user directory doesn't exist, this is their first chapter
-    if not os.path.exists(user_dir):
-        return "chapter1"
-    
-    # Get all directories that start with 'chapter'
-    chapters = [d for d in os.listdir(user_dir) if d.startswith("chapter") and os.path.isdir(os.path.join(user_dir, d))]
-    
-    if not chapters:
-        return "chapter1"
-    
-    # Extract numbers from chapter names (e.g., "chapter5" -> 5)
-    numbers = []
-    for chapter in chapters:
-        match = re.search(r'chapter(\d+)', chapter)
-        if match:
-            numbers.append(int(match.group(1)))
-    
-    # Get next number (max + 1)
-    next_num = max(numbers) + 1 if numbers else 1
-    return f"chapter{next_num}"
+    return get_chapter_store().next_chapter_id(username)
 
 
-def list_user_chapters(username: str) -> list[dict]:
+def allocate_chapter_id(username: str) -> str:
     """
-    List all chapters for a user with metadata.
-    
-    Scans the user's directory for chapters and reads their metadata
-    from the 'output.json' file in each chapter directory.
+    Reserve the next chapter ID for a user.
+
+    Two concurrent generations (even in different worker processes)
+    never get the same ID.
 
     Args:
         username (str): The username of the user.
 
     Returns:
-        list[dict]: A list of dictionaries, each containing chapter metadata 
-                    (id, title, characters, backgrounds, created_at, path).
+        str: The reserved chapter ID (e.g., 'chapter7').
     """
-    import json
-    from datetime import datetime
-    
-    user_dir = os.path.join(DATA_DIR, username)
-    
-    if not os.path.exists(user_dir):
-        return []
-    
-    chapters = []
-    # Loop through every folder in the user's directory
-    for chapter_dir in os.listdir(user_dir):
-        chapter_path = os.path.join(user_dir, chapter_dir)
-        if os.path.isdir(chapter_path):
-            output_file = os.path.join(chapter_path, "output.json")
-            if os.path.exists(output_file):
-                try:
-                    # Read the chapter data
-                    with open(output_file, "r", encoding="utf-8") as f:
-                        chapter_data = json.load(f)
-                    
-                    # Get file modification time (when was it last saved?)
-                    mod_time = os.path.getmtime(output_file)
-                    created_at = datetime.fromtimestamp(mod_time).isoformat()
-                    
-                    chapters.append({
-                        "chapter_id": chapter_dir,
-                        "title": chapter_data.get("title", "Untitled Chapter"),
-                        "characters": chapter_data.get("characters", []),
-                        "backgrounds": chapter_data.get("backgrounds", []),
-                        "created_at": created_at,
-                        "path": output_file
-                    })
-                except Exception as e:
-                    print(f"Error reading chapter {chapter_dir}: {e}")
-                    # Still include the chapter but with minimal info so the user sees *something*
-                    chapters.append({
-                        "chapter_id": chapter_dir,
-                        "title": "Error Loading Chapter",
-                        "characters": [],
-                        "backgrounds": [],
-                        "created_at": None,
-                        "path": output_file
-                    })
-    
-    # Sort by chapter number (newest/highest number first)
-    def get_chapter_number(chapter):
-        """Extract numeric value from chapter_id like 'chapter19' -> 19"""
-        match = re.search(r'chapter(\d+)', chapter.get("chapter_id", ""))
-        return int(match.group(1)) if match else 0
-    
-    chapters.sort(key=get_chapter_number, reverse=True)
-    
-    return chapters
-
-
-def get_chapter_path(username: str, chapter_id: str) -> str:
+    return get_chapter_store().allocate_chapter_id(username)
+
+
+def list_user_chapters(username: str) -> list[dict]:
     """
-    Get the full path to a chapter's output.json file.
-    
-    Creates the directory structure if it doesn't exist.
+    List all chapters for a user with metadata.
 
     Args:
-        username (str): The username.
-        chapter_id (str): The chapter ID.
+        username (str): The username of the user.
 
     Returns:
-        str: The absolute path to the output.json file.
+        list[dict]: A list of dictionaries, each containing chapter metadata
+                    (id, title, characters, backgrounds, created_at, path),
+                    newest/highest chapter number first.
     """
-    folder = os.path.join(DATA_DIR, username, chapter_id)
-    os.makedirs(folder, exist_ok=True)
-    return os.path.join(folder, "output.json")
+    entries, _ = get_chapter_store().list_chapters(username, order="number")
+    return [
+        dict(project(entry), path=f"{username}/{entry['chapter_id']}/output.json")
+        for entry in entries
+    ]
@@ -1,16 +1,36 @@
 import os
 from dotenv import load_dotenv
 
+# The app's settings, read once: .env is loaded here (and only here), and every other
+# module imports the values it needs from this one. Python caches the module, so the
+# environment is parsed a single time per process.
 load_dotenv()
 
 # App URLs
-print(f"DEBUG: Loading config.py. .env loaded? {load_dotenv()}")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:6001")
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:6002")
-print(f"DEBUG: Config BACKEND_URL: {BACKEND_URL}")
 
 # Database
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+# SQLite profile (applied to every new connection): how long a writer waits for the lock
+# before "database is locked", 'synchronous' level with WAL, memory-mapped I/O and page cache sizes.
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+# Connections per process for the async routes. SQLite lets one connection write at a time:
+# requests queueing for a single pooled connection (without blocking the event loop) get through
+# faster than many connections retrying the lock inside SQLite.
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "1"))
+# Other databases (e.g. postgresql://...): connection pool sizing. Connections are checked
+# before use (pre-ping) and replaced after DB_POOL_RECYCLE seconds.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Run the Alembic migrations ('alembic upgrade head') when the server starts. Off by default:
+# with several workers, run them once before starting instead.
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() == "true"
 
 # Security
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "").split(",") if os.getenv("ALLOWED_ORIGINS") else []
@@ -18,6 +38,52 @@ if not ALLOWED_ORIGINS:
     # Default fallback if not set
     ALLOWED_ORIGINS = [FRONTEND_URL, "https://updates-limitations-favors-effectively.trycloudflare.com"]
 
+# Storage
+# Which chapter storage driver to use: "filesystem", "sqlite" or "memory".
+CHAPTER_STORE = os.getenv("CHAPTER_STORE", "filesystem").lower()
+# Filesystem driver: where user folders live.
+CHAPTER_DATA_DIR = os.getenv("CHAPTER_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "common", "data"))
+# Filesystem driver: "flat" (data/{username}/) or "sharded" (data/ab/cd/{username}/, for many users).
+# See scripts/migrate_data_layout.py to move existing folders.
+CHAPTER_DATA_LAYOUT = os.getenv("CHAPTER_DATA_LAYOUT", "flat")
+# SQLite driver: the database file.
+CHAPTER_SQLITE_PATH = os.getenv("CHAPTER_SQLITE_PATH", "./chapters.db")
+# Upper bound (in bytes of stored JSON) for the in-memory parsed-chapter cache.
+CHAPTER_CACHE_MAX_BYTES = int(os.getenv("CHAPTER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# How chapters are written to disk: "json" (pretty), "minified", "gzip" or "zstd".
+# Reads detect the format automatically, so this can be changed at any time.
+CHAPTER_STORAGE_FORMAT = os.getenv("CHAPTER_STORAGE_FORMAT", "json").lower()
+# Number of threads doing chapter file I/O for the async routes.
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", "8"))
+# Deleted chapters go to the trash first and can be restored for this long (seconds)
+# before the background compactor removes them for good (checked every INTERVAL seconds).
+CHAPTER_TRASH_RETENTION_SECONDS = int(os.getenv("CHAPTER_TRASH_RETENTION_SECONDS", str(7 * 24 * 3600)))
+CHAPTER_TRASH_COMPACT_INTERVAL = int(os.getenv("CHAPTER_TRASH_COMPACT_INTERVAL", "3600"))
+# Watch the chapter folder for edits made outside the API (filesystem store only):
+# "off", "auto" (inotify if available, else polling), "inotify" or "poll".
+CHAPTER_WATCH = os.getenv("CHAPTER_WATCH", "off")
+CHAPTER_WATCH_DEBOUNCE_MS = int(os.getenv("CHAPTER_WATCH_DEBOUNCE_MS", "200"))
+CHAPTER_WATCH_POLL_INTERVAL = float(os.getenv("CHAPTER_WATCH_POLL_INTERVAL", "2"))
+# Full-text search index (SQLite FTS5) over every chapter.
+CHAPTER_SEARCH_PATH = os.getenv("CHAPTER_SEARCH_PATH", "./chapter_search.db")
+# Revision history: store a full snapshot every N revisions (deltas in between),
+# and keep at most this many revisions per chapter (older ones are compacted away).
+CHAPTER_REVISION_SNAPSHOT_EVERY = int(os.getenv("CHAPTER_REVISION_SNAPSHOT_EVERY", "10"))
+CHAPTER_REVISION_KEEP = int(os.getenv("CHAPTER_REVISION_KEEP", "50"))
+
+# Static files (/data)
+# The folder served at /data (backend/data by default). It is not where chapters are saved
+# (CHAPTER_DATA_DIR), so chapters stay behind their owner's token.
+STATIC_DATA_DIR = os.getenv("STATIC_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data"))
+# scripts/precompress_data.py writes .gz (and .br, with 'pip install brotli') copies of the
+# files there that are at least MIN_BYTES big, so /data can send them without compressing on each request.
+STATIC_PRECOMPRESS_MIN_BYTES = int(os.getenv("STATIC_PRECOMPRESS_MIN_BYTES", "1024"))
+
+# Usage quotas (per user, 0 = unlimited), checked before every AI generation.
+QUOTA_MAX_CHAPTERS = int(os.getenv("QUOTA_MAX_CHAPTERS", "0"))
+QUOTA_MAX_BYTES = int(os.getenv("QUOTA_MAX_BYTES", "0"))
+QUOTA_MAX_GENERATIONS_PER_DAY = int(os.getenv("QUOTA_MAX_GENERATIONS_PER_DAY", "0"))
+
 # AI Configuration
 # To hardcode a key for testing, use: os.getenv("GEMINI_API_KEY", "your-key-here")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -26,7 +92,58 @@ GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
 USE_PUBLIC_API = os.getenv("USE_PUBLIC_API", "false").lower() == "true"
 
 # Auth
+# bcrypt cost factor (each +1 doubles the time per hash). Existing passwords are
+# re-hashed with the new cost the next time their owner logs in.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads hashing/checking passwords, i.e. the most CPU cores a login burst can take.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Login throttling: failed logins are counted per client IP and per username over a sliding
+# window. After LOGIN_FREE_FAILURES_PER_* failures, each next attempt must wait LOGIN_DELAY_BASE_SECONDS,
+# doubling per failure up to LOGIN_DELAY_MAX_SECONDS; at the MAX_FAILURES limits the key is locked
+# until old failures leave the window. Throttled attempts are refused before bcrypt runs.
+# Backend: "memory" (one process) or "database" (shared by every worker, through DATABASE_URL).
+LOGIN_THROTTLE_BACKEND = os.getenv("LOGIN_THROTTLE_BACKEND", "memory").lower()
+LOGIN_THROTTLE_WINDOW_SECONDS = int(os.getenv("LOGIN_THROTTLE_WINDOW_SECONDS", "900"))
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "10"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "50"))
+LOGIN_FREE_FAILURES_PER_USER = int(os.getenv("LOGIN_FREE_FAILURES_PER_USER", "3"))
+LOGIN_FREE_FAILURES_PER_IP = int(os.getenv("LOGIN_FREE_FAILURES_PER_IP", "10"))
+LOGIN_DELAY_BASE_SECONDS = float(os.getenv("LOGIN_DELAY_BASE_SECONDS", "1"))
+LOGIN_DELAY_MAX_SECONDS = float(os.getenv("LOGIN_DELAY_MAX_SECONDS", "60"))
+# Memory backend: usernames/IPs tracked at most (the oldest are forgotten first).
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS", "100000"))
+# Behind a proxy (e.g. Cloudflare), every client has the proxy's IP: name the header carrying
+# the real one ("CF-Connecting-IP", "X-Forwarded-For"). Leave empty when clients connect directly.
+CLIENT_IP_HEADER = os.getenv("CLIENT_IP_HEADER", "")
+# In-memory cache of user records (by username and email): seconds an entry is trusted,
+# and how many entries are kept. Changes made through the API are seen at once.
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+# "No such user" is only trusted this long (0 = not cached): another worker may have just signed them up.
+USER_CACHE_MISS_TTL_SECONDS = float(os.getenv("USER_CACHE_MISS_TTL_SECONDS", "2"))
+# Decrypted Gemini API keys are kept in memory this long (seconds), so generations don't decrypt every time.
+API_KEY_CACHE_TTL_SECONDS = float(os.getenv("API_KEY_CACHE_TTL_SECONDS", "300"))
+API_KEY_CACHE_MAX_ENTRIES = int(os.getenv("API_KEY_CACHE_MAX_ENTRIES", "10000"))
+# Verified login tokens are remembered this long (seconds, never past their expiry),
+# so each request checks its token with a dictionary lookup instead of a signature check.
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
 SECRET_KEY = os.getenv("SECRET_KEY")
+# Fernet key for stored Gemini API keys (required to save or read them), and retired keys
+# (comma-separated) still accepted for decryption while scripts/migrate_keys.py re-encrypts.
+ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
+ENCRYPTION_OLD_KEYS = [k.strip() for k in os.getenv("ENCRYPTION_OLD_KEYS", "").split(",") if k.strip()]
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+# Google's signing keys for ID tokens (JWKS). Cached as long as Google's Cache-Control allows,
+# or GOOGLE_JWKS_DEFAULT_TTL seconds when it says nothing.
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_JWKS_DEFAULT_TTL = float(os.getenv("GOOGLE_JWKS_DEFAULT_TTL", "3600"))
+# Outgoing HTTP (Google): one pooled client for the app's lifetime.
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+# Admin endpoints (/api/admin/...) need this in the X-Admin-Key header; unset disables them.
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
 GOOGLE_REDIRECT_URI = f"{BACKEND_URL}/api/auth/google/callback"
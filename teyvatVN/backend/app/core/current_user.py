@@ -0,0 +1,50 @@
+"""
+Current User (Bearer Token Dependencies)
+
+Routes that belong to one user add these dependencies instead of trusting the
+username in the path or body.
+
+How it works:
+1.  **Bearer Token**: The frontend sends 'Authorization: Bearer <token>', the token it got at login.
+2.  **Verified Once**: The signature and expiry are checked the first time a token is seen.
+    After that, jwt_utils.token_cache answers from memory until the token expires.
+3.  **No Database**: The username comes from the token's 'sub' claim.
+4.  **Ownership**: require_owner() compares it with the {username} in the URL.
+"""
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.core import jwt_utils
+from app.core.jwt_utils import TokenUser
+
+# auto_error=False: a missing header gets our 401 below instead of FastAPI's 403.
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme)) -> TokenUser:
+    """
+    Dependency that returns the user a request's bearer token belongs to.
+
+    Raises:
+        HTTPException: 401 if the token is missing, fake or expired.
+    """
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not logged in", headers={"WWW-Authenticate": "Bearer"})
+    user = jwt_utils.token_cache.verify(credentials.credentials)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token. Please log in again.",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+
+def require_owner(username: str, user: TokenUser = Depends(get_current_user)) -> TokenUser:
+    """
+    Dependency for routes with a {username} path parameter: only that user may call them.
+
+    Raises:
+        HTTPException: 401 without a valid token, 403 if it belongs to someone else.
+    """
+    if user.username != username:
+        raise HTTPException(status_code=403, detail="You can only access your own chapters")
+    return user
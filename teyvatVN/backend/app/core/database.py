@@ -1,34 +1,182 @@
 """
 Database Configuration
 
-This file handles the connection to our database (SQLite).
+This file handles the connection to our database (SQLite by default, or any database
+SQLAlchemy supports, like PostgreSQL, through DATABASE_URL).
 It uses a library called "SQLAlchemy", which is the most popular way to work with databases in Python.
 
 Key Concepts:
-1.  **Engine**: The actual connection to the database file.
+1.  **Engine**: The actual connection to the database (built by create_db_engine()).
 2.  **Session**: A temporary workspace for database operations. Think of it like opening a file, making changes, and then saving.
 3.  **Base**: A template class that all our data models (Users, Stories) will inherit from.
+
+There are two ways in:
+- **Async** (get_async_db, AsyncSessionLocal): for the 'async def' routes. While a query waits
+  for the database, the event loop keeps serving other requests. SQLite goes through aiosqlite.
+- **Sync** (get_db, SessionLocal): for scripts, Alembic and work that already runs on a
+  worker thread (run_io), like the usage counters.
 """
 
-from sqlalchemy import create_engine
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.config import DATABASE_URL
+from app.core.config import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+    SQLITE_POOL_SIZE,
+    SQLITE_SYNCHRONOUS,
+)
 
 # --- Database URL ---
 # This tells SQLAlchemy where to find our database file.
 # "sqlite:///./sql_app.db" means "use SQLite and look for a file named 'sql_app.db' in the current folder".
 SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
-# --- Create Engine ---
+# --- Engine Factory ---
 # The engine is the starting point for any SQLAlchemy application.
 # It's like the ignition key for the database.
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    # "check_same_thread": False is ONLY needed for SQLite.
-    # It allows multiple parts of our web server to access the database at the same time.
-    connect_args={"check_same_thread": False}
-)
+
+def server_pool_options(overrides: dict) -> dict:
+    """
+    The engine options for a database server (anything but SQLite), sync or async.
+
+    Connections are checked with a cheap ping before use. The default queue pool is sized
+    by DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT and DB_POOL_RECYCLE; a custom
+    poolclass in 'overrides' (a NullPool, say) has no such sizing, so none is passed.
+
+    Args:
+        overrides (dict): The caller's options, which win over ours.
+
+    Returns:
+        dict: The options for create_engine() / create_async_engine().
+    """
+    options = {"pool_pre_ping": True}
+    if "poolclass" not in overrides:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    options.update(overrides)
+    return options
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL, **overrides) -> Engine:
+    """
+    Builds the engine for a database URL, tuned for the kind of database it is.
+
+    - **SQLite**: Every new connection gets the settings from apply_sqlite_profile():
+      WAL (readers and a writer no longer block each other), a busy timeout (writers wait
+      for the lock instead of failing with "database is locked"), and bigger caches.
+    - **Anything else** (e.g. PostgreSQL): A connection pool of DB_POOL_SIZE connections
+      (+ DB_MAX_OVERFLOW when busy), each checked with a cheap ping before use and replaced
+      after DB_POOL_RECYCLE seconds, so connections dropped by the server are never handed out.
+
+    Args:
+        url (str): The database URL.
+        **overrides: Passed on to create_engine() (e.g. pool_size in tests).
+
+    Returns:
+        Engine: The engine.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        options = {
+            # SQLite objects may only be used by the thread that created them, unless we say otherwise.
+            # We need this because the web server serves requests from several threads.
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            **overrides,
+        }
+        engine = create_engine(url, **options)
+        event.listen(engine, "connect", apply_sqlite_profile)
+        return engine
+
+    options = server_pool_options(overrides)
+    return create_engine(url, **options)
+
+def apply_sqlite_profile(dbapi_connection, connection_record: Optional[object] = None) -> None:
+    """
+    Connection event: tunes a fresh SQLite connection (runs once per connection, not per query).
+
+    1. journal_mode=WAL: readers keep reading while someone writes (file databases only).
+    2. busy_timeout: a writer waits up to SQLITE_BUSY_TIMEOUT_MS for the lock.
+    3. synchronous=NORMAL: with WAL, commits no longer wait for the disk (a power cut can lose
+       the last commits, but never corrupts the database).
+    4. mmap_size / cache_size: read pages straight from memory.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA database_list")
+        database = cursor.fetchone()[2]
+        if database:  # '' for in-memory databases, which can't use WAL
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+        if SQLITE_SYNCHRONOUS in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+        # A negative cache_size is in KiB rather than pages.
+        cursor.execute(f"PRAGMA cache_size={-int(SQLITE_CACHE_SIZE_KB)}")
+    finally:
+        cursor.close()
+
+# Drivers the async engine uses instead of the default (blocking) ones.
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "psycopg", "mysql": "aiomysql"}
+
+def async_database_url(url: str = SQLALCHEMY_DATABASE_URL) -> str:
+    """
+    The same database as 'url', through a driver that works with asyncio.
+
+    "sqlite:///./sql_app.db" becomes "sqlite+aiosqlite:///./sql_app.db". A URL that already
+    names an async driver is returned unchanged.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    driver = parsed.drivername.partition("+")[2]  # '' when the URL doesn't name one
+    if backend not in ASYNC_DRIVERS or driver in ASYNC_DRIVERS.values():
+        return url
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def create_async_db_engine(url: str = SQLALCHEMY_DATABASE_URL, **overrides) -> AsyncEngine:
+    """
+    Builds the async engine for a database URL, with the same tuning as create_db_engine().
+
+    SQLite file databases get a pool of SQLITE_POOL_SIZE connections (1 by default).
+
+    Args:
+        url (str): The database URL (a sync one is fine: see async_database_url()).
+        **overrides: Passed on to create_async_engine().
+
+    Returns:
+        AsyncEngine: The engine.
+    """
+    url = async_database_url(url)
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        options = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        if parsed.database not in (None, "", ":memory:") and "poolclass" not in overrides:
+            # A small pool (SQLITE_POOL_SIZE): SQLite has a single writer anyway, and waiting
+            # for the pool is first come, first served, unlike retrying a locked database.
+            options.update(pool_size=SQLITE_POOL_SIZE, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT)
+        options.update(overrides)
+        engine = create_async_engine(url, **options)
+        # Connection events are registered on the sync engine underneath.
+        event.listen(engine.sync_engine, "connect", apply_sqlite_profile)
+        return engine
+
+    options = server_pool_options(overrides)
+    return create_async_engine(url, **options)
+
+engine = create_db_engine()
+async_engine = create_async_db_engine()
 
 # --- Create Session Factory ---
 # 'SessionLocal' is a factory that produces new database sessions.
@@ -37,6 +185,10 @@ engine = create_engine(
 # - autoflush=False: Wait for us to explicitly say "push changes" (flush) before sending data to the DB.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async version. expire_on_commit=False: after a commit, objects keep their values
+# instead of reloading them on the next attribute access (which can't be awaited).
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # --- Create Base Model ---
 # We will create our own models (like User, Story) by inheriting from this 'Base' class.
 # It helps SQLAlchemy map our Python classes to SQL tables.
@@ -61,3 +213,27 @@ def get_db():
         # This block runs AFTER the request is finished (even if there was an error).
         # We must always close the session to free up resources.
         db.close()
+
+async def get_async_db():
+    """
+    Same as get_db(), for 'async def' routes: the queries are awaited, not blocking.
+
+    Usage in a route:
+    async def login(request: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+        user = await auth_service.get_user_record_async(db, request.username)
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def release_connection(db: AsyncSession) -> None:
+    """
+    Gives a session's connection back to the pool before a long 'await' (bcrypt, Gemini).
+
+    A session keeps its connection from its first query until it commits or closes.
+    Holding it while the request waits would let a burst of slow requests empty the pool,
+    and every other request would queue for up to DB_POOL_TIMEOUT seconds.
+
+    Only use it between read-only steps: anything not yet committed is discarded.
+    The session stays usable, and its next query checks out a connection again.
+    """
+    await db.close()
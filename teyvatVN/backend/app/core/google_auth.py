@@ -9,28 +9,196 @@ The Flow:
 2.  **Login**: User logs in on Google.
 3.  **Callback**: Google sends the user back to us with a special code.
 4.  **Exchange**: We trade that code for an ID Token (proof of who they are).
+5.  **Verify**: We check the ID Token's signature with Google's public keys, so a forged
+    or tampered token is refused. The keys are fetched once and cached for as long as
+    Google's Cache-Control header allows (GoogleKeyCache below).
+
+All the talking to Google goes through the app's shared, pooled HTTP client
+(app/common/http_client.py), so repeat logins reuse an open connection.
 """
 
-import os
-from dotenv import load_dotenv
+import asyncio
+import re
+import time
+from typing import Optional
+
 import httpx
 from fastapi import HTTPException, status
-from jose import jwt
+from jose import JWTError, jwt
 
-load_dotenv()
+from app.common.http_client import get_http_client
 
 # --- Configuration ---
 # These keys come from the Google Cloud Console.
-from app.core.config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, BACKEND_URL, FRONTEND_URL
+from app.core.config import (
+    GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, BACKEND_URL, FRONTEND_URL, GOOGLE_JWKS_URL, GOOGLE_JWKS_DEFAULT_TTL,
+)
 
 # Where Google sends the user after they log in. Must match exactly what's set in Google Console.
 GOOGLE_REDIRECT_URI = f"{FRONTEND_URL}/api/auth/google/callback"
-print(f"DEBUG: GOOGLE_REDIRECT_URI set to: {GOOGLE_REDIRECT_URI}")
 
 # Google's official URLs
 GOOGLE_AUTHORIZATION_URL = "https://accounts.google.com/o/oauth2/v2/auth"
 GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
 GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
+# Who may have issued a Google ID token (both spellings are used).
+GOOGLE_ISSUERS = ("https://accounts.google.com", "accounts.google.com")
+
+
+# --- Google's Signing Keys ---
+
+def cache_lifetime(cache_control: Optional[str], default: float = GOOGLE_JWKS_DEFAULT_TTL) -> float:
+    """
+    How many seconds a response may be cached, from its Cache-Control header.
+
+    Args:
+        cache_control (Optional[str]): The header, e.g. "public, max-age=19462, must-revalidate".
+        default (float): Used when the header doesn't say.
+
+    Returns:
+        float: max-age, 0 for no-store / no-cache, or 'default'.
+    """
+    if not cache_control:
+        return default
+    directives = cache_control.lower()
+    if "no-store" in directives or "no-cache" in directives:
+        return 0.0
+    match = re.search(r"(?<![-\w])max-age\s*=\s*(\d+)", directives)
+    return float(match.group(1)) if match else default
+
+
+class GoogleKeyCache:
+    """
+    Google's public signing keys (a JWKS), fetched on first use and kept until they expire.
+
+    Google rotates its keys every few days and publishes new ones ahead of time, so a
+    token signed with a key we don't know yet triggers an early refresh (rate limited).
+
+    Args:
+        url (str): Where the JWKS is published.
+        client (Optional[httpx.AsyncClient]): HTTP client to fetch with (the app's shared one by default).
+        min_refresh_interval (float): Seconds between refreshes forced by unknown key IDs,
+            so junk tokens can't make us hammer Google.
+    """
+
+    def __init__(self, url: str = GOOGLE_JWKS_URL, client: Optional[httpx.AsyncClient] = None,
+                 min_refresh_interval: float = 60.0):
+        self.url = url
+        self.client = client
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: dict[str, dict] = {}  # key ID ("kid") -> JWK
+        self._expires_at = 0.0
+        self._fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+        # --- Counters ---
+        self.hits = 0
+        self.fetches = 0
+        self.unknown_kids = 0
+
+    async def get_key(self, kid: Optional[str]) -> Optional[dict]:
+        """
+        The JWK with this key ID, or None if Google doesn't have it (even after a refresh).
+
+        Raises:
+            httpx.HTTPError: If the keys had to be fetched and Google couldn't be reached.
+        """
+        now = time.monotonic()
+        if now < self._expires_at and kid in self._keys:
+            self.hits += 1
+            return self._keys[kid]
+
+        async with self._lock:
+            # Another request may have refreshed while we waited for the lock.
+            now = time.monotonic()
+            expired = now >= self._expires_at
+            recently = self._fetched_at is not None and now - self._fetched_at < self.min_refresh_interval
+            if kid not in self._keys and not expired:
+                self.unknown_kids += 1
+            if expired or (kid not in self._keys and not recently):
+                await self._refresh()
+            elif kid in self._keys:
+                self.hits += 1
+            return self._keys.get(kid)
+
+    async def _refresh(self) -> None:
+        client = self.client or get_http_client()
+        response = await client.get(self.url)
+        response.raise_for_status()
+        keys = {key["kid"]: key for key in response.json().get("keys", []) if "kid" in key}
+        now = time.monotonic()
+        self._keys = keys
+        self._fetched_at = now
+        self._expires_at = now + cache_lifetime(response.headers.get("cache-control"))
+        self.fetches += 1
+
+    def clear(self) -> None:
+        self._keys = {}
+        self._expires_at = 0.0
+        self._fetched_at = None
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            "keys": len(self._keys),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "unknown_kids": self.unknown_kids,
+            "expires_in_seconds": round(max(self._expires_at - time.monotonic(), 0.0), 1),
+        }
+
+
+# The app-wide key cache.
+google_keys = GoogleKeyCache()
+
+
+async def verify_google_id_token(id_token: str, keys: Optional[GoogleKeyCache] = None) -> dict:
+    """
+    Checks a Google ID token and returns its claims.
+
+    The signature must match one of Google's keys (RS256), the token must be meant
+    for us (audience = GOOGLE_CLIENT_ID), issued by Google, and not expired.
+
+    Args:
+        id_token (str): The ID token from the token exchange.
+        keys (Optional[GoogleKeyCache]): Where to find Google's keys (google_keys by default).
+
+    Returns:
+        dict: The token's claims (email, name, picture, ...).
+
+    Raises:
+        HTTPException: 401 if the token isn't valid, 502 if Google's keys can't be fetched.
+    """
+    keys = keys or google_keys
+    invalid = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Google ID token.")
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except JWTError:
+        raise invalid
+    if header.get("alg") != "RS256":
+        raise invalid
+
+    try:
+        key = await keys.get_key(header.get("kid"))
+    except httpx.HTTPError as e:
+        print(f"Could not fetch Google's signing keys: {e}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Could not reach Google.")
+    if key is None:
+        raise invalid
+
+    try:
+        claims = jwt.decode(
+            id_token, key, algorithms=["RS256"], audience=GOOGLE_CLIENT_ID, issuer=GOOGLE_ISSUERS,
+            # The access token is checked by Google itself when it is used.
+            options={"verify_at_hash": False},
+        )
+    except JWTError:
+        raise invalid
+    # An unverified email could belong to someone else: don't log anyone in with it.
+    if claims.get("email") and claims.get("email_verified") is False:
+        raise invalid
+    return claims
+
 
 async def get_google_oauth_url():
     """
@@ -58,7 +226,7 @@ async def google_callback(code: str):
     Handles the Google OAuth2 callback.
 
     Exchanges the authorization code for an access token and ID token,
-    then decodes the ID token to get user information.
+    then verifies the ID token's signature and reads the user information from it.
     
     Args:
         code (str): The authorization code received from Google.
@@ -77,27 +245,28 @@ async def google_callback(code: str):
         "grant_type": "authorization_code",
     }
 
-    # We use 'httpx' (like axios but for Python) to talk to Google's servers
-    async with httpx.AsyncClient() as client:
-        # 1. Trade the Code for Tokens
-        token_response = await client.post(GOOGLE_TOKEN_URL, data=token_params)
-        token_response.raise_for_status()
-        token_data = token_response.json()
+    # We use 'httpx' (like axios but for Python) to talk to Google's servers,
+    # through the app's shared client so the connection is reused.
+    client = get_http_client()
 
-        id_token = token_data.get("id_token") # The ID Badge
-        access_token = token_data.get("access_token") # The Key
+    # 1. Trade the Code for Tokens
+    token_response = await client.post(GOOGLE_TOKEN_URL, data=token_params)
+    token_response.raise_for_status()
+    token_data = token_response.json()
 
-        if not access_token or not id_token:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to get access or ID token from Google.")
+    id_token = token_data.get("id_token") # The ID Badge
+    access_token = token_data.get("access_token") # The Key
 
-        # 2. Decode the ID Token to read the user's info
-        # (We skip signature verification here because we just got it directly from Google via HTTPS)
-        user_info = jwt.decode(id_token, None, audience=GOOGLE_CLIENT_ID, options={"verify_signature": False, "verify_at_hash": False})
+    if not access_token or not id_token:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to get access or ID token from Google.")
 
-        return {
-            "email": user_info.get("email"),
-            "name": user_info.get("name"),
-            "picture": user_info.get("picture"),
-            "id_token": id_token,
-            "access_token": access_token,
-        }
+    # 2. Verify the ID Token and read the user's info
+    user_info = await verify_google_id_token(id_token)
+
+    return {
+        "email": user_info.get("email"),
+        "name": user_info.get("name"),
+        "picture": user_info.get("picture"),
+        "id_token": id_token,
+        "access_token": access_token,
+    }
@@ -9,25 +9,49 @@ Key Concepts:
 1.  **JWT**: A secure string that contains data (like user ID) and is signed by us.
 2.  **Access Token**: The main ID card used to access the app. Expires quickly (30 mins).
 3.  **Partial Token**: A temporary pass used during the Google Login process.
+4.  **Verified Token Cache**: A token checked once is remembered (by its hash) until it
+    expires, so the next requests with it cost a dictionary lookup.
 """
 
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from types import MappingProxyType
+from typing import Mapping, Optional
 from jose import jwt, JWTError
-from dotenv import load_dotenv
-import os
+import hashlib
+import threading
+import time
 
-load_dotenv()
+from app.core.config import SECRET_KEY, TOKEN_CACHE_MAX_ENTRIES, TOKEN_CACHE_TTL_SECONDS
 
 # --- Configuration ---
 # SECRET_KEY: The digital signature stamp. Only we have this.
 # If someone changes the token data, the signature won't match, and we'll know it's fake.
-SECRET_KEY = os.getenv("SECRET_KEY")
+# (It comes from the .env file, through app/core/config.py.)
 ALGORITHM = "HS256" # The math used to sign the token
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 # How long the token is valid for
 
-if SECRET_KEY is None:
-    raise ValueError("SECRET_KEY environment variable not set.")
+class SecretKeyNotConfigured(RuntimeError):
+    """SECRET_KEY isn't set, so no token can be signed or checked."""
+
+def load_secret_key() -> str:
+    """
+    Returns SECRET_KEY, or fails if it isn't set.
+
+    The server calls it at startup (next to security.load_ciphers()), so a missing key
+    stops it right away. It is not checked on import: scripts and tests that never
+    touch a token can import this module without one.
+
+    Returns:
+        str: The signing key.
+
+    Raises:
+        SecretKeyNotConfigured: If SECRET_KEY is missing or empty.
+    """
+    if not SECRET_KEY:
+        raise SecretKeyNotConfigured("SECRET_KEY is not set. Add a long random string to your .env file as SECRET_KEY=...")
+    return SECRET_KEY
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """
@@ -53,7 +77,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     
     # Sign the token with our SECRET_KEY
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, load_secret_key(), algorithm=ALGORITHM)
     return encoded_jwt
 
 def create_partial_token(data: dict):
@@ -74,7 +98,7 @@ def create_partial_token(data: dict):
     expire = datetime.utcnow() + timedelta(minutes=10) # Short life
     to_encode.update({"exp": expire, "scope": "partial_registration"})
     
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, load_secret_key(), algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[dict]:
@@ -91,8 +115,100 @@ def verify_token(token: str) -> Optional[dict]:
     # 1. Checks the signature (was it signed by us?)
     # 2. Checks the expiration (is it still valid?)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, load_secret_key(), algorithms=[ALGORITHM])
         return payload
     except JWTError:
         # Token is fake, expired, or tampered with
         return None
+
+# --- Verified Token Cache ---
+
+@dataclass(frozen=True)
+class TokenUser:
+    """
+    Who a verified access token belongs to, straight from its claims (no database lookup).
+
+    Shared between the requests that send the same token, so nothing in it can be changed.
+    """
+    username: str
+    expires_at: float
+    claims: Mapping
+
+class VerifiedTokenCache:
+    """
+    A TTL + LRU cache of verified access tokens.
+
+    Entries are keyed by the SHA-256 of the token (the tokens themselves are not kept)
+    and expire with the token, or after 'ttl' seconds if that is sooner.
+    Tokens that fail verification are not cached.
+
+    Args:
+        ttl (float): Seconds a verification is trusted at most.
+        max_entries (int): Tokens kept at most.
+    """
+
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL_SECONDS, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # token hash -> (trusted until, TokenUser)
+        self._entries: "OrderedDict[bytes, tuple[float, TokenUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # --- Counters ---
+        self.hits = 0
+        self.misses = 0
+        self.rejections = 0
+
+    def verify(self, token: str) -> Optional[TokenUser]:
+        """
+        Verifies an access token, from memory when it was verified before.
+
+        Returns:
+            Optional[TokenUser]: The token's user, or None if the token is fake, expired,
+            has no 'sub' claim or is only a partial registration token.
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        payload = verify_token(token)
+        username = payload.get("sub") if payload else None
+        # Partial tokens only allow finishing the Google registration.
+        if not isinstance(username, str) or payload.get("scope") == "partial_registration":
+            with self._lock:
+                self.rejections += 1
+                self._entries.pop(digest, None)
+            return None
+
+        expires_at = float(payload.get("exp", now + self.ttl))
+        user = TokenUser(username=username, expires_at=expires_at, claims=MappingProxyType(payload))
+        with self._lock:
+            self._entries[digest] = (min(expires_at, now + self.ttl), user)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return user
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "rejections": self.rejections,
+                "ttl_seconds": self.ttl,
+            }
+
+token_cache = VerifiedTokenCache()
@@ -0,0 +1,56 @@
+"""
+Database Migrations (Alembic)
+
+The tables are created and changed by the Alembic scripts in alembic/versions, not by
+Base.metadata.create_all() when the app is imported.
+
+How it works:
+1.  **Before Starting**: Run 'alembic upgrade head' from the backend folder (once per deploy,
+    however many workers there are). With DB_MIGRATE_ON_STARTUP=true the server does it
+    itself when it starts (handy for a single process).
+2.  **Older Databases**: A database made by the old create_all() has the tables but no
+    Alembic version. It is marked as being at the first revision, and the later revisions
+    only add what is missing, so nothing is created twice.
+3.  **Changing a Model**: Edit app/models/sql.py, then
+    'alembic revision --autogenerate -m "what changed"' and check the generated script.
+"""
+
+import os
+from typing import Optional
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.pool import NullPool
+
+from app.core.config import DATABASE_URL
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "alembic.ini")
+# The revision that created the 'users' table (what create_all()-made databases are at, at least).
+BASELINE_REVISION = "f1e5d0bba151"
+
+
+def upgrade_database(url: Optional[str] = None, revision: str = "head") -> None:
+    """
+    Brings the database schema up to date ('alembic upgrade head').
+
+    Blocking (Alembic is synchronous): from async code, call it through run_io.
+
+    Args:
+        url (Optional[str]): The database (DATABASE_URL by default).
+        revision (str): The revision to upgrade to.
+    """
+    # Imported here: Alembic is only needed when migrations actually run.
+    from alembic import command
+    from alembic.config import Config
+
+    engine = create_engine(url or DATABASE_URL, poolclass=NullPool)
+    try:
+        with engine.begin() as connection:
+            config = Config(ALEMBIC_INI)
+            config.attributes["connection"] = connection
+            tables = inspect(connection).get_table_names()
+            if "users" in tables and "alembic_version" not in tables:
+                print("Database was created without Alembic: marking it as at the first revision.")
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, revision)
+    finally:
+        engine.dispose()
@@ -8,29 +8,79 @@ How it works:
 1.  We have a secret "Key" (like a password) stored in our .env file.
 2.  **Encrypt**: We take plain text ("my-secret-key") + the Key -> Scrambled text ("gAAAAABl...").
 3.  **Decrypt**: We take Scrambled text + the Key -> Plain text ("my-secret-key").
+4.  **Rotate**: To replace the key, the new one becomes ENCRYPTION_KEY and the old one moves to
+    ENCRYPTION_OLD_KEYS. Values are always encrypted with the newest key, but any of the keys
+    can decrypt, so nothing breaks while scripts/migrate_keys.py re-encrypts the stored values.
+
+Decrypting costs an HMAC check and an AES pass, and the AI routes need the user's key on
+every generation, so decrypt_api_key() keeps recently decrypted keys in memory for a short while.
+A value that can't be decrypted raises a DecryptionError: passing the scrambled text on
+to Gemini would only waste a call that is bound to fail.
 """
 
-from cryptography.fernet import Fernet
-import os
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+import hashlib
 import base64
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from app.core.config import (
+    API_KEY_CACHE_MAX_ENTRIES, API_KEY_CACHE_TTL_SECONDS, ENCRYPTION_KEY, ENCRYPTION_OLD_KEYS,
+)
 
-# --- Load Encryption Key ---
-# We try to get the key from the environment variables (.env file).
-# This key MUST be kept secret! If someone gets it, they can decrypt all our data.
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
+# --- Encryption Keys ---
+# The keys come from the .env file (through app/core/config.py).
+# ENCRYPTION_KEY MUST be kept secret! If someone gets it, they can decrypt all our data.
 
-if not ENCRYPTION_KEY:
-    print("WARNING: ENCRYPTION_KEY not found in environment variables.")
-    print("Generating a temporary key for this session (or for you to save to .env).")
-    # Generate a random key if one doesn't exist (useful for first-time setup)
-    key = Fernet.generate_key()
-    ENCRYPTION_KEY = key.decode()
-    print(f"Generated Key: {ENCRYPTION_KEY}")
-    print("Please add this to your .env file as ENCRYPTION_KEY=...")
+class EncryptionNotConfigured(RuntimeError):
+    """ENCRYPTION_KEY isn't set (or isn't a valid Fernet key), so nothing can be encrypted or decrypted."""
 
 # --- Initialize Cipher ---
-# The 'cipher_suite' is the tool that actually does the locking and unlocking using our key.
-cipher_suite = Fernet(ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY)
+# The 'cipher_suite' is the tool that actually does the locking and unlocking using our keys.
+# MultiFernet encrypts with the first key and tries each key in turn to decrypt.
+# Both are built on first use (or by load_ciphers() when the server starts), not on import.
+primary_cipher: Optional[Fernet] = None
+cipher_suite: Optional[MultiFernet] = None
+_cipher_lock = threading.Lock()
+
+def load_ciphers() -> MultiFernet:
+    """
+    Builds the ciphers from ENCRYPTION_KEY and ENCRYPTION_OLD_KEYS, once.
+
+    The server calls it at startup, so a missing or broken key stops it right away
+    instead of failing the first user who saves an API key.
+
+    Returns:
+        MultiFernet: The cipher suite (also kept in 'cipher_suite').
+
+    Raises:
+        EncryptionNotConfigured: If ENCRYPTION_KEY is missing or invalid.
+    """
+    global primary_cipher, cipher_suite
+    if cipher_suite is not None:
+        return cipher_suite
+    with _cipher_lock:
+        if cipher_suite is None:
+            if not ENCRYPTION_KEY:
+                raise EncryptionNotConfigured(
+                    "ENCRYPTION_KEY is not set. Create one with 'python scripts/migrate_keys.py --new-key' "
+                    "and add it to your .env file as ENCRYPTION_KEY=..."
+                )
+            try:
+                primary = Fernet(ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY)
+                suite = MultiFernet([primary] + [Fernet(k.encode()) for k in ENCRYPTION_OLD_KEYS])
+            except ValueError as e:
+                raise EncryptionNotConfigured(f"ENCRYPTION_KEY or ENCRYPTION_OLD_KEYS is not a valid Fernet key: {e}") from None
+            primary_cipher, cipher_suite = primary, suite
+    return cipher_suite
+
+def primary_key_id() -> str:
+    """A short fingerprint of ENCRYPTION_KEY (safe to log or store; the key can't be recovered from it)."""
+    load_ciphers()
+    raw = ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY
+    return hashlib.sha256(raw).hexdigest()[:16]
 
 def encrypt_value(value: str) -> str:
     """
@@ -46,9 +96,31 @@ def encrypt_value(value: str) -> str:
     """
     if not value:
         return value
-    encrypted_bytes = cipher_suite.encrypt(value.encode())
+    encrypted_bytes = load_ciphers().encrypt(value.encode())
     return encrypted_bytes.decode()
 
+# --- Decryption Errors ---
+
+class DecryptionError(ValueError):
+    """A stored value could not be decrypted. Never use the stored value as if it were plain text."""
+
+
+class NotEncryptedError(DecryptionError):
+    """The value isn't an encrypted token at all (e.g. a key saved before encryption was added)."""
+
+
+class WrongKeyError(DecryptionError):
+    """The value is an encrypted token, but not one made with our ENCRYPTION_KEY (or it was tampered with)."""
+
+
+def _looks_like_token(value: str) -> bool:
+    # Fernet tokens are URL-safe base64 of: version byte 0x80, timestamp, IV, ciphertext, HMAC.
+    try:
+        raw = base64.urlsafe_b64decode(value.encode() + b"=" * (-len(value) % 4))
+    except Exception:
+        return False
+    return len(raw) >= 57 and raw[0] == 0x80
+
 def decrypt_value(value: str) -> str:
     """
     Decrypts a scrambled string back to plain text.
@@ -56,18 +128,146 @@ def decrypt_value(value: str) -> str:
         value (str): The encrypted string to decrypt.
     Returns:
         str: The decrypted plaintext string.
+    Raises:
+        NotEncryptedError: If the value was never encrypted (e.g. old plaintext data).
+        WrongKeyError: If it was encrypted with another key, or changed since.
 
     Example: decrypt_value("gAAAAAB...") -> "hello"
     """
     if not value:
         return value
     try:
-        decrypted_bytes = cipher_suite.decrypt(value.encode())
+        decrypted_bytes = load_ciphers().decrypt(value.encode())
         return decrypted_bytes.decode()
-    except Exception as e:
-        # If decryption fails (e.g. old plaintext data), return as is or handle error
-        # For migration purposes, we might want to return the original if it's not valid fernet
-        # But Fernet tokens are URL-safe base64, so normal text might look different.
-        # Let's assume if it fails, it might be plaintext (during migration phase).
-        print(f"Decryption failed (returning original): {e}")
-        return value
+    except InvalidToken:
+        if _looks_like_token(value):
+            raise WrongKeyError("The value was encrypted with a different key") from None
+        raise NotEncryptedError("The value is not encrypted") from None
+
+def reencrypt_value(value: str) -> Optional[str]:
+    """
+    Brings a stored value up to date with the newest key.
+
+    Args:
+        value (str): A stored value: encrypted with any of our keys, or plain text saved
+            before encryption was added.
+
+    Returns:
+        Optional[str]: The value encrypted with ENCRYPTION_KEY, or None if it already is.
+
+    Raises:
+        WrongKeyError: If none of our keys can decrypt it.
+    """
+    if not value:
+        return None
+    suite = load_ciphers()
+    try:
+        primary_cipher.decrypt(value.encode())
+        return None  # already encrypted with the newest key
+    except InvalidToken:
+        pass
+    try:
+        # rotate() keeps the original timestamp; only the key changes.
+        return suite.rotate(value.encode()).decode()
+    except InvalidToken:
+        if _looks_like_token(value):
+            raise WrongKeyError("The value was encrypted with a key we no longer have") from None
+        return encrypt_value(value)  # plain text from before encryption: encrypt it now
+
+# --- Decrypted API Key Cache ---
+
+class DecryptedKeyCache:
+    """
+    A small TTL + LRU cache of decrypted API keys.
+
+    Entries are keyed by user ID and remember a hash of the ciphertext they came from,
+    so a key that was changed in the database (by any process) is never served stale.
+
+    Args:
+        ttl (float): Seconds a decrypted key is kept.
+        max_entries (int): Users kept at most.
+    """
+
+    def __init__(self, ttl: float = API_KEY_CACHE_TTL_SECONDS, max_entries: int = API_KEY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # user id -> (ciphertext hash, expires_at, plain key)
+        self._entries: "OrderedDict[Hashable, tuple[bytes, float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # --- Counters ---
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def get(self, user_id: Hashable, ciphertext: str) -> str:
+        """
+        Returns the decrypted key, from memory when possible.
+
+        Raises:
+            DecryptionError: If the ciphertext can't be decrypted (failures are not cached).
+        """
+        digest = hashlib.sha256(ciphertext.encode()).digest()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == digest and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        try:
+            plain = decrypt_value(ciphertext)
+        except DecryptionError:
+            with self._lock:
+                self.failures += 1
+                self._entries.pop(user_id, None)
+            raise
+
+        with self._lock:
+            self._entries[user_id] = (digest, time.monotonic() + self.ttl, plain)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return plain
+
+    def invalidate(self, user_id: Hashable) -> None:
+        """Forgets a user's decrypted key (call it when their key changes)."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "failures": self.failures,
+                "ttl_seconds": self.ttl,
+            }
+
+api_key_cache = DecryptedKeyCache()
+
+def decrypt_api_key(user_id: Hashable, ciphertext: Optional[str]) -> Optional[str]:
+    """
+    Decrypts a user's stored Gemini API key, from the short-lived cache when possible.
+
+    Args:
+        user_id (Hashable): The user's ID.
+        ciphertext (Optional[str]): The stored (encrypted) key.
+
+    Returns:
+        Optional[str]: The plain key, or None if the user has none.
+
+    Raises:
+        DecryptionError: If the stored key can't be decrypted.
+    """
+    if not ciphertext:
+        return None
+    return api_key_cache.get(user_id, ciphertext)
@@ -6,36 +6,78 @@ It sets up the FastAPI application, which is the framework we use to build our A
 
 Its main jobs are:
 1.  **Initialization**: Creating the 'app' object that runs everything.
-2.  **Database Setup**: Making sure our database tables exist.
+2.  **Startup**: Getting things ready when the server starts (in 'lifespan'), not when
+    this file is imported, so workers and '--reload' restarts come up quickly.
+    The database tables are managed by Alembic (see app/core/migrations.py).
 3.  **CORS**: Allowing our Frontend (React) to talk to this Backend (Python).
 4.  **Routing**: Connecting different parts of the API (Auth, Story, AI) to the main app.
+5.  **Background Tasks**: Emptying the chapter trash and (optionally) watching the
+    chapter folder for hand edits while the server runs.
 """
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
-from app.core.config import FRONTEND_URL, BACKEND_URL, ALLOWED_ORIGINS
+from app.core.config import FRONTEND_URL, BACKEND_URL, ALLOWED_ORIGINS, CHAPTER_WATCH, DB_MIGRATE_ON_STARTUP, STATIC_DATA_DIR
 
-# Import our database connection and models
-from app.core.database import engine, Base
+# Import our database connection
+from app.core import jwt_utils, security
+from app.core.database import async_engine
+from app.core.migrations import upgrade_database
 # Import our API routers (groups of related endpoints)
-from app.routers import auth, story, ai
-
-
-
-# --- Database Initialization ---
-# This line looks at all our Python data models (in app/models/sql.py)
-# and creates the corresponding tables in the database if they don't exist yet.
-# Note: In a big professional project, we would use a tool called "Alembic" for this,
-# but this is perfect for getting started.
-Base.metadata.create_all(bind=engine)
+from app.routers import auth, story, ai, admin
+from app.common.http_client import close_http_client
+from app.common.static_files import DataStaticFiles
+from app.common.storage_io import run_io
+from app.services.usage_service import usage_tracker_for
+from app.storage import get_chapter_store
+from app.storage.filesystem import FilesystemChapterStore
+from app.storage.trash import compact_trash_forever
+from app.storage.watcher import ChapterWatcher
+
+
+
+# --- Background Tasks ---
+# 'lifespan' runs once when the server starts (before 'yield') and once when it stops (after).
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail now, not on the first login or saved API key, if SECRET_KEY or ENCRYPTION_KEY
+    # is missing or broken.
+    jwt_utils.load_secret_key()
+    security.load_ciphers()
+    # The folder served at /data (see below) must exist before the first request.
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # Tables are normally migrated before starting ('alembic upgrade head').
+    if DB_MIGRATE_ON_STARTUP:
+        await run_io(upgrade_database)
+    # Deleted chapters sit in the trash until the retention window passes; this purges them.
+    store = get_chapter_store()
+    compactor = asyncio.create_task(compact_trash_forever(store))
+    # Per-user usage counters follow every write and delete from now on.
+    usage_tracker_for(store)
+
+    # Keep caches and indexes fresh when chapters are edited straight in the data folder.
+    watcher = None
+    if CHAPTER_WATCH != "off" and isinstance(store, FilesystemChapterStore):
+        watcher = ChapterWatcher(store, mode=CHAPTER_WATCH).start()
+    yield
+    compactor.cancel()
+    if watcher is not None:
+        watcher.stop()
+    # Close the pooled async database connections.
+    await async_engine.dispose()
+    # The pooled HTTP client for Google (created on the first Google login, if any).
+    await close_http_client()
 
 # --- FastAPI App Setup ---
 app = FastAPI(
     title="TeyvatVN Backend",
     description="Backend API for TeyvatVN Visual Novel",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # --- CORS Configuration ---
@@ -60,15 +102,14 @@ app.add_middleware(
 # We want to be able to serve images or other files directly from a folder.
 # This sets up the '/data' URL path to point to our local 'data' folder.
 
-# 1. Find the absolute path to the 'data' folder
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-# 2. Create it if it doesn't exist
-if not os.path.exists(DATA_DIR):
-    os.makedirs(DATA_DIR)
+# 1. Find the absolute path to the 'data' folder (STATIC_DATA_DIR; chapters are saved elsewhere)
+DATA_DIR = STATIC_DATA_DIR
 
-# 3. Mount it to the app
+# 2. Mount it to the app
 # Now, a file at 'backend/data/image.png' can be accessed at 'http://localhost:8000/data/image.png'
-app.mount("/data", StaticFiles(directory=DATA_DIR), name="data")
+# DataStaticFiles adds content ETags, precompressed .br/.gz copies and long caching for hashed URLs.
+# check_dir=False: the folder is created in the lifespan, not on import.
+app.mount("/data", DataStaticFiles(directory=DATA_DIR, check_dir=False), name="data")
 
 # --- Router Registration ---
 # We keep our code organized by splitting it into different files ("routers").
@@ -76,6 +117,7 @@ app.mount("/data", StaticFiles(directory=DATA_DIR), name="data")
 app.include_router(auth.router)  # Handles Login, Register, Google Auth
 app.include_router(story.router) # Handles Saving/Loading Stories
 app.include_router(ai.router)    # Handles AI Generation requests
+app.include_router(admin.router) # Usage reports for the server operator (needs ADMIN_API_KEY)
 
 # --- Development Server ---
 # This block only runs if you execute this file directly (python main.py).
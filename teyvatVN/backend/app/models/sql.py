@@ -5,7 +5,7 @@ This file defines the structure of our database tables.
 In SQLAlchemy, we define "Models" (Python classes) that map directly to SQL tables.
 """
 
-from sqlalchemy import Boolean, Column, Integer, String, DateTime
+from sqlalchemy import Boolean, Column, Float, Index, Integer, String, DateTime
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -43,3 +43,85 @@ class User(Base):
     
     # Created At: Automatically records the time when the user was created.
     created_at = Column(DateTime, server_default=func.now())
+
+
+class UserUsage(Base):
+    """
+    UserUsage Model
+
+    The 'user_usage' table: one row of running totals per user, kept up to date on every
+    chapter write, delete and AI generation (see app/services/usage_service.py).
+    Checking a quota is a single lookup of this row, whatever the size of the library.
+    """
+    __tablename__ = "user_usage"
+
+    # Chapters are stored by username, so usage is too (the user may not have an account row).
+    username = Column(String, primary_key=True)
+
+    # Live chapters (not the trash) and their total size, as compact JSON.
+    # Indexed so the admin "top consumers" list doesn't scan the table.
+    chapters = Column(Integer, nullable=False, default=0, index=True)
+    bytes = Column(Integer, nullable=False, default=0, index=True)
+
+    # AI generations: all time, and today (UTC) for the daily quota.
+    generations = Column(Integer, nullable=False, default=0, index=True)
+    generations_today = Column(Integer, nullable=False, default=0)
+    generations_day = Column(String, nullable=True)  # 'YYYY-MM-DD' the counter above belongs to
+
+    # False until the user's existing chapters have been counted once (see usage_service.ensure_counted).
+    counted = Column(Boolean, nullable=False, default=False)
+
+
+class ChapterUsage(Base):
+    """
+    ChapterUsage Model
+
+    The 'chapter_usage' table: the size of every live chapter, so a save knows how much
+    the user's total changes (new size - old size) without reading the old chapter.
+    """
+    __tablename__ = "chapter_usage"
+
+    username = Column(String, primary_key=True)
+    chapter_id = Column(String, primary_key=True)
+    bytes = Column(Integer, nullable=False, default=0)
+
+
+class KeyRotation(Base):
+    """
+    KeyRotation Model
+
+    The 'key_rotations' table: progress of re-encrypting every stored API key with a new
+    ENCRYPTION_KEY (see app/services/key_rotation.py). One row per target key, so an
+    interrupted run picks up where it stopped.
+    """
+    __tablename__ = "key_rotations"
+
+    # Fingerprint of the key values are being re-encrypted with (security.primary_key_id()).
+    key_id = Column(String, primary_key=True)
+    # Users are processed in ID order; everyone up to this ID is done.
+    last_user_id = Column(Integer, nullable=False, default=0)
+    checked = Column(Integer, nullable=False, default=0)
+    rotated = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+
+class LoginFailure(Base):
+    """
+    LoginFailure Model
+
+    The 'login_failures' table: one row per failed login, for the "database" login throttle
+    backend (see app/services/login_throttle.py), so every worker sees the same counts.
+    Rows older than the throttle window are deleted as new failures come in.
+    """
+    __tablename__ = "login_failures"
+
+    id = Column(Integer, primary_key=True)
+    # "user:<username>" or "ip:<address>"
+    key = Column(String, nullable=False)
+    # Unix time of the failure
+    failed_at = Column(Float, nullable=False)
+
+    # "This key's failures since ..." is answered from the index alone.
+    __table_args__ = (Index("ix_login_failures_key_failed_at", "key", "failed_at"),)
@@ -0,0 +1,126 @@
+"""
+Admin Router (API Endpoints)
+
+Endpoints for whoever runs the server, not for players.
+Every request must carry the ADMIN_API_KEY from config in the 'X-Admin-Key' header;
+if ADMIN_API_KEY isn't set, these endpoints don't exist (404).
+
+Key Endpoints:
+1.  **GET /api/admin/usage/top**: The users storing or generating the most.
+2.  **GET /api/admin/usage/{username}**: One user's usage.
+3.  **GET /api/admin/cache/users**: Hit rate and counters of the user record cache.
+4.  **GET /api/admin/cache/api-keys**: Hit rate and decrypt failures of the decrypted API key cache.
+5.  **GET /api/admin/cache/tokens**: Hit rate and rejections of the verified login token cache.
+6.  **GET /api/admin/cache/google-keys**: Fetches and hits of Google's cached signing keys.
+7.  **GET /api/admin/login-throttle**: The usernames and IPs with the most failed logins, and their waits.
+8.  **DELETE /api/admin/login-throttle**: Unlocks a username and/or an IP.
+"""
+
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+
+from app.common.storage_io import run_io
+from app.core import google_auth, jwt_utils, security
+from app.core.config import ADMIN_API_KEY
+from app.services.login_throttle import LoginThrottle, get_login_throttle
+from app.services.usage_service import USAGE_ORDERS, usage_tracker_for
+from app.services.user_cache import user_cache
+from app.storage import get_chapter_store
+from app.storage.base import ChapterStore
+
+
+def require_admin(x_admin_key: str | None = Header(default=None)) -> None:
+    """
+    Dependency that lets a request through only with the right X-Admin-Key header.
+
+    Raises:
+        HTTPException: 404 if admin endpoints are disabled, 403 if the key is missing or wrong.
+    """
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # compare_digest takes as long for a wrong first character as for a wrong last one.
+    if not x_admin_key or not hmac.compare_digest(x_admin_key.encode(), ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+
+router = APIRouter(prefix="/api/admin", dependencies=[Depends(require_admin)])
+
+
+@router.get("/usage/top")
+async def top_consumers(
+    by: str = Query("bytes"),
+    limit: int = Query(20, ge=1, le=500),
+    store: ChapterStore = Depends(get_chapter_store),
+):
+    """
+    Lists the heaviest users, by stored bytes, chapter count or all-time generations.
+
+    Only users whose usage has been counted appear (everyone who generated or was
+    looked up since usage tracking was added).
+    """
+    if by not in USAGE_ORDERS:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(USAGE_ORDERS)}")
+    users = await run_io(usage_tracker_for(store).top_consumers, by, limit)
+    return {"by": by, "users": users}
+
+
+@router.get("/usage/{username}")
+async def user_usage(username: str, store: ChapterStore = Depends(get_chapter_store)):
+    """One user's usage (counted on the spot if it never was), with the configured limits."""
+    tracker = usage_tracker_for(store)
+    try:
+        usage = await run_io(tracker.usage, store, username)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        **usage,
+        "limits": {
+            "chapters": tracker.max_chapters,
+            "bytes": tracker.max_bytes,
+            "generations_per_day": tracker.max_generations_per_day,
+        },
+    }
+
+
+@router.get("/cache/users")
+async def user_cache_stats():
+    """Hit rate, size and counters of the user record cache (app/services/user_cache.py)."""
+    return user_cache.stats()
+
+
+@router.get("/cache/api-keys")
+async def api_key_cache_stats():
+    """Hit rate and decrypt failures of the decrypted API key cache (app/core/security.py)."""
+    return security.api_key_cache.stats()
+
+
+@router.get("/cache/tokens")
+async def token_cache_stats():
+    """Hit rate and rejected tokens of the verified token cache (app/core/jwt_utils.py)."""
+    return jwt_utils.token_cache.stats()
+
+
+@router.get("/cache/google-keys")
+async def google_key_cache_stats():
+    """Fetches, hits and expiry of Google's cached signing keys (app/core/google_auth.py)."""
+    return google_auth.google_keys.stats()
+
+
+@router.get("/login-throttle")
+async def login_throttle_state(limit: int = Query(50, ge=1, le=500),
+                               throttle: LoginThrottle = Depends(get_login_throttle)):
+    """
+    Counters of the login throttle (app/services/login_throttle.py), and the usernames ("user:...")
+    and IPs ("ip:...") with the most failed logins in the window. 'retry_after' > 0 means throttled.
+    """
+    return {**throttle.stats(), "keys": await throttle.state(limit)}
+
+
+@router.delete("/login-throttle")
+async def unlock_login(username: str | None = Query(None), ip: str | None = Query(None),
+                       throttle: LoginThrottle = Depends(get_login_throttle)):
+    """Forgets the failed logins of a username and/or an IP, so they can log in again right away."""
+    if not username and not ip:
+        raise HTTPException(status_code=400, detail="Give a username or an ip")
+    return {"unlocked": await throttle.unlock(username=username, ip=ip)}
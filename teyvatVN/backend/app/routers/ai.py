@@ -7,19 +7,25 @@ It acts as the bridge between the user's prompt and our AI Service.
 Key Endpoints:
 1.  **POST /api/generate**: The main "Quick Start" endpoint. Takes a prompt, makes a chapter.
 2.  **POST /api/{username}/{chapter_id}**: A more detailed endpoint for saving specific chapter configurations.
+Both only work for the logged-in user (their bearer token, see app/core/current_user.py).
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 import os
 import json
 
-from app.core.database import get_db
+from app.core.current_user import TokenUser, get_current_user, require_owner
+from app.core.database import get_async_db, release_connection
 from app.core import security
 from app.core.config import USE_PUBLIC_API
 from app.services import ai_service, auth_service
-from app.common import utils
+from app.services.usage_service import QuotaExceeded, usage_tracker_for
+from app.common.storage_io import run_io
+from app.storage import get_chapter_store
+from app.storage.base import ChapterStore
+from app.storage.revisions import revision_log_for
 
 router = APIRouter()
 
@@ -29,10 +35,52 @@ class GenerateRequest(BaseModel):
     username: str
     api_key: str | None = None
 
+# --- Helpers ---
+
+async def resolve_api_key(db: AsyncSession, username: str) -> str | None:
+    """
+    Finds the Gemini API key to generate with: the user's own key, or None for the server's key.
+
+    Raises:
+        HTTPException: 400 if there's no usable key (none saved and USE_PUBLIC_API is off),
+            409 if the saved key can't be decrypted (it has to be entered again).
+    """
+    user = await auth_service.get_user_record_async(db, username)
+    # The Gemini call that follows can take many seconds; don't keep a pooled connection meanwhile.
+    await release_connection(db)
+    try:
+        # Served from the decrypted-key cache on repeat generations.
+        api_key = security.decrypt_api_key(user.id, user.gemini_api_key) if user else None
+    except security.DecryptionError as e:
+        # Sending the scrambled text to Gemini would only waste a call that is bound to fail.
+        print(f"Stored API key of {username} can't be decrypted: {e}")
+        raise HTTPException(status_code=409, detail="Your saved Gemini API Key can't be read. Please enter it again in Settings.")
+
+    # Fallback to public key if allowed
+    if not api_key and not USE_PUBLIC_API:
+        raise HTTPException(status_code=400, detail="Please configure your Gemini API Key in Settings.")
+    # If allowed, None tells the service to use the default env key
+    return api_key or None
+
+async def reserve_generation(store: ChapterStore, username: str) -> None:
+    """
+    Checks the user's quotas and counts one generation, before any Gemini call.
+
+    Raises:
+        HTTPException: 429 if a quota is used up, 400 for an invalid username.
+    """
+    try:
+        await run_io(usage_tracker_for(store).reserve_generation, store, username)
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # --- Endpoints ---
 
-@router.post("/api/{username}/{chapter_id}")
-async def save_chapter(username: str, chapter_id: str, request: Request, db: Session = Depends(get_db)):
+@router.post("/api/{username}/{chapter_id}", dependencies=[Depends(require_owner)])
+async def save_chapter(username: str, chapter_id: str, request: Request, db: AsyncSession = Depends(get_async_db),
+                       store: ChapterStore = Depends(get_chapter_store)):
     """
     Generate and save a story chapter based on detailed inputs.
 
@@ -43,7 +91,7 @@ async def save_chapter(username: str, chapter_id: str, request: Request, db: Ses
         username (str): The username of the user.
         chapter_id (str): The ID of the chapter to save.
         request (Request): The request object containing JSON body.
-        db (Session): Database session.
+        db (AsyncSession): Database session.
 
     Returns:
         dict: Status and data of the generated chapter.
@@ -83,43 +131,40 @@ async def save_chapter(username: str, chapter_id: str, request: Request, db: Ses
         "story_direction": prompt
     }
 
-    # Get the user's API key
-    user = auth_service.get_user(db, username)
-    api_key = security.decrypt_value(user.gemini_api_key) if user else None
-    
-    # Fallback to public key if allowed
-    if not api_key:
-        if USE_PUBLIC_API:
-            # If allowed, we pass None as the api_key, and the service will use the default env key
-            api_key = None 
-        else:
-            raise HTTPException(status_code=400, detail="Please configure your Gemini API Key in Settings.")
-    
-    # Generate the story!
+    # Get the user's API key (or the public one, if allowed)
+    api_key = await resolve_api_key(db, username)
+
+    # Quotas are checked (and the generation counted) before the AI is called.
+    await reserve_generation(store, username)
+
     try:
+        # Generate the story!
         story_segments = ai_service.generate_story(chapter_input, api_key=api_key)
+
+        # Construct the final JSON structure
+        final_output = {
+            "title": "Generated Story",
+            "characters": [char1, char2],
+            "backgrounds": [background],
+            "setting_narration": "Scene generated by AI.",
+            "segments": story_segments
+        }
+
+        # Save to disk (recorded in the chapter's revision history)
+        await run_io(revision_log_for(store).save, username, chapter_id, final_output, "generate")
     except Exception as e:
+        # The AI call or the save failed. save() writes the chapter last, so when it
+        # raises nothing was saved, and the generation doesn't count against the quota.
         print(f"Generation failed: {e}")
+        await run_io(usage_tracker_for(store).release_generation, username)
         raise HTTPException(status_code=500, detail=str(e))
 
-    # Construct the final JSON structure
-    final_output = {
-        "title": "Generated Story",
-        "characters": [char1, char2],
-        "backgrounds": [background],
-        "setting_narration": "Scene generated by AI.",
-        "segments": story_segments
-    }
-
-    # Save to disk
-    path = utils.get_chapter_path(username, chapter_id)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(final_output, f, indent=2, ensure_ascii=False)
-
     return {"status": "success", "path": f"{username}/{chapter_id}/output.json", "data": final_output}
 
 @router.post("/api/generate")
-async def generate_chapter(request: GenerateRequest, db: Session = Depends(get_db)):
+async def generate_chapter(request: GenerateRequest, db: AsyncSession = Depends(get_async_db),
+                           store: ChapterStore = Depends(get_chapter_store),
+                           user: TokenUser = Depends(get_current_user)):
     """
     Generate a new chapter from a simple prompt.
     
@@ -128,7 +173,8 @@ async def generate_chapter(request: GenerateRequest, db: Session = Depends(get_d
 
     Args:
         request (GenerateRequest): The request body containing prompt and username.
-        db (Session): Database session.
+        db (AsyncSession): Database session.
+        user (TokenUser): The caller, from their bearer token. It must be request.username.
 
     Returns:
         dict: Status and data of the generated chapter.
@@ -138,10 +184,12 @@ async def generate_chapter(request: GenerateRequest, db: Session = Depends(get_d
     
     Used by the main "Prompt Input" page.
     1. Checks inputs.
-    2. Finds the next available Chapter ID (e.g., "chapter_5").
-    3. Calls the AI to generate the story.
-    4. Saves the result.
+    2. Finds the API key and checks the user's quotas.
+    3. Finds the next available Chapter ID (e.g., "chapter_5").
+    4. Calls the AI to generate the story.
+    5. Saves the result.
     """
+    reserved = False
     try:
         prompt = request.prompt
         username = request.username
@@ -151,39 +199,44 @@ async def generate_chapter(request: GenerateRequest, db: Session = Depends(get_d
         
         if not username or not username.strip():
             raise HTTPException(status_code=400, detail="Username cannot be empty")
-            
-        # Auto-increment chapter ID
-        chapter_id = utils.get_next_chapter_id(username)
+
+        # The username comes from the body, so it is checked against the token here.
+        if username != user.username:
+            raise HTTPException(status_code=403, detail="You can only generate chapters for yourself")
+
+        # Get API Key (before anything is reserved, so a missing key costs nothing)
+        api_key = await resolve_api_key(db, username)
+
+        # Quotas are checked (and the generation counted) before the AI is called.
+        await reserve_generation(store, username)
+        reserved = True
+
+        # Auto-increment chapter ID (reserved atomically, so parallel generations can't collide)
+        chapter_id = await run_io(store.allocate_chapter_id, username)
         print(f"Generating chapter {chapter_id} for user {username}")
         print(f"Prompt: {prompt}")
-        
-        # Get API Key
-        user = auth_service.get_user(db, username)
-        api_key = security.decrypt_value(user.gemini_api_key) if user else None
-        
-        if not api_key:
-            if USE_PUBLIC_API:
-                api_key = None
-            else:
-                raise HTTPException(status_code=400, detail="Please configure your Gemini API Key in Settings.")
-        
+
         # Generate!
         chapter_data = ai_service.generate_chapter_from_prompt(prompt, api_key=api_key)
         
-        # Save!
-        path = utils.get_chapter_path(username, chapter_id)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(chapter_data, f, indent=2, ensure_ascii=False)
+        # Save! (the first revision of the new chapter's history)
+        await run_io(revision_log_for(store).save, username, chapter_id, chapter_data, "generate")
+        path = f"{username}/{chapter_id}/output.json"
         
         print(f"Chapter saved to {path}")
         
         return {
             "status": "success",
             "chapter_id": chapter_id,
-            "path": f"{username}/{chapter_id}/output.json",
+            "path": path,
             "data": chapter_data
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Generation failed: {e}")
+        # As above: if save() raised, the chapter was never written.
+        if reserved:
+            await run_io(usage_tracker_for(store).release_generation, username)
         raise HTTPException(status_code=500, detail=str(e))
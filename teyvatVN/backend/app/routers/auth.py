@@ -6,14 +6,15 @@ and settings management. It supports both local (username/password) and Google O
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import RedirectResponse
 import os
 from pydantic import BaseModel
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.core import jwt_utils, security, google_auth
 from app.services import auth_service
+from app.services.login_throttle import LoginThrottle, LoginThrottled, get_login_throttle
 from app.models.sql import User
 
 router = APIRouter()
@@ -40,10 +41,24 @@ class CompleteRegistrationRequest(BaseModel):
     username: str
     gemini_api_key: str | None = None
 
-from app.core.config import FRONTEND_URL
+from app.core.config import CLIENT_IP_HEADER, FRONTEND_URL
+
+def client_ip(request: Request) -> str | None:
+    """
+    The caller's IP address, for per-IP login throttling.
+
+    Behind a proxy, CLIENT_IP_HEADER names the header holding the real address. For
+    X-Forwarded-For the last entry is used: it is the one added by our own proxy, while
+    earlier entries come from the client and could be made up.
+    """
+    if CLIENT_IP_HEADER:
+        forwarded = request.headers.get(CLIENT_IP_HEADER)
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else None
 
 @router.post("/api/auth/complete-registration")
-async def complete_registration(request: CompleteRegistrationRequest, db: Session = Depends(get_db)):
+async def complete_registration(request: CompleteRegistrationRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Complete user registration after Google OAuth.
 
@@ -63,14 +78,14 @@ async def complete_registration(request: CompleteRegistrationRequest, db: Sessio
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token is missing email information.")
 
     # Check if username or email already exist
-    if auth_service.get_user(db, username=username):
+    if await auth_service.get_user_record_async(db, username=username):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username is already taken.")
-    if auth_service.get_user_by_email(db, email=email):
+    if await auth_service.get_user_record_by_email_async(db, email=email):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email is already registered.")
 
     # Create the new user
     encrypted_key = security.encrypt_value(request.gemini_api_key) if request.gemini_api_key else None
-    user = auth_service.create_user(db, username=username, password=os.urandom(16).hex(), email=email, gemini_api_key=encrypted_key)
+    user = await auth_service.create_user_async(db, username=username, password=os.urandom(16).hex(), email=email, gemini_api_key=encrypted_key)
     if not user:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create user.")
 
@@ -88,7 +103,7 @@ async def google_login():
     return RedirectResponse(google_oauth_url)
 
 @router.get("/api/auth/google/callback")
-async def google_callback(code: str, db: Session = Depends(get_db)):
+async def google_callback(code: str, db: AsyncSession = Depends(get_async_db)):
     """
     Handle Google OAuth2 callback.
     
@@ -102,7 +117,7 @@ async def google_callback(code: str, db: Session = Depends(get_db)):
     if not email:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Google did not provide an email.")
 
-    user = auth_service.get_user_by_email(db, email)
+    user = await auth_service.get_user_record_by_email_async(db, email)
     
     # If user already exists, log them in directly
     if user:
@@ -118,7 +133,7 @@ async def google_callback(code: str, db: Session = Depends(get_db)):
         return RedirectResponse(url=frontend_url)
 
 @router.post("/api/auth/register")
-async def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Register a new user with username and password.
     """
@@ -126,50 +141,74 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Username, password, and email are required")
     
     encrypted_key = security.encrypt_value(request.gemini_api_key) if request.gemini_api_key else None
-    user = auth_service.create_user(db, request.username, request.password, request.email, encrypted_key)
+    user = await auth_service.create_user_async(db, request.username, request.password, request.email, encrypted_key)
     if not user:
         raise HTTPException(status_code=400, detail="User with this username or email already exists")
     
     return {"status": "success", "message": "User created"}
 
 @router.post("/api/auth/login")
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: LoginRequest, http_request: Request, db: AsyncSession = Depends(get_async_db),
+                throttle: LoginThrottle = Depends(get_login_throttle)):
     """
     Authenticate a user with username and password.
     Returns a JWT access token upon success.
+
+    Too many failed attempts for the username or from the IP get a 429 with a
+    Retry-After header, before the database or bcrypt are touched.
     """
-    user = auth_service.authenticate_user(db, request.username, request.password)
+    ip = client_ip(http_request)
+    try:
+        # Counted as a failure from here on, so parallel guesses see each other.
+        attempt = await throttle.begin(ip, request.username)
+    except LoginThrottled as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    # bcrypt runs on the hashing pool, so other requests aren't held up meanwhile.
+    try:
+        user = await auth_service.authenticate_user_async(db, request.username, request.password)
+    except Exception:
+        await throttle.cancel(attempt)
+        raise
     if not user:
+        throttle.record_failure(attempt)
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    await throttle.record_success(attempt)
     
     access_token = jwt_utils.create_access_token(data={"sub": user.username})
     return {"status": "success", "username": user.username, "token": access_token}
 
 @router.put("/api/user/settings")
-async def update_settings(request: UpdateSettingsRequest, db: Session = Depends(get_db)):
+async def update_settings(request: UpdateSettingsRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Update user settings (e.g., Gemini API key).
     """
-    user = auth_service.get_user(db, request.username)
-    if not user:
+    # Saved through the service, which also drops the user's cached record.
+    if not await auth_service.update_gemini_api_key_async(db, request.username, security.encrypt_value(request.gemini_api_key)):
         raise HTTPException(status_code=404, detail="User not found")
     
-    user.gemini_api_key = security.encrypt_value(request.gemini_api_key)
-    db.commit()
-    
     return {"status": "success", "message": "Settings updated"}
 
 @router.get("/api/user/settings/{username}")
-async def get_settings(username: str, db: Session = Depends(get_db)):
+async def get_settings(username: str, db: AsyncSession = Depends(get_async_db)):
     """
     Get user settings.
     Returns the decrypted Gemini API key.
     """
-    user = auth_service.get_user(db, username)
+    user = await auth_service.get_user_record_async(db, username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
         
+    try:
+        gemini_api_key = security.decrypt_api_key(user.id, user.gemini_api_key)
+    except security.DecryptionError as e:
+        # Don't show the scrambled value as if it were the key: ask for it again.
+        return {
+            "status": "success",
+            "gemini_api_key": None,
+            "key_error": f"The saved API key can't be read ({e}). Please enter it again.",
+        }
     return {
         "status": "success", 
-        "gemini_api_key": security.decrypt_value(user.gemini_api_key)
+        "gemini_api_key": gemini_api_key
     }
@@ -11,151 +11,380 @@ It allows the Frontend to Save, Load, Rename, and Delete chapters.
 Key Endpoints:
 1.  **GET /api/library/{username}**: List all stories for a user.
 2.  **GET /api/chapter/...**: Load a specific story.
-3.  **DELETE /api/chapter/...**: Delete a story.
+3.  **DELETE /api/chapter/...**: Delete a story (it goes to the trash and can be restored).
 4.  **PUT /api/chapter/...**: Rename a story.
 5.  **PUT /api/chapter/.../segments**: Save edits to the story text.
+6.  **GET /api/chapter/.../revisions**: List, diff and restore earlier versions of a story.
+7.  **GET/POST /api/library/{username}/export|import**: Back up or restore a whole library.
+8.  **GET /api/search/{username}?q=...**: Full-text search over a user's chapters.
+9.  **GET /api/library/{username}/trash**, **POST /api/chapter/.../restore**: Recently deleted stories.
+
+Every endpoint here, the library list included, needs the owner's login token
+('Authorization: Bearer <token>', see app/core/current_user.py).
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
-import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 import json
-import shutil
+import time
 
-from app.core.database import get_db
-from app.common import utils
-from app.services import auth_service
+from app.core.current_user import require_owner
+from app.core.database import get_async_db
+from app.common.storage_io import run_io
+from app.services import auth_service, library_service
+from app.storage import get_chapter_store
+from app.storage.base import LIBRARY_FIELDS, ORDERS, ChapterStore, project
+from app.storage.revisions import RevisionNotFound, revision_log_for
+from app.storage.search import search_index_for
+from app.storage.trash import restorable_until
 
 router = APIRouter()
 
-# Define where chapter data is stored (should be in config but using relative for now)
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
+async def read_json_body(request: Request):
+    """
+    Reads the request body and parses it on the storage pool.
 
-@router.get("/api/library/{username}")
-def get_library(username: str, db: Session = Depends(get_db)):
+    Chapter bodies (full segment lists) can be large, and request.json()
+    would parse them on the event loop.
     """
-    Get all chapters for a user.
+    raw = await request.body()
+    return await run_io(json.loads, raw)
+
+@router.get("/api/library/{username}", dependencies=[Depends(require_owner)])
+async def get_library(
+    username: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    order: str = "number",
+    fields: Optional[str] = None,
+    store: ChapterStore = Depends(get_chapter_store),
+):
+    """
+    Get the chapters of a user, one page at a time.
     Returns a list of chapter metadata.
     
     Lists all the chapters a user has created.
     Used to display the "Library" page.
+
+    Query parameters:
+    - limit: Page size. Leave it out to get every chapter at once.
+    - cursor: The 'next_cursor' from the previous page.
+    - order: "number" (highest chapter number first) or "created_at" (newest first).
+    - fields: Comma-separated list of fields to return (e.g. "chapter_id,title").
     """
-    # 1. Check if user exists
-    if not auth_service.get_user(db, username):
-        raise HTTPException(status_code=404, detail="User not found")
+    # 1. Check the requested fields and order (the owner was checked from the token)
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if field_list and any(f not in LIBRARY_FIELDS for f in field_list):
+        raise HTTPException(status_code=400, detail=f"fields must be a subset of {', '.join(LIBRARY_FIELDS)}")
+    if order not in ORDERS:
+        raise HTTPException(status_code=400, detail=f"order must be one of {', '.join(ORDERS)}")
     
-    # 2. Get the list of files from the disk
-    chapters = utils.list_user_chapters(username)
+    # 2. Read the page from the store's index (no need to open every chapter)
+    try:
+        entries, next_cursor = await run_io(store.list_chapters, username, order=order, limit=limit, cursor=cursor)
+        total = await run_io(store.count, username)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    chapters = [project(entry, field_list) for entry in entries]
     
     return {
         "status": "success",
         "username": username,
         "chapters": chapters,
-        "count": len(chapters)
+        "count": len(chapters),
+        "total": total,
+        "next_cursor": next_cursor
     }
 
-@router.get("/api/chapter/{username}/{chapter_id}")
-def get_chapter(username: str, chapter_id: str):
+@router.get("/api/library/{username}/export", dependencies=[Depends(require_owner)])
+async def export_library(
+    username: str,
+    format: str = "ndjson",
+    db: AsyncSession = Depends(get_async_db),
+    store: ChapterStore = Depends(get_chapter_store),
+):
+    """
+    Downloads every chapter of a user in one file.
+
+    - format=ndjson: one JSON line per chapter ({"chapter_id": ..., "data": ...}).
+    - format=zip: one '{chapter_id}/output.json' per chapter.
+
+    The file is streamed page by page, so even huge libraries never sit in memory whole.
+    """
+    if not await auth_service.get_user_record_async(db, username):
+        raise HTTPException(status_code=404, detail="User not found")
+    if format not in library_service.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(library_service.EXPORT_FORMATS)}")
+
+    if format == "zip":
+        body, media_type = library_service.export_zip(store, username), "application/zip"
+    else:
+        body, media_type = library_service.export_ndjson(store, username), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{username}-library.{format}"'},
+    )
+
+@router.post("/api/library/{username}/import", dependencies=[Depends(require_owner)])
+async def import_library(
+    username: str,
+    request: Request,
+    format: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    store: ChapterStore = Depends(get_chapter_store),
+):
+    """
+    Uploads a file made by the export endpoint and adds its chapters to the user's library.
+
+    Every imported chapter gets a new chapter ID (nothing is overwritten);
+    the response maps each original ID to its new one.
+    The format is taken from ?format= or the Content-Type header (zip or NDJSON).
+    """
+    if not await auth_service.get_user_record_async(db, username):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if format is None:
+        format = "zip" if "zip" in request.headers.get("content-type", "") else "ndjson"
+    if format not in library_service.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(library_service.EXPORT_FORMATS)}")
+
+    importer = library_service.import_zip if format == "zip" else library_service.import_ndjson
+    try:
+        result = await importer(store, username, request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"status": "success", "username": username, **result}
+
+@router.get("/api/search/{username}", dependencies=[Depends(require_owner)])
+async def search_chapters(
+    username: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    store: ChapterStore = Depends(get_chapter_store),
+):
+    """
+    Searches a user's chapters: titles, narration, dialogue lines and speaker names.
+
+    Example: /api/search/dawn?q=kaeya wine
+
+    Hits are sorted by relevance. Each one says which chapter (and which segment)
+    matched, with a short snippet where the matching words are wrapped in <mark></mark>.
+    """
+    try:
+        hits = await run_io(search_index_for(store).search, store, username, q, limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"status": "success", "username": username, "query": q, "count": len(hits), "hits": hits}
+
+# The stored chapter JSON is dropped between these two, giving {"message": "Loaded", "data": <chapter>}.
+LOADED_PREFIX = b'{"message":"Loaded","data":'
+LOADED_SUFFIX = b"}"
+
+@router.get("/api/chapter/{username}/{chapter_id}", dependencies=[Depends(require_owner)])
+async def get_chapter(username: str, chapter_id: str, store: ChapterStore = Depends(get_chapter_store)):
     """
     Retrieve a specific chapter by ID.
     Reads the chapter data from the JSON file.
 
     Loads the full content of a single chapter.
     Used when the user clicks "Play" or "Edit".
+
+    The chapter is sent exactly as stored: its JSON bytes are placed inside the
+    response envelope without being parsed into Python objects and serialized again.
     """
-    path = utils.get_chapter_path(username, chapter_id)
+    # Storage reads happen on the storage pool, never on the event loop.
+    try:
+        chapter_json = await run_io(store.read_json_bytes, username, chapter_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if not os.path.exists(path):
+    if chapter_json is None:
         return {"message": "Chapter not found", "data": None}
         
-    # Read the JSON file
-    with open(path, "r", encoding="utf-8") as f:
-        return {"message": "Loaded", "data": json.load(f)}
+    return Response(b"".join((LOADED_PREFIX, chapter_json, LOADED_SUFFIX)), media_type="application/json")
 
-@router.delete("/api/chapter/{username}/{chapter_id}")
-def delete_chapter(username: str, chapter_id: str):
+@router.delete("/api/chapter/{username}/{chapter_id}", dependencies=[Depends(require_owner)])
+async def delete_chapter(username: str, chapter_id: str, store: ChapterStore = Depends(get_chapter_store)):
     """
-    Permanently deletes a chapter.
+    Deletes a chapter.
+
+    The chapter is moved to the trash: it disappears from the library but can be
+    brought back with POST .../restore until 'restorable_until' (Unix time).
     """
-    chapter_dir = os.path.join(DATA_DIR, username, chapter_id)
-    
-    if not os.path.exists(chapter_dir):
-        raise HTTPException(status_code=404, detail="Chapter not found")
-    
     try:
-        # Remove the entire folder for this chapter
-        shutil.rmtree(chapter_dir)
-        return {"status": "success", "message": f"Chapter {chapter_id} deleted"}
+        # Remove the chapter (on the storage pool)
+        deleted = await run_io(store.delete, username, chapter_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete chapter: {str(e)}")
 
-@router.put("/api/chapter/{username}/{chapter_id}")
-async def rename_chapter(username: str, chapter_id: str, request: Request):
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    return {
+        "status": "success",
+        "message": f"Chapter {chapter_id} deleted",
+        "restorable_until": restorable_until(time.time()),
+    }
+
+@router.get("/api/library/{username}/trash", dependencies=[Depends(require_owner)])
+async def list_trash(username: str, store: ChapterStore = Depends(get_chapter_store)):
+    """
+    Lists the user's deleted chapters that can still be restored, most recently deleted first.
+    """
+    try:
+        entries = await run_io(store.list_deleted, username)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"chapters": entries}
+
+@router.post("/api/chapter/{username}/{chapter_id}/restore", dependencies=[Depends(require_owner)])
+async def restore_deleted_chapter(username: str, chapter_id: str, store: ChapterStore = Depends(get_chapter_store)):
+    """
+    Brings a deleted chapter back from the trash (with its revision history).
+    """
+    try:
+        restored = await run_io(store.restore, username, chapter_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail=f"A chapter named {chapter_id} already exists")
+
+    if not restored:
+        raise HTTPException(status_code=404, detail="Chapter not in trash")
+    return {"status": "success", "message": f"Chapter {chapter_id} restored"}
+
+@router.put("/api/chapter/{username}/{chapter_id}", dependencies=[Depends(require_owner)])
+async def rename_chapter(username: str, chapter_id: str, request: Request, store: ChapterStore = Depends(get_chapter_store)):
     """
     Renames a chapter (changes its Title, not the ID).
     """
     try:
-        body = await request.json()
+        body = await read_json_body(request)
         new_title = body.get("title")
         
         if not new_title:
             raise HTTPException(status_code=400, detail="Title is required")
         
-        path = utils.get_chapter_path(username, chapter_id)
+        # 1. Read existing data (copied, the cached dict is shared)
+        cached = await run_io(store.read, username, chapter_id)
         
-        if not os.path.exists(path):
+        if cached is None:
             raise HTTPException(status_code=404, detail="Chapter not found")
         
-        # 1. Read existing data
-        with open(path, "r", encoding="utf-8") as f:
-            chapter_data = json.load(f)
+        chapter_data = dict(cached)
         
         # 2. Update title
         chapter_data["title"] = new_title
         
-        # 3. Save back to file
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(chapter_data, f, indent=2, ensure_ascii=False)
+        # 3. Save back to file (the old title stays in the revision history)
+        rev = await run_io(revision_log_for(store).save, username, chapter_id, chapter_data, "rename")
         
-        return {"status": "success", "message": "Title updated", "data": chapter_data}
+        return {"status": "success", "message": "Title updated", "revision": rev, "data": chapter_data}
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON")
+    except ValueError as e:
+        # e.g. a chapter ID the store refuses (see check_names)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.put("/api/chapter/{username}/{chapter_id}/segments")
-async def update_segments(username: str, chapter_id: str, request: Request):
+@router.put("/api/chapter/{username}/{chapter_id}/segments", dependencies=[Depends(require_owner)])
+async def update_segments(username: str, chapter_id: str, request: Request, store: ChapterStore = Depends(get_chapter_store)):
     """
     Saves changes to the story text (Segments).
     Used by the "Editor" page.
     """
     try:
-        body = await request.json()
+        body = await read_json_body(request)
         segments = body.get("segments")
         
         if not segments or not isinstance(segments, list):
             raise HTTPException(status_code=400, detail="Segments array is required")
         
-        path = utils.get_chapter_path(username, chapter_id)
+        # 1. Read existing data (copied, the cached dict is shared)
+        cached = await run_io(store.read, username, chapter_id)
         
-        if not os.path.exists(path):
+        if cached is None:
             raise HTTPException(status_code=404, detail="Chapter not found")
         
-        # 1. Read existing data
-        with open(path, "r", encoding="utf-8") as f:
-            chapter_data = json.load(f)
+        chapter_data = dict(cached)
         
         # 2. Update segments
         chapter_data["segments"] = segments
         
-        # 3. Save back to file
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(chapter_data, f, indent=2, ensure_ascii=False)
+        # 3. Save back to file (the old segments stay in the revision history)
+        rev = await run_io(revision_log_for(store).save, username, chapter_id, chapter_data, "segments")
         
-        return {"status": "success", "message": "Segments updated", "data": chapter_data}
+        return {"status": "success", "message": "Segments updated", "revision": rev, "data": chapter_data}
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON")
+    except ValueError as e:
+        # e.g. a chapter ID the store refuses (see check_names)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# --- Revision History ---
+
+@router.get("/api/chapter/{username}/{chapter_id}/revisions", dependencies=[Depends(require_owner)])
+async def list_revisions(username: str, chapter_id: str, store: ChapterStore = Depends(get_chapter_store)):
+    """
+    Lists the saved versions of a chapter, newest first.
+
+    Each entry has the revision number ('rev'), when it was saved ('created_at'),
+    what kind of save it was ('reason', e.g. "rename" or "segments") and its stored size.
+    """
+    try:
+        revisions = await run_io(revision_log_for(store).list_revisions, username, chapter_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"status": "success", "chapter_id": chapter_id, "revisions": revisions}
+
+@router.get("/api/chapter/{username}/{chapter_id}/revisions/{rev}/diff", dependencies=[Depends(require_owner)])
+async def diff_revision(username: str, chapter_id: str, rev: int, against: Optional[int] = None,
+                        store: ChapterStore = Depends(get_chapter_store)):
+    """
+    Shows what changed in a revision.
+
+    Compares 'rev' with the revision before it, or with 'against' if given.
+    Returns the changed fields (e.g. title) and the inserted/deleted/replaced segments.
+    """
+    try:
+        diff = await run_io(revision_log_for(store).diff, username, chapter_id, rev, against)
+    except RevisionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"status": "success", "chapter_id": chapter_id, **diff}
+
+@router.post("/api/chapter/{username}/{chapter_id}/revisions/{rev}/restore", dependencies=[Depends(require_owner)])
+async def restore_revision(username: str, chapter_id: str, rev: int, store: ChapterStore = Depends(get_chapter_store)):
+    """
+    Brings back an earlier version of a chapter.
+
+    The restored version is saved as a new revision, so the restore can be undone as well.
+    """
+    try:
+        new_rev, chapter_data = await run_io(revision_log_for(store).restore, username, chapter_id, rev)
+    except RevisionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"status": "success", "message": f"Restored revision {rev}", "revision": new_rev, "data": chapter_data}
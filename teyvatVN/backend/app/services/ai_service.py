@@ -5,17 +5,37 @@ This module interacts with the Google Gemini API to generate story beats,
 detailed narrative segments, and full chapters based on user prompts.
 """
 
-import google.generativeai as genai
 import os
+import threading
 import time
 import json
 import re
 from app.core.config import GEMINI_API_KEY, GEMINI_MODEL_NAME
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
-    print("Warning: GEMINI_API_KEY not found in environment variables.")
+# --- Gemini Client ---
+# Importing google.generativeai takes about half a second, so it is loaded on the first
+# generation instead of every time the server (or a worker, or a reload) starts.
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """
+    Returns the google.generativeai module, imported and configured on first use.
+
+    The server's GEMINI_API_KEY (if any) becomes the default key; a call made
+    with a user's own key configures that one instead.
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                if GEMINI_API_KEY:
+                    genai.configure(api_key=GEMINI_API_KEY)
+                else:
+                    print("Warning: GEMINI_API_KEY not found in environment variables.")
+                _genai = genai
+    return _genai
 
 def clean_json_string(json_str):
     """Clean markdown code blocks from string to extract JSON."""
@@ -127,6 +147,7 @@ def generate_beat_details(beats, chapter_data, api_key=None):
             },
         ]
         
+        genai = get_genai()
         if api_key:
             genai.configure(api_key=api_key)
         
@@ -233,6 +254,7 @@ def generate_beats(chapter_data, api_key=None):
         },
     ]
     
+    genai = get_genai()
     if api_key:
         genai.configure(api_key=api_key)
 
@@ -363,6 +385,7 @@ Remember to output ONLY the JSON object, nothing else."""
         },
     ]
     
+    genai = get_genai()
     if api_key:
         genai.configure(api_key=api_key)
 
@@ -8,21 +8,34 @@ Key Responsibilities:
 1.  **Hashing Passwords**: Turning "password123" into secure gibberish so we don't store plain text.
 2.  **Verifying Passwords**: Checking if a login password matches the stored hash.
 3.  **User Management**: Finding, creating, and authenticating users in the database.
+    Read-only lookups (get_user_record) are served from the user cache (user_cache.py);
+    get_user() returns the live database object, for code that changes the user.
+
+The routes use the '_async' functions: their queries go through an AsyncSession
+(get_async_db), and bcrypt, which takes a long time on purpose, runs on the hashing pool
+(app/common/hashing_pool.py). Neither holds up the event loop. The plain versions, with a
+normal Session, are for scripts.
 """
 
 import os
 import bcrypt
 from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import Depends
 from datetime import datetime
 
-from app.core.database import get_db
+from app.common.hashing_pool import run_hashing
+from app.core import security
+from app.core.config import BCRYPT_ROUNDS
+from app.core.database import get_db, release_connection
 from app.models.sql import User
+from app.services.user_cache import UserRecord, user_cache
 
 # --- Password Security ---
 
-def get_password_hash(password: str) -> str:
+def get_password_hash(password: str, rounds: Optional[int] = None) -> str:
     """
     Takes a plain password and turns it into a secure hash.
     
@@ -31,12 +44,13 @@ def get_password_hash(password: str) -> str:
 
     Args:
         password (str): The plain text password.
+        rounds (Optional[int]): The bcrypt cost factor. Defaults to BCRYPT_ROUNDS from config.
 
     Returns:
         str: The hashed password.
     """
     pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(pwd_bytes, salt)
     return hashed.decode('utf-8')
 
@@ -58,6 +72,24 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except Exception:
         return False
 
+def needs_rehash(hashed_password: str, rounds: Optional[int] = None) -> bool:
+    """
+    Checks if a stored hash was made with a different cost factor than the configured one.
+
+    A bcrypt hash records its cost: '$2b$12$...' was made with 12 rounds.
+
+    Args:
+        hashed_password (str): The stored hash.
+        rounds (Optional[int]): The cost it should have. Defaults to BCRYPT_ROUNDS from config.
+
+    Returns:
+        bool: True if the password should be hashed again (done at the next login).
+    """
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return True
+    return int(parts[2]) != (rounds or BCRYPT_ROUNDS)
+
 # --- User Management ---
 
 def get_user(db: Session, username: str) -> Optional[User]:
@@ -87,6 +119,68 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
     """
     return db.query(User).filter(User.email == email).first()
 
+def get_user_record(db: Session, username: str) -> Optional[UserRecord]:
+    """
+    Finds a user by username, from the user cache when possible.
+
+    The record is a read-only copy: to change the user, load them with get_user().
+
+    Args:
+        db (Session): The database session (only used on a cache miss).
+        username (str): The username to search for.
+
+    Returns:
+        Optional[UserRecord]: The user record if found, None otherwise.
+    """
+    return _cached_lookup("username", username, lambda: get_user(db, username))
+
+def get_user_record_by_email(db: Session, email: str) -> Optional[UserRecord]:
+    """
+    Finds a user by email address, from the user cache when possible.
+
+    Args:
+        db (Session): The database session (only used on a cache miss).
+        email (str): The email to search for.
+
+    Returns:
+        Optional[UserRecord]: The user record if found, None otherwise.
+    """
+    return _cached_lookup("email", email, lambda: get_user_by_email(db, email))
+
+def _cached_lookup(field: str, value: str, load) -> Optional[UserRecord]:
+    found, record = user_cache.lookup(field, value)
+    if found:
+        return record
+    generation = user_cache.generation()
+    user = load()
+    record = UserRecord.from_user(user) if user is not None else None
+    user_cache.put(field, value, record, generation)
+    return record
+
+def update_gemini_api_key(db: Session, username: str, encrypted_key: Optional[str]) -> bool:
+    """
+    Saves a user's (already encrypted) Gemini API key.
+
+    Args:
+        db (Session): The database session.
+        username (str): The username.
+        encrypted_key (Optional[str]): The encrypted key, or None to remove it.
+
+    Returns:
+        bool: False if there is no such user.
+    """
+    user = get_user(db, username)
+    if not user:
+        return False
+    # Read before the commit: afterwards each attribute access would reload the row
+    # (and hold on to a pooled connection until the request ends).
+    user_id, email = user.id, user.email
+    user.gemini_api_key = encrypted_key
+    db.commit()
+    user_cache.invalidate(username=username, email=email)
+    security.api_key_cache.invalidate(user_id)
+    return True
+
 def create_user(db: Session, username: str, password: str, email: str, gemini_api_key: str = None) -> Optional[User]:
     """
     Registers a new user.
@@ -107,12 +201,15 @@ def create_user(db: Session, username: str, password: str, email: str, gemini_ap
         Optional[User]: The created user object, or None if user already exists.
     """
     # Check for duplicates
-    if get_user(db, username) or get_user_by_email(db, email):
+    if get_user_record(db, username) or get_user_record_by_email(db, email):
         return None
     
     # Secure the password
     hashed_password = get_password_hash(password)
-    
+    return _add_user(db, username, email, hashed_password, gemini_api_key)
+
+def _add_user(db: Session, username: str, email: str, hashed_password: str, gemini_api_key: Optional[str]) -> User:
+    """Saves a new user whose password is already hashed."""
     # Create the User object
     db_user = User(
         username=username, 
@@ -125,6 +222,8 @@ def create_user(db: Session, username: str, password: str, email: str, gemini_ap
     db.add(db_user)
     db.commit()
     db.refresh(db_user) # Reload to get the generated ID
+    # Forget any cached "no such user" under this name or email.
+    user_cache.invalidate(username=username, email=email)
     return db_user
 
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
@@ -133,7 +232,8 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
     
     1. Finds the user.
     2. Checks the password.
-    3. Returns the user if everything is correct.
+    3. Re-hashes it if BCRYPT_ROUNDS has changed since it was stored.
+    4. Returns the user if everything is correct.
     Args:
         db (Session): The database session.
         username (str): The username.
@@ -147,4 +247,135 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
         return None
     if not verify_password(password, user.hashed_password):
         return None
-    return user
\ No newline at end of file
+    if needs_rehash(user.hashed_password):
+        _save_rehash(db, user, get_password_hash(password))
+    return user
+
+def _save_rehash(db: Session, user: User, hashed_password: str) -> None:
+    """Stores a password hashed with the current cost. A failure here never fails the login."""
+    username, email = user.username, user.email  # no reload after the commit
+    try:
+        user.hashed_password = hashed_password
+        db.commit()
+        user_cache.invalidate(username=username, email=email)
+    except Exception as e:
+        db.rollback()
+        print(f"Could not upgrade the password hash of {username}: {e}")
+
+# --- User Management (async, for the routes) ---
+# The same operations through an AsyncSession: while the database works, the event loop
+# serves other requests.
+
+async def get_user_async(db: AsyncSession, username: str) -> Optional[User]:
+    """
+    Same as get_user(), with an AsyncSession.
+
+    Args:
+        db (AsyncSession): The database session.
+        username (str): The username to search for.
+
+    Returns:
+        Optional[User]: The user object if found, None otherwise.
+    """
+    result = await db.execute(select(User).where(User.username == username).limit(1))
+    return result.scalars().first()
+
+async def get_user_by_email_async(db: AsyncSession, email: str) -> Optional[User]:
+    """Same as get_user_by_email(), with an AsyncSession."""
+    result = await db.execute(select(User).where(User.email == email).limit(1))
+    return result.scalars().first()
+
+async def get_user_record_async(db: AsyncSession, username: str) -> Optional[UserRecord]:
+    """
+    Same as get_user_record(): from the user cache when possible, else one awaited query.
+
+    Args:
+        db (AsyncSession): The database session (only used on a cache miss).
+        username (str): The username to search for.
+
+    Returns:
+        Optional[UserRecord]: The user record if found, None otherwise.
+    """
+    return await _cached_lookup_async("username", username, lambda: get_user_async(db, username))
+
+async def get_user_record_by_email_async(db: AsyncSession, email: str) -> Optional[UserRecord]:
+    """Same as get_user_record_by_email(), with an AsyncSession."""
+    return await _cached_lookup_async("email", email, lambda: get_user_by_email_async(db, email))
+
+async def _cached_lookup_async(field: str, value: str, load) -> Optional[UserRecord]:
+    found, record = user_cache.lookup(field, value)
+    if found:
+        return record
+    generation = user_cache.generation()
+    user = await load()
+    record = UserRecord.from_user(user) if user is not None else None
+    user_cache.put(field, value, record, generation)
+    return record
+
+async def update_gemini_api_key_async(db: AsyncSession, username: str, encrypted_key: Optional[str]) -> bool:
+    """
+    Same as update_gemini_api_key(), with an AsyncSession.
+
+    Returns:
+        bool: False if there is no such user.
+    """
+    user = await get_user_async(db, username)
+    if not user:
+        return False
+    user_id, email = user.id, user.email
+    user.gemini_api_key = encrypted_key
+    await db.commit()
+    user_cache.invalidate(username=username, email=email)
+    security.api_key_cache.invalidate(user_id)
+    return True
+
+async def create_user_async(db: AsyncSession, username: str, password: str, email: str,
+                            gemini_api_key: str = None) -> Optional[User]:
+    """
+    Same as create_user(), but the password is hashed on the hashing pool, off the event loop.
+
+    Returns:
+        Optional[User]: The created user object, or None if user already exists.
+    """
+    if await get_user_record_async(db, username) or await get_user_record_by_email_async(db, email):
+        return None
+    await release_connection(db)  # not needed while bcrypt runs
+    hashed_password = await run_hashing(get_password_hash, password)
+
+    db_user = User(username=username, email=email, hashed_password=hashed_password, gemini_api_key=gemini_api_key)
+    db.add(db_user)
+    # The generated ID is filled in by the commit (AsyncSessionLocal doesn't expire objects on commit).
+    await db.commit()
+    # Forget any cached "no such user" under this name or email.
+    user_cache.invalidate(username=username, email=email)
+    return db_user
+
+async def authenticate_user_async(db: AsyncSession, username: str, password: str) -> Optional[UserRecord]:
+    """
+    Same as authenticate_user(), but bcrypt runs on the hashing pool, off the event loop,
+    and the user is looked up in the user cache.
+
+    If the password is right but was hashed with an old BCRYPT_ROUNDS, it is hashed
+    again with the current cost (we only ever see the plain password at login).
+
+    Returns:
+        Optional[UserRecord]: The authenticated user, or None if authentication fails.
+    """
+    record = await get_user_record_async(db, username)
+    if not record:
+        return None
+    await release_connection(db)  # not needed while bcrypt runs
+    if not await run_hashing(verify_password, password, record.hashed_password):
+        return None
+    if needs_rehash(record.hashed_password):
+        new_hash = await run_hashing(get_password_hash, password)
+        user = await get_user_async(db, username)
+        if user is not None:
+            try:
+                user.hashed_password = new_hash
+                await db.commit()
+                user_cache.invalidate(username=record.username, email=record.email)
+            except Exception as e:
+                await db.rollback()
+                print(f"Could not upgrade the password hash of {username}: {e}")
+    return record
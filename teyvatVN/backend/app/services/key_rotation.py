@@ -0,0 +1,137 @@
+"""
+API Key Re-encryption (Key Rotation)
+
+After ENCRYPTION_KEY is replaced (the old key moved to ENCRYPTION_OLD_KEYS), every stored
+Gemini API key still decrypts, but with the old key. This job re-encrypts them with the new one,
+so the old key can be thrown away.
+
+How it works:
+1.  **Small Batches**: Users are read in ID order, batch_size at a time, streamed with
+    yield_per. Memory use stays flat however big the users table is, and each batch's read
+    is finished before it is committed (SQLite won't commit while a read is still open).
+2.  **No Downtime**: Each row is updated only if its key is still the one we read
+    (UPDATE ... WHERE gemini_api_key = <old value>), so a user saving a new key at the same
+    moment is never overwritten. While the job runs, all the keys keep decrypting.
+3.  **Resumable**: Progress (the last user ID done, and the counters) is saved in
+    'key_rotations' with every batch. Running the job again continues from there.
+4.  **Plain Text Too**: Keys saved before encryption was added are encrypted on the way.
+"""
+
+from typing import Callable, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.core import security
+from app.core.database import SessionLocal
+from app.models.sql import KeyRotation, User
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def rotation_status(db: Session, key_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Progress of the re-encryption towards a key (the current ENCRYPTION_KEY by default).
+
+    Returns:
+        Optional[dict]: The counters, or None if it never started.
+    """
+    job = db.get(KeyRotation, key_id or security.primary_key_id())
+    if job is None:
+        return None
+    return {
+        "key_id": job.key_id,
+        "last_user_id": job.last_user_id,
+        "checked": job.checked,
+        "rotated": job.rotated,
+        "failed": job.failed,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def reencrypt_api_keys(session_factory: Callable[[], Session] = SessionLocal, batch_size: int = DEFAULT_BATCH_SIZE,
+                       restart: bool = False, on_batch: Optional[Callable[[dict], None]] = None,
+                       max_batches: Optional[int] = None) -> dict:
+    """
+    Re-encrypts every stored API key with the current ENCRYPTION_KEY, in batches.
+
+    Args:
+        session_factory (Callable[[], Session]): Makes database sessions.
+        batch_size (int): Users read and committed per batch.
+        restart (bool): Start from the first user even if an earlier run got further.
+        on_batch (Optional[Callable[[dict], None]]): Called with the progress after each batch.
+        max_batches (Optional[int]): Stop after this many batches (the next run resumes).
+
+    Returns:
+        dict: The final progress (see rotation_status()).
+    """
+    key_id = security.primary_key_id()
+    with session_factory() as db:
+        job = db.get(KeyRotation, key_id)
+        if job is None:
+            job = KeyRotation(key_id=key_id, last_user_id=0, checked=0, rotated=0, failed=0)
+            db.add(job)
+        elif restart:
+            job.last_user_id, job.checked, job.rotated, job.failed = 0, 0, 0, 0
+            job.finished_at = None
+        elif job.finished_at is not None:
+            return rotation_status(db, key_id)
+        db.commit()
+        last_user_id = job.last_user_id
+
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with session_factory() as db:
+            rows = db.execute(
+                select(User.id, User.gemini_api_key)
+                .where(User.id > last_user_id, User.gemini_api_key.is_not(None))
+                .order_by(User.id)
+                .limit(batch_size)
+                .execution_options(yield_per=batch_size)
+            )
+            checked, failed, changes = 0, 0, []
+            for user_id, stored in rows:
+                checked += 1
+                last_user_id = user_id
+                try:
+                    new_value = security.reencrypt_value(stored)
+                except security.DecryptionError as e:
+                    failed += 1
+                    print(f"Key rotation: user {user_id}: {e}, left as is")
+                    continue
+                if new_value is not None:
+                    changes.append((user_id, stored, new_value))
+
+            job = db.get(KeyRotation, key_id)
+            if checked == 0:
+                job.finished_at = func.now()
+                db.commit()
+                return rotation_status(db, key_id)
+
+            rotated = 0
+            for user_id, stored, new_value in changes:
+                # Only if nobody changed the key since we read it.
+                result = db.execute(
+                    update(User)
+                    .where(User.id == user_id, User.gemini_api_key == stored)
+                    .values(gemini_api_key=new_value)
+                )
+                rotated += result.rowcount
+            job.last_user_id = last_user_id
+            job.checked += checked
+            job.rotated += rotated
+            job.failed += failed
+            db.commit()  # the batch and its progress are saved together
+            status = rotation_status(db, key_id)
+        batches += 1
+        if on_batch is not None:
+            on_batch(status)
+
+    with session_factory() as db:
+        return rotation_status(db, key_id)
+
+
+def count_users_with_keys(db: Session) -> int:
+    """How many users have a stored API key (for progress percentages)."""
+    return db.execute(select(func.count()).select_from(User).where(User.gemini_api_key.is_not(None))).scalar_one()
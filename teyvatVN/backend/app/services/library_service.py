@@ -0,0 +1,291 @@
+"""
+Library Export/Import Service
+
+Backs up a user's whole library in one download, and loads such a backup back in.
+
+Two formats:
+1.  **NDJSON** ("newline-delimited JSON"): one line per chapter,
+    {"chapter_id": "chapter3", "data": {...chapter...}}. Easy to stream and to read line by line.
+2.  **Zip**: one '{chapter_id}/output.json' file per chapter, the same layout as the data folder.
+
+Both directions stream:
+-   Export reads EXPORT_PAGE_SIZE chapters at a time and sends them before reading more.
+-   Import handles IMPORT_BATCH_SIZE chapters at a time: it reserves their new
+    chapter IDs in one go and writes them together.
+So memory use stays flat no matter how many chapters a library has.
+"""
+
+import json
+import tempfile
+import zipfile
+from typing import AsyncIterator, Iterator, Optional
+
+from app.common.storage_io import run_io
+from app.storage import chapter_format
+from app.storage.base import ChapterStore
+
+EXPORT_FORMATS = ("ndjson", "zip")
+EXPORT_PAGE_SIZE = 50
+IMPORT_BATCH_SIZE = 50
+# A single chapter (one NDJSON line or one zip member) larger than this is rejected.
+MAX_CHAPTER_BYTES = 16 * 1024 * 1024
+# Zip uploads are kept in memory up to this size, then spilled to a temporary file.
+ZIP_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+# --- Export ---
+
+def _chapter_ids_oldest_first(store: ChapterStore, username: str) -> list[str]:
+    """
+    All of the user's chapter IDs, lowest chapter number first.
+
+    Only the IDs are held in memory, never the chapters themselves.
+    Oldest first means a re-import hands out new IDs in the same order.
+    """
+    chapter_ids, cursor = [], None
+    while True:
+        entries, cursor = store.list_chapters(username, order="number", limit=500, cursor=cursor)
+        chapter_ids.extend(e["chapter_id"] for e in entries)
+        if cursor is None:
+            return chapter_ids[::-1]
+
+
+def _read_page(store: ChapterStore, username: str, chapter_ids: list[str]) -> list[tuple[str, dict]]:
+    """Reads a page of chapters, skipping any deleted since the listing."""
+    page = []
+    for chapter_id in chapter_ids:
+        data = store.read_uncached(username, chapter_id)
+        if data is not None:
+            page.append((chapter_id, data))
+    return page
+
+
+async def _iter_chapters(store: ChapterStore, username: str) -> AsyncIterator[list[tuple[str, dict]]]:
+    """Yields the user's chapters one page at a time (reads run on the storage pool)."""
+    chapter_ids = await run_io(_chapter_ids_oldest_first, store, username)
+    for start in range(0, len(chapter_ids), EXPORT_PAGE_SIZE):
+        yield await run_io(_read_page, store, username, chapter_ids[start:start + EXPORT_PAGE_SIZE])
+
+
+async def export_ndjson(store: ChapterStore, username: str) -> AsyncIterator[bytes]:
+    """
+    Streams the library as NDJSON, one page of chapters per chunk.
+
+    Args:
+        store (ChapterStore): Where the chapters live.
+        username (str): Whose library to export.
+
+    Yields:
+        bytes: Complete NDJSON lines.
+    """
+    async for page in _iter_chapters(store, username):
+        yield b"".join(
+            json.dumps({"chapter_id": chapter_id, "data": data}, ensure_ascii=False).encode("utf-8") + b"\n"
+            for chapter_id, data in page
+        )
+
+
+class _ChunkWriter:
+    """
+    A write-only file object that collects what zipfile writes, so we can send it on.
+
+    It has no seek() or tell(), which makes zipfile write a streamable archive
+    (sizes go after each file instead of being patched in afterwards).
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_page(archive: zipfile.ZipFile, writer: _ChunkWriter, page: list[tuple[str, dict]]) -> bytes:
+    for chapter_id, data in page:
+        payload = chapter_format.to_json_bytes(data, "minified")
+        archive.writestr(f"{chapter_id}/output.json", payload, compress_type=zipfile.ZIP_DEFLATED)
+    return writer.drain()
+
+
+async def export_zip(store: ChapterStore, username: str) -> AsyncIterator[bytes]:
+    """
+    Streams the library as a zip file ('{chapter_id}/output.json' per chapter).
+
+    Compression runs on the storage pool, and each page is sent as soon as it is compressed.
+
+    Yields:
+        bytes: Consecutive pieces of the zip file.
+    """
+    writer = _ChunkWriter()
+    archive = zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_DEFLATED)
+    async for page in _iter_chapters(store, username):
+        chunk = await run_io(_zip_page, archive, writer, page)
+        if chunk:
+            yield chunk
+    # The zip's table of contents goes at the very end.
+    archive.close()
+    yield writer.drain()
+
+
+# --- Import ---
+
+def _parse_chapter(raw: bytes) -> tuple[Optional[str], dict]:
+    """
+    Parses one exported chapter.
+
+    Accepts {"chapter_id": ..., "data": {...}} (our NDJSON lines) or a bare chapter object.
+
+    Raises:
+        ValueError: If it isn't a chapter.
+    """
+    value = chapter_format.loads(raw)
+    if not isinstance(value, dict):
+        raise ValueError("Expected a JSON object")
+    if isinstance(value.get("data"), dict):
+        return value.get("chapter_id"), value["data"]
+    return None, value
+
+
+def _import_batch(store: ChapterStore, username: str, batch: list[tuple[int, Optional[str], bytes]]) -> dict:
+    """
+    Parses a batch, reserves one new ID per valid chapter, and writes them all together.
+
+    Args:
+        batch: (position, original chapter_id or None, raw bytes) per chapter.
+               'position' is the line number (NDJSON) or file name (zip), used in error reports.
+
+    Returns:
+        dict: {"chapters": [{"from", "chapter_id"}], "errors": [{"at", "error"}]}.
+    """
+    parsed, errors = [], []
+    for position, original_id, raw in batch:
+        try:
+            chapter_id, data = _parse_chapter(raw)
+            parsed.append((original_id or chapter_id, data))
+        except ValueError as e:
+            errors.append({"at": position, "error": str(e)})
+
+    new_ids = store.allocate_chapter_ids(username, len(parsed)) if parsed else []
+    store.write_many(username, [(new_id, data) for new_id, (_, data) in zip(new_ids, parsed)])
+    return {
+        "chapters": [{"from": old_id, "chapter_id": new_id} for new_id, (old_id, _) in zip(new_ids, parsed)],
+        "errors": errors,
+    }
+
+
+async def import_ndjson(store: ChapterStore, username: str, chunks: AsyncIterator[bytes]) -> dict:
+    """
+    Imports an NDJSON stream chunk by chunk. Every chapter gets a fresh chapter ID.
+
+    Only the current partial line and one batch of lines are ever held in memory.
+
+    Args:
+        store (ChapterStore): Where to write.
+        username (str): Whose library to import into.
+        chunks (AsyncIterator[bytes]): The request body, e.g. request.stream().
+
+    Returns:
+        dict: {"imported": count, "chapters": [{"from", "chapter_id"}], "errors": [{"at", "error"}]}.
+
+    Raises:
+        ValueError: If a single line is larger than MAX_CHAPTER_BYTES.
+    """
+    result = {"imported": 0, "chapters": [], "errors": []}
+    batch: list[tuple[int, Optional[str], bytes]] = []
+    pending = b""
+    line_number = 0
+
+    async def flush():
+        outcome = await run_io(_import_batch, store, username, batch)
+        result["chapters"] += outcome["chapters"]
+        result["errors"] += outcome["errors"]
+        batch.clear()
+
+    async for chunk in _with_end_marker(chunks):
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        if len(pending) > MAX_CHAPTER_BYTES:
+            raise ValueError(f"Line {line_number + 1} is larger than {MAX_CHAPTER_BYTES} bytes")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                batch.append((line_number, None, line))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await flush()
+
+    if batch:
+        await flush()
+    result["imported"] = len(result["chapters"])
+    return result
+
+
+async def _with_end_marker(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # A final newline, so a last line without one is still processed.
+    async for chunk in chunks:
+        yield chunk
+    yield b"\n"
+
+
+def _iter_zip_members(archive: zipfile.ZipFile) -> Iterator[tuple[str, Optional[str]]]:
+    """Yields (member name, original chapter_id) for every chapter file in the zip."""
+    for info in archive.infolist():
+        if info.is_dir() or not info.filename.endswith(".json"):
+            continue
+        parts = info.filename.rstrip("/").split("/")
+        # '{chapter_id}/output.json' -> chapter_id, 'chapter3.json' -> chapter3
+        original_id = parts[-2] if len(parts) >= 2 else parts[-1][:-len(".json")]
+        yield info.filename, original_id
+
+
+def _import_zip_file(store: ChapterStore, username: str, spool) -> dict:
+    result = {"imported": 0, "chapters": [], "errors": []}
+    batch = []
+
+    def flush():
+        outcome = _import_batch(store, username, batch)
+        result["chapters"] += outcome["chapters"]
+        result["errors"] += outcome["errors"]
+        batch.clear()
+
+    spool.seek(0)
+    with zipfile.ZipFile(spool) as archive:
+        for name, original_id in _iter_zip_members(archive):
+            if archive.getinfo(name).file_size > MAX_CHAPTER_BYTES:
+                result["errors"].append({"at": name, "error": f"Larger than {MAX_CHAPTER_BYTES} bytes"})
+                continue
+            batch.append((name, original_id, archive.read(name)))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+    if batch:
+        flush()
+    result["imported"] = len(result["chapters"])
+    return result
+
+
+async def import_zip(store: ChapterStore, username: str, chunks: AsyncIterator[bytes]) -> dict:
+    """
+    Imports a zip upload. Every chapter gets a fresh chapter ID.
+
+    A zip's table of contents is at the end, so the upload is first spooled
+    (in memory up to ZIP_SPOOL_BYTES, then in a temporary file), and the
+    members are then read and written one batch at a time.
+
+    Raises:
+        ValueError: If the upload isn't a valid zip file.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES) as spool:
+        async for chunk in chunks:
+            await run_io(spool.write, chunk)
+        try:
+            return await run_io(_import_zip_file, store, username, spool)
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Invalid zip file: {e}")
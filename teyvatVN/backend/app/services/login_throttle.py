@@ -0,0 +1,452 @@
+"""
+Login Throttling
+
+Every login attempt costs a full bcrypt check (about a quarter of a second of CPU), so a
+burst of guessed passwords (credential stuffing) could keep every core busy and slow the
+whole server down.
+
+How it works:
+1.  **Two Keys per Attempt**: Failed logins are counted per client IP ("ip:<address>") and
+    per username ("user:<name>"), over a sliding window of LOGIN_THROTTLE_WINDOW_SECONDS.
+2.  **Progressive Delays**: The first few failures are free (LOGIN_FREE_FAILURES_PER_USER / _PER_IP).
+    After that, the next attempt must come at least LOGIN_DELAY_BASE_SECONDS after the last
+    failure, twice as long after each further failure, up to LOGIN_DELAY_MAX_SECONDS.
+    The server never sleeps: an early attempt is refused (429 with a Retry-After header),
+    which costs neither a worker nor a bcrypt check.
+3.  **Lockout**: At LOGIN_MAX_FAILURES_PER_USER (or _PER_IP) failures within the window, the
+    key is locked until enough of them are older than the window.
+4.  **Checked Before bcrypt**: begin() reads the counters and counts the attempt as a failure
+    in the same store operation, so a burst of parallel guesses can't all pass before the
+    first wrong password is recorded. A throttled attempt never reaches the user lookup or
+    the hashing pool, and isn't counted.
+5.  **Success**: The right password turns the attempt back into nothing and clears the
+    username's failures. The IP's earlier failures are kept, or an attacker could reset their
+    IP now and then by logging into an account of their own.
+6.  **Backends**: "memory" keeps the timestamps in a bounded dictionary (one process);
+    "database" keeps them in 'login_failures', so all workers count the same failures.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.common.storage_io import run_io
+from app.core.config import (
+    LOGIN_DELAY_BASE_SECONDS,
+    LOGIN_DELAY_MAX_SECONDS,
+    LOGIN_FREE_FAILURES_PER_IP,
+    LOGIN_FREE_FAILURES_PER_USER,
+    LOGIN_MAX_FAILURES_PER_IP,
+    LOGIN_MAX_FAILURES_PER_USER,
+    LOGIN_THROTTLE_BACKEND,
+    LOGIN_THROTTLE_MAX_KEYS,
+    LOGIN_THROTTLE_WINDOW_SECONDS,
+)
+from app.core.database import SessionLocal
+from app.models.sql import LoginFailure
+
+
+class LoginThrottled(Exception):
+    """Raised by check() when an attempt must wait. str(e) is a message for the user."""
+
+    def __init__(self, message: str, retry_after: float, scope: str):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.scope = scope  # "user" or "ip"
+
+
+@dataclass(frozen=True)
+class ThrottleRule:
+    """
+    The limits for one kind of key (usernames or IPs).
+
+    Args:
+        max_failures (int): Failures within the window that lock the key (0 = no lockout).
+        free_failures (int): Failures allowed before delays start.
+        base_delay (float): Seconds to wait after the first delayed failure (doubles each time).
+        max_delay (float): The longest delay.
+    """
+    max_failures: int
+    free_failures: int
+    base_delay: float = LOGIN_DELAY_BASE_SECONDS
+    max_delay: float = LOGIN_DELAY_MAX_SECONDS
+
+    def retry_after(self, failures: list[float], window: float, now: float) -> float:
+        """
+        Seconds until the next attempt is allowed (0 = right away).
+
+        Args:
+            failures (list[float]): Times of the failures within the window, oldest first.
+            window (float): The window length in seconds.
+            now (float): The current time.
+        """
+        count = len(failures)
+        wait = 0.0
+        if self.max_failures and count >= self.max_failures:
+            # Locked until enough failures leave the window to get back under the limit.
+            wait = failures[count - self.max_failures] + window - now
+        if count and count >= self.free_failures:
+            delay = min(self.base_delay * 2 ** min(count - self.free_failures, 32), self.max_delay)
+            wait = max(wait, failures[-1] + delay - now)
+        return max(wait, 0.0)
+
+
+@dataclass(frozen=True)
+class LoginAttempt:
+    """
+    An attempt let through by LoginThrottle.begin(). It already counts as a failure;
+    record_success() takes that back.
+
+    Args:
+        keys (dict[str, str]): The attempt's keys by scope ("user", "ip").
+        reservation: The store's handle on the failure it recorded.
+    """
+    keys: dict[str, str]
+    reservation: Any
+
+
+# --- Backends ---
+
+class MemoryThrottleStore:
+    """
+    Failure times in a dictionary, for a single process.
+
+    At most 'max_keys' keys are tracked; beyond that the least recently failed are forgotten,
+    so a flood of made-up usernames can't use up the server's memory.
+    """
+
+    blocking = False  # safe to call on the event loop
+
+    def __init__(self, max_keys: int = LOGIN_THROTTLE_MAX_KEYS, max_per_key: int = 1000):
+        self.max_keys = max_keys
+        self.max_per_key = max_per_key
+        self._failures: "OrderedDict[str, deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key: str, since: float) -> list[float]:
+        # Callers hold self._lock.
+        times = self._failures.get(key)
+        if times is None:
+            return []
+        while times and times[0] < since:
+            times.popleft()
+        if not times:
+            del self._failures[key]
+        return list(times)
+
+    def _add(self, keys: list[str], at: float) -> None:
+        # Callers hold self._lock.
+        for key in keys:
+            times = self._failures.get(key)
+            if times is None:
+                times = self._failures[key] = deque(maxlen=self.max_per_key)
+            times.append(at)
+            self._failures.move_to_end(key)
+        while len(self._failures) > self.max_keys:
+            self._failures.popitem(last=False)
+
+    def failures(self, keys: Iterable[str], since: float) -> dict[str, list[float]]:
+        """Each key's failure times since 'since', oldest first."""
+        with self._lock:
+            return {key: self._recent(key, since) for key in keys}
+
+    def reserve(self, keys: Iterable[str], at: float, since: float) -> tuple[float, dict[str, list[float]]]:
+        """
+        Records one failure at time 'at' for each key, and returns the failures that were
+        there before it, under one lock: no other attempt can read in between.
+
+        Returns:
+            tuple: (handle for release(), {key: failure times since 'since', oldest first}).
+        """
+        with self._lock:
+            keys = list(keys)
+            failures = {key: self._recent(key, since) for key in keys}
+            self._add(keys, at)
+            return at, failures
+
+    def release(self, keys: Iterable[str], reservation: float) -> None:
+        """Takes back the failures recorded by reserve() for these keys."""
+        with self._lock:
+            for key in keys:
+                times = self._failures.get(key)
+                if times is None:
+                    continue  # forgotten (or cleared) meanwhile
+                try:
+                    times.remove(reservation)
+                except ValueError:
+                    continue
+                if not times:
+                    del self._failures[key]
+
+    def clear(self, key: str) -> bool:
+        with self._lock:
+            return self._failures.pop(key, None) is not None
+
+    def top(self, since: float, limit: int) -> list[tuple[str, list[float]]]:
+        """The keys with the most failures since 'since', with their failure times."""
+        with self._lock:
+            rows = [(key, [t for t in times if t >= since]) for key, times in self._failures.items()]
+        rows = [row for row in rows if row[1]]
+        rows.sort(key=lambda row: (-len(row[1]), row[0]))
+        return rows[:limit]
+
+
+class DatabaseThrottleStore:
+    """
+    Failure times in the 'login_failures' table, shared by every worker using DATABASE_URL.
+
+    Blocking (sync sessions): LoginThrottle calls it through run_io.
+    """
+
+    blocking = True
+
+    # Old rows of every key (not just the ones being written) are deleted this often.
+    PRUNE_EVERY = 1000
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._writes = 0
+
+    def failures(self, keys: Iterable[str], since: float) -> dict[str, list[float]]:
+        keys = list(keys)
+        result = {key: [] for key in keys}
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(LoginFailure.key, LoginFailure.failed_at)
+                .where(LoginFailure.key.in_(keys), LoginFailure.failed_at >= since)
+                .order_by(LoginFailure.failed_at)
+            )
+            for key, failed_at in rows:
+                result[key].append(failed_at)
+        return result
+
+    def reserve(self, keys: Iterable[str], at: float, since: float) -> tuple[list[int], dict[str, list[float]]]:
+        """
+        Records one failure at time 'at' for each key, then reads the other failures.
+
+        The rows are committed before the read, so of two attempts racing in different
+        workers, at least one sees the other (both may, and both be refused: throttling
+        errs on the safe side).
+
+        Returns:
+            tuple: (handle for release(), {key: the other failure times since 'since', oldest first}).
+        """
+        keys = list(keys)
+        self._writes += 1
+        with self.session_factory() as db:
+            rows = [LoginFailure(key=key, failed_at=at) for key in keys]
+            db.add_all(rows)
+            db.flush()
+            ids = [row.id for row in rows]
+            if self._writes % self.PRUNE_EVERY == 0:
+                db.execute(delete(LoginFailure).where(LoginFailure.failed_at < since))
+            else:
+                db.execute(delete(LoginFailure).where(LoginFailure.key.in_(keys), LoginFailure.failed_at < since))
+            db.commit()
+
+            result = {key: [] for key in keys}
+            others = db.execute(
+                select(LoginFailure.key, LoginFailure.failed_at)
+                .where(LoginFailure.key.in_(keys), LoginFailure.failed_at >= since, LoginFailure.id.not_in(ids))
+                .order_by(LoginFailure.failed_at)
+            )
+            for key, failed_at in others:
+                result[key].append(failed_at)
+        return ids, result
+
+    def release(self, keys: Iterable[str], reservation: list[int]) -> None:
+        with self.session_factory() as db:
+            db.execute(delete(LoginFailure).where(LoginFailure.id.in_(reservation), LoginFailure.key.in_(list(keys))))
+            db.commit()
+
+    def clear(self, key: str) -> bool:
+        with self.session_factory() as db:
+            removed = db.execute(delete(LoginFailure).where(LoginFailure.key == key)).rowcount
+            db.commit()
+        return bool(removed)
+
+    def top(self, since: float, limit: int) -> list[tuple[str, list[float]]]:
+        with self.session_factory() as db:
+            keys = db.execute(
+                select(LoginFailure.key)
+                .where(LoginFailure.failed_at >= since)
+                .group_by(LoginFailure.key)
+                .order_by(func.count().desc(), LoginFailure.key)
+                .limit(limit)
+            ).scalars().all()
+        failures = self.failures(keys, since)
+        return [(key, failures[key]) for key in keys]
+
+
+# --- Throttle ---
+
+class LoginThrottle:
+    """
+    Decides whether a login attempt may go ahead, and keeps count of the failures.
+
+    Args:
+        store: Where failures are kept (MemoryThrottleStore or DatabaseThrottleStore).
+        window (float): Length of the sliding window, in seconds.
+        user_rule (ThrottleRule): Limits per username.
+        ip_rule (ThrottleRule): Limits per client IP.
+        clock (Callable[[], float]): Current Unix time (replaceable in tests).
+    """
+
+    def __init__(self, store, window: float = LOGIN_THROTTLE_WINDOW_SECONDS,
+                 user_rule: Optional[ThrottleRule] = None, ip_rule: Optional[ThrottleRule] = None,
+                 clock: Callable[[], float] = time.time):
+        self.store = store
+        self.window = window
+        self.user_rule = user_rule or ThrottleRule(LOGIN_MAX_FAILURES_PER_USER, LOGIN_FREE_FAILURES_PER_USER)
+        self.ip_rule = ip_rule or ThrottleRule(LOGIN_MAX_FAILURES_PER_IP, LOGIN_FREE_FAILURES_PER_IP)
+        self.clock = clock
+
+        # --- Counters ---
+        self.checks = 0
+        self.throttled = 0
+        self.failures_recorded = 0
+        self.successes = 0
+
+    @staticmethod
+    def _keys(ip: Optional[str], username: Optional[str]) -> dict[str, str]:
+        keys = {}
+        if username:
+            keys["user"] = f"user:{username}"
+        if ip:
+            keys["ip"] = f"ip:{ip}"
+        return keys
+
+    def _rule(self, key: str) -> ThrottleRule:
+        return self.user_rule if key.startswith("user:") else self.ip_rule
+
+    async def _call(self, method, *args):
+        # The database backend blocks: keep it off the event loop.
+        if self.store.blocking:
+            return await run_io(method, *args)
+        return method(*args)
+
+    async def begin(self, ip: Optional[str], username: Optional[str]) -> LoginAttempt:
+        """
+        Call before checking the password, then pass the attempt to record_failure()
+        or record_success() (or cancel() if the check itself broke).
+
+        The attempt is counted as a failure right away, in the same store call that reads
+        the counters: parallel attempts see each other, so a burst can't all get through
+        while the first password is still being hashed.
+
+        Returns:
+            LoginAttempt: The attempt, counted as a failure until record_success().
+
+        Raises:
+            LoginThrottled: If the username or the IP has to wait (retry_after seconds).
+        """
+        self.checks += 1
+        keys = self._keys(ip, username)
+        now = self.clock()
+        reservation, failures = await self._call(self.store.reserve, list(keys.values()), now, now - self.window)
+        waits = {scope: self._rule(key).retry_after(failures[key], self.window, now) for scope, key in keys.items()}
+        scope, wait = max(waits.items(), key=lambda item: item[1], default=("user", 0.0))
+        if wait <= 0:
+            return LoginAttempt(keys, reservation)
+        # Throttled attempts aren't failures: take it back.
+        await self._call(self.store.release, list(keys.values()), reservation)
+        self.throttled += 1
+        seconds = math.ceil(wait)
+        who = "this account" if scope == "user" else "your network"
+        raise LoginThrottled(f"Too many failed login attempts for {who}. Try again in {seconds} seconds.",
+                             retry_after=seconds, scope=scope)
+
+    def record_failure(self, attempt: LoginAttempt) -> None:
+        """A wrong username or password: the failure begin() recorded stays."""
+        self.failures_recorded += 1
+
+    async def record_success(self, attempt: LoginAttempt) -> None:
+        """The right password: the attempt isn't a failure, and the username starts with a clean slate."""
+        self.successes += 1
+        user_key = attempt.keys.get("user")
+        if user_key:
+            await self._call(self.store.clear, user_key)
+        others = [key for scope, key in attempt.keys.items() if scope != "user"]
+        if others:
+            await self._call(self.store.release, others, attempt.reservation)
+
+    async def cancel(self, attempt: LoginAttempt) -> None:
+        """The password couldn't be checked (e.g. the database failed): the attempt doesn't count."""
+        await self._call(self.store.release, list(attempt.keys.values()), attempt.reservation)
+
+    async def unlock(self, username: Optional[str] = None, ip: Optional[str] = None) -> bool:
+        """Forgets the failures of a username and/or an IP (for admins). True if there were any."""
+        cleared = False
+        for key in self._keys(ip, username).values():
+            cleared = await self._call(self.store.clear, key) or cleared
+        return cleared
+
+    async def state(self, limit: int = 50) -> list[dict]:
+        """
+        The usernames and IPs with the most failures in the window, and how long each must wait.
+
+        Returns:
+            list[dict]: {"key", "failures", "last_failure", "retry_after"}, most failures first.
+        """
+        now = self.clock()
+        rows = await self._call(self.store.top, now - self.window, limit)
+        return [
+            {
+                "key": key,
+                "failures": len(times),
+                "last_failure": times[-1],
+                "retry_after": math.ceil(self._rule(key).retry_after(times, self.window, now)),
+            }
+            for key, times in rows
+        ]
+
+    def stats(self) -> dict:
+        """Counters and settings for monitoring."""
+        return {
+            "backend": type(self.store).__name__,
+            "checks": self.checks,
+            "throttled": self.throttled,
+            "failures_recorded": self.failures_recorded,
+            "successes": self.successes,
+            "window_seconds": self.window,
+            "per_user": {"max_failures": self.user_rule.max_failures, "free_failures": self.user_rule.free_failures},
+            "per_ip": {"max_failures": self.ip_rule.max_failures, "free_failures": self.ip_rule.free_failures},
+        }
+
+
+def create_throttle_store(kind: str = LOGIN_THROTTLE_BACKEND):
+    """
+    Builds the failure store selected by LOGIN_THROTTLE_BACKEND.
+
+    Args:
+        kind (str): "memory" or "database".
+    """
+    if kind == "memory":
+        return MemoryThrottleStore()
+    if kind == "database":
+        return DatabaseThrottleStore()
+    raise ValueError(f"Unknown LOGIN_THROTTLE_BACKEND: {kind}")
+
+
+_throttle: Optional[LoginThrottle] = None
+_throttle_lock = threading.Lock()
+
+
+def get_login_throttle() -> LoginThrottle:
+    """
+    Returns the app-wide login throttle, creating it on first use.
+
+    Also works as a FastAPI dependency: throttle: LoginThrottle = Depends(get_login_throttle)
+    """
+    global _throttle
+    if _throttle is None:
+        with _throttle_lock:
+            if _throttle is None:
+                _throttle = LoginThrottle(create_throttle_store())
+    return _throttle
@@ -0,0 +1,267 @@
+"""
+Usage Accounting and Quotas
+
+Keeps running totals of what every user stores and generates, so heavy users can be capped
+without walking their library on each request.
+
+How it works:
+1.  **Counters in the Database**: 'user_usage' holds each user's chapter count, total bytes
+    and AI generations; 'chapter_usage' holds the size of every live chapter.
+2.  **Updated Incrementally**: The tracker subscribes to the chapter store. A save adds
+    (new size - old size) to the user's total, a delete subtracts the chapter's size.
+    Sizes are measured as compact JSON, so they don't depend on the storage driver or format.
+3.  **Counted Once**: Users whose chapters were written before the tracker existed are counted
+    the first time their usage is needed (one walk of their library, then never again).
+4.  **O(1) Quota Checks**: check_quota() reads one row. Generations are reserved with a single
+    conditional UPDATE before the Gemini call, so two parallel requests can't both slip past the limit.
+
+Chapters in the trash and revision history don't count towards the quotas.
+"""
+
+import threading
+import weakref
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import QUOTA_MAX_BYTES, QUOTA_MAX_CHAPTERS, QUOTA_MAX_GENERATIONS_PER_DAY
+from app.core.database import SessionLocal
+from app.models.sql import ChapterUsage, UserUsage
+from app.storage.base import ChapterStore, encode_record
+
+# What the admin "top consumers" list can be sorted by.
+USAGE_ORDERS = ("bytes", "chapters", "generations")
+
+
+class QuotaExceeded(Exception):
+    """Raised when a user has hit one of their limits. str(e) says which one."""
+
+    def __init__(self, message: str, limit: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+def chapter_bytes(data: dict) -> int:
+    """The size a chapter counts for: its compact JSON, whatever format it is stored in."""
+    return len(encode_record(data))
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _as_dict(row: UserUsage) -> dict:
+    today = _today()
+    return {
+        "username": row.username,
+        "chapters": row.chapters,
+        "bytes": row.bytes,
+        "generations": row.generations,
+        "generations_today": row.generations_today if row.generations_day == today else 0,
+    }
+
+
+class UsageTracker:
+    """
+    Maintains the usage counters of one chapter store and enforces the quotas.
+
+    Args:
+        session_factory (Callable[[], Session]): Makes database sessions (SessionLocal by default).
+        max_chapters (int): Chapters a user may keep (0 = unlimited).
+        max_bytes (int): Total chapter bytes a user may keep (0 = unlimited).
+        max_generations_per_day (int): AI generations per user per UTC day (0 = unlimited).
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 max_chapters: int = QUOTA_MAX_CHAPTERS, max_bytes: int = QUOTA_MAX_BYTES,
+                 max_generations_per_day: int = QUOTA_MAX_GENERATIONS_PER_DAY):
+        self.session_factory = session_factory
+        self.max_chapters = max_chapters
+        self.max_bytes = max_bytes
+        self.max_generations_per_day = max_generations_per_day
+        # Serializes the read-modify-write of chapter sizes (and first-time counting)
+        # within this process. The totals themselves are updated with 'x = x + delta'.
+        self._lock = threading.Lock()
+
+    def attach(self, store: ChapterStore) -> None:
+        """Keeps the counters in step with every future write/delete of the store."""
+        store.subscribe(self.on_change)
+
+    # --- Keeping Count ---
+
+    def on_change(self, username: str, chapter_id: str, data: Optional[dict]) -> None:
+        """Store listener: applies the size difference of one saved or deleted chapter."""
+        new_size = chapter_bytes(data) if data is not None else None
+        with self._lock, self.session_factory() as db:
+            usage = db.get(UserUsage, username)
+            if usage is None or not usage.counted:
+                return  # Counted from scratch (including this change) the first time it's needed.
+
+            chapter = db.get(ChapterUsage, (username, chapter_id))
+            chapters_delta, bytes_delta = 0, 0
+            if new_size is None:
+                if chapter is None:
+                    return
+                chapters_delta, bytes_delta = -1, -chapter.bytes
+                db.delete(chapter)
+            elif chapter is None:
+                chapters_delta, bytes_delta = 1, new_size
+                db.add(ChapterUsage(username=username, chapter_id=chapter_id, bytes=new_size))
+            else:
+                bytes_delta = new_size - chapter.bytes
+                chapter.bytes = new_size
+
+            db.execute(
+                update(UserUsage)
+                .where(UserUsage.username == username)
+                .values(chapters=UserUsage.chapters + chapters_delta, bytes=UserUsage.bytes + bytes_delta)
+            )
+            db.commit()
+
+    def ensure_counted(self, store: ChapterStore, username: str) -> None:
+        """
+        Counts a user's existing chapters, once. Later changes arrive through on_change().
+
+        Blocking (it may read the whole library the first time): call it through run_io.
+        """
+        with self.session_factory() as db:
+            usage = db.get(UserUsage, username)
+            if usage is not None and usage.counted:
+                return
+
+        with self._lock, self.session_factory() as db:
+            usage = db.get(UserUsage, username)
+            if usage is not None and usage.counted:
+                return  # Another thread got here first.
+            if usage is None:
+                usage = UserUsage(username=username, chapters=0, bytes=0, generations=0, generations_today=0)
+                db.add(usage)
+
+            sizes = {}
+            entries, _ = store.list_chapters(username)
+            for entry in entries:
+                # A one-off scan: keep the chapters people are playing in the cache.
+                data = store.read_uncached(username, entry["chapter_id"])
+                if data is not None:
+                    sizes[entry["chapter_id"]] = chapter_bytes(data)
+
+            db.query(ChapterUsage).filter(ChapterUsage.username == username).delete()
+            db.add_all(ChapterUsage(username=username, chapter_id=c, bytes=b) for c, b in sizes.items())
+            usage.chapters = len(sizes)
+            usage.bytes = sum(sizes.values())
+            usage.counted = True
+            db.commit()
+
+    # --- Quotas ---
+
+    def check_quota(self, store: ChapterStore, username: str) -> dict:
+        """
+        Raises QuotaExceeded if the user can't store or generate anything more.
+
+        Returns:
+            dict: The user's current usage (see usage()).
+        """
+        self.ensure_counted(store, username)
+        with self.session_factory() as db:
+            usage = _as_dict(db.get(UserUsage, username))
+        if self.max_chapters and usage["chapters"] >= self.max_chapters:
+            raise QuotaExceeded(f"Chapter limit reached ({self.max_chapters}). Delete some chapters first.",
+                                "chapters")
+        if self.max_bytes and usage["bytes"] >= self.max_bytes:
+            raise QuotaExceeded(f"Storage limit reached ({self.max_bytes} bytes). Delete some chapters first.",
+                                "bytes")
+        if self.max_generations_per_day and usage["generations_today"] >= self.max_generations_per_day:
+            raise QuotaExceeded(f"Daily generation limit reached ({self.max_generations_per_day}). "
+                                "Try again tomorrow.", "generations")
+        return usage
+
+    def reserve_generation(self, store: ChapterStore, username: str) -> None:
+        """
+        Checks every quota and counts one generation, before the AI is called.
+
+        The daily counter is bumped with one conditional UPDATE, so parallel requests
+        can't both take the last generation. Call release_generation() if the AI call fails.
+
+        Raises:
+            QuotaExceeded: If any limit has been reached.
+        """
+        self.check_quota(store, username)
+        today = _today()
+        limit = self.max_generations_per_day
+        with self.session_factory() as db:
+            statement = (
+                update(UserUsage)
+                .where(UserUsage.username == username)
+                .values(
+                    generations=UserUsage.generations + 1,
+                    generations_today=case(
+                        (UserUsage.generations_day == today, UserUsage.generations_today + 1), else_=1
+                    ),
+                    generations_day=today,
+                )
+            )
+            if limit:
+                statement = statement.where(or_(
+                    UserUsage.generations_day.is_(None),
+                    UserUsage.generations_day != today,
+                    UserUsage.generations_today < limit,
+                ))
+            reserved = db.execute(statement).rowcount
+            db.commit()
+        if not reserved:
+            raise QuotaExceeded(f"Daily generation limit reached ({limit}). Try again tomorrow.", "generations")
+
+    def release_generation(self, username: str) -> None:
+        """Gives back a generation reserved by reserve_generation() whose AI call failed."""
+        with self.session_factory() as db:
+            db.execute(
+                update(UserUsage)
+                .where(UserUsage.username == username, UserUsage.generations > 0)
+                .values(
+                    generations=UserUsage.generations - 1,
+                    generations_today=case(
+                        (UserUsage.generations_day == _today(), UserUsage.generations_today - 1),
+                        else_=UserUsage.generations_today,
+                    ),
+                )
+            )
+            db.commit()
+
+    # --- Reporting ---
+
+    def usage(self, store: ChapterStore, username: str) -> dict:
+        """{"username", "chapters", "bytes", "generations", "generations_today"} for one user."""
+        self.ensure_counted(store, username)
+        with self.session_factory() as db:
+            return _as_dict(db.get(UserUsage, username))
+
+    def top_consumers(self, by: str = "bytes", limit: int = 20) -> list[dict]:
+        """
+        The users using the most of something (served from an index, not a scan).
+
+        Args:
+            by (str): "bytes", "chapters" or "generations".
+            limit (int): How many users to return.
+        """
+        if by not in USAGE_ORDERS:
+            raise ValueError(f"by must be one of {', '.join(USAGE_ORDERS)}")
+        column = getattr(UserUsage, by)
+        with self.session_factory() as db:
+            rows = db.query(UserUsage).order_by(column.desc(), UserUsage.username).limit(limit).all()
+            return [_as_dict(row) for row in rows]
+
+
+_trackers: "weakref.WeakKeyDictionary[ChapterStore, UsageTracker]" = weakref.WeakKeyDictionary()
+_trackers_lock = threading.Lock()
+
+
+def usage_tracker_for(store: ChapterStore) -> UsageTracker:
+    """Returns the usage tracker kept in sync with a store, creating and attaching it on first use."""
+    with _trackers_lock:
+        tracker = _trackers.get(store)
+        if tracker is None:
+            tracker = _trackers[store] = UsageTracker()
+            tracker.attach(store)
+        return tracker
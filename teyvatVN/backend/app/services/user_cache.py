@@ -0,0 +1,192 @@
+"""
+User Record Cache
+
+Almost every request starts with "does this user exist?" (and often "what's their API key?").
+Asking SQLite every time costs a round trip per request for an answer that rarely changes.
+
+How it works:
+1.  **Plain Records, not ORM Objects**: A SQLAlchemy 'User' belongs to the session that loaded it
+    and goes stale (or raises) once that session is closed. The cache keeps a frozen UserRecord
+    copy instead, which any request can read safely.
+2.  **By Username and by Email**: Both lookups are served from the same entries.
+3.  **TTL + LRU**: Entries expire after USER_CACHE_TTL_SECONDS (a safety net for changes made
+    by another process), and the least recently used ones are dropped beyond USER_CACHE_MAX_ENTRIES.
+4.  **Misses Are Cached Briefly**: "No such user" is remembered for USER_CACHE_MISS_TTL_SECONDS
+    (a few seconds), so a burst of requests for an unknown name doesn't hit the database every time.
+    It is kept short because a user signing up through another worker doesn't clear this one's cache.
+5.  **Invalidation**: Every code path that changes a user (create_user, settings, password
+    re-hash) drops their entries right after committing.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import USER_CACHE_MAX_ENTRIES, USER_CACHE_MISS_TTL_SECONDS, USER_CACHE_TTL_SECONDS
+from app.models.sql import User
+
+
+@dataclass(frozen=True)
+class UserRecord:
+    """A read-only copy of a row of the 'users' table, not tied to any database session."""
+    id: int
+    username: str
+    email: str
+    hashed_password: str
+    is_active: bool
+    gemini_api_key: Optional[str]
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserRecord":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            hashed_password=user.hashed_password,
+            is_active=user.is_active,
+            gemini_api_key=user.gemini_api_key,
+            created_at=user.created_at,
+        )
+
+
+# Marks a cached "no such user".
+_MISSING = object()
+
+
+class UserCache:
+    """
+    A thread-safe TTL + LRU cache of user records, looked up by username or by email.
+
+    Args:
+        ttl (float): Seconds an entry stays valid.
+        max_entries (int): Entries kept at most (usernames and emails each count as one).
+        miss_ttl (float): Seconds a "no such user" stays valid (0 = never cached).
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS, max_entries: int = USER_CACHE_MAX_ENTRIES,
+                 miss_ttl: float = USER_CACHE_MISS_TTL_SECONDS):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.max_entries = max_entries
+        # ("username" | "email", value) -> (expires_at, UserRecord or _MISSING)
+        self._entries: "OrderedDict[tuple[str, str], tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation. A lookup that started before an invalidation
+        # must not store what it read (it may be the old row).
+        self._generation = 0
+
+        # --- Counters ---
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, field: str, value: str) -> tuple[bool, Optional[UserRecord]]:
+        """
+        Looks a user up in the cache.
+
+        Args:
+            field (str): "username" or "email".
+            value (str): The username or email.
+
+        Returns:
+            tuple[bool, Optional[UserRecord]]: (found in cache, record). A cached
+            "no such user" is (True, None); a cache miss is (False, None).
+        """
+        key = (field, value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, record = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, None if record is _MISSING else record
+
+    def generation(self) -> int:
+        """Take this before reading from the database, and pass it to put()."""
+        return self._generation
+
+    def put(self, field: str, value: str, record: Optional[UserRecord], generation: int) -> None:
+        """
+        Remembers the answer to a lookup (None = no such user).
+
+        A found user is stored under both their username and their email.
+        Nothing is stored if a user was invalidated since generation() was taken.
+        """
+        if record is None:
+            if self.miss_ttl <= 0:
+                return
+            expires_at = time.monotonic() + self.miss_ttl
+            keys = [((field, value), _MISSING)]
+        else:
+            expires_at = time.monotonic() + self.ttl
+            keys = [(("username", record.username), record), (("email", record.email), record)]
+        with self._lock:
+            if generation != self._generation:
+                return
+            for key, stored in keys:
+                self._entries[key] = (expires_at, stored)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username: Optional[str] = None, email: Optional[str] = None) -> None:
+        """
+        Drops everything cached about a user. Call it after committing a change to them.
+
+        Both names are needed to drop a cached "no such user" under either one
+        (e.g. when that user has just been created).
+        """
+        with self._lock:
+            self._generation += 1
+            for field, value in (("username", username), ("email", email)):
+                if value is None:
+                    continue
+                entry = self._entries.pop((field, value), None)
+                if entry is None:
+                    continue
+                self.invalidations += 1
+                # The same record is also stored under its other name.
+                record = entry[1]
+                if record is not _MISSING:
+                    self._entries.pop(("email", record.email), None)
+                    self._entries.pop(("username", record.username), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Counters for monitoring, including the hit rate (0.0 - 1.0)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "ttl_seconds": self.ttl,
+                "miss_ttl_seconds": self.miss_ttl,
+                "max_entries": self.max_entries,
+            }
+
+
+# The app-wide cache, used by auth_service.
+user_cache = UserCache()
@@ -0,0 +1,67 @@
+"""
+Chapter storage.
+
+Use get_chapter_store() (or Depends(get_chapter_store) in a route) to get the
+driver selected by CHAPTER_STORE in config:
+
+- "filesystem": data/{username}/{chapter_id}/output.json (default)
+- "sqlite":     a single SQLite file (CHAPTER_SQLITE_PATH)
+- "memory":     a Python dict, for tests and benchmarks
+
+The app-wide store is created with its search index (search.py) attached,
+so every write is searchable right away.
+"""
+
+import threading
+from typing import Optional
+
+from app.core.config import CHAPTER_DATA_DIR, CHAPTER_SQLITE_PATH, CHAPTER_STORE
+from app.storage.base import ChapterStore
+
+_store: Optional[ChapterStore] = None
+_store_lock = threading.Lock()
+
+
+def create_chapter_store(kind: str = CHAPTER_STORE) -> ChapterStore:
+    """
+    Builds a new chapter store of the given kind.
+
+    Args:
+        kind (str): "filesystem", "sqlite" or "memory".
+
+    Returns:
+        ChapterStore: The driver.
+    """
+    if kind == "filesystem":
+        from app.storage.filesystem import FilesystemChapterStore
+        return FilesystemChapterStore(CHAPTER_DATA_DIR)
+    if kind == "sqlite":
+        from app.storage.sqlite import SQLiteChapterStore
+        return SQLiteChapterStore(CHAPTER_SQLITE_PATH)
+    if kind == "memory":
+        from app.storage.memory import MemoryChapterStore
+        return MemoryChapterStore()
+    raise ValueError(f"Unknown CHAPTER_STORE: {kind}")
+
+
+def get_chapter_store() -> ChapterStore:
+    """
+    Returns the app-wide chapter store, creating it on first use.
+
+    Also works as a FastAPI dependency: store: ChapterStore = Depends(get_chapter_store)
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                from app.storage.search import search_index_for
+                _store = create_chapter_store()
+                search_index_for(_store)
+    return _store
+
+
+def set_chapter_store(store: Optional[ChapterStore]) -> None:
+    """Replaces the app-wide chapter store (used by tests and scripts). None resets it."""
+    global _store
+    with _store_lock:
+        _store = store
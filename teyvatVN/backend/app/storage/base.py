@@ -0,0 +1,293 @@
+"""
+Chapter Store Interface
+
+Every place that loads, saves, lists or deletes a chapter talks to a "ChapterStore".
+The routers don't know (or care) whether chapters live in folders on disk,
+in a SQLite file, or only in memory. That lets us:
+
+1.  **Swap Backends**: Pick the driver in config (CHAPTER_STORE) without touching router code.
+2.  **Test Without Disk**: The in-memory driver behaves exactly like the others.
+3.  **Compare**: All drivers pass the same conformance tests (tests/test_chapter_store.py),
+    so benchmarking one against another is a fair fight.
+
+All methods are synchronous. Async routes call them through storage_io.run_io().
+"""
+
+import base64
+import json
+import re
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, Optional
+
+# Fields a client may ask for with ?fields=...
+LIBRARY_FIELDS = ("chapter_id", "title", "characters", "backgrounds", "created_at")
+ORDERS = ("number", "created_at")
+
+
+def chapter_number(chapter_id: str) -> int:
+    """Extract numeric value from chapter_id like 'chapter19' -> 19"""
+    match = re.search(r'chapter(\d+)', chapter_id)
+    return int(match.group(1)) if match else 0
+
+
+def summarize(chapter_id: str, data: dict, mtime_ns: int) -> dict:
+    """
+    Builds the library summary of a chapter.
+
+    Args:
+        chapter_id (str): The chapter ID.
+        data (dict): The full chapter data.
+        mtime_ns (int): When the chapter was last saved (nanoseconds since the epoch).
+
+    Returns:
+        dict: The public LIBRARY_FIELDS plus '_mtime_ns' (used for sorting, never sent to clients).
+    """
+    return {
+        "chapter_id": chapter_id,
+        "title": data.get("title", "Untitled Chapter"),
+        "characters": data.get("characters", []),
+        "backgrounds": data.get("backgrounds", []),
+        "created_at": datetime.fromtimestamp(mtime_ns / 1e9).isoformat() if mtime_ns else None,
+        "_mtime_ns": mtime_ns,
+    }
+
+
+def trash_entry(chapter_id: str, title: Optional[str], deleted_at_ns: int) -> dict:
+    """Builds one list_deleted() entry."""
+    return {
+        "chapter_id": chapter_id,
+        "title": title or "Untitled Chapter",
+        "deleted_at": datetime.fromtimestamp(deleted_at_ns / 1e9).isoformat(),
+    }
+
+
+def sort_key(entry: dict, order: str) -> tuple:
+    """The (value, chapter_id) key a summary is sorted by for a given order."""
+    if order == "created_at":
+        return (entry["_mtime_ns"], entry["chapter_id"])
+    return (chapter_number(entry["chapter_id"]), entry["chapter_id"])
+
+
+def encode_cursor(key: tuple) -> str:
+    """Turns a sort key into an opaque, URL-safe cursor string."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Turns a cursor string back into a sort key.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        sort_value, chapter_id = value
+        return (int(sort_value), str(chapter_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def check_order(order: str) -> None:
+    """Raises ValueError for an unknown library order."""
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of {ORDERS}")
+
+
+def project(entry: dict, fields: Optional[list[str]] = None) -> dict:
+    """
+    Keeps only the requested public fields of a summary.
+
+    Args:
+        entry (dict): A summary from summarize().
+        fields (Optional[list[str]]): Field names; None means all public fields.
+    """
+    return {field: entry[field] for field in (fields or LIBRARY_FIELDS)}
+
+
+def encode_record(record: dict) -> bytes:
+    """Serializes a revision record (see revisions.py) as compact UTF-8 JSON."""
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def check_names(username: str, chapter_id: Optional[str] = None) -> None:
+    """
+    Rejects usernames and chapter IDs that could escape the user's storage (e.g. '../').
+
+    Usernames and chapter IDs become folder names in the filesystem driver,
+    and every driver applies the same rule so they behave alike.
+    Names starting with '.' are reserved for the store's own folders (like '.trash').
+
+    Raises:
+        ValueError: If a name is empty, starts with '.', or contains a path separator.
+    """
+    for name in (username, chapter_id):
+        if name is None:
+            continue
+        if not name or name.startswith(".") or any(c in name for c in "/\\\0"):
+            raise ValueError(f"Invalid name: {name!r}")
+
+
+class ChapterStore(ABC):
+    """
+    The operations every chapter storage driver must support.
+
+    Chapter data is the plain dict from output.json (title, characters, backgrounds, segments...).
+    Dicts returned by read() may be shared with a cache: copy before modifying.
+    """
+
+    def __init__(self):
+        # Callbacks told about every change (see subscribe()).
+        self._listeners: list[Callable[[str, str, Optional[dict]], None]] = []
+
+    def subscribe(self, listener: Callable[[str, str, Optional[dict]], None]) -> None:
+        """
+        Registers a callback that runs after every change.
+
+        listener(username, chapter_id, data) is called after a write, and with
+        data=None after a delete. The search index uses this to stay in sync.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, username: str, chapter_id: str, data: Optional[dict]) -> None:
+        # A failing listener must never fail the save itself.
+        for listener in self._listeners:
+            try:
+                listener(username, chapter_id, data)
+            except Exception as e:
+                print(f"Chapter change listener failed for {username}/{chapter_id}: {e}")
+
+    @abstractmethod
+    def read(self, username: str, chapter_id: str) -> Optional[dict]:
+        """Returns the chapter, or None if it doesn't exist."""
+
+    @abstractmethod
+    def write(self, username: str, chapter_id: str, data: dict) -> None:
+        """Creates or replaces a chapter."""
+
+    @abstractmethod
+    def delete(self, username: str, chapter_id: str) -> bool:
+        """
+        Moves a chapter (with its revision log) to the trash. Returns False if it didn't exist.
+
+        This is a cheap tombstone: the chapter disappears from read() and listings at once,
+        can be brought back with restore(), and is only removed for good by purge_deleted().
+        """
+
+    @abstractmethod
+    def restore(self, username: str, chapter_id: str) -> bool:
+        """
+        Brings the most recently deleted copy of a chapter back from the trash.
+
+        Returns:
+            bool: False if the trash has no such chapter.
+
+        Raises:
+            FileExistsError: If a chapter with that ID exists again.
+        """
+
+    @abstractmethod
+    def list_deleted(self, username: str) -> list[dict]:
+        """Returns the user's chapters in the trash, newest deletion first: {"chapter_id", "title", "deleted_at"}."""
+
+    @abstractmethod
+    def purge_deleted(self, older_than: float) -> dict:
+        """
+        Removes for good every chapter (of every user) deleted before a point in time.
+
+        Args:
+            older_than (float): Unix timestamp; chapters deleted earlier are purged.
+
+        Returns:
+            dict: {"chapters": how many were purged, "bytes_reclaimed": storage freed}.
+        """
+
+    @abstractmethod
+    def list_chapters(self, username: str, order: str = "number", limit: Optional[int] = None,
+                      cursor: Optional[str] = None) -> tuple[list[dict], Optional[str]]:
+        """
+        Returns one page of chapter summaries (see summarize()), newest/highest first.
+
+        Args:
+            username (str): The username.
+            order (str): "number" (chapter number) or "created_at".
+            limit (Optional[int]): Maximum entries to return. None means all.
+            cursor (Optional[str]): The cursor returned with the previous page.
+
+        Returns:
+            tuple[list[dict], Optional[str]]: The summaries and the cursor for the next page
+                                              (None when this was the last page).
+
+        Raises:
+            ValueError: For an unknown order or a malformed cursor.
+        """
+
+    @abstractmethod
+    def count(self, username: str) -> int:
+        """Returns how many chapters the user has."""
+
+    @abstractmethod
+    def next_chapter_id(self, username: str) -> str:
+        """Returns the ID the next allocate_chapter_id() would hand out, without reserving it."""
+
+    @abstractmethod
+    def allocate_chapter_id(self, username: str) -> str:
+        """Atomically reserves and returns the next chapter ID (e.g. 'chapter7')."""
+
+    def read_json_bytes(self, username: str, chapter_id: str) -> Optional[bytes]:
+        """
+        Returns the chapter as UTF-8 JSON bytes, or None if it doesn't exist.
+
+        For read-only responses: drivers that already keep JSON hand it back as is,
+        so nothing is parsed or serialized again. This default serializes read().
+        """
+        data = self.read(username, chapter_id)
+        return None if data is None else encode_record(data)
+
+    # --- Bulk operations (used by export/import) ---
+    # The defaults just loop; drivers override them when they can do better.
+
+    def read_uncached(self, username: str, chapter_id: str) -> Optional[dict]:
+        """Like read(), but for bulk scans: shouldn't push hot chapters out of any cache."""
+        return self.read(username, chapter_id)
+
+    def allocate_chapter_ids(self, username: str, count: int) -> list[str]:
+        """Reserves `count` new chapter IDs at once, in increasing order."""
+        return [self.allocate_chapter_id(username) for _ in range(count)]
+
+    def write_many(self, username: str, chapters: list[tuple[str, dict]]) -> None:
+        """Writes several (chapter_id, data) pairs."""
+        for chapter_id, data in chapters:
+            self.write(username, chapter_id, data)
+
+    # --- Revision log (see revisions.py) ---
+    # Drivers only persist the records; building and replaying them is RevisionLog's job.
+
+    @abstractmethod
+    def load_revisions(self, username: str, chapter_id: str) -> list[dict]:
+        """Returns the chapter's revision records, oldest first ([] if there are none)."""
+
+    @abstractmethod
+    def append_revision(self, username: str, chapter_id: str, record: dict) -> None:
+        """Adds one revision record to the end of the chapter's log."""
+
+    @abstractmethod
+    def replace_revisions(self, username: str, chapter_id: str, records: list[dict]) -> None:
+        """Atomically swaps the chapter's whole log (used by compaction)."""
+
+    @contextmanager
+    def revision_lock(self, username: str, chapter_id: str) -> Iterator[None]:
+        """
+        Held by RevisionLog while it reads a chapter's log and appends to (or replaces) it.
+
+        Drivers whose data is shared between worker processes must lock out the other
+        processes here, or two saves could both take the same revision number.
+        The default does nothing: it's enough for a store only one process uses (memory),
+        since RevisionLog already keeps its own threads apart.
+        """
+        yield
+
+    def close(self) -> None:
+        """Releases any resources (connections, threads). Optional."""
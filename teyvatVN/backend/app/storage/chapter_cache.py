@@ -0,0 +1,146 @@
+"""
+Parsed Chapter Cache (filesystem driver)
+
+Reading a chapter means opening its 'output.json' and running 'json.load' on it.
+During playback the same chapter is requested over and over, so we keep the
+already-parsed chapters in memory and hand them back without touching the JSON parser.
+
+How it works:
+1.  **LRU**: The least recently used chapter is thrown out first when we run out of room.
+2.  **Byte Budget**: The cache is limited by the size of the chapters' JSON, not by how many chapters it holds.
+3.  **Validation**: Every entry remembers the file's modification time and size.
+    If someone edits the file by hand (outside the API), the numbers no longer match and we reload it.
+4.  **Invalidation**: Every write path (save, rename, delete) updates or drops the entry explicitly.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.core.config import CHAPTER_CACHE_MAX_BYTES
+
+
+class ChapterCache:
+    """
+    A thread-safe LRU cache of parsed chapters, bounded by bytes.
+
+    Each entry is stored together with the (mtime, size) of the file it was read from,
+    so a stale entry is detected with a single os.stat() call.
+    """
+
+    def __init__(self, max_bytes: int = CHAPTER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # key -> (data, mtime_ns, size, cost)
+        self._entries: "OrderedDict[Hashable, tuple[Any, int, int, int]]" = OrderedDict()
+        # Sync routes run in FastAPI's thread pool, so access must be locked.
+        self._lock = threading.Lock()
+
+        # --- Counters ---
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, stat: os.stat_result) -> Optional[Any]:
+        """
+        Returns the cached chapter if it is still fresh, None otherwise.
+
+        Args:
+            key (Hashable): The cache key, usually (username, chapter_id).
+            stat (os.stat_result): The current stat of the chapter file.
+
+        Returns:
+            Optional[Any]: The parsed chapter, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            data, mtime_ns, size, _ = entry
+            if mtime_ns != stat.st_mtime_ns or size != stat.st_size:
+                # The file was changed behind our back (e.g. edited by hand).
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: Hashable, data: Any, stat: os.stat_result, cost: Optional[int] = None) -> None:
+        """
+        Stores a parsed chapter, evicting the least recently used entries if needed.
+
+        Args:
+            key (Hashable): The cache key, usually (username, chapter_id).
+            data (Any): The parsed chapter.
+            stat (os.stat_result): The stat of the file the data was read from (or written to).
+            cost (Optional[int]): Bytes charged against the budget. Defaults to the file size,
+                                  pass the uncompressed JSON size for compressed files.
+        """
+        if cost is None:
+            cost = stat.st_size
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            # A single chapter bigger than the whole budget is never cached.
+            if cost > self.max_bytes:
+                return
+
+            self._entries[key] = (data, stat.st_mtime_ns, stat.st_size, cost)
+            self.current_bytes += cost
+
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def is_fresh(self, key: Hashable, stat: os.stat_result) -> bool:
+        """True if the entry exists and matches the file (no counters or LRU order change)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] == stat.st_mtime_ns and entry[2] == stat.st_size
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drops a single entry (no-op if it isn't cached)."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drops every entry. Counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: entries, bytes, max_bytes, hits, misses, evictions, invalidations and hit_rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        # Caller must hold the lock.
+        _, _, _, cost = self._entries.pop(key)
+        self.current_bytes -= cost
@@ -0,0 +1,120 @@
+"""
+Chapter Storage Formats
+
+This file decides how a chapter looks on disk.
+The content is always the same JSON document, but it can be stored in different ways:
+
+1.  **json**: Pretty-printed JSON (indent=2). Easy to read by hand. This is the default.
+2.  **minified**: JSON without any extra whitespace.
+3.  **gzip**: Minified JSON, compressed with gzip (built into Python).
+4.  **zstd**: Minified JSON, compressed with Zstandard (needs `pip install zstandard`).
+
+Compressed files start with a small 5-byte header (b"\\0TVN" + one codec letter),
+so readers can tell what they are looking at without trusting the configuration.
+Plain JSON can never start with a NUL byte, so old files keep working as-is.
+"""
+
+import gzip
+import json
+from typing import Any
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+FORMATS = ("json", "minified", "gzip", "zstd")
+
+# --- Header ---
+MAGIC = b"\x00TVN"
+CODEC_GZIP = b"g"
+CODEC_ZSTD = b"z"
+HEADER_SIZE = len(MAGIC) + 1
+
+
+def to_json_bytes(data: Any, fmt: str = "json") -> bytes:
+    """
+    Serializes a chapter to UTF-8 JSON bytes (pretty for 'json', compact otherwise).
+
+    Args:
+        data (Any): The chapter data.
+        fmt (str): One of FORMATS.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    if fmt == "json":
+        text = json.dumps(data, indent=2, ensure_ascii=False)
+    else:
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    return text.encode("utf-8")
+
+
+def wrap(payload: bytes, fmt: str) -> bytes:
+    """
+    Turns JSON bytes into the bytes we actually write to disk.
+
+    Args:
+        payload (bytes): The JSON document.
+        fmt (str): One of FORMATS.
+
+    Returns:
+        bytes: The stored representation.
+    """
+    if fmt in ("json", "minified"):
+        return payload
+    if fmt == "gzip":
+        # mtime=0 keeps the output deterministic (same chapter -> same bytes).
+        return MAGIC + CODEC_GZIP + gzip.compress(payload, compresslevel=6, mtime=0)
+    if fmt == "zstd":
+        if zstandard is None:
+            raise RuntimeError("CHAPTER_STORAGE_FORMAT=zstd requires the 'zstandard' package.")
+        return MAGIC + CODEC_ZSTD + zstandard.ZstdCompressor(level=3).compress(payload)
+    raise ValueError(f"Unknown chapter storage format: {fmt}")
+
+
+def unwrap(raw: bytes) -> bytes:
+    """
+    Turns stored bytes (any format) back into JSON bytes.
+
+    Args:
+        raw (bytes): The file contents.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    if not raw.startswith(MAGIC):
+        return raw
+
+    codec = raw[len(MAGIC):HEADER_SIZE]
+    body = raw[HEADER_SIZE:]
+    if codec == CODEC_GZIP:
+        return gzip.decompress(body)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("This chapter is zstd-compressed but the 'zstandard' package is not installed.")
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(f"Unknown chapter codec: {codec!r}")
+
+
+def detect_format(raw: bytes) -> str:
+    """
+    Guesses the format of stored bytes.
+
+    Plain JSON is reported as 'json' whether or not it is pretty-printed.
+    """
+    if raw.startswith(MAGIC + CODEC_GZIP):
+        return "gzip"
+    if raw.startswith(MAGIC + CODEC_ZSTD):
+        return "zstd"
+    return "json"
+
+
+def dumps(data: Any, fmt: str = "json") -> bytes:
+    """Serializes a chapter straight to its stored representation."""
+    return wrap(to_json_bytes(data, fmt), fmt)
+
+
+def loads(raw: bytes) -> Any:
+    """Parses a chapter from its stored representation (any format)."""
+    return json.loads(unwrap(raw))
@@ -0,0 +1,485 @@
+"""
+Filesystem Chapter Store
+
+The original storage layout: one folder per user, one folder per chapter,
+and the chapter itself in 'output.json':
+
+    data/{username}/{chapter_id}/output.json
+
+(or data/ab/cd/{username}/... with the sharded layout, see layout.py).
+
+On top of the plain files this driver keeps:
+1.  A parsed-chapter cache (chapter_cache.py), validated with os.stat() on every read.
+2.  A per-user library index (library_index.py) for cheap, paginated listings.
+3.  A per-user counter file for atomic chapter-ID allocation.
+4.  A revision log next to each output.json (revisions.jsonl), appended to under an
+    OS lock on the chapter folder, so worker processes never take the same revision number.
+5.  A trash folder: deleting a chapter is one rename into data/.trash/, and
+    purge_deleted() removes old trash later.
+Files are written in the configured storage format (chapter_format.py) and swapped in atomically.
+"""
+
+import codecs
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+from app.core.config import CHAPTER_CACHE_MAX_BYTES, CHAPTER_DATA_LAYOUT, CHAPTER_STORAGE_FORMAT
+from app.storage import chapter_format
+from app.storage.base import ChapterStore, check_names, encode_record, trash_entry
+from app.storage.chapter_cache import ChapterCache
+from app.storage.layout import COUNTER_FILE, DataLayout
+from app.storage.library_index import LibraryIndex
+
+CHAPTER_FILE = "output.json"
+# Per-chapter revision log (see revisions.py): one JSON record per line, oldest first.
+REVISIONS_FILE = "revisions.jsonl"
+# Deleted chapters are moved to data/.trash/{username}/{chapter_id}@{deleted_at_ns} (see layout.py).
+
+
+def atomic_write(path: str, raw: bytes) -> None:
+    """
+    Write bytes to a file so readers never see a half-written file.
+
+    We write to a temporary file next to the target and then swap it in
+    with os.replace(), which is atomic on the same filesystem.
+
+    Args:
+        path (str): The destination file.
+        raw (bytes): The full file contents.
+    """
+    # A unique name, so two requests saving the same chapter don't share a temp file.
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+    os.replace(tmp_path, path)
+
+
+def _folder_size(path: str) -> int:
+    """Total size of the files under a folder."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class FilesystemChapterStore(ChapterStore):
+    """Stores each chapter as data/{username}/{chapter_id}/output.json."""
+
+    def __init__(self, data_dir: str, storage_format: str = CHAPTER_STORAGE_FORMAT,
+                 cache_max_bytes: int = CHAPTER_CACHE_MAX_BYTES, layout: str = CHAPTER_DATA_LAYOUT):
+        if storage_format not in chapter_format.FORMATS:
+            raise ValueError(f"Unknown chapter storage format: {storage_format}")
+        super().__init__()
+        self.data_dir = data_dir
+        # Every path below is resolved through the layout (flat or sharded).
+        self.layout = DataLayout(data_dir, layout)
+        self.storage_format = storage_format
+        self.cache = ChapterCache(cache_max_bytes)
+        self.index = LibraryIndex(self.layout.user_dir)
+        # Guards the counter files between threads when OS file locks aren't available (Windows).
+        self._counter_lock = threading.Lock()
+
+    # --- Paths ---
+
+    def user_dir(self, username: str) -> str:
+        """Folder holding all of a user's chapters."""
+        return self.layout.user_dir(username)
+
+    def chapter_dir(self, username: str, chapter_id: str) -> str:
+        """Folder holding one chapter (output.json and its revisions)."""
+        return self.layout.chapter_dir(username, chapter_id)
+
+    def chapter_file(self, username: str, chapter_id: str) -> str:
+        """Path to a chapter's output.json (nothing is created)."""
+        return os.path.join(self.layout.chapter_dir(username, chapter_id), CHAPTER_FILE)
+
+    # --- Reading ---
+
+    def read(self, username: str, chapter_id: str) -> Optional[dict]:
+        """
+        Load a chapter, using the in-memory cache when possible.
+
+        The file is stat'ed on every call so that edits made outside the API
+        (a changed modification time or size) are picked up immediately.
+        """
+        check_names(username, chapter_id)
+        key = (username, chapter_id)
+        path = self.chapter_file(username, chapter_id)
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.cache.invalidate(key)
+            return None
+
+        data = self.cache.get(key, stat)
+        if data is not None:
+            return data
+
+        # The file may be pretty JSON, minified JSON or compressed; unwrap() figures it out.
+        with open(path, "rb") as f:
+            payload = chapter_format.unwrap(f.read())
+        data = json.loads(payload)
+        self.cache.put(key, data, stat, cost=len(payload))
+        return data
+
+    def read_uncached(self, username: str, chapter_id: str) -> Optional[dict]:
+        """
+        Read a chapter straight from disk, bypassing the cache.
+
+        Used for bulk scans (like building the library index or exporting)
+        so they don't push the chapters people are actually playing out of the cache.
+        """
+        check_names(username, chapter_id)
+        try:
+            with open(self.chapter_file(username, chapter_id), "rb") as f:
+                return chapter_format.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def read_json_bytes(self, username: str, chapter_id: str) -> Optional[bytes]:
+        """
+        The JSON in output.json, exactly as stored (decompressed if needed, never parsed).
+        """
+        check_names(username, chapter_id)
+        try:
+            with open(self.chapter_file(username, chapter_id), "rb") as f:
+                payload = chapter_format.unwrap(f.read())
+        except FileNotFoundError:
+            return None
+        # Files saved by hand in some editors start with a byte order mark.
+        return payload[3:] if payload.startswith(codecs.BOM_UTF8) else payload
+
+    def list_chapters(self, username: str, order: str = "number", limit: Optional[int] = None,
+                      cursor: Optional[str] = None) -> tuple[list[dict], Optional[str]]:
+        """Served from the user's library index (built on first use)."""
+        return self._library(username).page(order=order, limit=limit, cursor=cursor)
+
+    def count(self, username: str) -> int:
+        """Served from the user's library index (built on first use)."""
+        return self._library(username).total()
+
+    def _library(self, username: str):
+        check_names(username)
+        return self.index.get(username, lambda chapter_id: self.read_uncached(username, chapter_id))
+
+    # --- Writing ---
+
+    def write(self, username: str, chapter_id: str, data: dict) -> None:
+        """Save a chapter in the configured format and refresh the cache and index."""
+        check_names(username, chapter_id)
+        folder = self.chapter_dir(username, chapter_id)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, CHAPTER_FILE)
+
+        payload = chapter_format.to_json_bytes(data, self.storage_format)
+        atomic_write(path, chapter_format.wrap(payload, self.storage_format))
+
+        # Write-through: the next read is served from memory. We cache a fresh parse of
+        # what was written, so later changes to the caller's dict can't leak into the cache.
+        self.cache.put((username, chapter_id), json.loads(payload), os.stat(path), cost=len(payload))
+
+        # Keep the library index in step (only if it was already built).
+        library = self.index.peek(username)
+        if library is not None:
+            library.upsert(chapter_id, data)
+        self._notify(username, chapter_id, data)
+
+    # --- Deleting (soft) ---
+
+    def trash_dir(self, username: str) -> str:
+        """Folder holding a user's deleted chapters."""
+        return self.layout.trash_dir(username)
+
+    def delete(self, username: str, chapter_id: str) -> bool:
+        """
+        Move the chapter folder into the trash.
+
+        A single rename, no matter how big the chapter is; the files are
+        only removed by purge_deleted() once the retention window has passed.
+        """
+        check_names(username, chapter_id)
+        chapter_dir = self.chapter_dir(username, chapter_id)
+        if not os.path.isdir(chapter_dir):
+            return False
+        os.makedirs(self.trash_dir(username), exist_ok=True)
+        os.rename(chapter_dir, os.path.join(self.trash_dir(username), f"{chapter_id}@{time.time_ns()}"))
+        self.forget(username, chapter_id)
+        self._notify(username, chapter_id, None)
+        return True
+
+    def _trashed(self, username: str) -> list[tuple[str, int, str]]:
+        """(chapter_id, deleted_at_ns, path) for each entry of the user's trash, newest first."""
+        try:
+            names = os.listdir(self.trash_dir(username))
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            chapter_id, _, deleted_at = name.rpartition("@")
+            if chapter_id and deleted_at.isdigit():
+                entries.append((chapter_id, int(deleted_at), os.path.join(self.trash_dir(username), name)))
+        entries.sort(key=lambda e: e[1], reverse=True)
+        return entries
+
+    def restore(self, username: str, chapter_id: str) -> bool:
+        """Rename the newest trashed copy back into place."""
+        check_names(username, chapter_id)
+        chapter_dir = self.chapter_dir(username, chapter_id)
+        if os.path.exists(chapter_dir):
+            raise FileExistsError(f"{chapter_id} exists again")
+        trashed = [path for c, _, path in self._trashed(username) if c == chapter_id]
+        if not trashed:
+            return False
+
+        os.makedirs(self.user_dir(username), exist_ok=True)
+        os.rename(trashed[0], chapter_dir)
+        data = self.read_uncached(username, chapter_id)
+        library = self.index.peek(username)
+        if library is not None and data is not None:
+            library.upsert(chapter_id, data)
+        self._notify(username, chapter_id, data)
+        return True
+
+    def list_deleted(self, username: str) -> list[dict]:
+        check_names(username)
+        entries = []
+        for chapter_id, deleted_at, path in self._trashed(username):
+            try:
+                with open(os.path.join(path, CHAPTER_FILE), "rb") as f:
+                    title = chapter_format.loads(f.read()).get("title")
+            except (OSError, ValueError):
+                title = None
+            entries.append(trash_entry(chapter_id, title, deleted_at))
+        return entries
+
+    def purge_deleted(self, older_than: float) -> dict:
+        """
+        Remove every trashed chapter deleted before `older_than`.
+
+        The whole trash is listed once, then all expired folders are measured
+        and removed in one pass (users' live folders are never touched).
+        """
+        trash_root = self.layout.trash_root()
+        cutoff_ns = int(older_than * 1e9)
+        try:
+            usernames = os.listdir(trash_root)
+        except FileNotFoundError:
+            return {"chapters": 0, "bytes_reclaimed": 0}
+
+        expired = [
+            path
+            for username in usernames
+            for _, deleted_at, path in self._trashed(username)
+            if deleted_at < cutoff_ns
+        ]
+        reclaimed = 0
+        for path in expired:
+            reclaimed += _folder_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+        for username in usernames:
+            try:
+                os.rmdir(self.trash_dir(username))  # only succeeds once it is empty
+            except OSError:
+                pass
+        return {"chapters": len(expired), "bytes_reclaimed": reclaimed}
+
+    def refresh(self, username: str, chapter_id: str) -> bool:
+        """
+        Bring the cache, library index and listeners (search) in line with one chapter on disk.
+
+        Used by the watcher (watcher.py) after the file was changed outside the API.
+        A chapter whose cache entry still matches the file was written by us and is skipped.
+
+        Returns:
+            bool: True if something was refreshed.
+        """
+        check_names(username, chapter_id)
+        path = self.chapter_file(username, chapter_id)
+        for _ in range(3):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self.forget(username, chapter_id)
+                self._notify(username, chapter_id, None)
+                return True
+            if self.cache.is_fresh((username, chapter_id), stat):
+                return False
+
+            try:
+                data = self.read(username, chapter_id)
+            except ValueError as e:
+                print(f"Watcher: skipping unreadable chapter {username}/{chapter_id}: {e}")
+                return False
+            if data is None:
+                continue
+            library = self.index.peek(username)
+            if library is not None:
+                library.upsert(chapter_id, data)
+            self._notify(username, chapter_id, data)
+            # If the file changed again while we were reading it, go round once more.
+            try:
+                if os.stat(path).st_mtime_ns == stat.st_mtime_ns:
+                    return True
+            except FileNotFoundError:
+                continue
+        return True
+
+    def forget(self, username: str, chapter_id: str) -> None:
+        """Drop a chapter from the cache and the library index (the files are not touched)."""
+        self.cache.invalidate((username, chapter_id))
+        library = self.index.peek(username)
+        if library is not None:
+            library.remove(chapter_id)
+
+    # --- Revision log ---
+
+    def _revisions_file(self, username: str, chapter_id: str) -> str:
+        return os.path.join(self.chapter_dir(username, chapter_id), REVISIONS_FILE)
+
+    def load_revisions(self, username: str, chapter_id: str) -> list[dict]:
+        """Reads revisions.jsonl. A half-written last line (after a crash) is skipped."""
+        check_names(username, chapter_id)
+        try:
+            with open(self._revisions_file(username, chapter_id), "rb") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def append_revision(self, username: str, chapter_id: str, record: dict) -> None:
+        """Appends one line; earlier revisions are never rewritten."""
+        check_names(username, chapter_id)
+        os.makedirs(self.chapter_dir(username, chapter_id), exist_ok=True)
+        with open(self._revisions_file(username, chapter_id), "ab") as f:
+            f.write(encode_record(record) + b"\n")
+
+    def replace_revisions(self, username: str, chapter_id: str, records: list[dict]) -> None:
+        check_names(username, chapter_id)
+        raw = b"".join(encode_record(r) + b"\n" for r in records)
+        atomic_write(self._revisions_file(username, chapter_id), raw)
+
+    @contextmanager
+    def revision_lock(self, username: str, chapter_id: str):
+        """
+        An exclusive flock on the chapter's folder, shared by every worker process.
+
+        The folder is locked rather than revisions.jsonl itself, because compaction
+        swaps that file for a new one (a lock on the old file wouldn't stop anyone).
+        Without fcntl (Windows) only RevisionLog's in-process locks apply.
+        """
+        check_names(username, chapter_id)
+        folder = self.chapter_dir(username, chapter_id)
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(folder, exist_ok=True)
+        fd = os.open(folder, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # closing it releases the lock
+
+    # --- Chapter IDs ---
+
+    def next_chapter_id(self, username: str) -> str:
+        """Reads the user's counter file, or scans their folder if there is none yet."""
+        check_names(username)
+        try:
+            with open(os.path.join(self.user_dir(username), COUNTER_FILE), "r") as f:
+                return f"chapter{int(f.read().strip())}"
+        except (FileNotFoundError, ValueError):
+            return f"chapter{self._scan_next_chapter_number(self.user_dir(username))}"
+
+    def allocate_chapter_id(self, username: str) -> str:
+        return self.allocate_chapter_ids(username, 1)[0]
+
+    def allocate_chapter_ids(self, username: str, count: int) -> list[str]:
+        """
+        Reserve the next chapter ID(s) for a user.
+
+        The user's counter file is locked, read, incremented and written back,
+        so two concurrent generations (even in different worker processes)
+        never get the same ID. This costs the same no matter how many chapters
+        the user has. The counter is seeded from the existing folders on first use.
+        A bulk import reserves all of its IDs under a single lock.
+        """
+        check_names(username)
+        user_dir = self.user_dir(username)
+        os.makedirs(user_dir, exist_ok=True)
+
+        # "a+" creates the file if needed without truncating it.
+        with open(os.path.join(user_dir, COUNTER_FILE), "a+") as f, self._locked(f):
+            f.seek(0)
+            content = f.read().strip()
+            next_num = int(content) if content.isdigit() else self._scan_next_chapter_number(user_dir)
+
+            chapter_ids = []
+            while len(chapter_ids) < count:
+                # Never hand out a folder that already exists (e.g. copied in by hand).
+                if not os.path.exists(os.path.join(user_dir, f"chapter{next_num}")):
+                    chapter_ids.append(f"chapter{next_num}")
+                next_num += 1
+
+            f.seek(0)
+            f.truncate()
+            f.write(str(next_num))
+            f.flush()
+
+        return chapter_ids
+
+    @staticmethod
+    def _scan_next_chapter_number(user_dir: str) -> int:
+        """
+        Find max(chapterN) + 1 by listing the user's folder.
+
+        This is the slow path: it's only used to seed the counter file the first time.
+        """
+        if not os.path.exists(user_dir):
+            return 1
+
+        # Extract numbers from chapter folder names (e.g., "chapter5" -> 5)
+        numbers = []
+        for d in os.listdir(user_dir):
+            match = re.fullmatch(r'chapter(\d+)', d)
+            if match and os.path.isdir(os.path.join(user_dir, d)):
+                numbers.append(int(match.group(1)))
+
+        # Get next number (max + 1)
+        return max(numbers) + 1 if numbers else 1
+
+    @contextmanager
+    def _locked(self, f):
+        """Hold an exclusive lock on an open file (across processes where the OS supports it)."""
+        with self._counter_lock:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
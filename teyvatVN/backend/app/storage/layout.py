@@ -0,0 +1,227 @@
+"""
+Data Folder Layout (filesystem driver)
+
+Where a user's folder lives inside the data folder. Every path the filesystem
+store (and its watcher) uses is worked out here, nowhere else.
+
+Two layouts (CHAPTER_DATA_LAYOUT):
+1.  **flat**: data/{username}/ — the original layout. Simple, but with tens of
+    thousands of users a single folder gets huge, and listing or backing it up gets slow.
+2.  **sharded**: data/ab/cd/{username}/, where 'abcd' are the first hex digits of a hash
+    of the username. Users are spread over 65,536 small folders.
+
+Moving between the two can happen while the server runs (scripts/migrate_data_layout.py):
+a user not found in the configured layout is looked up in the other one, so every user
+stays reachable while their folder is being moved.
+"""
+
+import hashlib
+import os
+import re
+from typing import Iterator, Optional
+
+from app.core.config import CHAPTER_DATA_LAYOUT
+
+LAYOUTS = ("flat", "sharded")
+# Deleted chapters: data/.trash/{username}/ in both layouts.
+TRASH_DIR = ".trash"
+# Per-user file holding the next chapter number to hand out.
+COUNTER_FILE = ".chapter_counter"
+
+# A shard folder name: two hex digits.
+SHARD_NAME = re.compile(r"^[0-9a-f]{2}$")
+
+
+def shard_of(username: str) -> tuple[str, str]:
+    """
+    The two shard folder names for a username, e.g. ('3f', 'a2').
+
+    Uses a hash (not the first letters), so users spread evenly no matter what their names look like.
+    """
+    digest = hashlib.sha1(username.encode("utf-8")).hexdigest()
+    return digest[:2], digest[2:4]
+
+
+def _is_user_name(name: str) -> bool:
+    # Hidden folders (.trash) are never users.
+    return bool(name) and not name.startswith(".")
+
+
+def _subdirs(path: str) -> list[str]:
+    try:
+        return [e.name for e in os.scandir(path) if e.is_dir(follow_symlinks=False)]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+class DataLayout:
+    """
+    Resolves user, chapter and trash paths for one data folder.
+
+    Args:
+        data_dir (str): The data folder.
+        layout (str): "flat" or "sharded".
+    """
+
+    def __init__(self, data_dir: str, layout: str = CHAPTER_DATA_LAYOUT):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown data layout: {layout}")
+        self.data_dir = data_dir
+        self.layout = layout
+        self.other = "flat" if layout == "sharded" else "sharded"
+        # Users whose folder is known to be in the configured layout. Folders never
+        # move away from it, so the answer can be remembered (no stat() next time).
+        self._settled: dict[str, str] = {}
+
+    # --- Paths ---
+
+    def path_in(self, username: str, layout: str) -> str:
+        """Where a user's folder is in the given layout (whether or not it exists)."""
+        if layout == "sharded":
+            return os.path.join(self.data_dir, *shard_of(username), username)
+        return os.path.join(self.data_dir, username)
+
+    def user_dir(self, username: str) -> str:
+        """
+        The user's folder: in the configured layout, unless it's still in the other one.
+
+        Returns:
+            str: The folder path. For a new user, that's where it will be created.
+        """
+        settled = self._settled.get(username)
+        if settled is not None:
+            return settled
+        primary = self.path_in(username, self.layout)
+        if os.path.isdir(primary):
+            self._settled[username] = primary
+            return primary
+        legacy = self.path_in(username, self.other)
+        if os.path.isdir(legacy):
+            return legacy  # Not migrated yet: not remembered, it will move.
+        return primary
+
+    def chapter_dir(self, username: str, chapter_id: str) -> str:
+        return os.path.join(self.user_dir(username), chapter_id)
+
+    def trash_root(self) -> str:
+        return os.path.join(self.data_dir, TRASH_DIR)
+
+    def trash_dir(self, username: str) -> str:
+        return os.path.join(self.data_dir, TRASH_DIR, username)
+
+    # --- Listing ---
+
+    def iter_users(self, layout: Optional[str] = None) -> Iterator[tuple[str, str]]:
+        """
+        Yields (username, folder) for every user folder stored in one layout.
+
+        Args:
+            layout (Optional[str]): "flat" or "sharded". Defaults to the configured layout.
+        """
+        layout = layout or self.layout
+        if layout == "flat":
+            for name in _subdirs(self.data_dir):
+                path = os.path.join(self.data_dir, name)
+                if _is_user_name(name) and not self.is_shard_dir(path):
+                    yield name, path
+            return
+        for first in _subdirs(self.data_dir):
+            if not SHARD_NAME.match(first):
+                continue
+            for second in _subdirs(os.path.join(self.data_dir, first)):
+                if not SHARD_NAME.match(second):
+                    continue
+                shard = os.path.join(self.data_dir, first, second)
+                for username in _subdirs(shard):
+                    if _is_user_name(username) and shard_of(username) == (first, second):
+                        yield username, os.path.join(shard, username)
+
+    def iter_all_users(self) -> Iterator[tuple[str, str]]:
+        """Yields (username, folder) for every user, in either layout (the configured one wins)."""
+        seen = set()
+        for username, path in self.iter_users(self.layout):
+            seen.add(username)
+            yield username, path
+        for username, path in self.iter_users(self.other):
+            if username not in seen:
+                yield username, path
+
+    def is_shard_dir(self, path: str) -> bool:
+        """
+        True for a first-level shard folder (data/ab/).
+
+        A flat user could also be called 'ab'; their folder holds chapters or a
+        counter file, while a shard folder only ever holds other shard folders
+        (or nothing, once its users have been moved out).
+        """
+        if os.path.dirname(path) != self.data_dir or not SHARD_NAME.match(os.path.basename(path)):
+            return False
+        try:
+            names = os.listdir(path)
+        except FileNotFoundError:
+            return False
+        return all(SHARD_NAME.match(n) for n in names)
+
+    # --- Migration ---
+
+    def migrate_user(self, username: str) -> bool:
+        """
+        Moves a user's folder from the other layout into the configured one.
+
+        Normally a single rename. If the target already exists (e.g. the server created it
+        while we were busy), the chapters are moved over one by one.
+
+        Returns:
+            bool: True if anything was moved.
+        """
+        source = self.path_in(username, self.other)
+        target = self.path_in(username, self.layout)
+        if not os.path.isdir(source):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        # A flat user named like a shard folder ('ab') shares it with sharded users,
+        # so only their own entries can be moved.
+        shares_folder = self.other == "flat" and SHARD_NAME.match(username)
+        if not shares_folder and not os.path.exists(target):
+            try:
+                os.rename(source, target)
+                return True
+            except OSError:
+                pass  # The target appeared in the meantime: merge below.
+
+        os.makedirs(target, exist_ok=True)
+        moved = False
+        for name in os.listdir(source):
+            if shares_folder and SHARD_NAME.match(name):
+                continue
+            src, dst = os.path.join(source, name), os.path.join(target, name)
+            if name == COUNTER_FILE:
+                moved |= _merge_counter(src, dst)
+            elif not os.path.exists(dst):
+                os.rename(src, dst)
+                moved = True
+            else:
+                print(f"Layout migration: {username}/{name} exists in both layouts, left in {source}")
+        try:
+            os.rmdir(source)
+        except OSError:
+            pass  # Not empty (conflicts, or shard folders of other users)
+        return moved
+
+
+def _merge_counter(src: str, dst: str) -> bool:
+    """Keeps the higher of two chapter counters, so no chapter number is handed out twice."""
+    def read(path):
+        try:
+            with open(path, "r") as f:
+                content = f.read().strip()
+            return int(content) if content.isdigit() else 0
+        except FileNotFoundError:
+            return 0
+
+    if read(src) > read(dst):
+        os.replace(src, dst)
+    else:
+        os.remove(src)
+    return True
@@ -0,0 +1,213 @@
+"""
+Library Index (filesystem driver)
+
+The Library page needs a short summary of every chapter (title, characters, date).
+Building that list means opening every chapter file, which gets slow once a user has
+thousands of chapters. Instead, we keep an in-memory index per user:
+
+1.  **Build Once**: The first request for a user scans their folder and remembers each chapter's summary.
+2.  **Stay Fresh**: Our own writes and deletes update the index directly.
+    Chapters added or removed by another worker (or by hand) are noticed because
+    the user folder's modification time changes; only the new folders are read.
+    Chapters on the requested page are re-checked with os.stat(), so an edit made
+    elsewhere (e.g. a rename) shows up without rescanning the whole library.
+3.  **Pages**: Entries are kept sorted, so a page is a binary search plus a slice,
+    no matter how many chapters the user has.
+"""
+
+import bisect
+import os
+import threading
+from typing import Callable, Optional
+
+from app.storage.base import check_order, decode_cursor, encode_cursor, sort_key, summarize
+
+
+class UserLibrary:
+    """
+    The index of one user's chapters.
+
+    Entries are summaries (no segments). For each order we keep an ascending
+    list of sort keys, rebuilt lazily after a change.
+    """
+
+    def __init__(self, locate: Callable[[], str], loader: Callable[[str], Optional[dict]]):
+        self._locate = locate  # -> the user's folder (it can move, see layout.py)
+        self._loader = loader  # chapter_id -> chapter data (or None)
+        self._entries: dict[str, dict] = {}
+        self._sorted: dict[str, list[tuple]] = {}
+        self._dir_mtime_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def user_dir(self) -> str:
+        return self._locate()
+
+    # --- Keeping the index up to date ---
+
+    def sync(self) -> None:
+        """
+        Makes sure the set of chapters matches the disk.
+
+        Costs one os.stat() when nothing changed. When the folder changed,
+        only chapters that appeared are read; removed ones are dropped.
+        """
+        user_dir = self.user_dir
+        try:
+            mtime_ns = os.stat(user_dir).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.clear()
+                self._sorted.clear()
+                self._dir_mtime_ns = None
+            return
+
+        with self._lock:
+            if mtime_ns == self._dir_mtime_ns:
+                return
+            on_disk = {
+                name for name in os.listdir(user_dir)
+                if os.path.isfile(os.path.join(user_dir, name, "output.json"))
+            }
+            for chapter_id in set(self._entries) - on_disk:
+                del self._entries[chapter_id]
+            for chapter_id in on_disk - set(self._entries):
+                self._load_entry(chapter_id)
+            self._sorted.clear()
+            self._dir_mtime_ns = mtime_ns
+
+    def upsert(self, chapter_id: str, data: dict) -> None:
+        """Records a chapter we just wrote."""
+        with self._lock:
+            self._entries[chapter_id] = self._summarize(chapter_id, data)
+            self._sorted.clear()
+            self._remember_dir_mtime()
+
+    def remove(self, chapter_id: str) -> None:
+        """Forgets a chapter we just deleted."""
+        with self._lock:
+            if self._entries.pop(chapter_id, None) is not None:
+                self._sorted.clear()
+            self._remember_dir_mtime()
+
+    # --- Reading ---
+
+    def total(self) -> int:
+        """Number of chapters in the index."""
+        return len(self._entries)
+
+    def page(self, order: str = "number", limit: Optional[int] = None, cursor: Optional[str] = None) -> tuple[list[dict], Optional[str]]:
+        """
+        Returns one page of chapter summaries, newest/highest first.
+
+        Args:
+            order (str): "number" (chapter number) or "created_at".
+            limit (Optional[int]): Maximum entries to return. None means all.
+            cursor (Optional[str]): The 'next_cursor' of the previous page.
+
+        Returns:
+            tuple[list[dict], Optional[str]]: The entries and the cursor for the next page
+                                              (None when this was the last page).
+        """
+        check_order(order)
+
+        with self._lock:
+            keys = self._sorted_keys(order)
+            # Keys are ascending; the page walks backwards from the cursor.
+            end = bisect.bisect_left(keys, decode_cursor(cursor)) if cursor else len(keys)
+            start = 0 if limit is None else max(0, end - limit)
+            page_keys = keys[start:end][::-1]
+            for key in page_keys:
+                self._refresh_if_changed(key[1])
+            entries = [self._entries[key[1]] for key in page_keys]
+
+        next_cursor = encode_cursor(page_keys[-1]) if page_keys and start > 0 else None
+        return entries, next_cursor
+
+    # --- Helpers (caller holds the lock) ---
+
+    def _sorted_keys(self, order: str) -> list[tuple]:
+        keys = self._sorted.get(order)
+        if keys is None:
+            keys = sorted(sort_key(entry, order) for entry in self._entries.values())
+            self._sorted[order] = keys
+        return keys
+
+    def _refresh_if_changed(self, chapter_id: str) -> None:
+        try:
+            mtime_ns = os.stat(os.path.join(self.user_dir, chapter_id, "output.json")).st_mtime_ns
+        except FileNotFoundError:
+            return  # Dropped by the next sync()
+        if mtime_ns != self._entries[chapter_id]["_mtime_ns"]:
+            self._load_entry(chapter_id)
+            self._sorted.clear()
+
+    def _load_entry(self, chapter_id: str) -> None:
+        try:
+            data = self._loader(chapter_id)
+        except Exception as e:
+            print(f"Error reading chapter {chapter_id}: {e}")
+            data = None
+        if data is None:
+            # Still include the chapter but with minimal info so the user sees *something*
+            self._entries[chapter_id] = {
+                "chapter_id": chapter_id,
+                "title": "Error Loading Chapter",
+                "characters": [],
+                "backgrounds": [],
+                "created_at": None,
+                "_mtime_ns": 0,
+            }
+            return
+        self._entries[chapter_id] = self._summarize(chapter_id, data)
+
+    def _summarize(self, chapter_id: str, data: dict) -> dict:
+        try:
+            mtime_ns = os.stat(os.path.join(self.user_dir, chapter_id, "output.json")).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = 0
+        return summarize(chapter_id, data, mtime_ns)
+
+    def _remember_dir_mtime(self) -> None:
+        # Our own change already updated the index, so the folder's new mtime is not news.
+        # If the index was never built, leave it unset so the first sync() does a full scan.
+        if self._dir_mtime_ns is None:
+            return
+        try:
+            self._dir_mtime_ns = os.stat(self.user_dir).st_mtime_ns
+        except FileNotFoundError:
+            self._dir_mtime_ns = None
+
+
+class LibraryIndex:
+    """Holds one UserLibrary per user of a data directory, created on first use."""
+
+    def __init__(self, user_dir: Callable[[str], str]):
+        self._user_dir = user_dir  # username -> folder
+        self._libraries: dict[str, UserLibrary] = {}
+        self._lock = threading.Lock()
+
+    def get(self, username: str, loader: Callable[[str], Optional[dict]]) -> UserLibrary:
+        """
+        Returns the (synced) index for a user.
+
+        Args:
+            username (str): The username.
+            loader (Callable): Reads a chapter by ID; used for chapters not yet indexed.
+        """
+        with self._lock:
+            library = self._libraries.get(username)
+            if library is None:
+                library = UserLibrary(lambda: self._user_dir(username), loader)
+                self._libraries[username] = library
+        library.sync()
+        return library
+
+    def peek(self, username: str) -> Optional[UserLibrary]:
+        """Returns the index for a user only if it was already built."""
+        return self._libraries.get(username)
+
+    def clear(self) -> None:
+        """Forgets every user's index (they are rebuilt on next use)."""
+        with self._lock:
+            self._libraries.clear()
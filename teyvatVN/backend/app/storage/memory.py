@@ -0,0 +1,163 @@
+"""
+In-Memory Chapter Store
+
+Keeps every chapter in a Python dict. Nothing touches the disk and everything
+is gone when the process stops, so this driver is meant for tests and benchmarks
+(or a throwaway demo server), not for real users.
+"""
+
+import bisect
+import copy
+import threading
+import time
+from typing import Optional
+
+from app.storage.base import (
+    ChapterStore, check_names, check_order, decode_cursor, encode_cursor, encode_record, sort_key, summarize,
+    trash_entry,
+)
+
+
+class MemoryChapterStore(ChapterStore):
+    """Stores chapters in a dict: {username: {chapter_id: (data, summary)}}."""
+
+    def __init__(self):
+        super().__init__()
+        self._users: dict[str, dict[str, tuple[dict, dict]]] = {}
+        self._counters: dict[str, int] = {}
+        self._revisions: dict[tuple[str, str], list[dict]] = {}
+        # Trash: (username, chapter_id) -> (data, summary, deleted_at_ns)
+        self._deleted: dict[tuple[str, str], tuple[dict, dict, int]] = {}
+        self._lock = threading.Lock()
+
+    def read(self, username: str, chapter_id: str) -> Optional[dict]:
+        check_names(username, chapter_id)
+        with self._lock:
+            entry = self._users.get(username, {}).get(chapter_id)
+        return entry[0] if entry else None
+
+    def write(self, username: str, chapter_id: str, data: dict) -> None:
+        check_names(username, chapter_id)
+        # Store our own copy, like the other drivers do by serializing.
+        data = copy.deepcopy(data)
+        summary = summarize(chapter_id, data, time.time_ns())
+        with self._lock:
+            self._users.setdefault(username, {})[chapter_id] = (data, summary)
+        self._notify(username, chapter_id, data)
+
+    def delete(self, username: str, chapter_id: str) -> bool:
+        check_names(username, chapter_id)
+        with self._lock:
+            entry = self._users.get(username, {}).pop(chapter_id, None)
+            if entry is not None:
+                self._deleted[(username, chapter_id)] = (*entry, time.time_ns())
+        if entry is None:
+            return False
+        self._notify(username, chapter_id, None)
+        return True
+
+    def restore(self, username: str, chapter_id: str) -> bool:
+        check_names(username, chapter_id)
+        with self._lock:
+            if chapter_id in self._users.get(username, {}):
+                raise FileExistsError(f"{chapter_id} exists again")
+            entry = self._deleted.pop((username, chapter_id), None)
+            if entry is not None:
+                self._users.setdefault(username, {})[chapter_id] = entry[:2]
+        if entry is None:
+            return False
+        self._notify(username, chapter_id, entry[0])
+        return True
+
+    def list_deleted(self, username: str) -> list[dict]:
+        check_names(username)
+        with self._lock:
+            entries = [(c, data, at) for (u, c), (data, _, at) in self._deleted.items() if u == username]
+        entries.sort(key=lambda e: e[2], reverse=True)
+        return [trash_entry(c, data.get("title"), at) for c, data, at in entries]
+
+    def purge_deleted(self, older_than: float) -> dict:
+        cutoff_ns = int(older_than * 1e9)
+        purged, reclaimed = 0, 0
+        with self._lock:
+            for key, (data, _, deleted_at) in list(self._deleted.items()):
+                if deleted_at < cutoff_ns:
+                    del self._deleted[key]
+                    revisions = self._revisions.pop(key, [])
+                    reclaimed += len(encode_record(data)) + sum(len(encode_record(r)) for r in revisions)
+                    purged += 1
+        return {"chapters": purged, "bytes_reclaimed": reclaimed}
+
+    def list_chapters(self, username: str, order: str = "number", limit: Optional[int] = None,
+                      cursor: Optional[str] = None) -> tuple[list[dict], Optional[str]]:
+        check_names(username)
+        check_order(order)
+        with self._lock:
+            summaries = [summary for _, summary in self._users.get(username, {}).values()]
+
+        summaries.sort(key=lambda s: sort_key(s, order))
+        keys = [sort_key(s, order) for s in summaries]
+        end = bisect.bisect_left(keys, decode_cursor(cursor)) if cursor else len(keys)
+        start = 0 if limit is None else max(0, end - limit)
+        page = summaries[start:end][::-1]
+        next_cursor = encode_cursor(sort_key(page[-1], order)) if page and start > 0 else None
+        return page, next_cursor
+
+    def count(self, username: str) -> int:
+        check_names(username)
+        with self._lock:
+            return len(self._users.get(username, {}))
+
+    def next_chapter_id(self, username: str) -> str:
+        check_names(username)
+        with self._lock:
+            return f"chapter{self._next_number(username)}"
+
+    def allocate_chapter_id(self, username: str) -> str:
+        return self.allocate_chapter_ids(username, 1)[0]
+
+    def allocate_chapter_ids(self, username: str, count: int) -> list[str]:
+        check_names(username)
+        chapter_ids = []
+        with self._lock:
+            for _ in range(count):
+                number = self._next_number(username)
+                self._counters[username] = number + 1
+                chapter_ids.append(f"chapter{number}")
+        return chapter_ids
+
+    def load_revisions(self, username: str, chapter_id: str) -> list[dict]:
+        check_names(username, chapter_id)
+        with self._lock:
+            return copy.deepcopy(self._revisions.get((username, chapter_id), []))
+
+    def append_revision(self, username: str, chapter_id: str, record: dict) -> None:
+        check_names(username, chapter_id)
+        record = copy.deepcopy(record)
+        with self._lock:
+            self._revisions.setdefault((username, chapter_id), []).append(record)
+
+    def replace_revisions(self, username: str, chapter_id: str, records: list[dict]) -> None:
+        check_names(username, chapter_id)
+        records = copy.deepcopy(records)
+        with self._lock:
+            self._revisions[(username, chapter_id)] = records
+
+    def _next_number(self, username: str) -> int:
+        # Caller holds the lock. Like the other drivers, a per-user counter: it is seeded from
+        # the user's chapters until the first allocation stores it, and after that each ID
+        # costs a dict lookup or two. Chapters in the trash still own their IDs (they may be restored).
+        number = self._counters.get(username)
+        if number is None:
+            number = self._seed_number(username)
+        chapters = self._users.get(username, {})
+        while f"chapter{number}" in chapters or (username, f"chapter{number}") in self._deleted:
+            number += 1
+        return number
+
+    def _seed_number(self, username: str) -> int:
+        # The slow path, only until a user's first allocation: max(chapterN) + 1 over their chapters and trash.
+        taken = list(self._users.get(username, {})) + [c for u, c in self._deleted if u == username]
+        existing = [int(c[len("chapter"):]) for c in taken
+                    if c.startswith("chapter") and c[len("chapter"):].isdigit()]
+        return max(existing) + 1 if existing else 1
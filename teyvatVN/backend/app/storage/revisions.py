@@ -0,0 +1,395 @@
+"""
+Chapter Revision History
+
+Every save (rename, segment edit, regeneration) replaces the whole chapter.
+To make those saves undoable without keeping a full copy of every version,
+each chapter gets a revision log made of two kinds of records:
+
+1.  **Snapshots**: The full chapter. Written for the first revision, then every
+    CHAPTER_REVISION_SNAPSHOT_EVERY revisions (or whenever a delta wouldn't be much smaller).
+2.  **Deltas**: Only what changed since the previous revision: the top-level fields
+    that were set or removed, plus an edit script for the segments list
+    ("keep 40 segments, drop 1, insert these 2, keep the rest").
+
+Rebuilding any revision = its nearest snapshot + at most SNAPSHOT_EVERY - 1 deltas,
+so restoring stays fast no matter how long the history gets.
+
+Old revisions are compacted in the background: once a chapter has more than
+CHAPTER_REVISION_KEEP revisions (plus some slack), the oldest ones are dropped and
+the oldest kept revision is turned into a snapshot.
+
+The drivers only store the records (load/append/replace_revisions); everything
+else happens here, so all drivers get the same history for free.
+"""
+
+import difflib
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.common.storage_io import storage_executor
+from app.core.config import CHAPTER_REVISION_KEEP, CHAPTER_REVISION_SNAPSHOT_EVERY
+from app.storage.base import ChapterStore, encode_record
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+# Record fields that describe the revision itself (everything else is chapter content).
+_META_FIELDS = ("rev", "kind", "created_at", "reason")
+
+# Chapters share this many in-process locks (picked by hash), so the lock table
+# stays the same size however many chapters get saved.
+LOCK_STRIPES = 64
+
+
+class RevisionNotFound(LookupError):
+    """Raised when a chapter has no revision with the requested number."""
+
+
+# --- Segment edit scripts ---
+
+def _segment_key(segment) -> str:
+    # Segments are dicts, which can't be compared by difflib directly.
+    return json.dumps(segment, sort_keys=True, ensure_ascii=False)
+
+
+def _segment_opcodes(old: list, new: list) -> list:
+    matcher = difflib.SequenceMatcher(
+        None, [_segment_key(s) for s in old], [_segment_key(s) for s in new], autojunk=False
+    )
+    return matcher.get_opcodes()
+
+
+def segment_edits(old: list, new: list) -> list:
+    """
+    Builds a compact edit script that turns the old segments into the new ones.
+
+    Ops are ["=", n] (keep n), ["-", n] (drop n) and ["+", [segments...]] (insert).
+
+    Args:
+        old (list): Segments of the previous revision.
+        new (list): Segments of this revision.
+
+    Returns:
+        list: The edit script.
+    """
+    ops = []
+    for tag, i1, i2, j1, j2 in _segment_opcodes(old, new):
+        if tag == "equal":
+            ops.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append(["-", i2 - i1])
+        if j2 > j1:
+            ops.append(["+", new[j1:j2]])
+    return ops
+
+
+def apply_segment_edits(old: list, ops: list) -> list:
+    """Replays an edit script from segment_edits() on the old segments."""
+    result, position = [], 0
+    for op, arg in ops:
+        if op == "=":
+            result.extend(old[position:position + arg])
+            position += arg
+        elif op == "-":
+            position += arg
+        else:
+            result.extend(arg)
+    return result
+
+
+# --- Chapter deltas ---
+
+def make_delta(old: dict, new: dict) -> dict:
+    """
+    Describes how to get from one chapter to the next.
+
+    Returns:
+        dict: {"set": {field: value}, "unset": [fields], "segments": edit script or None}.
+              "segments" is None when the segments list didn't change (or isn't a list,
+              in which case it is treated like any other field).
+    """
+    segment_diff = isinstance(old.get("segments"), list) and isinstance(new.get("segments"), list)
+    fields = [f for f in new if not (segment_diff and f == "segments")]
+
+    delta = {
+        "set": {f: new[f] for f in fields if f not in old or old[f] != new[f]},
+        "unset": [f for f in old if f not in new],
+        "segments": None,
+    }
+    if segment_diff and old["segments"] != new["segments"]:
+        delta["segments"] = segment_edits(old["segments"], new["segments"])
+    return delta
+
+
+def apply_delta(old: dict, delta: dict) -> dict:
+    """Applies a delta from make_delta() and returns the new chapter (old is not modified)."""
+    new = {f: v for f, v in old.items() if f not in delta["unset"]}
+    new.update(delta["set"])
+    if delta.get("segments") is not None:
+        new["segments"] = apply_segment_edits(old.get("segments", []), delta["segments"])
+    return new
+
+
+def rebuild(records: list[dict], rev: int) -> dict:
+    """
+    Rebuilds the chapter as it was at a revision.
+
+    Args:
+        records (list[dict]): The chapter's revision log, oldest first.
+        rev (int): The revision number.
+
+    Raises:
+        RevisionNotFound: If the log has no such revision.
+    """
+    position = next((i for i, r in enumerate(records) if r["rev"] == rev), None)
+    if position is None:
+        raise RevisionNotFound(f"Revision {rev} not found")
+
+    # Walk back to the nearest snapshot, then replay the deltas after it.
+    start = position
+    while records[start]["kind"] != SNAPSHOT:
+        start -= 1
+        if start < 0:
+            raise RevisionNotFound(f"Revision {rev} has no snapshot to start from")
+
+    data = records[start]["data"]
+    for record in records[start + 1:position + 1]:
+        data = apply_delta(data, record)
+    return data
+
+
+def describe_changes(old: dict, new: dict) -> dict:
+    """
+    A readable diff between two versions of a chapter (used by the diff endpoint).
+
+    Returns:
+        dict: {"fields": {field: {"from": ..., "to": ...}},
+               "segments": [{"op": "insert"|"delete"|"replace", "from_index", "to_index", "old", "new"}]}
+    """
+    fields = {}
+    for f in sorted(set(old) | set(new)):
+        if f != "segments" and old.get(f) != new.get(f):
+            fields[f] = {"from": old.get(f), "to": new.get(f)}
+
+    segments = []
+    old_segments, new_segments = old.get("segments") or [], new.get("segments") or []
+    for tag, i1, i2, j1, j2 in _segment_opcodes(old_segments, new_segments):
+        if tag != "equal":
+            segments.append({
+                "op": tag,
+                "from_index": i1,
+                "to_index": j1,
+                "old": old_segments[i1:i2],
+                "new": new_segments[j1:j2],
+            })
+    return {"fields": fields, "segments": segments}
+
+
+# --- The log ---
+
+class RevisionLog:
+    """
+    Saves chapters through a ChapterStore while recording every version.
+
+    Usage:
+        log = revision_log_for(store)
+        log.save("alice", "chapter3", chapter_data, reason="segments")
+        log.restore("alice", "chapter3", 5)
+    """
+
+    def __init__(self, store: ChapterStore, snapshot_every: int = CHAPTER_REVISION_SNAPSHOT_EVERY,
+                 keep: int = CHAPTER_REVISION_KEEP, executor: Optional[Executor] = None):
+        """
+        Args:
+            store (ChapterStore): Where chapters and revision records live.
+            snapshot_every (int): A full snapshot is stored at least every this many revisions.
+            keep (int): How many revisions compaction keeps per chapter.
+            executor (Optional[Executor]): Runs compaction in the background.
+                                           None means compaction runs inline.
+        """
+        self.store = store
+        self.snapshot_every = max(1, snapshot_every)
+        self.keep = max(1, keep)
+        self.executor = executor
+        # Saves and compaction of the same chapter take turns: first among this process's
+        # threads (a striped lock), then with other processes (the store's revision_lock()).
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._locks_guard = threading.Lock()
+        self._compaction_pending: set[tuple[str, str]] = set()
+
+    @contextmanager
+    def _lock(self, username: str, chapter_id: str) -> Iterator[None]:
+        with self._locks[hash((username, chapter_id)) % LOCK_STRIPES]:
+            with self.store.revision_lock(username, chapter_id):
+                yield
+
+    # --- Saving ---
+
+    def save(self, username: str, chapter_id: str, data: dict, reason: str = "save") -> int:
+        """
+        Writes the chapter and records it as a new revision.
+
+        If the chapter existed before history was kept, its current content
+        is recorded first, so the very first edit can be undone too.
+
+        The revision is appended before the chapter is written: if this raises,
+        the chapter on disk is unchanged (callers rely on that to give back a
+        generation). A revision left behind by a failed write is harmless,
+        restoring it just writes it. SQLite commits both together anyway.
+
+        Returns:
+            int: The new revision number.
+        """
+        with self._lock(username, chapter_id):
+            records = self.store.load_revisions(username, chapter_id)
+            if not records:
+                previous = self.store.read(username, chapter_id)
+                if previous is not None:
+                    records.append(self._append(username, chapter_id, records, previous, "original"))
+
+            rev = self._append(username, chapter_id, records, data, reason)["rev"]
+            self.store.write(username, chapter_id, data)
+
+        if len(records) + 1 > self.keep + self.snapshot_every:
+            self._schedule_compaction(username, chapter_id)
+        return rev
+
+    def _append(self, username: str, chapter_id: str, records: list[dict], data: dict, reason: str) -> dict:
+        """Builds the next record (snapshot or delta) and appends it to the log."""
+        rev = records[-1]["rev"] + 1 if records else 1
+        record = {"rev": rev, "created_at": time.time(), "reason": reason}
+
+        last_snapshot = next((r["rev"] for r in reversed(records) if r["kind"] == SNAPSHOT), None)
+        snapshot = {**record, "kind": SNAPSHOT, "data": data}
+        if last_snapshot is not None and rev - last_snapshot < self.snapshot_every:
+            delta = {**record, "kind": DELTA, **make_delta(rebuild(records, rev - 1), data)}
+            # A delta that is nearly as big as the chapter isn't worth the replay cost.
+            if len(encode_record(delta)) * 2 < len(encode_record(snapshot)):
+                snapshot = delta
+
+        self.store.append_revision(username, chapter_id, snapshot)
+        return snapshot
+
+    # --- Reading ---
+
+    def list_revisions(self, username: str, chapter_id: str) -> list[dict]:
+        """
+        Returns a summary of every revision, newest first.
+
+        Returns:
+            list[dict]: {"rev", "created_at", "reason", "kind", "bytes"} per revision.
+        """
+        records = self.store.load_revisions(username, chapter_id)
+        return [
+            {**{f: r[f] for f in _META_FIELDS}, "bytes": len(encode_record(r))}
+            for r in reversed(records)
+        ]
+
+    def get(self, username: str, chapter_id: str, rev: int) -> dict:
+        """Returns the full chapter as it was at a revision (raises RevisionNotFound)."""
+        return rebuild(self.store.load_revisions(username, chapter_id), rev)
+
+    def diff(self, username: str, chapter_id: str, rev: int, against: Optional[int] = None) -> dict:
+        """
+        Compares a revision with another one (by default, the one just before it).
+
+        Returns:
+            dict: describe_changes() output plus "from" and "to" revision numbers.
+                  The first revision is compared with an empty chapter.
+        """
+        records = self.store.load_revisions(username, chapter_id)
+        new = rebuild(records, rev)
+        if against is None:
+            earlier = [r["rev"] for r in records if r["rev"] < rev]
+            against = earlier[-1] if earlier else None
+        old = rebuild(records, against) if against is not None else {}
+        return {"from": against, "to": rev, **describe_changes(old, new)}
+
+    def restore(self, username: str, chapter_id: str, rev: int) -> tuple[int, dict]:
+        """
+        Makes an old revision the current chapter.
+
+        Nothing is thrown away: the restored content is saved as a new revision,
+        so a restore can itself be undone.
+
+        Returns:
+            tuple[int, dict]: The new revision number and the restored chapter.
+        """
+        data = self.get(username, chapter_id, rev)
+        new_rev = self.save(username, chapter_id, data, reason=f"restore:{rev}")
+        return new_rev, data
+
+    # --- Compaction ---
+
+    def _schedule_compaction(self, username: str, chapter_id: str) -> None:
+        key = (username, chapter_id)
+        with self._locks_guard:
+            if key in self._compaction_pending:
+                return
+            self._compaction_pending.add(key)
+
+        def run():
+            try:
+                self.compact(username, chapter_id)
+            except Exception as e:
+                print(f"Revision compaction failed for {username}/{chapter_id}: {e}")
+            finally:
+                with self._locks_guard:
+                    self._compaction_pending.discard(key)
+
+        if self.executor is None:
+            run()
+        else:
+            self.executor.submit(run)
+
+    def compact(self, username: str, chapter_id: str) -> dict:
+        """
+        Drops all but the newest `keep` revisions of a chapter.
+
+        The oldest kept revision becomes a snapshot (if it was a delta),
+        so every kept revision can still be rebuilt.
+
+        Returns:
+            dict: {"dropped": revisions removed, "bytes_reclaimed": size saved}.
+        """
+        with self._lock(username, chapter_id):
+            records = self.store.load_revisions(username, chapter_id)
+            if len(records) <= self.keep:
+                return {"dropped": 0, "bytes_reclaimed": 0}
+
+            cut = len(records) - self.keep
+            first = records[cut]
+            if first["kind"] != SNAPSHOT:
+                first = {**{f: first[f] for f in _META_FIELDS}, "kind": SNAPSHOT,
+                         "data": rebuild(records, first["rev"])}
+            kept = [first] + records[cut + 1:]
+
+            before = sum(len(encode_record(r)) for r in records)
+            after = sum(len(encode_record(r)) for r in kept)
+            self.store.replace_revisions(username, chapter_id, kept)
+
+        print(f"Compacted revisions of {username}/{chapter_id}: dropped {cut}, reclaimed {before - after} bytes")
+        return {"dropped": cut, "bytes_reclaimed": before - after}
+
+
+_logs: "weakref.WeakKeyDictionary[ChapterStore, RevisionLog]" = weakref.WeakKeyDictionary()
+_logs_lock = threading.Lock()
+
+
+def revision_log_for(store: ChapterStore) -> RevisionLog:
+    """
+    Returns the RevisionLog for a store (one per store, so they share per-chapter locks).
+
+    Compaction runs on the storage I/O pool.
+    """
+    with _logs_lock:
+        log = _logs.get(store)
+        if log is None:
+            log = _logs[store] = RevisionLog(store, executor=storage_executor)
+        return log
@@ -0,0 +1,331 @@
+"""
+Chapter Search (SQLite FTS5)
+
+Finds chapters by their words: titles, narration text, dialogue lines and speakers.
+Without this, finding "the chapter where Kaeya mentioned wine" means opening every chapter.
+
+How it works:
+1.  **One FTS5 Row per Segment**: Every segment (and every chapter title) becomes a row of a
+    full-text index in its own small SQLite file (CHAPTER_SEARCH_PATH). FTS5 keeps an inverted
+    index (word -> rows), so a query only touches the rows that contain its words.
+2.  **Per-User Scope by Row ID**: Row IDs are built as (user, chapter slot, position), so all of
+    a user's rows sit in one row-ID range. A search asks FTS5 for that range only, and it skips
+    straight over other users' rows instead of reading and discarding them.
+3.  **Kept in Sync**: The index subscribes to the chapter store and re-indexes a chapter after
+    every write (and drops it after a delete). Libraries written before search existed are
+    indexed the first time their owner searches.
+4.  **Ranking and Snippets**: Results are ordered by BM25 relevance (a title hit counts more
+    than a speaker hit, which counts more than a hit in the text), and each hit comes with a
+    short snippet with the matching words wrapped in markers.
+"""
+
+import re
+import sqlite3
+import threading
+import weakref
+from typing import Optional
+
+from app.core.config import CHAPTER_SEARCH_PATH
+from app.storage.base import ChapterStore, check_names
+
+# Row ID layout (63 bits): | user number | chapter slot (16 bits) | position (20 bits) |
+# Position 0 is the chapter title, 1.. are the segments.
+POSITION_BITS = 20
+SLOT_BITS = 16
+MAX_SEGMENTS = (1 << POSITION_BITS) - 1
+MAX_SLOTS = 1 << SLOT_BITS
+# BM25 weights per column: title, speaker, body.
+RANK_WEIGHTS = (5.0, 2.0, 1.0)
+# Prefix matching ("kae" -> "Kaeya") only kicks in from this many characters,
+# otherwise "k" would match nearly every row.
+MIN_PREFIX_CHARS = 3
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chapter_fts USING fts5(
+    title, speaker, body, kind UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS search_users (
+    user_no  INTEGER PRIMARY KEY,
+    username TEXT    NOT NULL UNIQUE,
+    indexed  INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS search_chapters (
+    username   TEXT    NOT NULL,
+    chapter_id TEXT    NOT NULL,
+    slot       INTEGER NOT NULL,
+    title      TEXT,
+    PRIMARY KEY (username, chapter_id),
+    UNIQUE (username, slot)
+);
+"""
+
+
+def build_match(query: str) -> Optional[str]:
+    """
+    Turns what the user typed into a safe FTS5 query.
+
+    Every word is quoted (so characters like '"' or '-' can't break the query syntax)
+    and all words must match. The last word also matches as a prefix,
+    so "kae" already finds "Kaeya" while typing.
+
+    Returns:
+        Optional[str]: The MATCH expression, or None if the query has no words.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    phrases = [f'"{w}"' for w in words]
+    if len(words[-1]) >= MIN_PREFIX_CHARS:
+        phrases[-1] += "*"
+    return " ".join(phrases)
+
+
+class ChapterSearchIndex:
+    """An FTS5 index over every user's chapters."""
+
+    def __init__(self, path: str = CHAPTER_SEARCH_PATH):
+        """
+        Args:
+            path (str): The SQLite file (":memory:" for a throwaway index).
+        """
+        self.path = path
+        # One connection shared by all threads (queries take milliseconds), guarded by a lock.
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def attach(self, store: ChapterStore) -> None:
+        """Keeps this index in sync with every future write/delete of the store."""
+        store.subscribe(self.on_change)
+
+    def on_change(self, username: str, chapter_id: str, data: Optional[dict]) -> None:
+        """Store listener: re-indexes a written chapter, or removes a deleted one."""
+        if data is None:
+            self.remove_chapter(username, chapter_id)
+        else:
+            self.index_chapter(username, chapter_id, data)
+
+    # --- Row IDs ---
+
+    def _user_no(self, username: str) -> int:
+        # Caller holds the lock.
+        self._conn.execute("INSERT OR IGNORE INTO search_users (username) VALUES (?)", (username,))
+        return self._conn.execute("SELECT user_no FROM search_users WHERE username = ?", (username,)).fetchone()[0]
+
+    def _slot(self, username: str, chapter_id: str) -> int:
+        """The chapter's slot within its user's row-ID range (allocated on first index)."""
+        # Caller holds the lock and an open transaction.
+        row = self._conn.execute(
+            "SELECT slot FROM search_chapters WHERE username = ? AND chapter_id = ?", (username, chapter_id)
+        ).fetchone()
+        if row:
+            return row[0]
+        slot = self._conn.execute(
+            "SELECT COALESCE(MAX(slot) + 1, 0) FROM search_chapters WHERE username = ?", (username,)
+        ).fetchone()[0]
+        if slot >= MAX_SLOTS:
+            # Ran off the end: reuse the lowest slot freed by a deleted chapter.
+            used = {r[0] for r in self._conn.execute("SELECT slot FROM search_chapters WHERE username = ?", (username,))}
+            slot = next((s for s in range(MAX_SLOTS) if s not in used), None)
+            if slot is None:
+                raise ValueError(f"Too many chapters to index for {username}")
+        self._conn.execute(
+            "INSERT INTO search_chapters (username, chapter_id, slot) VALUES (?, ?, ?)", (username, chapter_id, slot)
+        )
+        return slot
+
+    @staticmethod
+    def _base(user_no: int, slot: int) -> int:
+        return ((user_no << SLOT_BITS) | slot) << POSITION_BITS
+
+    @staticmethod
+    def _user_range(user_no: int) -> tuple[int, int]:
+        start = user_no << (SLOT_BITS + POSITION_BITS)
+        return start, start + (1 << (SLOT_BITS + POSITION_BITS)) - 1
+
+    # --- Writing ---
+
+    def index_chapter(self, username: str, chapter_id: str, data: dict) -> None:
+        """
+        (Re-)indexes one chapter: its title and every segment.
+
+        Args:
+            username (str): The owner.
+            chapter_id (str): The chapter ID.
+            data (dict): The chapter (title, segments...).
+        """
+        title = str(data.get("title") or "")
+        rows = [(title, "", "", "title")]
+        for segment in (data.get("segments") or [])[:MAX_SEGMENTS]:
+            if not isinstance(segment, dict):
+                continue
+            body = segment.get("text") or segment.get("line") or ""
+            rows.append(("", str(segment.get("speaker") or ""), str(body), str(segment.get("type") or "")))
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                base = self._base(self._user_no(username), self._slot(username, chapter_id))
+                self._conn.execute(
+                    "UPDATE search_chapters SET title = ? WHERE username = ? AND chapter_id = ?",
+                    (title, username, chapter_id),
+                )
+                self._delete_rows(base)
+                self._conn.executemany(
+                    "INSERT INTO chapter_fts (rowid, title, speaker, body, kind) VALUES (?, ?, ?, ?, ?)",
+                    [(base + position, *row) for position, row in enumerate(rows)],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def remove_chapter(self, username: str, chapter_id: str) -> None:
+        """Drops a chapter from the index."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT u.user_no, c.slot FROM search_chapters AS c JOIN search_users AS u USING (username) "
+                "WHERE c.username = ? AND c.chapter_id = ?",
+                (username, chapter_id),
+            ).fetchone()
+            if row is None:
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete_rows(self._base(*row))
+                self._conn.execute(
+                    "DELETE FROM search_chapters WHERE username = ? AND chapter_id = ?", (username, chapter_id)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete_rows(self, base: int) -> None:
+        self._conn.execute(
+            "DELETE FROM chapter_fts WHERE rowid BETWEEN ? AND ?", (base, base + MAX_SEGMENTS)
+        )
+
+    def reindex_user(self, store: ChapterStore, username: str) -> int:
+        """
+        Rebuilds one user's part of the index from the store.
+
+        Returns:
+            int: How many chapters were indexed.
+        """
+        with self._lock:
+            known = [r[0] for r in self._conn.execute(
+                "SELECT chapter_id FROM search_chapters WHERE username = ?", (username,)
+            )]
+        for chapter_id in known:
+            self.remove_chapter(username, chapter_id)
+
+        indexed, cursor = 0, None
+        while True:
+            entries, cursor = store.list_chapters(username, limit=200, cursor=cursor)
+            for entry in entries:
+                data = store.read_uncached(username, entry["chapter_id"])
+                if data is not None:
+                    self.index_chapter(username, entry["chapter_id"], data)
+                    indexed += 1
+            if cursor is None:
+                break
+
+        with self._lock:
+            self._user_no(username)
+            self._conn.execute("UPDATE search_users SET indexed = 1 WHERE username = ?", (username,))
+        return indexed
+
+    def _ensure_user(self, store: ChapterStore, username: str) -> None:
+        """Indexes the user's existing chapters the first time they search."""
+        with self._lock:
+            row = self._conn.execute("SELECT indexed FROM search_users WHERE username = ?", (username,)).fetchone()
+        if not (row and row[0]):
+            print(f"Building search index for {username}...")
+            self.reindex_user(store, username)
+
+    # --- Searching ---
+
+    def search(self, store: ChapterStore, username: str, query: str, limit: int = 20, offset: int = 0,
+               highlight: tuple[str, str] = ("<mark>", "</mark>")) -> list[dict]:
+        """
+        Finds the best-matching titles and segments in one user's chapters.
+
+        Args:
+            store (ChapterStore): Used to index the user's chapters on their first search.
+            username (str): Whose chapters to search.
+            query (str): What the user typed (e.g. "kaeya wine").
+            limit (int): Maximum hits to return.
+            offset (int): Hits to skip (for the next page).
+            highlight (tuple[str, str]): Markers put around matching words in snippets.
+
+        Returns:
+            list[dict]: Hits, best first:
+                        {"chapter_id", "title", "segment_index" (None for a title hit),
+                         "kind", "speaker", "snippet", "score"}.
+        """
+        check_names(username)
+        match = build_match(query)
+        if match is None:
+            return []
+        self._ensure_user(store, username)
+
+        weights = ", ".join(str(w) for w in RANK_WEIGHTS)
+        with self._lock:
+            first, last = self._user_range(self._user_no(username))
+            # Snippets come from the title for title rows, from the text otherwise.
+            rows = self._conn.execute(
+                f"""
+                SELECT f.rowid, c.chapter_id, c.title, f.kind, f.speaker,
+                       snippet(chapter_fts, CASE f.kind WHEN 'title' THEN 0 ELSE 2 END, ?, ?, '…', 12),
+                       bm25(chapter_fts, {weights}) AS score
+                FROM chapter_fts AS f
+                JOIN search_chapters AS c
+                  ON c.username = ? AND c.slot = (f.rowid >> {POSITION_BITS}) & {MAX_SLOTS - 1}
+                WHERE chapter_fts MATCH ? AND f.rowid BETWEEN ? AND ?
+                ORDER BY score
+                LIMIT ? OFFSET ?
+                """,
+                (highlight[0], highlight[1], username, match, first, last, limit, offset),
+            ).fetchall()
+
+        return [
+            {
+                "chapter_id": chapter_id,
+                "title": title,
+                "segment_index": (rowid & MAX_SEGMENTS) - 1 if rowid & MAX_SEGMENTS else None,
+                "kind": kind,
+                "speaker": speaker or None,
+                "snippet": snippet,
+                # bm25() is "lower is better"; flip it so a higher score means more relevant.
+                "score": round(-score, 4),
+            }
+            for rowid, chapter_id, title, kind, speaker, snippet, score in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_indexes: "weakref.WeakKeyDictionary[ChapterStore, ChapterSearchIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def search_index_for(store: ChapterStore, path: str = CHAPTER_SEARCH_PATH) -> ChapterSearchIndex:
+    """
+    Returns the search index kept in sync with a store, creating and attaching it on first use.
+
+    Args:
+        store (ChapterStore): The chapter store.
+        path (str): Index file, only used when the index is created.
+    """
+    with _indexes_lock:
+        index = _indexes.get(store)
+        if index is None:
+            index = _indexes[store] = ChapterSearchIndex(path)
+            index.attach(store)
+        return index
@@ -0,0 +1,352 @@
+"""
+SQLite Chapter Store
+
+Keeps every chapter as a row in a single SQLite file instead of a folder per chapter.
+Listing a library is an indexed query, and the chapter counter is a row that is
+incremented inside a write transaction, so it is safe across worker processes.
+
+Tables:
+1.  **chapters**: One row per chapter. The full chapter is stored in 'data' (in any
+    chapter_format, minified JSON by default); title/characters/backgrounds are
+    copied into their own columns so listings never parse the full chapter.
+    Deleting a chapter only sets 'deleted_at' (a tombstone); purge_deleted() removes the row later.
+2.  **chapter_counters**: The next chapter number to hand out, per user.
+3.  **chapter_revisions**: The revision log of each chapter (see revisions.py), one row per revision.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.storage import chapter_format
+from app.storage.base import (
+    ChapterStore, chapter_number, check_names, check_order, decode_cursor, encode_cursor, encode_record,
+    sort_key, summarize, trash_entry,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chapters (
+    username    TEXT    NOT NULL,
+    chapter_id  TEXT    NOT NULL,
+    number      INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    title       TEXT,
+    characters  TEXT,
+    backgrounds TEXT,
+    data        BLOB    NOT NULL,
+    deleted_at  INTEGER,
+    PRIMARY KEY (username, chapter_id)
+);
+CREATE INDEX IF NOT EXISTS ix_chapters_number ON chapters (username, number, chapter_id);
+CREATE INDEX IF NOT EXISTS ix_chapters_mtime ON chapters (username, mtime_ns, chapter_id);
+CREATE TABLE IF NOT EXISTS chapter_counters (
+    username    TEXT    PRIMARY KEY,
+    next_number INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chapter_revisions (
+    username    TEXT    NOT NULL,
+    chapter_id  TEXT    NOT NULL,
+    rev         INTEGER NOT NULL,
+    record      BLOB    NOT NULL,
+    PRIMARY KEY (username, chapter_id, rev)
+);
+"""
+
+# The column each library order sorts by.
+_ORDER_COLUMNS = {"number": "number", "created_at": "mtime_ns"}
+
+
+class SQLiteChapterStore(ChapterStore):
+    """Stores chapters as rows of a SQLite database file."""
+
+    def __init__(self, path: str, storage_format: str = "minified"):
+        if storage_format not in chapter_format.FORMATS:
+            raise ValueError(f"Unknown chapter storage format: {storage_format}")
+        super().__init__()
+        self.path = path
+        self.storage_format = storage_format
+        # sqlite3 connections can't be shared between threads, so each thread gets its own.
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # Databases created before soft delete existed don't have the tombstone column yet.
+        if "deleted_at" not in [row[1] for row in conn.execute("PRAGMA table_info(chapters)")]:
+            conn.execute("ALTER TABLE chapters ADD COLUMN deleted_at INTEGER")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_chapters_deleted ON chapters (deleted_at) WHERE deleted_at IS NOT NULL"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: we issue BEGIN/COMMIT ourselves.
+            # check_same_thread=False only so close() can close every thread's connection.
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """
+        BEGIN IMMEDIATE ... COMMIT (or ROLLBACK on error) on this thread's connection.
+
+        Inside a transaction that is already open (see revision_lock()), it simply joins it.
+        """
+        conn = self._conn()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- Reading ---
+
+    def read(self, username: str, chapter_id: str) -> Optional[dict]:
+        check_names(username, chapter_id)
+        row = self._conn().execute(
+            "SELECT data FROM chapters WHERE username = ? AND chapter_id = ? AND deleted_at IS NULL",
+            (username, chapter_id),
+        ).fetchone()
+        return chapter_format.loads(row[0]) if row else None
+
+    def read_json_bytes(self, username: str, chapter_id: str) -> Optional[bytes]:
+        """The stored JSON, decompressed if needed but never parsed."""
+        check_names(username, chapter_id)
+        row = self._conn().execute(
+            "SELECT data FROM chapters WHERE username = ? AND chapter_id = ? AND deleted_at IS NULL",
+            (username, chapter_id),
+        ).fetchone()
+        return chapter_format.unwrap(row[0]) if row else None
+
+    def list_chapters(self, username: str, order: str = "number", limit: Optional[int] = None,
+                      cursor: Optional[str] = None) -> tuple[list[dict], Optional[str]]:
+        check_names(username)
+        check_order(order)
+        column = _ORDER_COLUMNS[order]
+
+        sql = ("SELECT chapter_id, title, characters, backgrounds, mtime_ns FROM chapters "
+               "WHERE username = ? AND deleted_at IS NULL")
+        params: list = [username]
+        if cursor:
+            sql += f" AND ({column}, chapter_id) < (?, ?)"
+            params += list(decode_cursor(cursor))
+        sql += f" ORDER BY {column} DESC, chapter_id DESC"
+        if limit is not None:
+            # One extra row tells us whether there is a next page.
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        rows = self._conn().execute(sql, params).fetchall()
+        has_more = limit is not None and len(rows) > limit
+        rows = rows[:limit] if limit is not None else rows
+
+        page = [
+            summarize(chapter_id, {
+                "title": title,
+                "characters": json.loads(characters or "[]"),
+                "backgrounds": json.loads(backgrounds or "[]"),
+            }, mtime_ns)
+            for chapter_id, title, characters, backgrounds, mtime_ns in rows
+        ]
+        next_cursor = encode_cursor(sort_key(page[-1], order)) if has_more else None
+        return page, next_cursor
+
+    def count(self, username: str) -> int:
+        check_names(username)
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM chapters WHERE username = ? AND deleted_at IS NULL", (username,)
+        ).fetchone()[0]
+
+    # --- Writing ---
+
+    _INSERT = (
+        "INSERT OR REPLACE INTO chapters "
+        "(username, chapter_id, number, mtime_ns, title, characters, backgrounds, data) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+    def _row(self, username: str, chapter_id: str, data: dict) -> tuple:
+        return (
+            username,
+            chapter_id,
+            chapter_number(chapter_id),
+            time.time_ns(),
+            data.get("title", "Untitled Chapter"),
+            json.dumps(data.get("characters", []), ensure_ascii=False),
+            json.dumps(data.get("backgrounds", []), ensure_ascii=False),
+            chapter_format.dumps(data, self.storage_format),
+        )
+
+    def write(self, username: str, chapter_id: str, data: dict) -> None:
+        check_names(username, chapter_id)
+        self._conn().execute(self._INSERT, self._row(username, chapter_id, data))
+        self._notify(username, chapter_id, data)
+
+    def write_many(self, username: str, chapters: list[tuple[str, dict]]) -> None:
+        """One transaction for the whole batch (one fsync instead of one per chapter)."""
+        for chapter_id, _ in chapters:
+            check_names(username, chapter_id)
+        rows = [self._row(username, chapter_id, data) for chapter_id, data in chapters]
+        with self._transaction() as conn:
+            conn.executemany(self._INSERT, rows)
+        for chapter_id, data in chapters:
+            self._notify(username, chapter_id, data)
+
+    # --- Deleting (soft) ---
+
+    def delete(self, username: str, chapter_id: str) -> bool:
+        """A single-row UPDATE: the chapter (and its revisions) stay until purged."""
+        check_names(username, chapter_id)
+        cursor = self._conn().execute(
+            "UPDATE chapters SET deleted_at = ? WHERE username = ? AND chapter_id = ? AND deleted_at IS NULL",
+            (time.time_ns(), username, chapter_id),
+        )
+        if cursor.rowcount == 0:
+            return False
+        self._notify(username, chapter_id, None)
+        return True
+
+    def restore(self, username: str, chapter_id: str) -> bool:
+        check_names(username, chapter_id)
+        cursor = self._conn().execute(
+            "UPDATE chapters SET deleted_at = NULL WHERE username = ? AND chapter_id = ? AND deleted_at IS NOT NULL",
+            (username, chapter_id),
+        )
+        if cursor.rowcount == 0:
+            # Not in the trash. (A live chapter and a tombstone can't share an ID here:
+            # writing over a tombstone replaces it.)
+            if self.read(username, chapter_id) is not None:
+                raise FileExistsError(f"{chapter_id} exists again")
+            return False
+        self._notify(username, chapter_id, self.read(username, chapter_id))
+        return True
+
+    def list_deleted(self, username: str) -> list[dict]:
+        check_names(username)
+        rows = self._conn().execute(
+            "SELECT chapter_id, title, deleted_at FROM chapters "
+            "WHERE username = ? AND deleted_at IS NOT NULL ORDER BY deleted_at DESC",
+            (username,),
+        ).fetchall()
+        return [trash_entry(chapter_id, title, deleted_at) for chapter_id, title, deleted_at in rows]
+
+    def purge_deleted(self, older_than: float) -> dict:
+        """Removes every expired tombstone (and its revisions) in one transaction."""
+        cutoff_ns = int(older_than * 1e9)
+        with self._transaction() as conn:
+            expired = conn.execute(
+                "SELECT username, chapter_id, length(data) FROM chapters WHERE deleted_at < ?", (cutoff_ns,)
+            ).fetchall()
+            keys = [(username, chapter_id) for username, chapter_id, _ in expired]
+            reclaimed = sum(size for _, _, size in expired)
+            for username, chapter_id in keys:
+                reclaimed += conn.execute(
+                    "SELECT COALESCE(SUM(length(record)), 0) FROM chapter_revisions "
+                    "WHERE username = ? AND chapter_id = ?",
+                    (username, chapter_id),
+                ).fetchone()[0]
+            conn.execute("DELETE FROM chapters WHERE deleted_at < ?", (cutoff_ns,))
+            conn.executemany("DELETE FROM chapter_revisions WHERE username = ? AND chapter_id = ?", keys)
+        return {"chapters": len(expired), "bytes_reclaimed": reclaimed}
+
+    # --- Revision log ---
+
+    def load_revisions(self, username: str, chapter_id: str) -> list[dict]:
+        check_names(username, chapter_id)
+        rows = self._conn().execute(
+            "SELECT record FROM chapter_revisions WHERE username = ? AND chapter_id = ? ORDER BY rev",
+            (username, chapter_id),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def append_revision(self, username: str, chapter_id: str, record: dict) -> None:
+        check_names(username, chapter_id)
+        self._conn().execute(
+            "INSERT INTO chapter_revisions (username, chapter_id, rev, record) VALUES (?, ?, ?, ?)",
+            (username, chapter_id, record["rev"], encode_record(record)),
+        )
+
+    @contextmanager
+    def revision_lock(self, username: str, chapter_id: str):
+        """
+        One write transaction (BEGIN IMMEDIATE) around a revision save or compaction.
+
+        It takes SQLite's write lock before the log is read, so no other process can take
+        the same revision number meanwhile. The chapter and its new revision are also
+        committed together: either both are saved or neither is.
+        """
+        check_names(username, chapter_id)
+        with self._transaction():
+            yield
+
+    def replace_revisions(self, username: str, chapter_id: str, records: list[dict]) -> None:
+        check_names(username, chapter_id)
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM chapter_revisions WHERE username = ? AND chapter_id = ?", (username, chapter_id)
+            )
+            conn.executemany(
+                "INSERT INTO chapter_revisions (username, chapter_id, rev, record) VALUES (?, ?, ?, ?)",
+                [(username, chapter_id, r["rev"], encode_record(r)) for r in records],
+            )
+
+    # --- Chapter IDs ---
+
+    def next_chapter_id(self, username: str) -> str:
+        check_names(username)
+        return f"chapter{self._next_number(self._conn(), username)}"
+
+    def allocate_chapter_id(self, username: str) -> str:
+        return self.allocate_chapter_ids(username, 1)[0]
+
+    def allocate_chapter_ids(self, username: str, count: int) -> list[str]:
+        check_names(username)
+        # BEGIN IMMEDIATE takes the write lock up front, so no other process can
+        # read the same counter value between our SELECT and UPDATE.
+        chapter_ids = []
+        with self._transaction() as conn:
+            for _ in range(count):
+                number = self._next_number(conn, username)
+                conn.execute(
+                    "INSERT OR REPLACE INTO chapter_counters (username, next_number) VALUES (?, ?)",
+                    (username, number + 1),
+                )
+                chapter_ids.append(f"chapter{number}")
+        return chapter_ids
+
+    @staticmethod
+    def _next_number(conn: sqlite3.Connection, username: str) -> int:
+        row = conn.execute("SELECT next_number FROM chapter_counters WHERE username = ?", (username,)).fetchone()
+        if row:
+            number = row[0]
+        else:
+            # First use: seed from the chapters we already have.
+            number = conn.execute(
+                "SELECT COALESCE(MAX(number), 0) + 1 FROM chapters WHERE username = ?", (username,)
+            ).fetchone()[0]
+        while conn.execute(
+            "SELECT 1 FROM chapters WHERE username = ? AND chapter_id = ?", (username, f"chapter{number}")
+        ).fetchone():
+            number += 1
+        return number
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -0,0 +1,53 @@
+"""
+Trash Compaction
+
+Deleting a chapter only moves it to the trash (see ChapterStore.delete), so a
+mistaken delete can be undone and the delete itself is cheap.
+Something still has to empty the trash: this module runs a background task that,
+every CHAPTER_TRASH_COMPACT_INTERVAL seconds, permanently removes every chapter
+deleted more than CHAPTER_TRASH_RETENTION_SECONDS ago.
+"""
+
+import asyncio
+import time
+
+from app.common.storage_io import run_io
+from app.core.config import CHAPTER_TRASH_COMPACT_INTERVAL, CHAPTER_TRASH_RETENTION_SECONDS
+from app.storage.base import ChapterStore
+
+
+def restorable_until(deleted_at: float, retention: float = CHAPTER_TRASH_RETENTION_SECONDS) -> float:
+    """Unix time after which a chapter deleted at 'deleted_at' may be purged."""
+    return deleted_at + retention
+
+
+def compact_trash(store: ChapterStore, retention: float = CHAPTER_TRASH_RETENTION_SECONDS) -> dict:
+    """
+    Purges every chapter that has been in the trash longer than 'retention' seconds.
+
+    Args:
+        store (ChapterStore): The store to clean up.
+        retention (float): How long deleted chapters stay restorable.
+
+    Returns:
+        dict: {"chapters": count purged, "bytes_reclaimed": bytes freed}.
+    """
+    return store.purge_deleted(time.time() - retention)
+
+
+async def compact_trash_forever(store: ChapterStore, interval: float = CHAPTER_TRASH_COMPACT_INTERVAL) -> None:
+    """
+    Runs compact_trash() every 'interval' seconds until cancelled (at shutdown).
+
+    The purge itself runs on the storage pool, so requests are never held up by it.
+    """
+    while True:
+        try:
+            result = await run_io(compact_trash, store)
+            if result["chapters"]:
+                print(f"Trash compaction: purged {result['chapters']} chapters, "
+                      f"reclaimed {result['bytes_reclaimed']} bytes")
+        except Exception as e:
+            # A failed pass is retried at the next interval.
+            print(f"Trash compaction failed: {e}")
+        await asyncio.sleep(interval)
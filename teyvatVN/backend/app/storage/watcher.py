@@ -0,0 +1,461 @@
+"""
+Chapter Folder Watcher (filesystem driver)
+
+Operators sometimes edit chapters by hand or copy whole chapter folders into data/.
+The filesystem store notices some of that on its own (the cache checks os.stat() on
+every read), but the library index and the search index only hear about changes made
+through the API. This watcher closes the gap:
+
+1.  **inotify** (Linux): the kernel tells us which files changed, so nothing is scanned.
+    We watch data/, the shard folders (sharded layout), every user folder and every chapter folder.
+2.  **Polling** (everywhere else, or if inotify runs out of watches): every few seconds
+    we stat each chapter's output.json and compare with the previous round.
+3.  **Debouncing**: editors and copy tools touch a file several times in a row, so
+    changed chapters are collected until things have been quiet for a moment
+    (CHAPTER_WATCH_DEBOUNCE_MS) and then refreshed once each.
+4.  **Incremental**: only the changed chapters are re-read (store.refresh()), which
+    updates the parsed-chapter cache, the library index and the search index.
+
+Our own writes also produce events; refresh() recognises them (the cache already
+matches the file) and skips them.
+
+Usage:
+    watcher = ChapterWatcher(store).start()
+    ...
+    watcher.stop()
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+import time
+from typing import Optional
+
+from app.core.config import CHAPTER_WATCH_DEBOUNCE_MS, CHAPTER_WATCH_POLL_INTERVAL
+from app.storage.filesystem import CHAPTER_FILE, FilesystemChapterStore
+from app.storage.layout import SHARD_NAME, DataLayout
+
+WATCH_MODES = ("auto", "inotify", "poll")
+
+# A chapter is refreshed at the latest this long after its first event, even if events keep coming.
+MAX_DEBOUNCE_FACTOR = 10
+# How often the watcher thread wakes up to check whether it should stop.
+WAKE_INTERVAL = 0.5
+
+# --- inotify constants (from <sys/inotify.h>) ---
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+_DIR_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR
+_CHAPTER_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+
+def _is_user_or_chapter(name: str) -> bool:
+    # Skips .trash, the counter file's temp copies and anything else hidden.
+    return bool(name) and not name.startswith(".")
+
+
+class InotifySource:
+    """
+    Reports changed chapters using Linux inotify (through ctypes, no extra package).
+
+    Args:
+        layout (DataLayout): Tells us where user folders are (flat or sharded).
+
+    Raises:
+        OSError: If inotify isn't available or the watch limit is reached
+                 (ChapterWatcher then falls back to polling).
+    """
+
+    def __init__(self, layout: DataLayout):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, "libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self.layout = layout
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # A target is ("root",), ("shard", "ab"), ("shard", "ab", "cd"), ("user", username)
+        # or ("chapter", username, chapter_id).
+        self._watches: dict[int, tuple] = {}
+        self._by_target: dict[tuple, int] = {}
+        self._paths: dict[tuple, str] = {}
+        self._chapters: dict[str, set[str]] = {}  # username -> watched chapter IDs
+        # Users moved away in this batch: cookie -> (username, chapters). A move within
+        # the data folder (e.g. a layout migration) comes back with the same cookie.
+        self._moved_out: dict[int, tuple[str, set]] = {}
+        try:
+            self._add_watch(("root",), layout.data_dir)
+            for name in self._list_dirs(layout.data_dir):
+                self._watch_root_entry(name)
+        except OSError:
+            self.close()
+            raise
+
+    # --- Watches ---
+
+    def _add_watch(self, target: tuple, path: str) -> bool:
+        mask = _CHAPTER_MASK if target[0] == "chapter" else _DIR_MASK
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return False  # Gone already; the event that removed it tells the rest.
+            raise OSError(err, f"inotify_add_watch failed for {path}: {os.strerror(err)}")
+        self._watches[wd] = target
+        self._by_target[target] = wd
+        self._paths[target] = path
+        return True
+
+    def _remove_watch(self, target: tuple) -> None:
+        wd = self._by_target.pop(target, None)
+        self._paths.pop(target, None)
+        if wd is not None:
+            self._watches.pop(wd, None)
+            # A folder moved away (e.g. into .trash) keeps its watch unless we drop it.
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _watch_root_entry(self, name: str) -> set[tuple[str, str]]:
+        path = os.path.join(self.layout.data_dir, name)
+        if self.layout.layout == "sharded" and SHARD_NAME.match(name):
+            return self._watch_shard((name,), path)
+        return self._watch_user(name, path)
+
+    def _watch_shard(self, shard: tuple, path: str) -> set[tuple[str, str]]:
+        """Watches data/ab/ or data/ab/cd/ and everything below. Returns the chapters found."""
+        if not self._add_watch(("shard", *shard), path):
+            return set()
+        chapters = set()
+        for name in self._list_dirs(path):
+            if len(shard) == 1 and SHARD_NAME.match(name):
+                chapters |= self._watch_shard((*shard, name), os.path.join(path, name))
+            elif len(shard) == 2:
+                chapters |= self._watch_user(name, os.path.join(path, name))
+        return chapters
+
+    def _watch_user(self, username: str, path: str) -> set[tuple[str, str]]:
+        """Watches a user folder and all its chapter folders. Returns the chapters found."""
+        if not self._add_watch(("user", username), path):
+            return set()
+        chapters = self._chapters.setdefault(username, set())
+        for chapter_id in self._list_dirs(path):
+            if self._add_watch(("chapter", username, chapter_id), os.path.join(path, chapter_id)):
+                chapters.add(chapter_id)
+        return {(username, c) for c in chapters}
+
+    def _unwatch_user(self, username: str) -> set[tuple[str, str]]:
+        chapters = self._chapters.pop(username, set())
+        for chapter_id in chapters:
+            self._remove_watch(("chapter", username, chapter_id))
+        self._remove_watch(("user", username))
+        return {(username, c) for c in chapters}
+
+    def _unwatch_below(self, path: str) -> set[tuple[str, str]]:
+        """Drops every watch under a removed shard folder (rare, so a full scan is fine)."""
+        prefix = path + os.sep
+        users = [t[1] for t, p in list(self._paths.items()) if t[0] == "user" and p.startswith(prefix)]
+        changed = set()
+        for username in users:
+            changed |= self._unwatch_user(username)
+        for target in [t for t, p in list(self._paths.items()) if p == path or p.startswith(prefix)]:
+            self._remove_watch(target)
+        return changed
+
+    @staticmethod
+    def _list_dirs(path: str) -> list[str]:
+        try:
+            return [e.name for e in os.scandir(path) if e.is_dir() and _is_user_or_chapter(e.name)]
+        except FileNotFoundError:
+            return []
+
+    # --- Events ---
+
+    def wait(self, timeout: float) -> set[tuple[str, str]]:
+        """
+        Waits up to 'timeout' seconds for events.
+
+        Returns:
+            set[tuple[str, str]]: (username, chapter_id) of every chapter that may have changed.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed: set[tuple[str, str]] = set()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                self._handle(wd, mask, cookie, name, changed)
+        # Moved out and not back in: the chapters are gone.
+        for _, chapters in self._moved_out.values():
+            changed |= chapters
+        self._moved_out.clear()
+        return changed
+
+    def _handle(self, wd: int, mask: int, cookie: int, name: str, changed: set) -> None:
+        if mask & IN_Q_OVERFLOW:
+            # The kernel dropped events: re-check every chapter we know about.
+            print("Watcher: inotify queue overflowed, re-checking all watched chapters")
+            changed.update((u, c) for u, chapters in self._chapters.items() for c in chapters)
+            return
+        target = self._watches.get(wd)
+        if target is None or mask & IN_IGNORED:
+            return
+        kind = target[0]
+        if kind == "chapter":
+            if name == CHAPTER_FILE or mask & IN_DELETE_SELF:
+                changed.add(target[1:])
+            return
+        if not (mask & IN_ISDIR and _is_user_or_chapter(name)):
+            return
+        path = os.path.join(self._paths[target], name)
+        arrived = mask & (IN_CREATE | IN_MOVED_TO)
+
+        if kind == "user":
+            # A chapter folder appeared (copied in, restored) or disappeared (deleted, trashed).
+            username, chapter = target[1], (target[1], name)
+            if arrived:
+                if self._add_watch(("chapter", *chapter), path):
+                    self._chapters.setdefault(username, set()).add(name)
+            else:
+                self._remove_watch(("chapter", *chapter))
+                self._chapters.get(username, set()).discard(name)
+            changed.add(chapter)
+            return
+
+        # A folder appeared or disappeared under data/ or a shard folder.
+        is_shard = (kind == "root" and self.layout.layout == "sharded" and SHARD_NAME.match(name)) \
+            or (kind == "shard" and len(target) == 2)
+        if is_shard:
+            if arrived:
+                changed |= self._watch_shard((*target[1:], name), path)
+            else:
+                changed |= self._unwatch_below(path)
+        elif kind in ("root", "shard"):
+            if arrived:
+                found = self._watch_user(name, path)
+                moved = self._moved_out.pop(cookie, None) if mask & IN_MOVED_TO else None
+                if moved is None or moved[0] != name:
+                    changed |= found  # A new user, not just the same folder moved
+            elif mask & IN_MOVED_FROM:
+                self._moved_out[cookie] = (name, self._unwatch_user(name))
+            else:
+                changed |= self._unwatch_user(name)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingSource:
+    """
+    Reports changed chapters by comparing os.stat() of every output.json between rounds.
+
+    Works everywhere; costs one stat per chapter every 'interval' seconds.
+    User folders are only listed again when their modification time changed.
+    """
+
+    def __init__(self, layout: DataLayout, interval: float = CHAPTER_WATCH_POLL_INTERVAL):
+        self.layout = layout
+        self.interval = interval
+        self._user_mtimes: dict[str, int] = {}
+        self._chapters: dict[str, set[str]] = {}
+        self._stats: dict[tuple[str, str], Optional[tuple[int, int]]] = {}
+        self._next_poll = 0.0
+        self._poll()  # The first round only records what is there.
+
+    def wait(self, timeout: float) -> set[tuple[str, str]]:
+        """Sleeps until the next round is due (at most 'timeout' seconds), then polls."""
+        delay = self._next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        if delay > 0:
+            time.sleep(delay)
+        return self._poll()
+
+    def _poll(self) -> set[tuple[str, str]]:
+        self._next_poll = time.monotonic() + self.interval
+        changed: set[tuple[str, str]] = set()
+        users = dict(self.layout.iter_all_users())
+
+        for username in set(self._chapters) - set(users):
+            changed.update((username, c) for c in self._chapters.pop(username))
+            self._user_mtimes.pop(username, None)
+
+        for username, user_dir in users.items():
+            try:
+                mtime_ns = os.stat(user_dir).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if self._user_mtimes.get(username) != mtime_ns:
+                self._user_mtimes[username] = mtime_ns
+                try:
+                    current = {e.name for e in os.scandir(user_dir) if e.is_dir() and _is_user_or_chapter(e.name)}
+                except FileNotFoundError:
+                    current = set()
+                for chapter_id in self._chapters.get(username, set()) - current:
+                    self._stats.pop((username, chapter_id), None)
+                    changed.add((username, chapter_id))
+                self._chapters[username] = current
+
+            for chapter_id in self._chapters.get(username, ()):
+                key = (username, chapter_id)
+                try:
+                    stat = os.stat(os.path.join(user_dir, chapter_id, CHAPTER_FILE))
+                    signature = (stat.st_mtime_ns, stat.st_size)
+                except FileNotFoundError:
+                    signature = None
+                if key not in self._stats or self._stats[key] != signature:
+                    if key in self._stats or signature is not None:
+                        changed.add(key)
+                    self._stats[key] = signature
+
+        for key in [k for k in self._stats if k[0] not in users]:
+            del self._stats[key]
+        return changed
+
+    def known_chapters(self) -> set[tuple[str, str]]:
+        """Every chapter seen in the last round."""
+        return {(u, c) for u, chapters in self._chapters.items() for c in chapters}
+
+    def close(self) -> None:
+        pass
+
+
+class ChapterWatcher:
+    """
+    Keeps a FilesystemChapterStore in sync with changes made directly in its data folder.
+
+    Runs in its own background thread.
+
+    Args:
+        store (FilesystemChapterStore): The store to keep fresh.
+        mode (str): "inotify", "poll", or "auto" (inotify if possible, else polling).
+        debounce (float): Seconds of quiet before the collected changes are applied.
+        poll_interval (float): Seconds between rounds in polling mode.
+    """
+
+    def __init__(self, store: FilesystemChapterStore, mode: str = "auto",
+                 debounce: float = CHAPTER_WATCH_DEBOUNCE_MS / 1000,
+                 poll_interval: float = CHAPTER_WATCH_POLL_INTERVAL):
+        if mode not in WATCH_MODES:
+            raise ValueError(f"Unknown watch mode: {mode}")
+        self.store = store
+        self.mode = mode
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.source = None
+        self._pending: set[tuple[str, str]] = set()
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # --- Counters ---
+        self.refreshed = 0
+
+    def start(self) -> "ChapterWatcher":
+        """Opens the event source and starts the background thread. Returns self."""
+        os.makedirs(self.store.data_dir, exist_ok=True)
+        self.source = self._open_source()
+        self._thread = threading.Thread(target=self._run, name="chapter-watcher", daemon=True)
+        self._thread.start()
+        print(f"Watching {self.store.data_dir} for chapter changes ({self.mode})")
+        return self
+
+    def stop(self) -> None:
+        """Stops the thread and applies anything still pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.source is not None:
+            self.source.close()
+        self.flush()
+
+    def _open_source(self):
+        if self.mode in ("auto", "inotify"):
+            try:
+                source = InotifySource(self.store.layout)
+                self.mode = "inotify"
+                return source
+            except OSError as e:
+                if self.mode == "inotify":
+                    raise
+                print(f"Watcher: inotify unavailable ({e}), falling back to polling")
+        self.mode = "poll"
+        return PollingSource(self.store.layout, self.poll_interval)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                changed = self.source.wait(self._timeout())
+            except OSError as e:
+                # Usually the inotify watch limit; polling needs no watches.
+                print(f"Watcher: {e}; switching to polling")
+                self.source.close()
+                self.mode = "poll"
+                self.source = PollingSource(self.store.layout, self.poll_interval)
+                changed = self.source.known_chapters()
+
+            now = time.monotonic()
+            if changed:
+                if not self._pending:
+                    self._first_event = now
+                self._pending |= changed
+                self._last_event = now
+            if self._pending and (
+                now - self._last_event >= self.debounce
+                or now - self._first_event >= self.debounce * MAX_DEBOUNCE_FACTOR
+            ):
+                self.flush()
+
+    def _timeout(self) -> float:
+        if not self._pending:
+            return WAKE_INTERVAL
+        return max(0.0, min(WAKE_INTERVAL, self._last_event + self.debounce - time.monotonic()))
+
+    def flush(self) -> int:
+        """
+        Refreshes every pending chapter now.
+
+        Returns:
+            int: How many chapters were actually refreshed (our own writes are skipped).
+        """
+        pending, self._pending = self._pending, set()
+        refreshed = 0
+        for username, chapter_id in sorted(pending):
+            try:
+                refreshed += self.store.refresh(username, chapter_id)
+            except ValueError:
+                continue  # Not a valid chapter name (e.g. a stray folder).
+            except Exception as e:
+                print(f"Watcher: failed to refresh {username}/{chapter_id}: {e}")
+        self.refreshed += refreshed
+        return refreshed
@@ -0,0 +1,73 @@
+"""
+Compares the chapter storage formats on real chapters.
+
+Usage (from the backend directory):
+    python scripts/bench_chapter_formats.py [--data-dir ./data] [--rounds 200]
+
+For each format it reports the total size on disk, the time to encode
+every chapter and the time for a cold read (read bytes + decode + parse).
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.storage import chapter_format
+
+
+def load_chapters(data_dir: str) -> list:
+    chapters = []
+    for path in glob.glob(os.path.join(data_dir, "*", "*", "output.json")):
+        with open(path, "rb") as f:
+            chapters.append(chapter_format.loads(f.read()))
+    return chapters
+
+
+def bench(chapters: list, fmt: str, rounds: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        blobs = [chapter_format.dumps(c, fmt) for c in chapters]
+    encode_s = (time.perf_counter() - start) / rounds
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, blob in enumerate(blobs):
+            path = os.path.join(tmp, f"{i}.bin")
+            with open(path, "wb") as f:
+                f.write(blob)
+            paths.append(path)
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for path in paths:
+                with open(path, "rb") as f:
+                    chapter_format.loads(f.read())
+        read_s = (time.perf_counter() - start) / rounds
+
+    return {"bytes": sum(len(b) for b in blobs), "encode_ms": encode_s * 1000, "read_ms": read_s * 1000}
+
+
+if __name__ == "__main__":
+    default_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+    parser = argparse.ArgumentParser(description="Benchmark chapter storage formats.")
+    parser.add_argument("--data-dir", default=default_dir)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    chapters = load_chapters(args.data_dir)
+    print(f"Benchmarking {len(chapters)} chapters, {args.rounds} rounds each\n")
+    print(f"{'format':<10} {'bytes':>10} {'ratio':>7} {'encode ms':>10} {'read ms':>9}")
+
+    baseline = None
+    for fmt in chapter_format.FORMATS:
+        if fmt == "zstd" and chapter_format.zstandard is None:
+            print(f"{fmt:<10} (skipped, 'zstandard' not installed)")
+            continue
+        result = bench(chapters, fmt, args.rounds)
+        baseline = baseline or result["bytes"]
+        ratio = baseline / result["bytes"]
+        print(f"{fmt:<10} {result['bytes']:>10,} {ratio:>6.1f}x {result['encode_ms']:>10.2f} {result['read_ms']:>9.2f}")
@@ -0,0 +1,102 @@
+"""
+Compares the old and the new way of serving GET /api/chapter/{username}/{chapter_id}.
+
+Usage (from the backend directory):
+    python scripts/bench_chapter_serving.py [--segments 500] [--requests 300]
+
+- "parse + dump (cold)": the old route with an empty cache: read, json.loads, then
+  FastAPI turns the dict back into JSON.
+- "parse + dump (warm)": the old route with the chapter in the parsed-chapter cache
+  (no json.loads, but the dict is still walked and serialized).
+- "stored bytes": the current route: the file's bytes go straight into the envelope.
+
+For each it reports the time per request and the peak memory allocated per request.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import httpx
+from fastapi import Depends, FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.common.storage_io import run_io
+from app.routers import story
+from app.storage import get_chapter_store
+from app.storage.base import ChapterStore
+from app.storage.filesystem import FilesystemChapterStore
+
+
+def make_chapter(segments: int) -> dict:
+    lines = []
+    for i in range(segments):
+        if i % 3 == 0:
+            lines.append({"type": "narration", "text": f"The wind over Mondstadt shifts for the {i}th time."})
+        else:
+            lines.append({"type": "dialogue", "speaker": "Paimon", "line": f"Line {i}: let's go eat!",
+                          "expression": "happy", "position": "left"})
+    return {"title": "Benchmark", "characters": ["Paimon", "Venti"], "backgrounds": ["mondstadt"],
+            "segments": lines}
+
+
+def make_app(store: ChapterStore) -> FastAPI:
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+
+    # The route as it was before: parse, then let FastAPI serialize the dict again.
+    @app.get("/legacy/{username}/{chapter_id}")
+    async def legacy_get_chapter(username: str, chapter_id: str, store: ChapterStore = Depends(get_chapter_store)):
+        chapter_data = await run_io(store.read, username, chapter_id)
+        if chapter_data is None:
+            return {"message": "Chapter not found", "data": None}
+        return {"message": "Loaded", "data": chapter_data}
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, requests: int) -> tuple[float, int, int]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get(path)  # warm-up
+        size = len(response.content)
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            await client.get(path)
+        per_request = (time.perf_counter() - start) / requests
+
+        tracemalloc.start()
+        await client.get(path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return per_request, peak, size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chapter serving.")
+    parser.add_argument("--segments", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    chapter = make_chapter(args.segments)
+    with tempfile.TemporaryDirectory() as tmp:
+        cold = FilesystemChapterStore(tmp, cache_max_bytes=0)
+        warm = FilesystemChapterStore(tmp)
+        cold.write("bench", "chapter1", chapter)
+
+        runs = [
+            ("parse + dump (cold)", make_app(cold), "/legacy/bench/chapter1"),
+            ("parse + dump (warm)", make_app(warm), "/legacy/bench/chapter1"),
+            ("stored bytes", make_app(cold), "/api/chapter/bench/chapter1"),
+        ]
+        print(f"Chapter with {args.segments} segments, {args.requests} requests per path\n")
+        print(f"{'path':<22} {'ms/request':>11} {'peak KiB':>9} {'body bytes':>11}")
+        for name, app, path in runs:
+            per_request, peak, size = asyncio.run(measure(app, path, args.requests))
+            print(f"{name:<22} {per_request * 1000:>11.3f} {peak / 1024:>9.1f} {size:>11,}")
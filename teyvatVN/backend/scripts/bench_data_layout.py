@@ -0,0 +1,90 @@
+"""
+Compares the flat and the sharded data layout with many users.
+
+Usage (from the backend directory):
+    python scripts/bench_data_layout.py [--users 100000] [--lookups 20000] [--dir /tmp]
+
+For each layout it builds a data folder with one chapter per user, then times:
+- create:  making every user folder and chapter file
+- new:     adding 1,000 more users to the full folder
+- lookup:  os.stat() of random chapters' output.json (what every read starts with)
+- list:    finding every user (what the watcher and migrations do)
+- walk:    visiting every file (what a backup does)
+It also reports the biggest folder, in entries.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.storage.layout import LAYOUTS, DataLayout
+
+CHAPTER = b'{"title": "Benchmark", "segments": []}'
+
+
+def add_users(layout: DataLayout, usernames: list[str]) -> None:
+    for username in usernames:
+        chapter_dir = layout.chapter_dir(username, "chapter1")
+        os.makedirs(chapter_dir)
+        with open(os.path.join(chapter_dir, "output.json"), "wb") as f:
+            f.write(CHAPTER)
+
+
+def bench(root: str, layout_name: str, users: int, lookups: int) -> dict:
+    data_dir = os.path.join(root, layout_name)
+    layout = DataLayout(data_dir, layout_name)
+    usernames = [f"traveler{i}" for i in range(users)]
+    result = {}
+
+    start = time.perf_counter()
+    add_users(layout, usernames)
+    result["create_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    add_users(layout, [f"newcomer{i}" for i in range(1000)])
+    result["new_ms"] = (time.perf_counter() - start) * 1000
+
+    # A fresh layout, so user folders aren't already remembered.
+    fresh = DataLayout(data_dir, layout_name)
+    sample = random.Random(1).choices(usernames, k=lookups)
+    start = time.perf_counter()
+    for username in sample:
+        os.stat(os.path.join(fresh.chapter_dir(username, "chapter1"), "output.json"))
+    result["lookup_us"] = (time.perf_counter() - start) / lookups * 1e6
+
+    start = time.perf_counter()
+    found = sum(1 for _ in fresh.iter_users())
+    result["list_s"] = time.perf_counter() - start
+    assert found == users + 1000, found
+
+    start = time.perf_counter()
+    files, biggest = 0, 0
+    for _, dirs, names in os.walk(data_dir):
+        files += len(names)
+        biggest = max(biggest, len(dirs) + len(names))
+    result["walk_s"] = time.perf_counter() - start
+    result["biggest"] = biggest
+
+    shutil.rmtree(data_dir)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the flat and sharded data layouts.")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--dir", default=None, help="Where to build the test folders (default: system temp)")
+    args = parser.parse_args()
+
+    print(f"{args.users:,} users, one chapter each\n")
+    print(f"{'layout':<8} {'create s':>9} {'new ms':>8} {'lookup us':>10} {'list s':>7} {'walk s':>7} {'biggest dir':>12}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as root:
+        for name in LAYOUTS:
+            r = bench(root, name, args.users, args.lookups)
+            print(f"{name:<8} {r['create_s']:>9.1f} {r['new_ms']:>8.1f} {r['lookup_us']:>10.1f} "
+                  f"{r['list_s']:>7.2f} {r['walk_s']:>7.2f} {r['biggest']:>12,}")
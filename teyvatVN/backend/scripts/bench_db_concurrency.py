@@ -0,0 +1,117 @@
+"""
+Hammers the auth endpoints from several worker processes at once, with the old and the tuned database engine.
+
+Usage (from the backend directory):
+    python scripts/bench_db_concurrency.py [--workers 4] [--users 150] [--concurrency 8]
+
+Each worker process runs its own copy of the app (like 'uvicorn --workers N') against one
+shared SQLite file, and every simulated user registers, saves their settings twice and logs in.
+
+- "plain engine": create_async_engine() with aiosqlite and SQLite's defaults.
+- "tuned engine": create_async_db_engine(url) (WAL, busy_timeout, synchronous=NORMAL, mmap, cache).
+
+Reported: requests per second, failed requests (mostly "database is locked") and latency.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "bench-only-secret")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def run_worker(args: tuple) -> tuple[int, int, list[float]]:
+    """One worker process: its own engine and app, a share of the users. Returns (ok, failed, latencies)."""
+    engine_kind, url, worker, users, concurrency = args
+    import httpx
+    from fastapi import FastAPI
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app.core.database import async_database_url, create_async_db_engine, get_async_db
+    from app.routers import auth
+    from app.services import auth_service
+
+    auth_service.BCRYPT_ROUNDS = 4  # measure the database, not bcrypt
+    if engine_kind == "tuned":
+        engine = create_async_db_engine(url)
+    else:
+        engine = create_async_engine(async_database_url(url))
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    app = FastAPI()
+    app.include_router(auth.router)
+
+    async def override_db():
+        async with Session() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_db
+
+    async def main():
+        ok, failed, latencies = 0, 0, []
+        limit = asyncio.Semaphore(concurrency)
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def call(method, path, body):
+                nonlocal ok, failed
+                start = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code == 200:
+                    ok += 1
+                else:
+                    failed += 1
+
+            async def user(i):
+                name = f"w{worker}u{i}"
+                async with limit:
+                    await call("POST", "/api/auth/register", {"username": name, "password": "pw", "email": f"{name}@x.org"})
+                    await call("PUT", "/api/user/settings", {"username": name, "gemini_api_key": "AIza-1"})
+                    await call("PUT", "/api/user/settings", {"username": name, "gemini_api_key": "AIza-2"})
+                    await call("POST", "/api/auth/login", {"username": name, "password": "pw"})
+
+            await asyncio.gather(*(user(i) for i in range(users)))
+        await engine.dispose()
+        return ok, failed, latencies
+
+    return asyncio.run(main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent auth requests against SQLite.")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--users", type=int, default=150, help="users per worker")
+    parser.add_argument("--concurrency", type=int, default=8, help="users in flight per worker")
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+    from app.core.database import Base
+    import app.models.sql  # noqa: F401  (registers the tables)
+
+    print(f"{args.workers} workers x {args.users} users (register, 2x settings, login), "
+          f"{args.concurrency} in flight per worker\n")
+    print(f"{'engine':<14} {'req/s':>7} {'failed':>7} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>8}")
+    ctx = multiprocessing.get_context("spawn")
+    for kind in ("plain", "tuned"):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{tmp}/bench.db"
+            setup = create_engine(url)
+            Base.metadata.create_all(bind=setup)
+            setup.dispose()
+
+            with ctx.Pool(args.workers) as pool:
+                start = time.perf_counter()
+                results = pool.map(run_worker, [(kind, url, w, args.users, args.concurrency) for w in range(args.workers)])
+                elapsed = time.perf_counter() - start
+            ok = sum(r[0] for r in results)
+            failed = sum(r[1] for r in results)
+            latencies = sorted(l for r in results for l in r[2])
+            p95 = latencies[int(len(latencies) * 0.95)]
+            print(f"{kind + ' engine':<14} {(ok + failed) / elapsed:>7.0f} {failed:>7} "
+                  f"{statistics.median(latencies) * 1000:>7.1f} {p95 * 1000:>7.1f} {latencies[-1] * 1000:>8.1f}")
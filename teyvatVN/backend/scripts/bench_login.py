@@ -0,0 +1,125 @@
+"""
+Measures login throughput, and how much logins slow down everything else.
+
+Usage (from the backend directory):
+    python scripts/bench_login.py [--rounds 12] [--logins 32] [--concurrency 8]
+
+Two ways of checking passwords are compared:
+- "on the loop": bcrypt called straight from the async route (how login used to work).
+- "hashing pool": the current route (bcrypt on app/common/hashing_pool.py).
+
+While the logins run, a cheap /ping request is due every 10ms. How late it completes
+(counted from when it was due) shows how long other users had to wait while
+passwords were being checked.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "bench-only-secret")
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.common import hashing_pool
+from app.core.database import Base, create_async_db_engine, get_async_db, get_db
+from app.routers import auth
+from app.services import auth_service
+
+
+def make_app(session_factory, async_session_factory) -> FastAPI:
+    app = FastAPI()
+    app.include_router(auth.router)
+
+    def override_db():
+        with session_factory() as db:
+            yield db
+
+    async def override_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_async_db] = override_async_db
+
+    # The login route as it was before: bcrypt right on the event loop.
+    @app.post("/legacy/login")
+    async def legacy_login(request: auth.LoginRequest, db: Session = Depends(get_db)):
+        user = auth_service.authenticate_user(db, request.username, request.password)
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        return {"status": "success"}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, logins: int, concurrency: int) -> tuple[float, float, float]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        limit = asyncio.Semaphore(concurrency)
+
+        async def login(i):
+            async with limit:
+                response = await client.post(path, json={"username": f"user{i % 8}", "password": "hunter2"})
+                assert response.status_code == 200, response.text
+
+        ping_latencies = []
+        done = asyncio.Event()
+
+        async def pinger():
+            while not done.is_set():
+                due = time.perf_counter() + 0.01
+                await asyncio.sleep(0.01)
+                await client.get("/ping")
+                # A blocked loop delays the wake-up as well as the request itself.
+                ping_latencies.append(time.perf_counter() - due)
+
+        pinging = asyncio.create_task(pinger())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await pinging
+    return logins / elapsed, max(ping_latencies), statistics.median(ping_latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark login throughput.")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8, help="logins in flight at once")
+    args = parser.parse_args()
+
+    auth_service.BCRYPT_ROUNDS = args.rounds
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/users.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        with session_factory() as db:
+            for i in range(8):
+                auth_service.create_user(db, f"user{i}", "hunter2", f"user{i}@example.com")
+
+        # NullPool: each measure() runs on its own event loop, so no connection is kept between them.
+        async_engine = create_async_db_engine(f"sqlite:///{tmp}/users.db", poolclass=NullPool)
+        app = make_app(session_factory, async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False))
+        print(f"bcrypt cost {args.rounds}, {args.logins} logins, {args.concurrency} at a time, "
+              f"{hashing_pool.hashing_executor._max_workers} hashing threads, {os.cpu_count()} CPUs\n")
+        print(f"{'path':<14} {'logins/s':>9} {'worst ping ms':>14} {'median ping ms':>15}")
+        for name, path in (("on the loop", "/legacy/login"), ("hashing pool", "/api/auth/login")):
+            rate, worst, median = asyncio.run(measure(app, path, args.logins, args.concurrency))
+            print(f"{name:<14} {rate:>9.1f} {worst * 1000:>14.1f} {median * 1000:>15.1f}")
+        engine.dispose()
@@ -0,0 +1,105 @@
+"""
+Measures what a credential-stuffing burst costs, with and without login throttling.
+
+Usage (from the backend directory):
+    python scripts/bench_login_throttle.py [--rounds 10] [--attempts 300] [--usernames 20]
+
+The burst sends wrong passwords for a few usernames from one IP, 8 at a time.
+- "unthrottled": every attempt is checked with bcrypt.
+- "throttled": the default limits (app/services/login_throttle.py). Attempts that must wait
+  are refused with 429 before bcrypt runs.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "bench-only-secret")
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.database import Base, create_async_db_engine, get_async_db
+from app.routers import auth
+from app.services import auth_service
+from app.services.login_throttle import LoginThrottle, MemoryThrottleStore, ThrottleRule, get_login_throttle
+
+
+async def burst(url: str, throttle: LoginThrottle, attempts: int, usernames: int) -> dict:
+    engine = create_async_db_engine(url, poolclass=NullPool)
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def override_db():
+        async with Session() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.dependency_overrides[get_async_db] = override_db
+    app.dependency_overrides[get_login_throttle] = lambda: throttle
+
+    checks = []
+    verify = auth_service.verify_password
+    auth_service.verify_password = lambda *a: checks.append(1) or verify(*a)
+    statuses = []
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            limit = asyncio.Semaphore(8)
+
+            async def attempt(i):
+                async with limit:
+                    body = {"username": f"user{i % usernames}", "password": f"guess{i}"}
+                    statuses.append((await client.post("/api/auth/login", json=body)).status_code)
+
+            start, cpu = time.perf_counter(), time.process_time()
+            await asyncio.gather(*(attempt(i) for i in range(attempts)))
+            elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    finally:
+        auth_service.verify_password = verify
+        await engine.dispose()
+    return {"bcrypt": len(checks), "refused": statuses.count(429), "seconds": elapsed, "cpu": cpu}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark a credential-stuffing burst.")
+    parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost factor")
+    parser.add_argument("--attempts", type=int, default=300)
+    parser.add_argument("--usernames", type=int, default=20, help="usernames the burst cycles through")
+    args = parser.parse_args()
+
+    auth_service.BCRYPT_ROUNDS = args.rounds
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/users.db"
+        setup = create_engine(url)
+        Base.metadata.create_all(bind=setup)
+        setup.dispose()
+
+        async def create_users():
+            engine = create_async_db_engine(url, poolclass=NullPool)
+            Session = async_sessionmaker(engine, expire_on_commit=False)
+            async with Session() as db:
+                for i in range(args.usernames):
+                    await auth_service.create_user_async(db, f"user{i}", "hunter2", f"user{i}@example.com")
+            await engine.dispose()
+
+        asyncio.run(create_users())
+
+        unlimited = ThrottleRule(max_failures=0, free_failures=10 ** 9)
+        throttles = (
+            ("unthrottled", LoginThrottle(MemoryThrottleStore(), user_rule=unlimited, ip_rule=unlimited)),
+            ("throttled", LoginThrottle(MemoryThrottleStore())),
+        )
+        print(f"bcrypt cost {args.rounds}, {args.attempts} wrong passwords for {args.usernames} usernames "
+              f"from one IP, {os.cpu_count()} CPUs\n")
+        print(f"{'':<12} {'bcrypt checks':>14} {'refused':>8} {'seconds':>8} {'CPU s':>6}")
+        for name, throttle in throttles:
+            result = asyncio.run(burst(url, throttle, args.attempts, args.usernames))
+            print(f"{name:<12} {result['bcrypt']:>14} {result['refused']:>8} "
+                  f"{result['seconds']:>8.2f} {result['cpu']:>6.2f}")
@@ -0,0 +1,76 @@
+"""
+Measures full-text search speed on a synthetic library.
+
+Usage (from the backend directory):
+    python scripts/bench_search.py [--chapters 400] [--segments 100] [--users 20]
+
+Builds an in-memory search index where the searched user has chapters x segments
+segments (plus the same for every other user), then times a mix of queries.
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.storage.memory import MemoryChapterStore
+from app.storage.search import ChapterSearchIndex
+
+SPEAKERS = ["Kaeya", "Diluc", "Paimon", "Lumine", "Venti", "Jean", "Lisa", "Amber"]
+# Story words; like real text, a few are very common and most are rare (Zipf's law).
+THEMED = ("the a of and to wind wine tavern knight dragon archon anemo starfall cape statue city gate "
+          "song lyre dandelion cat tail hunt mora quest slime sword harbor").split()
+WORDS = THEMED + [f"w{i}" for i in range(5000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(WORDS) + 1)))
+QUERIES = ["kaeya", "wine", "dragon song", "star", "venti lyre", "knight of favonius", "mora", "the"]
+
+
+def make_chapter(rng: random.Random, n: int, segments: int) -> dict:
+    segs = []
+    for _ in range(segments):
+        text = " ".join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=rng.randint(8, 25)))
+        if rng.random() < 0.5:
+            segs.append({"type": "narration", "text": text})
+        else:
+            segs.append({"type": "dialogue", "speaker": rng.choice(SPEAKERS), "line": text})
+    return {"title": f"Chapter {n}: The {rng.choice(WORDS)} {rng.choice(WORDS)}", "segments": segs}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chapter full-text search.")
+    parser.add_argument("--chapters", type=int, default=400)
+    parser.add_argument("--segments", type=int, default=100)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    store = MemoryChapterStore()
+    index = ChapterSearchIndex(":memory:")
+    index.attach(store)
+
+    start = time.perf_counter()
+    for u in range(args.users):
+        for n in range(1, args.chapters + 1):
+            store.write(f"user{u}", f"chapter{n}", make_chapter(rng, n, args.segments))
+    build_s = time.perf_counter() - start
+    total = args.users * args.chapters * args.segments
+    print(f"Indexed {total:,} segments in {build_s:.1f}s "
+          f"({build_s / (args.users * args.chapters) * 1000:.2f} ms per chapter write)")
+    print(f"Segments per user: {args.chapters * args.segments:,}")
+
+    index.search(store, "user0", "warmup")
+    print(f"{'query':<22} {'hits':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            hits = index.search(store, "user0", query, limit=20)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{query:<22} {len(hits):>6} {statistics.median(timings):>8.2f} {p95:>8.2f}")
@@ -0,0 +1,70 @@
+"""
+Measures how long a fresh worker takes to come up: importing app.main, then the lifespan startup.
+
+Usage (from the backend directory):
+    python scripts/bench_startup.py [--runs 10]
+
+Each run is a new Python process (like a new worker or a '--reload' restart).
+The "eager AI" row imports the Gemini SDK first, which is what every start used to pay
+before it was loaded on the first generation instead.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from cryptography.fernet import Fernet
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+if {eager_ai}:
+    import google.generativeai
+import app.main
+imported = time.perf_counter() - start
+
+async def boot():
+    start = time.perf_counter()
+    async with app.main.app.router.lifespan_context(app.main.app):
+        return time.perf_counter() - start
+
+print(json.dumps({{"import": imported, "startup": asyncio.run(boot())}}))
+"""
+
+
+def measure(eager_ai: bool, runs: int) -> dict:
+    """Median seconds of each phase over 'runs' fresh processes."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.path.abspath(BACKEND_DIR),
+            "PYTHONWARNINGS": "ignore",
+            "SECRET_KEY": os.environ.get("SECRET_KEY", "bench-only-secret"),
+            "ENCRYPTION_KEY": os.environ.get("ENCRYPTION_KEY") or Fernet.generate_key().decode(),
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            "CHAPTER_STORE": "memory",
+        }
+        for _ in range(runs):
+            child = subprocess.run([sys.executable, "-c", CHILD.format(eager_ai=eager_ai)], cwd=tmp, env=env,
+                                   capture_output=True, text=True, check=True)
+            results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    return {phase: statistics.median(r[phase] for r in results) for phase in ("import", "startup")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark worker cold start.")
+    parser.add_argument("--runs", type=int, default=10, help="fresh processes per row")
+    args = parser.parse_args()
+
+    print(f"median of {args.runs} fresh processes\n")
+    print(f"{'':<10} {'import ms':>10} {'startup ms':>11} {'total ms':>9}")
+    for name, eager_ai in (("lazy AI", False), ("eager AI", True)):
+        timing = measure(eager_ai, args.runs)
+        total = timing["import"] + timing["startup"]
+        print(f"{name:<10} {timing['import'] * 1000:>10.0f} {timing['startup'] * 1000:>11.1f} {total * 1000:>9.0f}")
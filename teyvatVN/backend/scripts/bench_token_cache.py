@@ -0,0 +1,37 @@
+"""
+Measures what checking a login token costs, with and without the verified token cache.
+
+Usage (from the backend directory):
+    python scripts/bench_token_cache.py [--tokens 100] [--requests 100000]
+
+- "verify": jwt_utils.verify_token() (base64, JSON and an HMAC check) on every request.
+- "cached": jwt_utils.token_cache.verify() (one SHA-256 and a dictionary lookup once warm).
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "bench-only-secret")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core import jwt_utils
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark token verification.")
+    parser.add_argument("--tokens", type=int, default=100, help="distinct users (tokens)")
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+
+    tokens = [jwt_utils.create_access_token({"sub": f"user{i}"}) for i in range(args.tokens)]
+    cache = jwt_utils.VerifiedTokenCache()
+    print(f"{args.requests} requests from {args.tokens} users\n")
+    print(f"{'check':<8} {'µs/request':>11} {'requests/s':>12}")
+    for name, check in (("verify", jwt_utils.verify_token), ("cached", cache.verify)):
+        start = time.perf_counter()
+        for i in range(args.requests):
+            assert check(tokens[i % len(tokens)])
+        elapsed = time.perf_counter() - start
+        print(f"{name:<8} {elapsed / args.requests * 1e6:>11.1f} {args.requests / elapsed:>12.0f}")
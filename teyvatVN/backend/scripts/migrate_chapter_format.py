@@ -0,0 +1,64 @@
+"""
+Rewrites every stored chapter in a given storage format.
+
+Usage (from the backend directory):
+    python scripts/migrate_chapter_format.py minified
+    python scripts/migrate_chapter_format.py zstd --data-dir ./data
+
+Files are read in whatever format they currently use and swapped in atomically,
+so the server can keep running while this script works.
+Remember to set CHAPTER_STORAGE_FORMAT to the same value, or new chapters
+will keep being written in the old format.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import CHAPTER_DATA_DIR
+from app.storage import chapter_format
+from app.storage.filesystem import atomic_write
+from app.storage.layout import DataLayout
+
+
+def migrate(data_dir: str, fmt: str, dry_run: bool = False) -> None:
+    print(f"--- Migrating chapters in {data_dir} to '{fmt}' ---")
+    before_total = 0
+    after_total = 0
+    converted = 0
+
+    for username, user_dir in sorted(DataLayout(data_dir).iter_all_users()):
+        for chapter_id in sorted(os.listdir(user_dir)):
+            path = os.path.join(user_dir, chapter_id, "output.json")
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                new_raw = chapter_format.dumps(chapter_format.loads(raw), fmt)
+            except Exception as e:
+                print(f"Skipping {username}/{chapter_id}: {e}")
+                continue
+
+            before_total += len(raw)
+            after_total += len(new_raw)
+            if new_raw != raw:
+                converted += 1
+                if not dry_run:
+                    atomic_write(path, new_raw)
+
+    ratio = before_total / after_total if after_total else 0
+    print(f"Converted {converted} chapters.")
+    print(f"Size: {before_total:,} -> {after_total:,} bytes ({ratio:.1f}x smaller)")
+    if dry_run:
+        print("(dry run, nothing was written)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert stored chapters to another storage format.")
+    parser.add_argument("format", choices=chapter_format.FORMATS)
+    parser.add_argument("--data-dir", default=CHAPTER_DATA_DIR)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    migrate(args.data_dir, args.format, args.dry_run)
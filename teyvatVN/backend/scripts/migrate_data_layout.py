@@ -0,0 +1,82 @@
+"""
+Moves user folders between the flat and the sharded data layout (see app/storage/layout.py).
+
+Usage (from the backend directory):
+    python scripts/migrate_data_layout.py sharded
+    python scripts/migrate_data_layout.py flat --data-dir ./app/common/data
+
+Safe to run while the server is up:
+1.  Set CHAPTER_DATA_LAYOUT to the new layout and restart the server first.
+    It then creates new users in the new layout and still finds everyone else in the old one.
+2.  Run this script. Each user folder is moved with a single rename, so a user's
+    chapters are always all in one place or all in the other.
+3.  It repeats until a pass finds nothing left to move (a chapter saved into an old
+    folder during the move is picked up by the next pass).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import CHAPTER_DATA_DIR, CHAPTER_DATA_LAYOUT
+from app.storage.layout import LAYOUTS, DataLayout
+
+
+def _remove_if_empty(path: str) -> None:
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def migrate(data_dir: str, layout: str, max_passes: int = 5, dry_run: bool = False) -> int:
+    print(f"--- Moving users in {data_dir} to the '{layout}' layout ---")
+    if layout != CHAPTER_DATA_LAYOUT:
+        print(f"Note: CHAPTER_DATA_LAYOUT is '{CHAPTER_DATA_LAYOUT}'. Set it to '{layout}' (and restart the "
+              f"server) or the server will keep creating users in the old layout.")
+
+    data_layout = DataLayout(data_dir, layout)
+    total = 0
+    for number in range(1, max_passes + 1):
+        start = time.perf_counter()
+        pending = [username for username, _ in data_layout.iter_users(data_layout.other)]
+        if dry_run:
+            print(f"{len(pending)} users would be moved (dry run, nothing was moved)")
+            return 0
+        moved = 0
+        for i, username in enumerate(pending, 1):
+            try:
+                moved += data_layout.migrate_user(username)
+            except OSError as e:
+                print(f"Could not move {username}: {e}")
+            if i % 1000 == 0:
+                print(f"  pass {number}: {i}/{len(pending)} users")
+        total += moved
+        print(f"Pass {number}: moved {moved} users in {time.perf_counter() - start:.1f}s")
+        if moved == 0:
+            break
+
+    if layout == "flat":
+        # The server no longer creates shard folders, so the empty ones can go.
+        for first in os.listdir(data_dir):
+            first_dir = os.path.join(data_dir, first)
+            if data_layout.is_shard_dir(first_dir):
+                for second in os.listdir(first_dir):
+                    _remove_if_empty(os.path.join(first_dir, second))
+                _remove_if_empty(first_dir)
+
+    left = sum(1 for _ in data_layout.iter_users(data_layout.other))
+    print(f"Done: {total} users moved, {left} left in the '{data_layout.other}' layout.")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move user folders to another data layout.")
+    parser.add_argument("layout", choices=LAYOUTS)
+    parser.add_argument("--data-dir", default=CHAPTER_DATA_DIR)
+    parser.add_argument("--passes", type=int, default=5)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    migrate(args.data_dir, args.layout, args.passes, args.dry_run)
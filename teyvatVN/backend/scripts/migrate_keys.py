@@ -1,54 +1,69 @@
+"""
+Re-encrypts every stored Gemini API key with the current ENCRYPTION_KEY.
+
+Use it after rotating the key (the server keeps running the whole time):
+    1. python scripts/migrate_keys.py --new-key      # prints a fresh key
+    2. In .env: ENCRYPTION_KEY=<new key>, ENCRYPTION_OLD_KEYS=<old key>; restart the server.
+    3. python scripts/migrate_keys.py [--batch-size 500]
+    4. Once it reports "done", remove ENCRYPTION_OLD_KEYS and restart.
+
+Keys saved in plain text (before encryption was added) are encrypted as well.
+The job can be stopped at any time; running it again continues where it stopped.
+"""
+import argparse
 import os
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import User
-import security
-
-def migrate_keys():
-    print("--- Starting API Key Encryption Migration ---")
-    db = SessionLocal()
-    try:
-        users = db.query(User).all()
-        print(f"Found {len(users)} users.")
-        
-        count = 0
-        for user in users:
-            if user.gemini_api_key:
-                # Check if already encrypted? 
-                # Fernet tokens start with gAAAAA... usually.
-                # But to be safe, we can try to decrypt. If it fails, it's likely plaintext.
-                # OR, we just assume this is a one-time migration and everything is plaintext.
-                # Let's try to decrypt. If it works, skip. If it fails, encrypt.
-                
-                try:
-                    # If this succeeds, it's likely already encrypted
-                    decrypted = security.decrypt_value(user.gemini_api_key)
-                    # If decrypt returns the same value (our fallback), then it wasn't encrypted properly or failed
-                    # But our decrypt_value returns original on failure.
-                    # So we need a way to distinguish.
-                    # Let's modify security.py temporarily or just check prefix?
-                    # Fernet tokens are base64url encoded.
-                    # Let's just assume plaintext for now as we just implemented encryption.
-                    # But wait, if I run this twice, I double encrypt.
-                    # Let's check if it starts with gAAAAA.
-                    if user.gemini_api_key.startswith("gAAAAA"):
-                        print(f"User {user.username}: Key appears already encrypted. Skipping.")
-                        continue
-                        
-                    print(f"User {user.username}: Encrypting key...")
-                    encrypted = security.encrypt_value(user.gemini_api_key)
-                    user.gemini_api_key = encrypted
-                    count += 1
-                except Exception as e:
-                    print(f"Error processing user {user.username}: {e}")
-        
-        db.commit()
-        print(f"Migration complete. Encrypted {count} keys.")
-        
-    except Exception as e:
-        print(f"Migration failed: {e}")
-    finally:
-        db.close()
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from cryptography.fernet import Fernet
+
+from app.core import security
+from app.core.database import SessionLocal
+from app.core.migrations import upgrade_database
+from app.services.key_rotation import (
+    DEFAULT_BATCH_SIZE,
+    count_users_with_keys,
+    reencrypt_api_keys,
+    rotation_status,
+)
+
+
+def _print_progress(total: int):
+    def report(status: dict) -> None:
+        percent = 100.0 * status["checked"] / total if total else 100.0
+        print(f"  up to user {status['last_user_id']}: {status['checked']}/{total} checked ({percent:.1f}%), "
+              f"{status['rotated']} re-encrypted, {status['failed']} unreadable")
+    return report
+
 
 if __name__ == "__main__":
-    migrate_keys()
+    parser = argparse.ArgumentParser(description="Re-encrypt stored API keys with the current ENCRYPTION_KEY.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Users per batch (one commit each)")
+    parser.add_argument("--restart", action="store_true", help="Start over instead of resuming")
+    parser.add_argument("--status", action="store_true", help="Only show the progress so far")
+    parser.add_argument("--new-key", action="store_true", help="Print a new key to rotate to, and exit")
+    args = parser.parse_args()
+
+    if args.new_key:
+        print(Fernet.generate_key().decode())
+        sys.exit(0)
+
+    upgrade_database()  # makes sure the progress table exists
+    with SessionLocal() as db:
+        total = count_users_with_keys(db)
+        status = rotation_status(db)
+    if args.status:
+        print(status or "Not started for the current ENCRYPTION_KEY.")
+        sys.exit(0)
+
+    if status and status["finished_at"] and not args.restart:
+        print(f"Already done for this key: {status}")
+        sys.exit(0)
+    print(f"Re-encrypting API keys of {total} users with key {security.primary_key_id()}"
+          f"{' (resuming)' if status and not args.restart else ''}...")
+    final = reencrypt_api_keys(SessionLocal, batch_size=args.batch_size, restart=args.restart,
+                               on_batch=_print_progress(total))
+    print(f"Done: {final['rotated']} re-encrypted, {final['failed']} unreadable (left as is).")
+    if final["failed"]:
+        print("Unreadable keys were encrypted with a key that is no longer configured; those users must re-enter them.")
@@ -0,0 +1,45 @@
+"""
+Writes .gz (and .br) copies of the files under the /data folder (STATIC_DATA_DIR).
+
+Run it again after adding or changing files there: a copy older than its file is ignored.
+
+Usage (from the backend directory):
+    python scripts/precompress_data.py [--data-dir STATIC_DATA_DIR]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.common.static_files import write_precompressed
+from app.core.config import STATIC_DATA_DIR
+from app.storage import chapter_format
+
+# Text files compress well; images and audio are already compressed.
+COMPRESSIBLE = (".json", ".txt", ".html", ".css", ".js", ".svg")
+
+
+def precompress(data_dir: str) -> int:
+    written = 0
+    for root, dirs, files in os.walk(data_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]  # skip the trash
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                raw = f.read()
+            if raw.startswith(chapter_format.MAGIC):
+                continue  # Stored compressed (gzip/zstd format): not servable as is.
+            write_precompressed(path, raw)
+            written += 1
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompress the files served under /data.")
+    parser.add_argument("--data-dir", default=STATIC_DATA_DIR)
+    args = parser.parse_args()
+
+    print(f"Precompressed {precompress(args.data_dir)} files in {args.data_dir}")
@@ -0,0 +1,10 @@
+"""
+Shared test setup: the settings the app refuses to start without.
+"""
+import os
+
+from cryptography.fernet import Fernet
+
+# Read by app/core/config.py on first import, so they must be set before any app module loads.
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
@@ -0,0 +1,74 @@
+"""
+Tests for API key decryption errors and the decrypted-key cache (app/core/security.py).
+"""
+import asyncio
+
+import httpx
+import pytest
+from cryptography.fernet import Fernet
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import jwt_utils, security
+from app.core.database import get_async_db
+from app.routers import ai
+from app.services import ai_service, auth_service
+from app.services.user_cache import UserRecord
+from app.storage import get_chapter_store
+from app.storage.memory import MemoryChapterStore
+
+
+def test_undecryptable_values_raise_distinct_errors():
+    assert security.decrypt_value(security.encrypt_value("AIza-secret")) == "AIza-secret"
+    with pytest.raises(security.NotEncryptedError):
+        security.decrypt_value("AIza-saved-before-encryption")
+    with pytest.raises(security.WrongKeyError):
+        security.decrypt_value(Fernet(Fernet.generate_key()).encrypt(b"AIza-secret").decode())
+
+
+def test_cache_is_keyed_by_user_and_ciphertext(monkeypatch):
+    cache = security.DecryptedKeyCache(ttl=60)
+    calls = []
+    real_decrypt = security.decrypt_value
+    monkeypatch.setattr(security, "decrypt_value", lambda value: calls.append(value) or real_decrypt(value))
+
+    first, second = security.encrypt_value("key-one"), security.encrypt_value("key-two")
+    assert cache.get(1, first) == "key-one"
+    assert cache.get(1, first) == "key-one"
+    assert len(calls) == 1
+    assert cache.get(1, second) == "key-two"  # a changed key in the database is never served stale
+    cache.invalidate(1)
+    assert cache.get(1, second) == "key-two"
+    assert len(calls) == 3
+
+    with pytest.raises(security.DecryptionError):
+        cache.get(2, "not-encrypted")
+    assert cache.stats()["failures"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_unreadable_key_stops_generation_before_gemini(monkeypatch):
+    record = UserRecord(id=7, username="diluc", email="diluc@dawnwinery.com", hashed_password="x",
+                        is_active=True, gemini_api_key="not-encrypted", created_at=None)
+    async def get_record(db, username):
+        return record
+
+    monkeypatch.setattr(auth_service, "get_user_record_async", get_record)
+    monkeypatch.setattr(ai_service, "generate_chapter_from_prompt", lambda *a, **k: pytest.fail("AI called"))
+    monkeypatch.setattr(ai, "reserve_generation", lambda *a, **k: pytest.fail("quota reserved"))
+
+    app = FastAPI()
+    app.include_router(ai.router)
+    store = MemoryChapterStore()
+    app.dependency_overrides[get_chapter_store] = lambda: store
+    app.dependency_overrides[get_async_db] = lambda: AsyncSession()  # never queried: the lookup is patched
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            token = jwt_utils.create_access_token({"sub": "diluc"})
+            return await client.post("/api/generate", json={"prompt": "Wine tasting", "username": "diluc"},
+                                     headers={"Authorization": f"Bearer {token}"})
+
+    response = asyncio.run(run())
+    assert response.status_code == 409
+    assert store.allocate_chapter_id("diluc") == "chapter1"  # no chapter ID was used up either
@@ -0,0 +1,62 @@
+"""
+Tests for the parsed-chapter cache (app/storage/chapter_cache.py)
+as used by the filesystem chapter store.
+"""
+import json
+import os
+import time
+
+from app.storage.chapter_cache import ChapterCache
+from app.storage.filesystem import FilesystemChapterStore
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return os.stat(path)
+
+
+def test_lru_is_bounded_by_bytes(tmp_path):
+    cache = ChapterCache(max_bytes=100)
+    stat_a = _write(str(tmp_path / "a.json"), {"x": "a" * 40})
+    stat_b = _write(str(tmp_path / "b.json"), {"x": "b" * 40})
+    stat_c = _write(str(tmp_path / "c.json"), {"x": "c" * 40})
+
+    cache.put("a", {"x": "a"}, stat_a)
+    cache.put("b", {"x": "b"}, stat_b)
+    assert cache.get("a", stat_a) is not None  # 'a' is now the most recent
+
+    cache.put("c", {"x": "c"}, stat_c)  # over budget -> evicts 'b'
+    assert cache.get("b", stat_b) is None
+    assert cache.get("a", stat_a) is not None
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= 100
+
+
+def test_stale_entry_is_dropped_when_file_changes(tmp_path):
+    cache = ChapterCache(max_bytes=1024)
+    path = str(tmp_path / "chapter.json")
+    stat = _write(path, {"title": "Old"})
+    cache.put("k", {"title": "Old"}, stat)
+
+    new_stat = _write(path, {"title": "A much longer new title"})
+    assert cache.get("k", new_stat) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_store_reads_through_the_cache(tmp_path):
+    store = FilesystemChapterStore(str(tmp_path))
+
+    assert store.read("alice", "chapter1") is None
+
+    store.write("alice", "chapter1", {"title": "First", "segments": []})
+    assert store.read("alice", "chapter1")["title"] == "First"
+    assert store.cache.hits == 1
+
+    # Out-of-band edit: the cache must notice the new mtime/size.
+    time.sleep(0.01)
+    _write(store.chapter_file("alice", "chapter1"), {"title": "Edited by hand", "segments": []})
+    assert store.read("alice", "chapter1")["title"] == "Edited by hand"
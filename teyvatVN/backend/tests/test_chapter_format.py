@@ -0,0 +1,32 @@
+"""
+Tests for the chapter storage formats (app/storage/chapter_format.py).
+"""
+import pytest
+
+from app.storage import chapter_format
+from app.storage.filesystem import FilesystemChapterStore
+
+SAMPLE = {
+    "title": "Café at Angel's Share",
+    "characters": ["Diluc", "Kaeya"],
+    "segments": [{"type": "dialogue", "speaker": "Kaeya", "line": "Another round?"}] * 20,
+}
+
+
+@pytest.mark.parametrize("fmt", chapter_format.FORMATS)
+def test_round_trip_and_detection(fmt):
+    if fmt == "zstd" and chapter_format.zstandard is None:
+        pytest.skip("zstandard not installed")
+    raw = chapter_format.dumps(SAMPLE, fmt)
+    assert chapter_format.loads(raw) == SAMPLE
+    assert chapter_format.detect_format(raw) == ("json" if fmt == "minified" else fmt)
+
+
+def test_reader_handles_mixed_formats(tmp_path):
+    FilesystemChapterStore(str(tmp_path), storage_format="gzip").write("alice", "chapter1", SAMPLE)
+    FilesystemChapterStore(str(tmp_path), storage_format="json").write("alice", "chapter2", SAMPLE)
+
+    store = FilesystemChapterStore(str(tmp_path), storage_format="minified")
+    assert store.read("alice", "chapter1") == SAMPLE
+    assert store.read("alice", "chapter2") == SAMPLE
+    assert [c["title"] for c in store.list_chapters("alice")[0]] == [SAMPLE["title"]] * 2
@@ -0,0 +1,46 @@
+"""
+Tests for the filesystem driver's atomic chapter-ID allocator.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.storage.filesystem import FilesystemChapterStore
+
+
+def _allocate_many(data_dir, count, queue):
+    store = FilesystemChapterStore(data_dir)
+    for _ in range(count):
+        queue.put(store.allocate_chapter_id("alice"))
+
+
+def test_counter_is_seeded_from_existing_folders(tmp_path):
+    store = FilesystemChapterStore(str(tmp_path))
+    for n in (1, 2, 7):
+        os.makedirs(tmp_path / "alice" / f"chapter{n}")
+
+    assert store.next_chapter_id("alice") == "chapter8"
+    assert store.allocate_chapter_id("alice") == "chapter8"
+    assert store.allocate_chapter_id("alice") == "chapter9"
+    assert store.next_chapter_id("alice") == "chapter10"
+
+
+def test_concurrent_allocations_never_collide(tmp_path):
+    store = FilesystemChapterStore(str(tmp_path))
+
+    # Threads in this process...
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda _: store.allocate_chapter_id("alice"), range(40)))
+
+    # ...and separate worker processes.
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    workers = [ctx.Process(target=_allocate_many, args=(str(tmp_path), 20, queue)) for _ in range(3)]
+    for w in workers:
+        w.start()
+    ids += [queue.get(timeout=10) for _ in range(60)]
+    for w in workers:
+        w.join()
+
+    assert len(set(ids)) == 100
+    assert sorted(int(i[len("chapter"):]) for i in ids) == list(range(1, 101))
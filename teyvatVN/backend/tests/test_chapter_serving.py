@@ -0,0 +1,53 @@
+"""
+Tests for serving chapters without parsing them (GET /api/chapter/{username}/{chapter_id}).
+"""
+import asyncio
+import os
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core import jwt_utils
+from app.routers import story
+from app.storage import get_chapter_store
+from app.storage.filesystem import FilesystemChapterStore
+
+CHAPTER = {"title": "Mondstadt", "segments": [{"type": "dialogue", "speaker": "Venti", "line": "Ehe ♪"}]}
+
+# The chapter endpoints only answer their owner.
+AS_ALICE = {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': 'alice'})}"}
+
+
+def _get(store, path):
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=AS_ALICE) as client:
+            return await client.get(path)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("storage_format", ["json", "gzip"])
+def test_stored_bytes_are_wrapped_in_the_envelope(tmp_path, storage_format):
+    store = FilesystemChapterStore(str(tmp_path), storage_format=storage_format)
+    store.write("alice", "chapter1", CHAPTER)
+
+    response = _get(store, "/api/chapter/alice/chapter1")
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == {"message": "Loaded", "data": CHAPTER}
+    # The chapter was never parsed: the parsed-chapter cache wasn't even consulted.
+    assert store.cache.hits == 0 and store.cache.misses == 0
+
+    assert _get(store, "/api/chapter/alice/chapter9").json() == {"message": "Chapter not found", "data": None}
+
+
+def test_hand_saved_file_with_byte_order_mark(tmp_path):
+    store = FilesystemChapterStore(str(tmp_path))
+    os.makedirs(tmp_path / "alice" / "chapter1")
+    (tmp_path / "alice" / "chapter1" / "output.json").write_bytes(b'\xef\xbb\xbf{"title": "BOM"}')
+    assert _get(store, "/api/chapter/alice/chapter1").json()["data"] == {"title": "BOM"}
@@ -0,0 +1,196 @@
+"""
+Conformance tests for the chapter storage drivers (app/storage/).
+
+Every driver runs the same tests, so switching CHAPTER_STORE never changes behaviour.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.storage.filesystem import FilesystemChapterStore
+from app.storage.memory import MemoryChapterStore
+from app.storage.sqlite import SQLiteChapterStore
+
+
+@pytest.fixture(params=["filesystem", "filesystem-sharded", "sqlite", "memory"])
+def store(request, tmp_path):
+    if request.param == "filesystem":
+        store = FilesystemChapterStore(str(tmp_path / "data"))
+    elif request.param == "filesystem-sharded":
+        store = FilesystemChapterStore(str(tmp_path / "data"), layout="sharded")
+    elif request.param == "sqlite":
+        store = SQLiteChapterStore(str(tmp_path / "chapters.db"))
+    else:
+        store = MemoryChapterStore()
+    yield store
+    store.close()
+
+
+def _chapter(title):
+    return {"title": title, "characters": ["Paimon"], "backgrounds": ["Mondstadt"], "segments": []}
+
+
+def test_read_write_delete(store):
+    assert store.read("alice", "chapter1") is None
+    assert store.delete("alice", "chapter1") is False
+
+    store.write("alice", "chapter1", _chapter("First"))
+    assert store.read("alice", "chapter1") == _chapter("First")
+    assert store.read("bob", "chapter1") is None
+
+    store.write("alice", "chapter1", _chapter("Renamed"))
+    assert store.read("alice", "chapter1")["title"] == "Renamed"
+
+    assert store.delete("alice", "chapter1") is True
+    assert store.read("alice", "chapter1") is None
+    assert store.count("alice") == 0
+
+
+def test_read_json_bytes_matches_read(store):
+    store.write("alice", "chapter1", {"title": "Ünïcode", "segments": [{"type": "narration", "text": "Hi"}]})
+    assert json.loads(store.read_json_bytes("alice", "chapter1")) == store.read("alice", "chapter1")
+    assert store.read_json_bytes("alice", "chapter2") is None
+
+
+def test_written_data_is_copied(store):
+    data = _chapter("Original")
+    store.write("alice", "chapter1", data)
+    data["title"] = "Changed after saving"
+    assert store.read("alice", "chapter1")["title"] == "Original"
+
+
+def test_list_orders_and_pages(store):
+    for n in (1, 2, 10, 3):
+        store.write("alice", f"chapter{n}", _chapter(f"Chapter {n}"))
+    store.write("bob", "chapter1", _chapter("Not Alice's"))
+    assert store.count("alice") == 4
+
+    entries, cursor = store.list_chapters("alice")
+    assert [e["chapter_id"] for e in entries] == ["chapter10", "chapter3", "chapter2", "chapter1"]
+    assert cursor is None
+    assert entries[0]["characters"] == ["Paimon"]
+
+    # created_at follows write order, newest first.
+    entries, _ = store.list_chapters("alice", order="created_at")
+    assert [e["chapter_id"] for e in entries] == ["chapter3", "chapter10", "chapter2", "chapter1"]
+
+    seen, cursor = [], None
+    while True:
+        entries, cursor = store.list_chapters("alice", limit=3, cursor=cursor)
+        seen += [e["chapter_id"] for e in entries]
+        if cursor is None:
+            break
+    assert seen == ["chapter10", "chapter3", "chapter2", "chapter1"]
+
+
+def test_list_rejects_bad_order_and_cursor(store):
+    with pytest.raises(ValueError):
+        store.list_chapters("alice", order="title")
+    with pytest.raises(ValueError):
+        store.list_chapters("alice", cursor="not-a-cursor")
+
+
+def test_allocation_is_seeded_and_unique(store):
+    assert store.next_chapter_id("alice") == "chapter1"
+    store.write("alice", "chapter5", _chapter("Imported"))
+    assert store.allocate_chapter_id("alice") == "chapter6"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda _: store.allocate_chapter_id("alice"), range(30)))
+    assert sorted(ids, key=lambda i: int(i[len("chapter"):])) == [f"chapter{n}" for n in range(7, 37)]
+    assert store.next_chapter_id("alice") == "chapter37"
+    assert store.next_chapter_id("bob") == "chapter1"
+
+
+@pytest.mark.parametrize("username, chapter_id", [("..", "chapter1"), ("alice", "../bob"), ("", "chapter1"), ("a/b", "c")])
+def test_names_that_escape_are_rejected(store, username, chapter_id):
+    with pytest.raises(ValueError):
+        store.write(username, chapter_id, _chapter("Nope"))
+    with pytest.raises(ValueError):
+        store.read(username, chapter_id)
+
+
+def test_revision_records_round_trip(store):
+    assert store.load_revisions("alice", "chapter1") == []
+    store.write("alice", "chapter1", _chapter("First"))
+    store.append_revision("alice", "chapter1", {"rev": 1, "kind": "snapshot", "data": _chapter("First")})
+    store.append_revision("alice", "chapter1", {"rev": 2, "kind": "delta", "set": {"title": "Ünïcode"}})
+    assert [r["rev"] for r in store.load_revisions("alice", "chapter1")] == [1, 2]
+
+    store.replace_revisions("alice", "chapter1", [{"rev": 2, "kind": "snapshot", "data": {}}])
+    assert store.load_revisions("alice", "chapter1") == [{"rev": 2, "kind": "snapshot", "data": {}}]
+
+    # History survives a soft delete and goes away with the purge.
+    store.delete("alice", "chapter1")
+    assert store.restore("alice", "chapter1")
+    assert len(store.load_revisions("alice", "chapter1")) == 1
+    store.delete("alice", "chapter1")
+    store.purge_deleted(time.time() + 1)
+    assert store.load_revisions("alice", "chapter1") == []
+
+
+def test_delete_moves_to_trash_and_restore_brings_back(store):
+    store.write("alice", "chapter1", _chapter("Keep me"))
+    store.write("alice", "chapter2", _chapter("Other"))
+    assert store.delete("alice", "chapter1")
+    assert not store.delete("alice", "chapter1")
+
+    assert store.read("alice", "chapter1") is None
+    assert store.count("alice") == 1
+    assert [e["chapter_id"] for e in store.list_deleted("alice")] == ["chapter1"]
+    assert store.list_deleted("alice")[0]["title"] == "Keep me"
+    # A trashed chapter's ID is never handed out again.
+    assert store.allocate_chapter_id("alice") == "chapter3"
+
+    assert store.restore("alice", "chapter1")
+    assert store.read("alice", "chapter1")["title"] == "Keep me"
+    assert store.count("alice") == 2
+    assert store.list_deleted("alice") == []
+    assert not store.restore("alice", "chapter9")
+
+
+def test_restore_refuses_to_overwrite(store):
+    store.write("alice", "chapter1", _chapter("Old"))
+    store.delete("alice", "chapter1")
+    store.write("alice", "chapter1", _chapter("New"))
+    with pytest.raises(FileExistsError):
+        store.restore("alice", "chapter1")
+    assert store.read("alice", "chapter1")["title"] == "New"
+
+
+def test_purge_only_removes_expired_trash(store):
+    store.write("alice", "chapter1", _chapter("Old"))
+    store.write("bob", "chapter1", _chapter("Live"))
+    store.delete("alice", "chapter1")
+    assert store.purge_deleted(time.time() - 3600) == {"chapters": 0, "bytes_reclaimed": 0}
+
+    result = store.purge_deleted(time.time() + 1)
+    assert result["chapters"] == 1 and result["bytes_reclaimed"] > 0
+    assert store.list_deleted("alice") == []
+    assert not store.restore("alice", "chapter1")
+    assert store.read("bob", "chapter1")["title"] == "Live"
+
+
+def test_bulk_allocation_and_writes(store):
+    store.write("alice", "chapter2", _chapter("Existing"))
+    ids = store.allocate_chapter_ids("alice", 3)
+    assert ids == ["chapter3", "chapter4", "chapter5"]
+
+    store.write_many("alice", [(chapter_id, _chapter(chapter_id)) for chapter_id in ids])
+    assert store.count("alice") == 4
+    assert store.read_uncached("alice", "chapter5")["title"] == "chapter5"
+    assert store.allocate_chapter_id("alice") == "chapter6"
+
+
+def test_memory_store_allocates_from_its_counter(monkeypatch):
+    store = MemoryChapterStore()
+    store.write_many("alice", [(f"chapter{n}", _chapter(str(n))) for n in range(1, 1001)])
+    assert store.allocate_chapter_id("alice") == "chapter1001"
+
+    # From now on the counter is used, not a scan of the library.
+    monkeypatch.setattr(store, "_seed_number", lambda username: pytest.fail("library scanned"))
+    store.write("alice", "chapter1002", _chapter("Copied in"))
+    store.delete("alice", "chapter1002")  # trashed, but it may come back
+    assert store.allocate_chapter_id("alice") == "chapter1003"
@@ -0,0 +1,106 @@
+"""
+Tests for the bearer token dependencies and the verified token cache
+(app/core/current_user.py, app/core/jwt_utils.py).
+"""
+import asyncio
+from datetime import timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core import jwt_utils
+from app.core.jwt_utils import VerifiedTokenCache
+from app.routers import story
+from app.storage import get_chapter_store
+from app.storage.memory import MemoryChapterStore
+
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_tokens_are_verified_once_and_rejected_when_invalid(monkeypatch):
+    cache = VerifiedTokenCache(ttl=60)
+    calls = []
+    verify = jwt_utils.verify_token
+    monkeypatch.setattr(jwt_utils, "verify_token", lambda token: calls.append(token) or verify(token))
+
+    token = jwt_utils.create_access_token({"sub": "nahida"})
+    user = cache.verify(token)
+    assert user.username == "nahida" and user.claims["sub"] == "nahida"
+    assert cache.verify(token) is user
+    assert len(calls) == 1
+    with pytest.raises(TypeError):
+        user.claims["sub"] = "scaramouche"  # shared between requests: read-only
+
+    expired = jwt_utils.create_access_token({"sub": "nahida"}, expires_delta=timedelta(seconds=-1))
+    partial = jwt_utils.create_partial_token({"sub": "nahida", "email": "nahida@sumeru.org"})
+    assert cache.verify(expired) is None
+    assert cache.verify(partial) is None
+    assert cache.verify(token[:-2] + "xx") is None
+    assert cache.stats()["rejections"] == 3
+    assert cache.stats()["entries"] == 1
+
+
+def test_cached_tokens_still_expire():
+    cache = VerifiedTokenCache(ttl=60)
+    token = jwt_utils.create_access_token({"sub": "nahida"}, expires_delta=timedelta(seconds=30))
+    assert cache.verify(token) is not None
+    # Trusted until the token's own expiry, even though the TTL is longer.
+    trusted_until, user = next(iter(cache._entries.values()))
+    assert trusted_until == user.expires_at
+
+
+def test_chapter_endpoints_only_answer_their_owner():
+    store = MemoryChapterStore()
+    store.write("alice", "chapter1", {"title": "Mine", "segments": []})
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+    alice = _bearer(jwt_utils.create_access_token({"sub": "alice"}))
+    bob = _bearer(jwt_utils.create_access_token({"sub": "bob"}))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                await client.get("/api/chapter/alice/chapter1"),
+                await client.get("/api/chapter/alice/chapter1", headers=_bearer("not-a-token")),
+                await client.get("/api/chapter/alice/chapter1", headers=bob),
+                await client.delete("/api/chapter/alice/chapter1", headers=bob),
+                await client.get("/api/chapter/alice/chapter1", headers=alice),
+            ]
+
+    anonymous, invalid, other, other_delete, owner = asyncio.run(run())
+    assert anonymous.status_code == invalid.status_code == 401
+    assert anonymous.headers["www-authenticate"] == "Bearer"
+    assert other.status_code == other_delete.status_code == 403
+    assert owner.status_code == 200 and owner.json()["data"]["title"] == "Mine"
+    assert store.read("alice", "chapter1") is not None
+
+
+def test_the_library_list_only_answers_its_owner():
+    store = MemoryChapterStore()
+    store.write("alice", "chapter1", {"title": "Mine", "segments": []})
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+    alice = _bearer(jwt_utils.create_access_token({"sub": "alice"}))
+    bob = _bearer(jwt_utils.create_access_token({"sub": "bob"}))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                await client.get("/api/library/alice"),
+                await client.get("/api/library/alice", headers=bob),
+                await client.get("/api/library/alice", headers=alice),
+            ]
+
+    # No database behind this app: the owner comes from the token, not a user lookup.
+    anonymous, other, owner = asyncio.run(run())
+    assert anonymous.status_code == 401
+    assert other.status_code == 403
+    assert owner.status_code == 200
+    assert [c["chapter_id"] for c in owner.json()["chapters"]] == ["chapter1"]
@@ -0,0 +1,55 @@
+"""
+Tests for the flat and sharded data folder layouts (app/storage/layout.py).
+"""
+import os
+
+from app.storage.filesystem import FilesystemChapterStore
+from app.storage.layout import DataLayout, shard_of
+
+
+def _chapter(title):
+    return {"title": title, "segments": []}
+
+
+def test_sharded_paths(tmp_path):
+    layout = DataLayout(str(tmp_path), "sharded")
+    first, second = shard_of("alice")
+    assert len(first) == len(second) == 2
+    assert layout.user_dir("alice") == os.path.join(str(tmp_path), first, second, "alice")
+    assert DataLayout(str(tmp_path), "flat").user_dir("alice") == os.path.join(str(tmp_path), "alice")
+
+
+def test_migration_keeps_every_user_reachable(tmp_path):
+    flat = FilesystemChapterStore(str(tmp_path), layout="flat")
+    for username in ("alice", "bob", "ab"):  # 'ab' looks like a shard folder
+        flat.write(username, "chapter1", _chapter(f"{username} 1"))
+        flat.allocate_chapter_ids(username, 3)
+
+    # The server switches to the sharded layout before anything is moved.
+    store = FilesystemChapterStore(str(tmp_path), layout="sharded")
+    assert store.read("alice", "chapter1")["title"] == "alice 1"
+    assert store.count("bob") == 1
+
+    assert store.layout.migrate_user("alice")
+    store.write("carol", "chapter1", _chapter("carol 1"))  # new users go straight to a shard
+    for username, _ in list(store.layout.iter_users("flat")):
+        store.layout.migrate_user(username)
+
+    assert list(store.layout.iter_users("flat")) == []
+    assert sorted(u for u, _ in store.layout.iter_users()) == ["ab", "alice", "bob", "carol"]
+    for username in ("alice", "bob", "ab"):
+        assert store.read(username, "chapter1")["title"] == f"{username} 1"
+        assert store.allocate_chapter_id(username) == "chapter5"  # the counter moved too
+    assert store.count("alice") == 1
+
+
+def test_migration_merges_into_an_existing_folder(tmp_path):
+    FilesystemChapterStore(str(tmp_path), layout="flat").write("alice", "chapter1", _chapter("Old"))
+    store = FilesystemChapterStore(str(tmp_path), layout="sharded")
+    # Written to the sharded folder by hand while the flat one still exists.
+    os.makedirs(store.layout.path_in("alice", "sharded"))
+    store.write("alice", "chapter2", _chapter("New"))
+
+    assert store.layout.migrate_user("alice")
+    assert not os.path.exists(store.layout.path_in("alice", "flat"))
+    assert {e["title"] for e in store.list_chapters("alice")[0]} == {"Old", "New"}
@@ -0,0 +1,170 @@
+"""
+Tests for Google ID token verification and the cached signing keys (app/core/google_auth.py),
+against a local stand-in for Google's token and key endpoints.
+"""
+import asyncio
+import base64
+import time
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI, HTTPException, Response
+from jose import jwt
+
+from app.common import http_client
+from app.core import google_auth
+from app.core.google_auth import GoogleKeyCache, cache_lifetime, verify_google_id_token
+
+CLIENT_ID = "teyvat-test.apps.googleusercontent.com"
+
+
+def _b64(number):
+    raw = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _rsa_key(kid):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption()).decode()
+    numbers = private.public_key().public_numbers()
+    jwk = {"kty": "RSA", "alg": "RS256", "use": "sig", "kid": kid, "n": _b64(numbers.n), "e": _b64(numbers.e)}
+    return pem, jwk
+
+
+class FakeGoogle:
+    """Serves /certs (with a Cache-Control header) and /token, counting the key fetches."""
+
+    def __init__(self, cache_control="public, max-age=600"):
+        self.pem, self.jwk = _rsa_key("key-1")
+        self.cache_control = cache_control
+        self.cert_fetches = 0
+        self.claims = {}
+        self.app = FastAPI()
+
+        @self.app.get("/certs")
+        async def certs(response: Response):
+            self.cert_fetches += 1
+            response.headers["Cache-Control"] = self.cache_control
+            return {"keys": [self.jwk]}
+
+        @self.app.post("/token")
+        async def token():
+            if not self.claims:
+                raise HTTPException(status_code=400)
+            return {"access_token": "ya29.fake", "id_token": self.id_token(**self.claims)}
+
+    def id_token(self, pem=None, kid="key-1", **overrides):
+        now = int(time.time())
+        claims = {"iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "1234", "iat": now,
+                  "exp": now + 3600, "email": "lumine@teyvat.org", "email_verified": True, "name": "Lumine"}
+        claims.update(overrides)
+        return jwt.encode(claims, pem or self.pem, algorithm="RS256", headers={"kid": kid})
+
+    def client(self):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://google.test")
+
+
+@pytest.fixture
+def google(monkeypatch):
+    fake = FakeGoogle()
+    monkeypatch.setattr(google_auth, "GOOGLE_CLIENT_ID", CLIENT_ID)
+    return fake
+
+
+def test_cache_lifetime_follows_cache_control():
+    assert cache_lifetime("public, max-age=19462, must-revalidate, no-transform") == 19462
+    assert cache_lifetime("no-store", default=50) == 0
+    assert cache_lifetime("private, no-cache, max-age=100", default=50) == 0
+    assert cache_lifetime("s-maxage=100", default=50) == 50
+    assert cache_lifetime(None, default=50) == 50
+
+
+def test_keys_are_fetched_once_and_bad_tokens_are_refused(google):
+    async def run():
+        async with google.client() as client:
+            keys = GoogleKeyCache("http://google.test/certs", client=client)
+            for _ in range(3):
+                claims = await verify_google_id_token(google.id_token(), keys)
+                assert claims["email"] == "lumine@teyvat.org"
+            fetches_after_logins = google.cert_fetches
+
+            other_pem, _ = _rsa_key("key-1")
+            bad_tokens = [
+                google.id_token(pem=other_pem),  # forged: signed with someone else's key
+                google.id_token(aud="someone-else.apps.googleusercontent.com"),
+                google.id_token(iss="https://evil.example.com"),
+                google.id_token(exp=int(time.time()) - 60),
+                google.id_token(email_verified=False),
+                jwt.encode({"aud": CLIENT_ID, "iss": "accounts.google.com"}, "secret", algorithm="HS256"),
+                "not-a-token",
+            ]
+            for token in bad_tokens:
+                with pytest.raises(HTTPException) as error:
+                    await verify_google_id_token(token, keys)
+                assert error.value.status_code == 401
+
+            # Unknown key IDs don't make us ask Google again right after a fetch...
+            for _ in range(3):
+                with pytest.raises(HTTPException):
+                    await verify_google_id_token(google.id_token(kid="key-2"), keys)
+            assert google.cert_fetches == 1
+
+            # ...but once a while has passed, a token signed with Google's new key is accepted.
+            keys.min_refresh_interval = 0
+            new_pem, new_jwk = _rsa_key("key-2")
+            google.jwk = new_jwk
+            claims = await verify_google_id_token(google.id_token(pem=new_pem, kid="key-2"), keys)
+            assert claims["sub"] == "1234"
+            return fetches_after_logins, keys.stats()
+
+    fetches_after_logins, stats = asyncio.run(run())
+    assert fetches_after_logins == 1
+    assert google.cert_fetches == 2
+    assert stats["keys"] == 1 and stats["fetches"] == 2 and stats["unknown_kids"] == 4
+
+
+def test_keys_are_refetched_when_google_says_not_to_cache(google):
+    google.cache_control = "no-cache, no-store, max-age=0"
+
+    async def run():
+        async with google.client() as client:
+            keys = GoogleKeyCache("http://google.test/certs", client=client)
+            for _ in range(2):
+                await verify_google_id_token(google.id_token(), keys)
+
+    asyncio.run(run())
+    assert google.cert_fetches == 2
+
+
+def test_callback_exchanges_the_code_through_the_shared_client(google, monkeypatch):
+    monkeypatch.setattr(google_auth, "GOOGLE_CLIENT_SECRET", "shh")
+    monkeypatch.setattr(google_auth, "GOOGLE_TOKEN_URL", "http://google.test/token")
+    google.claims = {"name": "Aether", "email": "aether@teyvat.org"}
+
+    async def run():
+        client = http_client.start_http_client(google.client())
+        monkeypatch.setattr(google_auth, "google_keys", GoogleKeyCache("http://google.test/certs"))
+        try:
+            first = await google_auth.google_callback("code-1")
+            second = await google_auth.google_callback("code-2")
+        finally:
+            await http_client.close_http_client()
+        return client, first, second
+
+    client, first, second = asyncio.run(run())
+    assert first["email"] == second["email"] == "aether@teyvat.org"
+    assert first["name"] == "Aether"
+    assert google.cert_fetches == 1
+    assert client.is_closed
+
+
+def test_shared_client_is_pooled_with_timeouts():
+    client = http_client.create_http_client()
+    try:
+        assert client.timeout.connect == http_client.HTTP_CONNECT_TIMEOUT
+        assert client.timeout.read == http_client.HTTP_TIMEOUT
+    finally:
+        asyncio.run(client.aclose())
@@ -0,0 +1,77 @@
+"""
+Tests for encryption key rotation (app/core/security.py, app/services/key_rotation.py).
+"""
+import pytest
+from cryptography.fernet import Fernet, MultiFernet
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import security
+from app.core.database import Base
+from app.models.sql import User
+from app.services.key_rotation import reencrypt_api_keys, rotation_status
+
+OLD_KEY, NEW_KEY = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+
+
+def _use_keys(monkeypatch, primary, *old):
+    """Configures the keys the way ENCRYPTION_KEY / ENCRYPTION_OLD_KEYS would."""
+    monkeypatch.setattr(security, "ENCRYPTION_KEY", primary)
+    monkeypatch.setattr(security, "primary_cipher", Fernet(primary.encode()))
+    monkeypatch.setattr(security, "cipher_suite", MultiFernet([Fernet(k.encode()) for k in (primary, *old)]))
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_old_keys_still_decrypt_and_new_values_use_the_new_key(monkeypatch):
+    _use_keys(monkeypatch, OLD_KEY)
+    stored = security.encrypt_value("AIza-old")
+
+    _use_keys(monkeypatch, NEW_KEY, OLD_KEY)
+    assert security.decrypt_value(stored) == "AIza-old"
+    rotated = security.reencrypt_value(stored)
+    assert Fernet(NEW_KEY.encode()).decrypt(rotated.encode()) == b"AIza-old"
+    assert security.reencrypt_value(rotated) is None  # already up to date
+    assert security.decrypt_value(security.reencrypt_value("AIza-plain")) == "AIza-plain"
+
+    _use_keys(monkeypatch, NEW_KEY)  # old key removed too early
+    with pytest.raises(security.WrongKeyError):
+        security.reencrypt_value(stored)
+
+
+def test_batched_reencryption_resumes_and_respects_concurrent_updates(Session, monkeypatch):
+    _use_keys(monkeypatch, OLD_KEY)
+    with Session() as db:
+        for i in range(25):
+            key = f"AIza-{i}" if i == 3 else security.encrypt_value(f"AIza-{i}")  # user 4: plain text
+            db.add(User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x",
+                        gemini_api_key=None if i == 5 else key))
+        db.commit()
+
+    _use_keys(monkeypatch, NEW_KEY, OLD_KEY)
+    progress = reencrypt_api_keys(Session, batch_size=10, max_batches=1)
+    assert progress["checked"] == 10 and progress["last_user_id"] == 11  # user 6 has no key
+    assert progress["finished_at"] is None
+
+    # A user saves a new key while the job is paused; the job must not overwrite it.
+    with Session() as db:
+        db.get(User, 20).gemini_api_key = security.encrypt_value("AIza-fresh")
+        db.commit()
+
+    final = reencrypt_api_keys(Session, batch_size=10)
+    assert final["finished_at"] is not None
+    assert final["checked"] == 24 and final["rotated"] == 23 and final["failed"] == 0
+
+    new_only = Fernet(NEW_KEY.encode())
+    with Session() as db:
+        keys = {u.id: u.gemini_api_key for u in db.query(User) if u.gemini_api_key}
+        assert new_only.decrypt(keys[4].encode()) == b"AIza-3"
+        assert new_only.decrypt(keys[20].encode()) == b"AIza-fresh"
+        assert all(new_only.decrypt(k.encode()) for k in keys.values())
+        assert rotation_status(db)["rotated"] == 23
@@ -0,0 +1,61 @@
+"""
+Tests for the filesystem driver's library index and cursor pagination
+(app/storage/library_index.py).
+"""
+import json
+import os
+import shutil
+
+from app.storage.base import project
+from app.storage.filesystem import FilesystemChapterStore
+
+
+def _seed(tmp_path, count):
+    store = FilesystemChapterStore(str(tmp_path))
+    for n in range(1, count + 1):
+        store.write("alice", f"chapter{n}", {"title": f"Chapter {n}", "segments": []})
+    return store
+
+
+def test_pages_walk_the_whole_library_in_order(tmp_path):
+    store = _seed(tmp_path, 25)
+    assert store.count("alice") == 25
+
+    seen, cursor = [], None
+    while True:
+        entries, cursor = store.list_chapters("alice", order="number", limit=10, cursor=cursor)
+        seen += [e["chapter_id"] for e in entries]
+        if cursor is None:
+            break
+    assert seen == [f"chapter{n}" for n in range(25, 0, -1)]
+
+
+def test_index_follows_writes_deletes_and_out_of_band_changes(tmp_path):
+    store = _seed(tmp_path, 3)
+    assert store.count("alice") == 3
+
+    store.write("alice", "chapter4", {"title": "New"})
+    assert store.list_chapters("alice", limit=1)[0][0]["title"] == "New"
+
+    assert store.delete("alice", "chapter4")
+    assert store.count("alice") == 3
+
+    # A chapter copied in by hand is picked up on the next lookup.
+    folder = os.path.join(str(tmp_path), "alice", "chapter9")
+    os.makedirs(folder)
+    with open(os.path.join(folder, "output.json"), "w") as f:
+        json.dump({"title": "Copied"}, f)
+    assert store.count("alice") == 4
+    assert store.list_chapters("alice", limit=1)[0][0]["title"] == "Copied"
+
+    # ...and one removed by hand disappears.
+    shutil.rmtree(folder)
+    assert store.count("alice") == 3
+
+
+def test_projection_hides_internal_fields(tmp_path):
+    store = _seed(tmp_path, 1)
+    entry = store.list_chapters("alice")[0][0]
+    assert project(entry, ["chapter_id", "title"]) == {"chapter_id": "chapter1", "title": "Chapter 1"}
+    assert "_mtime_ns" not in project(entry)
+    assert "path" not in project(entry)
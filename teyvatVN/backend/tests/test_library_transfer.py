@@ -0,0 +1,104 @@
+"""
+Tests for the streaming library export/import (app/services/library_service.py).
+"""
+import asyncio
+import io
+import json
+import zipfile
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core import jwt_utils
+from app.core.database import get_async_db
+from app.routers import story
+from app.services import auth_service, library_service
+from app.storage import get_chapter_store
+from app.storage.filesystem import FilesystemChapterStore
+from app.storage.memory import MemoryChapterStore
+
+# A library only answers its owner.
+AS_ALICE = {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': 'alice'})}"}
+
+
+def _app(store, monkeypatch):
+    async def any_user(db, username):
+        return object()
+
+    monkeypatch.setattr(auth_service, "get_user_record_async", any_user)
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+    app.dependency_overrides[get_async_db] = lambda: None
+    return app
+
+
+async def _call(app, method, url, headers=AS_ALICE, **kwargs):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+        return await client.request(method, url, **kwargs)
+
+
+def _seed(store, count):
+    for n in range(1, count + 1):
+        store.write("alice", f"chapter{n}", {"title": f"Chapter {n}", "segments": [{"type": "narration", "text": "Hi"}]})
+
+
+@pytest.mark.parametrize("fmt", library_service.EXPORT_FORMATS)
+def test_export_then_import_round_trip(tmp_path, monkeypatch, fmt):
+    source = FilesystemChapterStore(str(tmp_path))
+    _seed(source, 120)
+    exported = asyncio.run(_call(_app(source, monkeypatch), "GET", f"/api/library/alice/export?format={fmt}"))
+    assert exported.status_code == 200
+
+    target = MemoryChapterStore()
+    target.write("alice", "chapter1", {"title": "Already here"})
+    imported = asyncio.run(_call(
+        _app(target, monkeypatch), "POST", f"/api/library/alice/import?format={fmt}", content=exported.content,
+    )).json()
+
+    assert imported["imported"] == 120 and imported["errors"] == []
+    # New IDs are handed out after the existing chapter, in the original order.
+    assert imported["chapters"][0] == {"from": "chapter1", "chapter_id": "chapter2"}
+    assert target.read("alice", "chapter121")["title"] == "Chapter 120"
+    assert target.count("alice") == 121
+
+
+def test_export_streams_page_by_page(monkeypatch):
+    store = MemoryChapterStore()
+    _seed(store, 120)
+
+    async def collect(stream):
+        return [chunk async for chunk in stream]
+
+    ndjson = asyncio.run(collect(library_service.export_ndjson(store, "alice")))
+    assert len(ndjson) == 3  # 120 chapters / EXPORT_PAGE_SIZE, never the whole library at once
+    assert json.loads(ndjson[0].splitlines()[0])["chapter_id"] == "chapter1"
+
+    zipped = asyncio.run(collect(library_service.export_zip(store, "alice")))
+    assert len(zipped) > 3
+    with zipfile.ZipFile(io.BytesIO(b"".join(zipped))) as archive:
+        assert len(archive.namelist()) == 120
+
+
+def test_import_reports_bad_lines_and_keeps_the_rest(monkeypatch):
+    store = MemoryChapterStore()
+    body = b'{"chapter_id": "chapter9", "data": {"title": "Good"}}\nnot json\n[1, 2]\n{"title": "Bare chapter"}'
+    result = asyncio.run(_call(_app(store, monkeypatch), "POST", "/api/library/alice/import", content=body)).json()
+
+    assert [c["from"] for c in result["chapters"]] == ["chapter9", None]
+    assert [e["at"] for e in result["errors"]] == [2, 3]
+    assert store.read("alice", "chapter2")["title"] == "Bare chapter"
+
+
+def test_only_the_owner_can_export_or_import(monkeypatch):
+    store = MemoryChapterStore()
+    _seed(store, 1)
+    app = _app(store, monkeypatch)
+    as_bob = {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': 'bob'})}"}
+
+    assert asyncio.run(_call(app, "GET", "/api/library/alice/export", headers={})).status_code == 401
+    assert asyncio.run(_call(app, "GET", "/api/library/alice/export", headers=as_bob)).status_code == 403
+    assert asyncio.run(_call(app, "POST", "/api/library/alice/import", headers=as_bob, content=b"")).status_code == 403
+    assert store.count("alice") == 1
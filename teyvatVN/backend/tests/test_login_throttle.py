@@ -0,0 +1,234 @@
+"""
+Tests for login throttling (app/services/login_throttle.py, /api/auth/login, /api/admin/login-throttle).
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base, create_async_db_engine, get_async_db
+from app.models.sql import LoginFailure
+from app.routers import admin, auth
+from app.services import auth_service
+from app.services.login_throttle import (
+    DatabaseThrottleStore,
+    LoginThrottle,
+    LoginThrottled,
+    MemoryThrottleStore,
+    ThrottleRule,
+    get_login_throttle,
+)
+from app.services.user_cache import user_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _fail(throttle, ip, username):
+    """One wrong password, as /api/auth/login records it."""
+    throttle.record_failure(await throttle.begin(ip, username))
+
+
+def _throttle(store=None, clock=None):
+    return LoginThrottle(
+        store or MemoryThrottleStore(), window=600, clock=clock or Clock(),
+        user_rule=ThrottleRule(max_failures=5, free_failures=2, base_delay=1, max_delay=8),
+        ip_rule=ThrottleRule(max_failures=20, free_failures=10, base_delay=1, max_delay=8),
+    )
+
+
+def test_delays_grow_then_the_username_locks_until_failures_leave_the_window():
+    clock = Clock()
+    throttle = _throttle(clock=clock)
+
+    async def run():
+        waits = []
+        for _ in range(5):
+            try:
+                attempt = await throttle.begin("10.0.0.1", "venti")
+                waits.append(0)
+            except LoginThrottled as e:
+                waits.append(e.retry_after)
+                clock.now += e.retry_after
+                attempt = await throttle.begin("10.0.0.1", "venti")
+            throttle.record_failure(attempt)
+        with pytest.raises(LoginThrottled) as locked:
+            await throttle.begin("10.0.0.1", "venti")
+        # Another username from the same IP is still fine.
+        await throttle.begin("10.0.0.1", "jean")
+        clock.now += 600
+        await throttle.begin("10.0.0.1", "venti")
+        return waits, locked.value
+
+    waits, locked = asyncio.run(run())
+    assert waits == [0, 0, 1, 2, 4]  # two free failures, then doubling delays
+    assert locked.scope == "user" and locked.retry_after > 8  # the lockout outlasts the longest delay
+
+
+def test_success_clears_the_username_but_not_the_ip():
+    clock = Clock()
+    throttle = _throttle(clock=clock)
+
+    async def run():
+        await _fail(throttle, "10.0.0.3", "lisa")
+        await _fail(throttle, "10.0.0.3", "lisa")
+        clock.now += 1  # two free failures, then a one second delay
+        await throttle.record_success(await throttle.begin("10.0.0.3", "lisa"))
+        await throttle.begin("10.0.0.3", "lisa")
+        for name in ("a", "b", "c", "d", "e", "f", "g", "h", "i", "j"):
+            await _fail(throttle, "10.0.0.2", name)
+        with pytest.raises(LoginThrottled) as error:
+            await throttle.begin("10.0.0.2", "lisa")  # ten different usernames from one IP
+        return error.value, await throttle.state()
+
+    error, state = asyncio.run(run())
+    assert error.scope == "ip"
+    # The successful attempt didn't count against the IP; the attempt after it still does.
+    assert {row["key"]: row["failures"] for row in state}["ip:10.0.0.3"] == 3
+
+
+def test_memory_store_forgets_the_oldest_keys():
+    store = MemoryThrottleStore(max_keys=3)
+    for i in range(5):
+        store.reserve([f"user:u{i}"], at=100.0 + i, since=0)
+    assert [key for key, _ in store.top(since=0, limit=10)] == ["user:u2", "user:u3", "user:u4"]
+
+
+def test_database_backend_is_shared_between_workers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'throttle.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    clock = Clock()
+    worker_a = _throttle(DatabaseThrottleStore(Session), clock)
+    worker_b = _throttle(DatabaseThrottleStore(Session), clock)
+
+    async def run():
+        await _fail(worker_a, "10.0.0.4", "kaeya")
+        await _fail(worker_b, "10.0.0.4", "kaeya")
+        with pytest.raises(LoginThrottled):
+            await worker_a.begin("10.0.0.4", "kaeya")
+        state = await worker_b.state()
+        clock.now += 601
+        await _fail(worker_a, "10.0.0.5", "kaeya")  # old rows of the key are pruned
+        return state
+
+    state = asyncio.run(run())
+    assert {row["key"]: row["failures"] for row in state} == {"user:kaeya": 2, "ip:10.0.0.4": 2}
+    with Session() as db:
+        keys = db.execute(select(LoginFailure.key, func.count()).group_by(LoginFailure.key)).all()
+    # ip:10.0.0.4 wasn't written to again: its rows wait for the periodic prune of all keys.
+    assert dict(keys) == {"user:kaeya": 1, "ip:10.0.0.5": 1, "ip:10.0.0.4": 2}
+    engine.dispose()
+
+
+def _login_app(tmp_path, monkeypatch, throttle):
+    """
+    The auth and admin routers on a fresh user database, with bcrypt calls counted.
+
+    Returns:
+        tuple: (app, async engine, async session factory, list that gets one item per bcrypt check).
+    """
+    url = f"sqlite:///{tmp_path / 'users.db'}"
+    setup = create_engine(url)
+    Base.metadata.create_all(bind=setup)
+    setup.dispose()
+    user_cache.clear()
+    monkeypatch.setattr(auth_service, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(admin, "ADMIN_API_KEY", "letmein")
+
+    checks = []
+    verify = auth_service.verify_password
+    monkeypatch.setattr(auth_service, "verify_password", lambda *a: checks.append(1) or verify(*a))
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.include_router(admin.router)
+    app.dependency_overrides[get_login_throttle] = lambda: throttle
+
+    engine = create_async_db_engine(url)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def override_db():
+        async with Session() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_db
+    return app, engine, Session, checks
+
+
+def test_throttled_logins_never_reach_bcrypt(tmp_path, monkeypatch):
+    throttle = _throttle()
+    app, engine, Session, checks = _login_app(tmp_path, monkeypatch, throttle)
+
+    async def run():
+        async with Session() as db:
+            await auth_service.create_user_async(db, "diluc", "dawn-winery", "diluc@mondstadt.org")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            wrong = {"username": "diluc", "password": "guess"}
+            failed = [await client.post("/api/auth/login", json=wrong) for _ in range(2)]
+            throttled = [await client.post("/api/auth/login", json=wrong) for _ in range(10)]
+            state = await client.get("/api/admin/login-throttle", headers={"X-Admin-Key": "letmein"})
+            unlocked = await client.delete("/api/admin/login-throttle?username=diluc",
+                                           headers={"X-Admin-Key": "letmein"})
+            ok = await client.post("/api/auth/login", json={"username": "diluc", "password": "dawn-winery"})
+        await engine.dispose()
+        return failed, throttled, state, unlocked, ok
+
+    failed, throttled, state, unlocked, ok = asyncio.run(run())
+    assert [r.status_code for r in failed] == [401, 401]
+    assert all(r.status_code == 429 for r in throttled)
+    assert throttled[0].headers["Retry-After"] == "1"
+    assert len(checks) == 3  # two wrong passwords and the right one; nothing for the throttled attempts
+
+    body = state.json()
+    assert body["throttled"] == 10 and body["failures_recorded"] == 2
+    keys = {row["key"]: row for row in body["keys"]}
+    assert keys["user:diluc"]["failures"] == 2 and keys["user:diluc"]["retry_after"] >= 1
+    assert keys["ip:127.0.0.1"]["retry_after"] == 0  # under the per-IP limits
+    assert unlocked.json() == {"unlocked": True}
+    assert ok.status_code == 200
+
+
+@pytest.mark.parametrize("backend", ["memory", "database"])
+def test_a_burst_of_parallel_guesses_cannot_all_reach_bcrypt(tmp_path, monkeypatch, backend):
+    if backend == "memory":
+        store = MemoryThrottleStore()
+    else:
+        throttle_engine = create_engine(f"sqlite:///{tmp_path / 'throttle.db'}")
+        Base.metadata.create_all(bind=throttle_engine)
+        store = DatabaseThrottleStore(sessionmaker(bind=throttle_engine))
+    throttle = _throttle(store)
+    app, engine, Session, checks = _login_app(tmp_path, monkeypatch, throttle)
+
+    async def run():
+        async with Session() as db:
+            await auth_service.create_user_async(db, "diluc", "dawn-winery", "diluc@mondstadt.org")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # All sent before any of them gets an answer from bcrypt.
+            responses = await asyncio.gather(*[
+                client.post("/api/auth/login", json={"username": "diluc", "password": f"guess{i}"})
+                for i in range(30)
+            ])
+        await engine.dispose()
+        return responses
+
+    statuses = [r.status_code for r in asyncio.run(run())]
+    # Two free failures per username: only two guesses are checked, the rest are refused.
+    assert len(checks) == statuses.count(401) <= 2
+    assert statuses.count(429) >= 28
+    if backend == "database":
+        with store.session_factory() as db:
+            # The refused attempts left no rows behind.
+            assert db.execute(select(func.count()).select_from(LoginFailure)).scalar() == 2 * len(checks)
+        throttle_engine.dispose()
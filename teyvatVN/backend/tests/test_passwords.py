@@ -0,0 +1,78 @@
+"""
+Tests for password hashing off the event loop and rehash-on-login (app/services/auth_service.py).
+"""
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.database import Base, create_async_db_engine
+from app.services import auth_service
+from app.services.user_cache import user_cache
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'users.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    user_cache.clear()
+    return url
+
+
+def test_login_upgrades_the_hash_when_the_cost_changes(db_url, monkeypatch):
+    engine = create_async_db_engine(db_url)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def stored_hash():
+        async with Session() as db:
+            return (await auth_service.get_user_async(db, "amber")).hashed_password
+
+    async def run():
+        async with Session() as db:
+            monkeypatch.setattr(auth_service, "BCRYPT_ROUNDS", 4)
+            user = await auth_service.create_user_async(db, "amber", "outrider", "amber@mondstadt.org")
+            assert user.id is not None
+            assert user.hashed_password.startswith("$2b$04$")
+            assert not auth_service.needs_rehash(user.hashed_password)
+
+            monkeypatch.setattr(auth_service, "BCRYPT_ROUNDS", 5)
+            assert await auth_service.authenticate_user_async(db, "amber", "wrong") is None
+            assert (await stored_hash()).startswith("$2b$04$")  # a failed login changes nothing
+
+            assert await auth_service.authenticate_user_async(db, "amber", "outrider") is not None
+            stored = await stored_hash()
+            assert stored.startswith("$2b$05$")
+            assert auth_service.verify_password("outrider", stored)
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_hashing_does_not_block_the_loop(monkeypatch):
+    monkeypatch.setattr(auth_service, "BCRYPT_ROUNDS", 10)
+    hashed = auth_service.get_password_hash("outrider")
+
+    async def run():
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.005)
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.sleep(0)
+        results = await asyncio.gather(*[
+            auth_service.run_hashing(auth_service.verify_password, "outrider", hashed) for _ in range(4)
+        ])
+        beat.cancel()
+        return results, max(b - a for a, b in zip(ticks, ticks[1:]))
+
+    results, worst_gap = asyncio.run(run())
+    assert all(results)
+    # One check at cost 10 takes ~60ms; the loop kept ticking meanwhile.
+    assert worst_gap < 0.05
@@ -0,0 +1,163 @@
+"""
+Tests for the chapter revision history (app/storage/revisions.py).
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core import jwt_utils
+from app.routers import story
+from app.storage import get_chapter_store
+from app.storage.filesystem import FilesystemChapterStore
+from app.storage.memory import MemoryChapterStore
+from app.storage.sqlite import SQLiteChapterStore
+from app.storage.revisions import (
+    DELTA, SNAPSHOT, RevisionLog, RevisionNotFound, apply_delta, make_delta, rebuild, revision_log_for,
+)
+
+# The chapter endpoints only answer their owner.
+AS_ALICE = {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': 'alice'})}"}
+
+
+def _chapter(title, lines):
+    return {"title": title, "characters": ["Lumine"], "segments": [{"type": "narration", "text": t} for t in lines]}
+
+
+def test_delta_round_trip():
+    old = _chapter("Old", ["a", "b", "c", "d"])
+    new = {**_chapter("New", ["a", "x", "c", "d", "e"]), "mood": "calm"}
+    new.pop("characters")
+
+    delta = make_delta(old, new)
+    assert apply_delta(old, delta) == new
+    assert delta["unset"] == ["characters"]
+    # Unchanged segments are referenced by count, not copied.
+    assert [op[0] for op in delta["segments"]] == ["=", "-", "+", "=", "+"]
+
+
+def test_every_revision_rebuilds_with_a_bounded_replay():
+    store = MemoryChapterStore()
+    log = RevisionLog(store, snapshot_every=4, keep=100)
+    lines = [f"line {n}" for n in range(50)]
+    versions = []
+    for n in range(12):
+        lines[n] = f"edited {n}"
+        versions.append(_chapter(f"Take {n}", lines))
+        assert log.save("alice", "chapter1", versions[-1]) == n + 1
+
+    records = store.load_revisions("alice", "chapter1")
+    assert [r["kind"] for r in records[:5]] == [SNAPSHOT, DELTA, DELTA, DELTA, SNAPSHOT]
+    for rev, expected in enumerate(versions, start=1):
+        assert log.get("alice", "chapter1", rev) == expected
+    with pytest.raises(RevisionNotFound):
+        log.get("alice", "chapter1", 99)
+
+
+def test_history_starts_with_the_pre_existing_chapter():
+    store = MemoryChapterStore()
+    store.write("alice", "chapter1", _chapter("Before history", ["a"]))
+    log = RevisionLog(store)
+
+    assert log.save("alice", "chapter1", _chapter("After", ["a"]), reason="rename") == 2
+    assert [r["reason"] for r in log.list_revisions("alice", "chapter1")] == ["rename", "original"]
+    assert log.diff("alice", "chapter1", 2)["fields"] == {"title": {"from": "Before history", "to": "After"}}
+
+
+def test_compaction_keeps_recent_revisions_rebuildable():
+    store = MemoryChapterStore()
+    log = RevisionLog(store, snapshot_every=5, keep=6)
+    for n in range(20):
+        log.save("alice", "chapter1", _chapter("Same", [f"line {i}" for i in range(n + 1)]))
+
+    # Compaction already ran inline (no executor) whenever the log outgrew keep + snapshot_every.
+    assert len(store.load_revisions("alice", "chapter1")) <= 6 + 5
+
+    result = log.compact("alice", "chapter1")
+    records = store.load_revisions("alice", "chapter1")
+    assert [r["rev"] for r in records] == list(range(15, 21))
+    assert records[0]["kind"] == SNAPSHOT
+    assert result["dropped"] > 0 and result["bytes_reclaimed"] > 0
+    assert log.get("alice", "chapter1", 20) == store.read("alice", "chapter1")
+    assert log.get("alice", "chapter1", 15)["segments"][-1]["text"] == "line 14"
+
+
+def test_restore_endpoint_round_trip():
+    store = MemoryChapterStore()
+    store.write("alice", "chapter1", _chapter("Original", ["a", "b"]))
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=AS_ALICE) as client:
+            await client.put("/api/chapter/alice/chapter1", json={"title": "Oops"})
+            listing = (await client.get("/api/chapter/alice/chapter1/revisions")).json()
+            diff = (await client.get("/api/chapter/alice/chapter1/revisions/2/diff")).json()
+            restored = await client.post("/api/chapter/alice/chapter1/revisions/1/restore")
+            missing = await client.post("/api/chapter/alice/chapter1/revisions/9/restore")
+            return listing, diff, restored, missing
+
+    listing, diff, restored, missing = asyncio.run(run())
+    assert [r["rev"] for r in listing["revisions"]] == [2, 1]
+    assert diff["fields"]["title"] == {"from": "Original", "to": "Oops"}
+    assert restored.json()["revision"] == 3
+    assert store.read("alice", "chapter1")["title"] == "Original"
+    assert missing.status_code == 404
+    assert revision_log_for(store).get("alice", "chapter1", 2)["title"] == "Oops"
+
+
+def test_saves_keep_client_errors_out_of_500():
+    store = MemoryChapterStore()
+    store.write("alice", "chapter1", _chapter("Original", ["a"]))
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=AS_ALICE) as client:
+            return [
+                await client.put("/api/chapter/alice/chapter1", json={"title": ""}),
+                await client.put("/api/chapter/alice/chapter9", json={"title": "Lost"}),
+                await client.put("/api/chapter/alice/.trash", json={"title": "Sneaky"}),
+                await client.put("/api/chapter/alice/chapter1/segments", json={"segments": "a"}),
+                await client.put("/api/chapter/alice/chapter9/segments", json={"segments": [{"text": "b"}]}),
+                await client.put("/api/chapter/alice/chapter1/segments", content=b"{not json"),
+            ]
+
+    assert [r.status_code for r in asyncio.run(run())] == [400, 404, 400, 400, 404, 400]
+
+
+@pytest.mark.parametrize("driver", ["filesystem", "sqlite"])
+def test_workers_saving_one_chapter_never_share_a_revision(tmp_path, driver):
+    # Each "worker" has its own store and RevisionLog, as separate processes would:
+    # only the store's cross-process lock keeps them apart.
+    def worker_log():
+        if driver == "filesystem":
+            store = FilesystemChapterStore(str(tmp_path / "data"))
+        else:
+            store = SQLiteChapterStore(str(tmp_path / "chapters.db"))
+        return RevisionLog(store, snapshot_every=3, keep=10)
+
+    workers = [worker_log() for _ in range(6)]
+
+    def save_many(w):
+        for n in range(15):
+            workers[w].save("alice", "chapter1", _chapter(f"Worker {w} save {n}", [str(w), str(n)]))
+
+    with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+        list(pool.map(save_many, range(len(workers))))
+
+    store = workers[0].store
+    revs = [r["rev"] for r in store.load_revisions("alice", "chapter1")]
+    # Compaction ran along the way and lost no append: the newest revision is the 90th save,
+    # the kept ones are consecutive, and it matches the chapter on disk.
+    assert revs[-1] == 6 * 15
+    assert revs == list(range(revs[0], revs[-1] + 1))
+    assert rebuild(store.load_revisions("alice", "chapter1"), revs[-1]) == store.read_uncached("alice", "chapter1")
+    for w in workers:
+        w.store.close()
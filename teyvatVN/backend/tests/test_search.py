@@ -0,0 +1,93 @@
+"""
+Tests for full-text chapter search (app/storage/search.py).
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core import jwt_utils
+from app.routers import story
+from app.storage import get_chapter_store
+from app.storage.memory import MemoryChapterStore
+from app.storage.search import ChapterSearchIndex, build_match
+
+
+def _chapter(title, segments):
+    return {"title": title, "segments": segments}
+
+
+@pytest.fixture
+def store_and_index():
+    store = MemoryChapterStore()
+    index = ChapterSearchIndex(":memory:")
+    index.attach(store)
+    yield store, index
+    index.close()
+
+
+def test_finds_dialogue_narration_titles_and_speakers(store_and_index):
+    store, index = store_and_index
+    store.write("alice", "chapter1", _chapter("Angel's Share", [
+        {"type": "narration", "text": "The tavern smells of dandelion wine."},
+        {"type": "dialogue", "speaker": "Kaeya", "line": "Another round, Master Diluc?"},
+    ]))
+    store.write("alice", "chapter2", _chapter("Wine and Wind", []))
+
+    hits = index.search(store, "alice", "wine")
+    # The title hit ranks above the narration hit.
+    assert [(h["chapter_id"], h["segment_index"]) for h in hits] == [("chapter2", None), ("chapter1", 0)]
+    assert "<mark>wine</mark>" in hits[1]["snippet"]
+
+    speaker_hit = index.search(store, "alice", "kaeya")[0]
+    assert (speaker_hit["chapter_id"], speaker_hit["segment_index"], speaker_hit["speaker"]) == ("chapter1", 1, "Kaeya")
+    # The last word matches as a prefix; diacritics are ignored.
+    assert index.search(store, "alice", "dilu")[0]["segment_index"] == 1
+    assert index.search(store, "alice", "DANDÉLION")[0]["chapter_id"] == "chapter1"
+
+
+def test_index_follows_writes_deletes_and_scopes_by_user(store_and_index):
+    store, index = store_and_index
+    store.write("alice", "chapter1", _chapter("Old title", [{"type": "narration", "text": "Paimon eats"}]))
+    store.write("bob", "chapter1", _chapter("Bob's Paimon story", []))
+
+    assert len(index.search(store, "alice", "paimon")) == 1
+    store.write("alice", "chapter1", _chapter("New title", [{"type": "narration", "text": "Nothing here"}]))
+    assert index.search(store, "alice", "paimon") == []
+    assert index.search(store, "alice", "new")[0]["title"] == "New title"
+
+    store.delete("bob", "chapter1")
+    assert index.search(store, "bob", "paimon") == []
+
+
+def test_existing_library_is_indexed_on_first_search():
+    store = MemoryChapterStore()
+    store.write("alice", "chapter1", _chapter("Written before search existed", []))
+    index = ChapterSearchIndex(":memory:")
+    index.attach(store)
+    assert index.search(store, "alice", "existed")[0]["chapter_id"] == "chapter1"
+
+
+def test_query_syntax_cannot_break_out():
+    assert build_match('" OR body:*') == '"OR" "body"*'
+    assert build_match("lu k") == '"lu" "k"'  # one letter is too short for a prefix search
+    assert build_match("?!") is None
+
+
+def test_search_endpoint_only_answers_the_owner(store_and_index, monkeypatch):
+    store, index = store_and_index
+    store.write("alice", "chapter1", _chapter("Secret Diary", []))
+    monkeypatch.setattr(story, "search_index_for", lambda s: index)
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+
+    async def search(name):
+        token = jwt_utils.create_access_token({"sub": name})
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/search/alice?q=diary", headers={"Authorization": f"Bearer {token}"})
+
+    assert asyncio.run(search("alice")).json()["count"] == 1
+    assert asyncio.run(search("bob")).status_code == 403
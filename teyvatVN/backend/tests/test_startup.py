@@ -0,0 +1,101 @@
+"""
+Startup checks (app/main.py): importing the app must be quick and free of side effects,
+and the work it skipped must happen in the lifespan instead.
+
+Each check starts a fresh Python process, like a new worker or a '--reload' restart.
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from cryptography.fernet import Fernet
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Generous: a cold import is well under a second here. Loading the Gemini SDK on import
+# (as before) added about half a second on its own.
+STARTUP_BUDGET_SECONDS = 3.0
+
+CHILD = """
+import asyncio, json, os, sys, time
+import dotenv
+
+dotenv_loads = []
+real_load_dotenv = dotenv.load_dotenv
+dotenv.load_dotenv = lambda *a, **k: dotenv_loads.append(1) or real_load_dotenv(*a, **k)
+
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter() - start
+import_state = {
+    "data_dir_on_import": os.path.isdir(app.main.DATA_DIR),
+    "ai_loaded": "google.generativeai" in sys.modules,
+    "alembic_loaded": "alembic" in sys.modules,
+    "ciphers_loaded": app.main.security.cipher_suite is not None,
+}
+
+async def boot():
+    start = time.perf_counter()
+    async with app.main.app.router.lifespan_context(app.main.app):
+        return time.perf_counter() - start, app.main.security.cipher_suite is not None, os.path.isdir(app.main.DATA_DIR)
+
+ready, ciphers_after_startup, data_dir_after_startup = asyncio.run(boot())
+print("RESULT " + json.dumps({"import_seconds": imported, "startup_seconds": ready,
+                              "dotenv_loads": len(dotenv_loads), "ciphers_after_startup": ciphers_after_startup,
+                              "data_dir_after_startup": data_dir_after_startup, **import_state}))
+"""
+
+
+def _start_app(tmp_path, **env):
+    environment = {
+        **os.environ,
+        "PYTHONPATH": BACKEND_DIR,
+        "SECRET_KEY": "startup-test",
+        "ENCRYPTION_KEY": Fernet.generate_key().decode(),
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'startup.db'}",
+        "CHAPTER_STORE": "memory",
+        "CHAPTER_WATCH": "off",
+        "STATIC_DATA_DIR": str(tmp_path / "static"),
+        **env,
+    }
+    return subprocess.run([sys.executable, "-c", CHILD], cwd=tmp_path, env=environment,
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_import_is_fast_and_side_effect_free(tmp_path):
+    child = _start_app(tmp_path)
+    assert child.returncode == 0, child.stderr
+    printed, _, result = child.stdout.rpartition("RESULT ")
+    result = json.loads(result)
+
+    assert printed == ""  # no debug lines
+    assert result["dotenv_loads"] == 1
+    assert not result["ai_loaded"] and not result["alembic_loaded"] and not result["ciphers_loaded"]
+    assert not (tmp_path / "startup.db").exists()  # no tables created on import
+    assert not result["data_dir_on_import"]  # nor folders
+    assert result["ciphers_after_startup"] and result["data_dir_after_startup"]
+    assert result["import_seconds"] + result["startup_seconds"] < STARTUP_BUDGET_SECONDS, result
+
+
+def test_startup_needs_an_encryption_key(tmp_path):
+    child = _start_app(tmp_path, ENCRYPTION_KEY="")
+    assert child.returncode != 0
+    assert "EncryptionNotConfigured" in child.stderr and "ENCRYPTION_KEY is not set" in child.stderr
+
+
+def test_import_works_without_a_secret_key_but_startup_does_not(tmp_path):
+    child = _start_app(tmp_path, SECRET_KEY="")
+    assert child.returncode != 0
+    # 'import app.main' went through; the lifespan is what stopped it.
+    assert "in boot" in child.stderr
+    assert "SecretKeyNotConfigured" in child.stderr and "SECRET_KEY is not set" in child.stderr
+
+
+def test_startup_can_run_the_migrations(tmp_path):
+    child = _start_app(tmp_path, DB_MIGRATE_ON_STARTUP="true")
+    assert child.returncode == 0, child.stderr
+
+    with sqlite3.connect(tmp_path / "startup.db") as db:
+        tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"alembic_version", "users", "user_usage", "chapter_usage", "key_rotations"} <= tables
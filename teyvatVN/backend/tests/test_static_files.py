@@ -0,0 +1,98 @@
+"""
+Tests for the /data static handler (app/common/static_files.py).
+"""
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.common.static_files import IMMUTABLE_CACHE_CONTROL, DataStaticFiles, write_precompressed
+from app.storage.filesystem import FilesystemChapterStore
+
+
+@pytest.fixture
+def served(tmp_path):
+    store = FilesystemChapterStore(str(tmp_path))
+    chapter = {"title": "Liyue", "segments": [{"type": "narration", "text": "Rex Lapis descends. " * 200}]}
+    store.write("alice", "chapter1", chapter)
+    path = store.chapter_file("alice", "chapter1")
+    write_precompressed(path, open(path, "rb").read())  # what scripts/precompress_data.py does
+    files = DataStaticFiles(directory=str(tmp_path))
+    app = FastAPI()
+    app.mount("/data", files, name="data")
+    return TestClient(app), files, store
+
+
+def test_precompressed_copy_is_served_when_accepted(served):
+    client, _, store = served
+    plain = open(store.chapter_file("alice", "chapter1"), "rb").read()
+    assert os.path.exists(store.chapter_file("alice", "chapter1") + ".gz")
+
+    response = client.get("/data/alice/chapter1/output.json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(plain)
+    assert response.content == plain  # the client decompressed it
+
+    identity = client.get("/data/alice/chapter1/output.json", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] != response.headers["etag"]
+
+
+def test_stale_copy_is_ignored(served):
+    client, _, store = served
+    path = store.chapter_file("alice", "chapter1")
+    with open(path, "wb") as f:
+        f.write(b'{"title": "Edited by hand"}')
+    stat = os.stat(path)
+    os.utime(path + ".gz", ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+
+    response = client.get("/data/alice/chapter1/output.json", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"title": "Edited by hand"}
+
+
+def test_etag_revalidation_and_ranges(served):
+    client, _, _ = served
+    first = client.get("/data/alice/chapter1/output.json", headers={"Accept-Encoding": "identity"})
+    assert first.headers["cache-control"] == "no-cache"
+
+    again = client.get("/data/alice/chapter1/output.json",
+                       headers={"Accept-Encoding": "identity", "If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert again.headers["etag"] == first.headers["etag"]
+
+    part = client.get("/data/alice/chapter1/output.json", headers={"Accept-Encoding": "gzip", "Range": "bytes=0-9"})
+    assert part.status_code == 206
+    assert "content-encoding" not in part.headers
+    assert part.content == first.content[:10]
+
+
+def test_hashed_urls_are_immutable(served, tmp_path):
+    client, files, _ = served
+    versioned = files.versioned_path("alice/chapter1/output.json")
+    assert client.get(f"/data/{versioned}").headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert client.get("/data/alice/chapter1/output.json?v=00000000").headers["cache-control"] == "no-cache"
+
+    (tmp_path / "scene.3f9a1c2b.png").write_bytes(b"\x89PNG")
+    assert client.get("/data/scene.3f9a1c2b.png").headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_small_files_get_no_copies(tmp_path):
+    path = str(tmp_path / "tiny.json")
+    write_precompressed(path, b"{}")
+    assert not os.path.exists(path + ".gz")
+
+    raw = b'{"text": "' + b"wind " * 1000 + b'"}'
+    write_precompressed(path, raw)
+    assert gzip.decompress(open(path + ".gz", "rb").read()) == raw
+
+
+def test_saving_a_chapter_writes_no_copies(tmp_path):
+    # /data doesn't serve the chapter folder, so saves don't pay for compressing.
+    store = FilesystemChapterStore(str(tmp_path))
+    store.write("alice", "chapter1", {"title": "Inazuma", "segments": [{"type": "narration", "text": "Thunder. " * 500}]})
+    assert os.listdir(os.path.dirname(store.chapter_file("alice", "chapter1"))) == ["output.json"]
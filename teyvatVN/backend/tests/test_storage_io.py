@@ -0,0 +1,101 @@
+"""
+Checks that chapter saves don't block the event loop (app/common/storage_io.py).
+
+We simulate a slow disk (50ms per write) and fire many concurrent segment saves,
+while a ticker coroutine measures how late the loop wakes it up.
+If the writes ran on the loop, the ticker would be delayed by whole writes.
+
+The lag is compared with the same saves run right on the loop (the code before run_io),
+rather than with a fixed bound: a slow machine or a garbage-collection pause delays
+the ticker in both runs, while blocking writes only delay it in one.
+"""
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core import jwt_utils
+from app.routers import story
+from app.storage import filesystem, get_chapter_store
+from app.storage.filesystem import FilesystemChapterStore
+
+SLOW_WRITE_SECONDS = 0.05
+CONCURRENT_SAVES = 16
+
+# The chapter endpoints only answer their owner.
+AS_ALICE = {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': 'alice'})}"}
+
+
+async def run_inline(func, *args, **kwargs):
+    """Stands in for run_io(): the blocking call runs right on the event loop."""
+    return func(*args, **kwargs)
+
+
+async def measure_saves(client, body):
+    """
+    Fires CONCURRENT_SAVES segment saves at once.
+
+    Returns:
+        tuple: (responses, total event-loop lag in seconds while they ran).
+    """
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    tick = asyncio.create_task(ticker())
+    responses = await asyncio.gather(*[
+        client.put("/api/chapter/alice/chapter1/segments", content=body,
+                   headers={"Content-Type": "application/json"})
+        for _ in range(CONCURRENT_SAVES)
+    ])
+    done.set()
+    await tick
+    return responses, sum(lags)
+
+
+def test_concurrent_saves_keep_event_loop_responsive(tmp_path, monkeypatch):
+    store = FilesystemChapterStore(str(tmp_path))
+    store.write("alice", "chapter1", {"title": "Lag test", "segments": []})
+
+    real_atomic_write = filesystem.atomic_write
+
+    def slow_atomic_write(path, raw):
+        time.sleep(SLOW_WRITE_SECONDS)
+        real_atomic_write(path, raw)
+
+    monkeypatch.setattr(filesystem, "atomic_write", slow_atomic_write)
+
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+    segments = [{"type": "narration", "text": "The wind carries a song. " * 8}] * 200
+    # Encoded once up front, so the test client itself doesn't keep the loop busy.
+    body = json.dumps({"segments": segments}).encode("utf-8")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=AS_ALICE) as client:
+            # Warm up first: one-off work on a fresh app's first request isn't what is measured here.
+            await client.get("/api/chapter/alice/chapter1")
+            with monkeypatch.context() as patch:
+                patch.setattr(story, "run_io", run_inline)
+                _, blocking_lag = await measure_saves(client, body)
+            responses, lag = await measure_saves(client, body)
+        return responses, blocking_lag, lag
+
+    responses, blocking_lag, lag = asyncio.run(run())
+
+    assert all(r.status_code == 200 for r in responses)
+    # On the loop, every write stalls it: that is the baseline.
+    assert blocking_lag > CONCURRENT_SAVES * SLOW_WRITE_SECONDS * 0.8
+    assert lag < blocking_lag / 4, (
+        f"event-loop lag {lag * 1000:.0f}ms, {blocking_lag * 1000:.0f}ms with blocking writes"
+    )
+    assert len(store.read("alice", "chapter1")["segments"]) == len(segments)
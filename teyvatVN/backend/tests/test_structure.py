@@ -6,10 +6,10 @@ import json
 import os
 import sys
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(__file__))
+# Add the backend directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-import utils
+from app.common import utils
 
 def test_auto_increment():
     """Test the auto-increment chapter ID functionality"""
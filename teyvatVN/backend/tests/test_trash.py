@@ -0,0 +1,49 @@
+"""
+Tests for deleting into the trash, restoring, and trash compaction (app/storage/trash.py).
+"""
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.core import jwt_utils
+from app.routers import story
+from app.storage import get_chapter_store
+from app.storage.memory import MemoryChapterStore
+from app.storage.trash import compact_trash
+
+# The chapter endpoints only answer their owner.
+AS_ALICE = {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': 'alice'})}"}
+AS_BOB = {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': 'bob'})}"}
+
+
+def test_delete_restore_and_compact_over_http():
+    store = MemoryChapterStore()
+    store.write("alice", "chapter1", {"title": "Oops", "segments": []})
+    app = FastAPI()
+    app.include_router(story.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=AS_ALICE) as client:
+            deleted = await client.delete("/api/chapter/alice/chapter1")
+            trash = await client.get("/api/library/alice/trash")
+            peek = await client.get("/api/library/alice/trash", headers=AS_BOB)
+            stolen = await client.post("/api/chapter/alice/chapter1/restore", headers=AS_BOB)
+            restored = await client.post("/api/chapter/alice/chapter1/restore")
+            again = await client.post("/api/chapter/alice/chapter1/restore")
+            await client.delete("/api/chapter/alice/chapter1")
+            return deleted, trash, peek, stolen, restored, again
+
+    deleted, trash, peek, stolen, restored, again = asyncio.run(run())
+    assert deleted.status_code == 200 and "restorable_until" in deleted.json()
+    assert [e["title"] for e in trash.json()["chapters"]] == ["Oops"]
+    assert peek.status_code == 403 and stolen.status_code == 403
+    assert restored.status_code == 200
+    assert again.status_code == 409
+
+    # Still within the retention window: kept. Past it: gone.
+    assert compact_trash(store, retention=3600)["chapters"] == 0
+    assert compact_trash(store, retention=-1)["chapters"] == 1
+    assert store.list_deleted("alice") == []
@@ -0,0 +1,195 @@
+"""
+Tests for usage accounting and quotas (app/services/usage_service.py, app/routers/admin.py).
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.core import jwt_utils
+from app.core.database import Base, create_async_db_engine, get_async_db
+from app.routers import admin, ai
+from app.services import ai_service, usage_service
+from app.services.usage_service import QuotaExceeded, UsageTracker, chapter_bytes
+from app.services.user_cache import user_cache
+from app.storage import get_chapter_store
+from app.storage.filesystem import FilesystemChapterStore
+from app.storage.memory import MemoryChapterStore
+
+
+def _as(username):
+    return {"Authorization": f"Bearer {jwt_utils.create_access_token({'sub': username})}"}
+
+
+def _chapter(text):
+    return {"title": "Usage", "segments": [{"type": "narration", "text": text}]}
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+def test_counters_follow_writes_deletes_and_restores(session_factory):
+    store = MemoryChapterStore()
+    store.write("alice", "chapter1", _chapter("written before tracking"))
+    tracker = UsageTracker(session_factory)
+    tracker.attach(store)
+
+    # Existing chapters are counted on first use.
+    first = _chapter("written before tracking")
+    assert tracker.usage(store, "alice")["chapters"] == 1
+    assert tracker.usage(store, "alice")["bytes"] == chapter_bytes(first)
+
+    second = _chapter("a much longer chapter " * 20)
+    store.write("alice", "chapter2", second)
+    store.write("alice", "chapter1", _chapter("short"))  # overwrite: only the size changes
+    usage = tracker.usage(store, "alice")
+    assert usage["chapters"] == 2
+    assert usage["bytes"] == chapter_bytes(_chapter("short")) + chapter_bytes(second)
+
+    store.delete("alice", "chapter2")
+    assert tracker.usage(store, "alice")["chapters"] == 1
+    store.restore("alice", "chapter2")
+    assert tracker.usage(store, "alice")["chapters"] == 2
+    assert tracker.top_consumers("bytes")[0]["username"] == "alice"
+
+
+
+def test_first_count_leaves_the_chapter_cache_alone(session_factory, tmp_path):
+    store = FilesystemChapterStore(str(tmp_path))
+    for n in range(1, 4):
+        store.write("alice", f"chapter{n}", _chapter(f"chapter {n}"))
+    store.cache.clear()
+    store.read("alice", "chapter2")  # the one being played
+    before = store.cache.stats()
+
+    tracker = UsageTracker(session_factory)
+    assert tracker.usage(store, "alice")["chapters"] == 3
+    after = store.cache.stats()
+    assert (after["entries"], after["hits"], after["misses"]) == (1, before["hits"], before["misses"])
+
+def test_quotas(session_factory):
+    store = MemoryChapterStore()
+    tracker = UsageTracker(session_factory, max_chapters=2, max_generations_per_day=2)
+    tracker.attach(store)
+
+    tracker.reserve_generation(store, "bob")
+    tracker.reserve_generation(store, "bob")
+    with pytest.raises(QuotaExceeded) as error:
+        tracker.reserve_generation(store, "bob")
+    assert error.value.limit == "generations"
+    tracker.release_generation("bob")  # a failed AI call gives its generation back
+    tracker.reserve_generation(store, "bob")
+    usage = tracker.usage(store, "bob")
+    assert usage["generations"] == usage["generations_today"] == 2
+
+    other = UsageTracker(session_factory, max_chapters=2)
+    store.write("bob", "chapter1", _chapter("one"))
+    store.write("bob", "chapter2", _chapter("two"))
+    with pytest.raises(QuotaExceeded) as error:
+        other.reserve_generation(store, "bob")
+    assert error.value.limit == "chapters"
+
+
+def test_quota_is_enforced_before_the_ai_is_called(session_factory, tmp_path, monkeypatch):
+    store = MemoryChapterStore()
+    tracker = UsageTracker(session_factory, max_generations_per_day=1)
+    tracker.attach(store)
+    monkeypatch.setitem(usage_service._trackers, store, tracker)
+    monkeypatch.setattr(ai_service, "generate_chapter_from_prompt", lambda prompt, api_key=None: _chapter(prompt))
+    monkeypatch.setattr(ai, "USE_PUBLIC_API", True)
+    monkeypatch.setattr(admin, "ADMIN_API_KEY", "letmein")
+
+    app = FastAPI()
+    app.include_router(ai.router)
+    app.include_router(admin.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+
+    async_engine = create_async_db_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_db
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = {"prompt": "Klee finds a bomb", "username": "klee"}
+            monkeypatch.setattr(ai_service, "generate_chapter_from_prompt", lambda *a, **k: pytest.fail("AI called"))
+            anonymous = await client.post("/api/generate", json=body)
+            impostor = await client.post("/api/generate", json=body, headers=_as("jean"))
+            monkeypatch.setattr(ai_service, "generate_chapter_from_prompt", lambda prompt, api_key=None: _chapter(prompt))
+            first = await client.post("/api/generate", json=body, headers=_as("klee"))
+            monkeypatch.setattr(ai_service, "generate_chapter_from_prompt", lambda *a, **k: pytest.fail("AI called"))
+            second = await client.post("/api/generate", json=body, headers=_as("klee"))
+            forbidden = await client.get("/api/admin/usage/top", headers={"X-Admin-Key": "wrong"})
+            top = await client.get("/api/admin/usage/top?by=generations", headers={"X-Admin-Key": "letmein"})
+        await async_engine.dispose()
+        return anonymous, impostor, first, second, forbidden, top
+
+    anonymous, impostor, first, second, forbidden, top = asyncio.run(run())
+    # Another user's name in the body doesn't spend their quota.
+    assert (anonymous.status_code, impostor.status_code) == (401, 403)
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert store.count("klee") == 1
+    assert forbidden.status_code == 403
+    assert top.json()["users"][0] == {
+        "username": "klee", "chapters": 1, "bytes": chapter_bytes(_chapter("Klee finds a bomb")),
+        "generations": 1, "generations_today": 1,
+    }
+
+
+@pytest.mark.parametrize("failing", ["write", "append_revision"])
+def test_a_failed_save_gives_the_generation_back(session_factory, tmp_path, monkeypatch, failing):
+    store = FilesystemChapterStore(str(tmp_path / "data"))
+    tracker = UsageTracker(session_factory)
+    tracker.attach(store)
+    monkeypatch.setitem(usage_service._trackers, store, tracker)
+    monkeypatch.setattr(ai_service, "generate_story", lambda chapter_input, api_key=None: _chapter("x")["segments"])
+    monkeypatch.setattr(ai, "USE_PUBLIC_API", True)
+
+    def full_disk(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(store, failing, full_disk)
+
+    app = FastAPI()
+    app.include_router(ai.router)
+    app.dependency_overrides[get_chapter_store] = lambda: store
+    async_engine = create_async_db_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_db
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = {"prompt": "Qiqi forgets", "char1": "Qiqi", "char2": "Baizhu", "background": "Bubu Pharmacy"}
+            stranger = await client.post("/api/qiqi/chapter1", json=body, headers=_as("hutao"))
+            response = await client.post("/api/qiqi/chapter1", json=body, headers=_as("qiqi"))
+        await async_engine.dispose()
+        return stranger, response
+
+    stranger, response = asyncio.run(run())
+    assert stranger.status_code == 403
+    assert response.status_code == 500
+    # Whichever half of the save failed, the chapter wasn't written, so nothing is counted.
+    assert store.read("qiqi", "chapter1") is None
+    assert tracker.usage(store, "qiqi")["generations"] == 0
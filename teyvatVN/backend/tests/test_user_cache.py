@@ -0,0 +1,77 @@
+"""
+Tests for the user record cache (app/services/user_cache.py) and its use in auth_service.
+"""
+import time
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.services import auth_service
+from app.services.user_cache import UserCache, UserRecord, user_cache
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(auth_service, "BCRYPT_ROUNDS", 4)
+    user_cache.clear()
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    yield sessionmaker(bind=engine), queries
+    engine.dispose()
+
+
+def test_lookups_are_served_from_the_cache(sessions):
+    Session, queries = sessions
+    with Session() as db:
+        assert auth_service.get_user_record(db, "lisa") is None
+        auth_service.create_user(db, "lisa", "librarian", "lisa@mondstadt.org")
+
+    queries.clear()
+    with Session() as db:
+        record = auth_service.get_user_record(db, "lisa")  # the cached "no such user" was dropped
+    assert record.email == "lisa@mondstadt.org"
+    assert len(queries) == 1
+
+    # The record outlives its session and answers both kinds of lookups without a query.
+    with Session() as db:
+        assert auth_service.get_user_record(db, "lisa") == record
+        assert auth_service.get_user_record_by_email(db, "lisa@mondstadt.org") is record
+    assert len(queries) == 1
+    assert user_cache.stats()["hit_rate"] > 0
+
+
+def test_changes_invalidate_and_entries_expire(sessions, monkeypatch):
+    Session, queries = sessions
+    with Session() as db:
+        auth_service.create_user(db, "jean", "dandelion", "jean@mondstadt.org")
+        assert auth_service.get_user_record(db, "jean").gemini_api_key is None
+
+        assert auth_service.update_gemini_api_key(db, "jean", "encrypted-key")
+        monkeypatch.setattr(user_cache, "ttl", 0)  # entries stored from now on expire at once
+        assert auth_service.get_user_record(db, "jean").gemini_api_key == "encrypted-key"
+        queries.clear()
+        auth_service.get_user_record(db, "jean")
+    assert len(queries) == 1
+    assert user_cache.stats()["expirations"] >= 1
+
+
+def test_misses_are_trusted_briefly():
+    # What another worker's signup looks like here: nothing invalidates this cache.
+    cache = UserCache(ttl=60, miss_ttl=0.05)
+    cache.put("username", "nahida", None, cache.generation())
+    assert cache.lookup("username", "nahida") == (True, None)
+    time.sleep(0.06)
+    assert cache.lookup("username", "nahida") == (False, None)
+
+    record = UserRecord(1, "nahida", "nahida@sumeru.org", "hash", True, None, None)
+    cache.put("username", "nahida", record, cache.generation())
+    time.sleep(0.06)
+    assert cache.lookup("email", "nahida@sumeru.org") == (True, record)  # found users keep the full TTL
+
+    uncached = UserCache(miss_ttl=0)
+    uncached.put("username", "wanderer", None, uncached.generation())
+    assert uncached.lookup("username", "wanderer") == (False, None)
@@ -0,0 +1,75 @@
+"""
+Tests for the chapter folder watcher (app/storage/watcher.py).
+
+Chapters are edited, copied in and removed by hand (not through the store),
+and the library index, cache and search index must follow.
+"""
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+from app.storage.filesystem import FilesystemChapterStore
+from app.storage.layout import DataLayout
+from app.storage.search import ChapterSearchIndex
+from app.storage.watcher import ChapterWatcher, InotifySource
+
+
+def _write_by_hand(store, username, chapter_id, title):
+    folder = store.chapter_dir(username, chapter_id)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "output.json"), "w", encoding="utf-8") as f:
+        json.dump({"title": title, "segments": [{"type": "narration", "text": f"{title} happens"}]}, f)
+
+
+def _eventually(check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.02)
+
+
+def _inotify_available(tmp_path):
+    try:
+        InotifySource(DataLayout(str(tmp_path))).close()
+        return True
+    except OSError:
+        return False
+
+
+@pytest.mark.parametrize("layout", ["flat", "sharded"])
+@pytest.mark.parametrize("mode", ["inotify", "poll"])
+def test_hand_edits_reach_library_and_search(tmp_path, mode, layout):
+    if mode == "inotify" and not _inotify_available(tmp_path):
+        pytest.skip("inotify is not available here")
+    store = FilesystemChapterStore(str(tmp_path / "data"), layout=layout)
+    index = ChapterSearchIndex(":memory:")
+    index.attach(store)
+    store.write("alice", "chapter1", {"title": "Original", "segments": []})
+    assert store.count("alice") == 1  # builds the library index
+    index.search(store, "alice", "original")  # builds the search index
+
+    watcher = ChapterWatcher(store, mode=mode, debounce=0.05, poll_interval=0.05).start()
+    try:
+        # Our own writes are recognised and not refreshed a second time.
+        store.write("alice", "chapter1", {"title": "Through the API", "segments": []})
+
+        _write_by_hand(store, "alice", "chapter1", "Edited by hand")
+        _write_by_hand(store, "alice", "chapter2", "Copied in")
+        _write_by_hand(store, "bob", "chapter1", "Brand new user")
+        _eventually(lambda: index.search(store, "alice", "copied"))
+        _eventually(lambda: index.search(store, "bob", "brand"))
+        _eventually(lambda: index.search(store, "alice", "hand"))
+        assert {e["title"] for e in store.list_chapters("alice")[0]} == {"Edited by hand", "Copied in"}
+        assert store.cache.is_fresh(("alice", "chapter1"), os.stat(store.chapter_file("alice", "chapter1")))
+
+        shutil.rmtree(store.chapter_dir("alice", "chapter2"))
+        _eventually(lambda: not index.search(store, "alice", "copied"))
+        assert store.count("alice") == 1
+        assert watcher.refreshed >= 4
+    finally:
+        watcher.stop()
+        index.close()
@@ -12,3 +12,14 @@ export const API_BASE_URL = import.meta.env.VITE_API_BASE_URL !== undefined ? im
 
 // A specific endpoint used for story generation (legacy constant, might be used in some older files)
 export const API_URL = `${API_BASE_URL}/api/generate`;
+
+/**
+ * Headers that prove who the user is (their login token), for fetch() calls.
+ * Chapter endpoints (/api/chapter/{username}/...) only answer the chapter's owner.
+ *
+ * @param {Object} headers - Any other headers to send along.
+ */
+export const authHeaders = (headers = {}) => {
+    const token = localStorage.getItem("authToken");
+    return token ? { ...headers, Authorization: `Bearer ${token}` } : headers;
+};
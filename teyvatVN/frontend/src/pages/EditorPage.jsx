@@ -15,7 +15,7 @@ import bg3 from "../assets/background/statue-of-seven-day.png";
 // Components
 import VNScene from "../components/vn/VNScene";
 import { characterDatabase } from "../data/characterData.js";
-import { API_BASE_URL } from "../config/api";
+import { API_BASE_URL, authHeaders } from "../config/api";
 
 // Map background IDs to imported images
 const backgroundImages = {
@@ -76,7 +76,7 @@ export default function EditorPage() {
     const loadChapter = async () => {
         setIsLoading(true);
         try {
-            const response = await fetch(`${API_BASE_URL}/api/chapter/${username}/${chapterId}`);
+            const response = await fetch(`${API_BASE_URL}/api/chapter/${username}/${chapterId}`, { headers: authHeaders() });
 
             if (!response.ok) {
                 throw new Error("Failed to load chapter");
@@ -116,7 +116,7 @@ export default function EditorPage() {
             // Send a PUT request to update the segments
             const response = await fetch(`${API_BASE_URL}/api/chapter/${username}/${chapterId}/segments`, {
                 method: "PUT",
-                headers: { "Content-Type": "application/json" },
+                headers: authHeaders({ "Content-Type": "application/json" }),
                 body: JSON.stringify({ segments: segments })
             });
 
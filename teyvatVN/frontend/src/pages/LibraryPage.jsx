@@ -5,7 +5,7 @@ import toast from "react-hot-toast";
 import Layout from "../components/layout/Layout";
 import { useAuth } from "../context/AuthContext";
 import "../styles/LibraryPage.css";
-import { API_BASE_URL } from "../config/api";
+import { API_BASE_URL, authHeaders } from "../config/api";
 
 // Assets
 import pageBg from "../assets/background/goodNews.jpg";
@@ -49,7 +49,9 @@ export default function LibraryPage() {
         setIsLoading(true);
         try {
             // Make a GET request to the library endpoint
-            const response = await fetch(`${API_BASE_URL}/api/library/${username}`);
+            const response = await fetch(`${API_BASE_URL}/api/library/${username}`, {
+                headers: authHeaders()
+            });
 
             if (!response.ok) {
                 throw new Error("Failed to fetch library");
@@ -111,7 +113,8 @@ export default function LibraryPage() {
         try {
             // Make a DELETE request to the API
             const response = await fetch(`${API_BASE_URL}/api/chapter/${username}/${chapterId}`, {
-                method: "DELETE"
+                method: "DELETE",
+                headers: authHeaders()
             });
 
             if (!response.ok) {
@@ -143,7 +146,7 @@ export default function LibraryPage() {
             // Make a PUT request to update the title
             const response = await fetch(`${API_BASE_URL}/api/chapter/${username}/${chapterId}`, {
                 method: "PUT",
-                headers: { "Content-Type": "application/json" },
+                headers: authHeaders({ "Content-Type": "application/json" }),
                 body: JSON.stringify({ title: newTitle })
             });
 
@@ -9,7 +9,7 @@ import Layout from "../components/layout/Layout";
 
 // Config & Context
 import { BACKGROUND_OPTIONS } from "../config/backgrounds.js";
-import { API_BASE_URL } from "../config/api";
+import { API_BASE_URL, authHeaders } from "../config/api";
 
 // Assets
 import pageBg from "../assets/background/goodNews.jpg";
@@ -87,7 +87,7 @@ export default function PlayPage() {
 
         try {
             console.log(`Loading chapter: ${chapterId} for user: ${username}`);
-            const response = await fetch(`${API_BASE_URL}/api/chapter/${username}/${chapterId}`);
+            const response = await fetch(`${API_BASE_URL}/api/chapter/${username}/${chapterId}`, { headers: authHeaders() });
 
             if (!response.ok) {
                 throw new Error("Failed to load chapter");
@@ -14,7 +14,7 @@ import { useCharacters } from "../context/CharacterContext";
 import { characterDatabase } from "../data/characterData.js";
 import SegmentNavigator from "../components/vn/SegmentNavigator";
 import { BACKGROUND_OPTIONS } from "../config/backgrounds.js";
-import { API_URL, API_BASE_URL } from "../config/api";
+import { API_URL, API_BASE_URL, authHeaders } from "../config/api";
 
 // Assets
 import quillIcon from "../assets/images/quill.png";
@@ -121,7 +121,7 @@ export default function StoryPage() {
     try {
       console.log(`Loading chapter: ${chapterId} for user: ${username}`);
       // Make a GET request to the backend
-      const response = await fetch(`${API_BASE_URL}/api/chapter/${username}/${chapterId}`);
+      const response = await fetch(`${API_BASE_URL}/api/chapter/${username}/${chapterId}`, { headers: authHeaders() });
 
       if (!response.ok) {
         throw new Error("Failed to load chapter");
@@ -184,9 +184,9 @@ export default function StoryPage() {
       // Make a POST request to the AI generation endpoint
       const response = await fetch(API_URL, {
         method: "POST",
-        headers: {
+        headers: authHeaders({
           "Content-Type": "application/json",
-        },
+        }),
         body: JSON.stringify({
           prompt: enhancedPrompt,
           username: username,